@@ -21,25 +21,57 @@ from __future__ import division
 
 import logging
 import json
+import sqlite3
+import typing
 
 # AKL modules
 from resources.lib import globals
 from resources.lib.repositories import UnitOfWork, ROMsRepository, ROMCollectionRepository, SourcesRepository, LaunchersRepository
+from resources.lib.domain import ROMLaunchPlan
 
 logger = logging.getLogger(__name__)
         
         
 def qry_get_rom(rom_id: str) -> str:
+    launch_plan = _find_or_create_launch_plan(rom_id)
+    if launch_plan is None:
+        return None
+    
+    return json.dumps(launch_plan.get_rom_dto_data())
+
+
+def qry_get_rom_launcher_settings(rom_id: str, launcher_id: str) -> str:
+    launch_plan = _find_or_create_launch_plan(rom_id)
+    if launch_plan is None:
+        return None
+    
+    settings = launch_plan.get_launcher_settings(launcher_id)
+    return json.dumps(settings) if settings is not None else None
+
+
+def _find_or_create_launch_plan(rom_id: str) -> typing.Optional[ROMLaunchPlan]:
+    # Storing a new launch plan only speeds up the next queries. When the database is busy or
+    # locked the query still answers with the resolved plan instead of failing the launch.
+    launch_plan = None
     uow = UnitOfWork(globals.g_PATHS.DATABASE_FILE_PATH)
-    with uow:
-        rom_repository = ROMsRepository(uow)
-        rom = rom_repository.find_rom(rom_id)
-        
-        if rom is None:
-            return None
-        
-        rom_dto = rom.create_dto()
-        return json.dumps(rom_dto.get_data_dic())
+    try:
+        with uow:
+            rom_repository = ROMsRepository(uow)
+            launch_plan = rom_repository.find_launch_plan(rom_id)
+            if launch_plan is not None:
+                return launch_plan
+            
+            launch_plan = rom_repository.create_launch_plan(rom_id)
+            if launch_plan is None:
+                return None
+            
+            rom_repository.insert_launch_plan(rom_id, launch_plan)
+            uow.commit()
+    except sqlite3.OperationalError as ex:
+        if launch_plan is None:
+            raise
+        logger.warning(f'Could not store the launch plan of ROM#{rom_id}: {ex}')
+    return launch_plan
 
 
 def qry_get_rom_collection(collection_id: str) -> str:
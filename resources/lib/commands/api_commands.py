@@ -355,3 +355,25 @@ def cmd_store_scraped_single_rom(args) -> bool:
         AppMediator.async_cmd('EDIT_ROM', {'rom_id': rom_id})
         
     return True
+
+
+# -------------------------------------------------------------------------------------------------
+# Database API commands
+# -------------------------------------------------------------------------------------------------
+def cmd_store_writes(args) -> bool:
+    # Executes the writes of a plugin session in one transaction, so the service is the single writer
+    writes: list = args['writes'] if 'writes' in args else None
+    if not writes:
+        return
+    
+    unknown_writes = [sql for sql, _ in writes if not UnitOfWork.is_known_write(sql)]
+    if unknown_writes:
+        logger.warning(f'Refusing to store writes with unknown statements: {unknown_writes}')
+        return
+    
+    uow = UnitOfWork(globals.g_PATHS.DATABASE_FILE_PATH, forward_writes=False)
+    with uow:
+        for sql, sql_args in writes:
+            uow.execute(sql, *sql_args)
+        uow.commit()
+    return True
@@ -1,12 +1,18 @@
 import logging
+import copy
+import typing
 
 from akl.utils import text, kodi
 
+from resources.lib.instrumentation import CommandMetrics
+
 logger = logging.getLogger(__name__)
 
 class AppMediator(object):
 
     _commands = {}
+    # Queues async commands directly when running inside the service process.
+    _async_dispatcher: typing.Callable[[dict], None] = None
 
     @classmethod
     def register(cls, event: str):
@@ -31,11 +37,20 @@ class AppMediator(object):
         commands_by_event = cls._commands[command]
         for a_command in commands_by_event:
             try:
-                return a_command(args)
+                return CommandMetrics.execute(command, a_command, args)
             except Exception as ex:
                 logger.fatal('Failure processing command "{}"'.format(command), exc_info=ex)
                 kodi.notify_error(kodi.translate(41043).format(command))
             
+    @classmethod
+    def set_async_dispatcher(cls, dispatcher: typing.Callable[[dict], None]):
+        cls._async_dispatcher = dispatcher
+
     @classmethod
     def async_cmd(cls, command='undefined', args=None):
+        if cls._async_dispatcher is not None:
+            # same process as the service, no need for a roundtrip through the Kodi event bus.
+            # Args are copied to keep them detached from the caller, like serialising them does.
+            cls._async_dispatcher({'action': command.upper(), 'data': copy.deepcopy(args)})
+            return
         kodi.event(command=command, data=args)
@@ -20,20 +20,28 @@ from __future__ import division
 import logging
 import typing
 import collections
+import time
 
-from xml.etree import cElementTree as ET
-from xml.dom import minidom
 from distutils.version import LooseVersion
+from datetime import datetime
+from xml.etree import ElementTree as ET
 
-from akl.utils import kodi, io
-from akl import constants
+from akl.utils import kodi, io, text
+from akl import constants, settings
 
 from resources.lib.commands.mediator import AppMediator
 from resources.lib import globals
+from resources.lib import queries as qry
+from resources.lib.instrumentation import SqlTracer
 from resources.lib.repositories import UnitOfWork, AklAddonRepository, CategoryRepository, ROMCollectionRepository, XmlConfigurationRepository, SourcesRepository
+from resources.lib.repositories import XmlConfigurationWriter
 from resources.lib.domain import Category, ROMCollection, AklAddon
 
 logger = logging.getLogger(__name__)
+# Amount of imported categories and collections stored at once while reading a XML file.
+IMPORT_BATCH_SIZE = 250
+
+
 @AppMediator.register('IMPORT_LAUNCHERS')
 def cmd_execute_import_launchers(args):
     file_list = kodi.browse(text=kodi.translate(41145),mask='.xml', multiple=True)
@@ -43,66 +51,97 @@ def cmd_execute_import_launchers(args):
         addon_repository = AklAddonRepository(uow)
         available_launchers = [*addon_repository.find_all_launcher_addons()]
         
-        categories_repository = CategoryRepository(uow)
-        existing_categories   = [*categories_repository.find_all_categories()]
-
-        romcollections_repository    = ROMCollectionRepository(uow)
-        existing_romcollections      = [*romcollections_repository.find_all_romcollections()]
+        categories_repository     = CategoryRepository(uow)
+        romcollections_repository = ROMCollectionRepository(uow)
 
         available_launcher_ids      = { a.get_addon_id() : a for a in available_launchers }
-        existing_category_ids       = map(lambda c: c.get_id(), existing_categories)
-        existing_romcollection_ids  = map(lambda r: r.get_id(), existing_romcollections)
+        existing_category_ids       = set(categories_repository.find_all_category_ids())
+        existing_romcollection_ids  = set(romcollections_repository.find_all_romcollection_ids())
+        # >> Categories used as parent of imported collections, loaded when first needed
+        parent_categories: typing.Dict[str, Category] = {}
 
         categories_to_insert:typing.List[Category]  = []
         categories_to_update:typing.List[Category]  = []
         romcollections_to_insert:typing.List[ROMCollection] = []
         romcollections_to_update:typing.List[ROMCollection] = []
+        # >> Collections of which the parent category is not read yet, inserted after all files are read
+        romcollections_without_parent: typing.List[ROMCollection] = []
 
-        # >> Process file by file
-        for xml_file in file_list:
-            logger.debug(f'cmd_execute_import_launchers() Importing "{xml_file}"')
-            import_FN = io.FileName(xml_file)
-            if not import_FN.exists(): continue
+        def _insert_romcollection(romcollection_to_insert: ROMCollection):
+            parent_id = romcollection_to_insert.get_custom_attribute('parent_id')
+            if parent_id not in parent_categories and parent_id in existing_category_ids:
+                parent_categories[parent_id] = categories_repository.find_category(parent_id)
+            parent_obj = parent_categories.get(parent_id)
+            romcollections_repository.insert_romcollection(romcollection_to_insert, parent_obj)
 
-            xml_file_repository  = XmlConfigurationRepository(import_FN)
-            categories_to_import = xml_file_repository.get_categories()
-            launchers_to_import  = xml_file_repository.get_launchers()
+        def _store_batch():
+            for category_to_insert in categories_to_insert:
+                categories_repository.insert_category(category_to_insert)
+                parent_categories[category_to_insert.get_id()] = category_to_insert
 
-            for category_to_import in categories_to_import:
-                if category_to_import.get_id() in existing_category_ids:
-                     # >> Category exists (by name). Overwrite?
-                    logger.debug('Category found. Edit existing category.')
-                    if kodi.dialog_yesno(kodi.translate(41072).format(category_to_import.get_name())):
-                        categories_to_update.append(category_to_import)
-                else:
-                    categories_to_insert.append(category_to_import)
-
-            for launcher_to_import in launchers_to_import:
-                _apply_addon_launcher_for_legacy_launcher(launcher_to_import, available_launcher_ids)                
-                if launcher_to_import.get_id() in existing_romcollection_ids:
-                     # >> Romset exists (by name). Overwrite?
-                    logger.debug('ROMCollection found. Edit existing ROMCollection.')
-                    if kodi.dialog_yesno(kodi.translate(41073).format(launcher_to_import.get_name())):
-                        romcollections_to_update.append(launcher_to_import)
+            for category_to_update in categories_to_update:
+                categories_repository.update_category(category_to_update)
+                
+            for romcollection_to_insert in romcollections_to_insert:
+                if romcollection_to_insert.get_custom_attribute('parent_id') in existing_category_ids:
+                    _insert_romcollection(romcollection_to_insert)
                 else:
-                    romcollections_to_insert.append(launcher_to_import)
+                    romcollections_without_parent.append(romcollection_to_insert)
 
-        for category_to_insert in categories_to_insert:
-            categories_repository.insert_category(category_to_insert)
-            existing_categories.append(category_to_insert)
-
-        for category_to_update in categories_to_update:
-            categories_repository.update_category(category_to_update)
+            for romcollection_to_update in romcollections_to_update:
+                romcollections_repository.update_romcollection(romcollection_to_update)
             
-        for romcollection_to_insert in romcollections_to_insert:
-            parent_id = romcollection_to_insert.get_custom_attribute('parent_id')
-            parent_obj = next((c for c in existing_categories if c.get_id() == parent_id), None)
-            romcollections_repository.insert_romcollection(romcollection_to_insert, parent_obj)
-            existing_romcollections.append(romcollection_to_insert)
+            categories_to_insert.clear()
+            categories_to_update.clear()
+            romcollections_to_insert.clear()
+            romcollections_to_update.clear()
+
+        def _import_items(items_to_import: typing.Iterator[typing.Union[Category, ROMCollection]]):
+            for item_to_import in items_to_import:
+                if isinstance(item_to_import, Category):
+                    if item_to_import.get_id() in existing_category_ids:
+                        # >> Category exists (by id). Overwrite?
+                        logger.debug('Category found. Edit existing category.')
+                        if kodi.dialog_yesno(kodi.translate(41072).format(item_to_import.get_name())):
+                            categories_to_update.append(item_to_import)
+                    else:
+                        categories_to_insert.append(item_to_import)
+                        existing_category_ids.add(item_to_import.get_id())
+                else:
+                    _apply_addon_launcher_for_legacy_launcher(item_to_import, available_launcher_ids)
+                    if item_to_import.get_id() in existing_romcollection_ids:
+                        # >> ROMCollection exists (by id). Overwrite?
+                        logger.debug('ROMCollection found. Edit existing ROMCollection.')
+                        if kodi.dialog_yesno(kodi.translate(41073).format(item_to_import.get_name())):
+                            romcollections_to_update.append(item_to_import)
+                    else:
+                        romcollections_to_insert.append(item_to_import)
+                        existing_romcollection_ids.add(item_to_import.get_id())
+
+                batch_size = len(categories_to_insert) + len(categories_to_update) + \
+                    len(romcollections_to_insert) + len(romcollections_to_update)
+                if batch_size >= IMPORT_BATCH_SIZE:
+                    _store_batch()
+            _store_batch()
 
-        for romcollection_to_update in romcollections_to_update:
-            romcollections_repository.update_romcollection(romcollection_to_update)
+        # >> Process file by file
+        for xml_file in file_list:
+            logger.debug(f'cmd_execute_import_launchers() Importing "{xml_file}"')
+            import_FN = io.FileName(xml_file)
+            if not import_FN.exists(): continue
 
+            xml_file_repository = XmlConfigurationRepository(import_FN)
+            try:
+                _import_items(xml_file_repository.get_items())
+            except ET.ParseError:
+                # >> The batches stored so far are in the same transaction, so nothing gets imported
+                uow.rollback()
+                kodi.notify_error(kodi.translate(41201).format(import_FN.getBase()))
+                return
+
+        # >> Parents not found in any file nor in the database are left empty
+        for romcollection_to_insert in romcollections_without_parent:
+            _insert_romcollection(romcollection_to_insert)
         uow.commit()
 
     AppMediator.async_cmd('RENDER_VIEWS')
@@ -132,80 +171,73 @@ def cmd_export_to_xml(args):
         categories_repository     = CategoryRepository(uow)        
         romcollections_repository = ROMCollectionRepository(uow)
         
+        sources_repository        = SourcesRepository(uow)
+        
         existing_categories     = [*categories_repository.find_all_categories()]
         existing_romcollections = [*romcollections_repository.find_all_romcollections()]
+        
+        # ROM paths are configured per source, not on the collection itself anymore
+        sources_by_collection = {}
+        for source in sources_repository.find_all():
+            for romcollection_id in sources_repository.find_romcollection_ids_by_source(source.get_id()):
+                sources_by_collection.setdefault(romcollection_id, source)
     
         # --- Export stuff ---
         try:
-            # --- XML header ---
-            root = ET.Element('advanced_emulator_launcher_configuration')
-            #comment = ET.Comment(f'<!-- Exported by AKL on {datetime.now().strftime("%Y-%m-%d %H:%M:%S")} -->')
-            #root.insert(1, comment)
-            # --- Export Categories ---
-            # Data which is not string must be converted to string
-            for category in sorted(existing_categories, key = lambda c : c.get_name()):
-                logger.debug(f'cmd_export_to_xml() Category "{category.get_name()}" (ID "{category.get_id()}")')
-                category_xml = ET.SubElement(root, 'category')
-                ET.SubElement(category_xml,'name').text = category.get_name()
-                ET.SubElement(category_xml,'year').text = category.get_releaseyear()
-                ET.SubElement(category_xml,'genre').text = category.get_genre()
-                ET.SubElement(category_xml,'developer').text = category.get_developer()
-                ET.SubElement(category_xml,'rating').text = category.get_rating()
-                ET.SubElement(category_xml,'plot').text = category.get_plot()
-                ET.SubElement(category_xml,'Asset_Prefix').text = category.get_custom_attribute('Asset_Prefix')
-                for asset in category.get_assets():
-                    ET.SubElement(category_xml, f"s_{asset.get_asset_info().id}").text = asset.get_path()
-            
-            # --- Export Launchers and add XML tail ---
-            # Data which is not string must be converted to string
-            for collection in sorted(existing_romcollections, key = lambda rc : rc.get_name()):
-                category_id = collection.get_parent_id()
-                category = next((c for c in existing_categories if c.get_id() == category_id), None)
-                if category:
-                    category_name = category.get_name()
-                else:
-                    category_name = constants.VCATEGORY_ADDONROOT_ID
-
-                logger.debug(f'cmd_export_to_xml() Launcher "{collection.get_name()}" (ID "{collection.get_id()}")')
-                # Check if all artwork paths share the same ROM_asset_path. Unless the user has
-                # customised the ROM artwork paths this should be the case.
-                # A) This function checks if all path_* share a common root directory. If so
-                #    this function returns that common directory as an Unicode string. In this
-                #    case AKL will write the tag <ROM_asset_path> only.
-                # B) If path_* do not share a common root directory this function returns '' and then
-                #    AKL writes all <path_*> tags in the XML file.
-
-                # Export Launcher
-                launcher_xml = ET.SubElement(root, 'launcher')
-                ET.SubElement(launcher_xml, 'name').text = collection.get_name()
-                ET.SubElement(launcher_xml, 'category').text = category_name
-                ET.SubElement(launcher_xml, 'year').text = collection.get_releaseyear()
-                ET.SubElement(launcher_xml, 'genre').text = collection.get_genre()
-                ET.SubElement(launcher_xml, 'developer').text = collection.get_developer()
-                ET.SubElement(launcher_xml, 'rating').text = collection.get_rating()
-                ET.SubElement(launcher_xml, 'plot').text = collection.get_plot()
-                ET.SubElement(launcher_xml, 'platform').text = collection.get_platform()
-                
-                launcher = collection.get_default_launcher()
-                if launcher:
-                    for key, value in launcher.get_settings().items():
-                        ET.SubElement(launcher_xml, key, value)
-                
-                scanners = collection.get_scanners()
-                scanner_data = scanners[0].get_settings() if scanners and len(scanners) > 0 else {}
-                ET.SubElement(launcher_xml, 'ROM_path').text = scanner_data['rompath'] if 'rompath' in scanner_data else ''
-                ET.SubElement(launcher_xml, 'ROM_ext').text = scanner_data['romext'] if 'romext' in scanner_data else ''
+            categories_by_id = {category.get_id(): category for category in existing_categories}
+            with XmlConfigurationWriter(export_FN) as xml_writer:
+                # --- Export Categories ---
+                for category in sorted(existing_categories, key = lambda c : c.get_name()):
+                    logger.debug(f'cmd_export_to_xml() Category "{category.get_name()}" (ID "{category.get_id()}")')
+                    category_xml = [
+                        ('name', category.get_name()),
+                        ('year', category.get_releaseyear()),
+                        ('genre', category.get_genre()),
+                        ('developer', category.get_developer()),
+                        ('rating', category.get_rating()),
+                        ('plot', category.get_plot()),
+                        ('Asset_Prefix', category.get_custom_attribute('Asset_Prefix'))
+                    ]
+                    for asset in category.get_assets():
+                        category_xml.append((f"s_{asset.get_asset_info().id}", asset.get_path()))
+                    xml_writer.write_element('category', category_xml)
                 
-                ET.SubElement(launcher_xml,'Asset_Prefix').text = collection.get_custom_attribute('Asset_Prefix')
-                for path in collection.get_asset_paths():
-                    ET.SubElement(launcher_xml, path.get_asset_info().path_key).text = path.get_path()
-
-                for asset in collection.get_assets():
-                    ET.SubElement(launcher_xml, f"s_{asset.get_asset_info().id}").text = asset.get_path()
-
-            result_xml = ET.tostring(root, 'utf-8')
-            parsed_xml = minidom.parseString(result_xml)
-            export_FN.saveStrToFile(parsed_xml.toprettyxml(indent="  "))
+                # --- Export Launchers ---
+                for collection in sorted(existing_romcollections, key = lambda rc : rc.get_name()):
+                    category = categories_by_id.get(collection.get_parent_id())
+                    if category:
+                        category_name = category.get_name()
+                    else:
+                        category_name = constants.VCATEGORY_ADDONROOT_ID
+
+                    logger.debug(f'cmd_export_to_xml() Launcher "{collection.get_name()}" (ID "{collection.get_id()}")')
+                    launcher_xml = [
+                        ('name', collection.get_name()),
+                        ('category', category_name),
+                        ('year', collection.get_releaseyear()),
+                        ('genre', collection.get_genre()),
+                        ('developer', collection.get_developer()),
+                        ('rating', collection.get_rating()),
+                        ('plot', collection.get_plot()),
+                        ('platform', collection.get_platform())
+                    ]
+                    
+                    launcher = collection.get_default_launcher()
+                    if launcher:
+                        launcher_xml.extend(launcher.get_settings().items())
+                    
+                    source = sources_by_collection.get(collection.get_id())
+                    scanner_data = source.get_settings() if source else {}
+                    launcher_xml.append(('ROM_path', scanner_data['rompath'] if 'rompath' in scanner_data else ''))
+                    launcher_xml.append(('ROM_ext', scanner_data['romext'] if 'romext' in scanner_data else ''))
+                    
+                    launcher_xml.append(('Asset_Prefix', collection.get_custom_attribute('Asset_Prefix')))
+                    for path in collection.get_asset_paths():
+                        launcher_xml.append((path.get_asset_info().path_key, path.get_path()))
+
+                    for asset in collection.get_assets():
+                        launcher_xml.append((f"s_{asset.get_asset_info().id}", asset.get_path()))
+                    xml_writer.write_element('launcher', launcher_xml)
         except constants.AddonError as ex:
             kodi.notify_warn(str(ex))
         else:
@@ -268,10 +300,88 @@ def cmd_execute_migrations(args):
         if not kodi.dialog_yesno(kodi.translate(41055).format(migration_file.getBaseNoExt())):
             return
         
-    uow.migrate_database([migration_file], version_to_store, selected_index == 1)
+    uow.migrate_database([migration_file], version_to_store, selected_index == 1,
+                         settings.getSettingAsBool('migrate_in_place'))
     kodi.notify(kodi.translate(41016))
 
 
+# Queries timed before and after the maintenance to show the effect on the views.
+MAINTENANCE_BENCHMARK_QUERIES = [
+    qry.SELECT_CATEGORIES,
+    qry.SELECT_ROMCOLLECTIONS,
+    qry.SELECT_VCOLLECTION_TITLES,
+    qry.SELECT_VCOLLECTION_GENRES,
+    qry.SELECT_VCOLLECTION_YEAR
+]
+# Fraction of out of order pages after which the database is rebuilt with a full VACUUM.
+MAINTENANCE_MAX_FRAGMENTATION = 0.3
+
+
+@AppMediator.register('DATABASE_MAINTENANCE')
+def cmd_database_maintenance(args):
+    uow = UnitOfWork(globals.g_PATHS.DATABASE_FILE_PATH)
+    
+    before = uow.get_storage_statistics()
+    before_timings = _time_queries(uow, MAINTENANCE_BENCHMARK_QUERIES)
+    full_vacuum = before['fragmentation'] is not None and before['fragmentation'] > MAINTENANCE_MAX_FRAGMENTATION
+    logger.info(f"DATABASE_MAINTENANCE: {before['freelist_count']} free pages of {before['page_count']}, "
+                f"fragmentation {before['fragmentation']}")
+    
+    start = time.perf_counter()
+    uow.optimize_database(full_vacuum)
+    duration = time.perf_counter() - start
+    
+    after = uow.get_storage_statistics()
+    after_timings = _time_queries(uow, MAINTENANCE_BENCHMARK_QUERIES)
+    
+    sl = []
+    sl.append(f'Database maintenance on {datetime.now().strftime("%Y-%m-%d %H:%M:%S")} '
+              f'took {duration:.2f}s{" (full vacuum)" if full_vacuum else ""}')
+    sl.append('')
+    table_str = [
+        ['left', 'right', 'right'],
+        ['', 'Before', 'After'],
+        ['File size (KiB)', f"{before['file_size'] / 1024:.0f}", f"{after['file_size'] / 1024:.0f}"],
+        ['Pages', str(before['page_count']), str(after['page_count'])],
+        ['Free pages', str(before['freelist_count']), str(after['freelist_count'])],
+        ['Fragmentation', _fragmentation_str(before), _fragmentation_str(after)],
+        ['Auto vacuum', str(before['auto_vacuum']), str(after['auto_vacuum'])]
+    ]
+    sl.extend(text.render_table_str(table_str))
+    sl.append('')
+    sl.append('Query timings in milliseconds')
+    table_str = [
+        ['left', 'right', 'right'],
+        ['Query', 'Before', 'After'],
+    ]
+    for query, before_time, after_time in zip(MAINTENANCE_BENCHMARK_QUERIES, before_timings, after_timings):
+        table_str.append([SqlTracer.get_query_name(query), f'{before_time * 1000:.1f}', f'{after_time * 1000:.1f}'])
+    sl.extend(text.render_table_str(table_str))
+    
+    report_path = globals.g_PATHS.DB_MAINTENANCE_REPORT_FILE_PATH
+    logger.info(f'Writing report file "{report_path.getPath()}"')
+    report_path.writeAll('\n'.join(sl))
+    globals.g_PATHS.MAINTENANCE_INDICATOR_FILE.writeAll(f'last database maintenance on {datetime.now()} ')
+
+
+def _fragmentation_str(statistics: dict) -> str:
+    return 'n/a' if statistics['fragmentation'] is None else f"{statistics['fragmentation'] * 100:.1f}%"
+
+
+def _time_queries(uow: UnitOfWork, queries: typing.List[str]) -> typing.List[float]:
+    timings = []
+    uow.open_session()
+    try:
+        for query in queries:
+            start = time.perf_counter()
+            uow.execute(query)
+            uow.result_set()
+            timings.append(time.perf_counter() - start)
+    finally:
+        uow.close_session()
+    return timings
+
+
 @AppMediator.register('CHECK_DUPLICATE_ASSET_DIRS')
 def cmd_check_duplicate_asset_dirs(args):
     source_id: str = args['source_id'] if 'source_id' in args else None
@@ -20,53 +20,142 @@ from __future__ import division
 
 import logging
 
+from akl import constants
 from akl.utils import kodi, text
 
 from resources.lib.commands.mediator import AppMediator
 
-from resources.lib.repositories import CategoryRepository, ROMCollectionRepository, UnitOfWork
+from resources.lib.repositories import StatisticsRepository, UnitOfWork
+from resources.lib.domain import g_assetFactory
+from resources.lib.instrumentation import CommandMetrics, SqlTracer
 from resources.lib import globals
 
 logger = logging.getLogger(__name__)
 
+# Dimensions of the library stats shown in the global ROM statistics, next to the collections.
+STATS_DIMENSIONS = [('source', 'Source'), ('platform', 'Platform'), ('genre', 'Genre'), ('year', 'Year')]
+
+
 @AppMediator.register('GLOBAL_ROM_STATS')
 def cmd_report_global_rom_stats(args):    
     window_title = 'Global ROM statistics'
     sl = []
-    # sl.append('[COLOR violet]Launcher ROM report.[/COLOR]')
-    # sl.append('')
+
+    # Stats are aggregated by the service after changes, so normally there is nothing left to refresh.
+    uow = UnitOfWork(globals.g_PATHS.DATABASE_FILE_PATH)
+    with uow:
+        stats_repository = StatisticsRepository(uow)
+        stats_repository.refresh_stats()
+        uow.commit()
+        
+        totals = stats_repository.find_totals()
+        romcollection_stats = stats_repository.find_romcollection_stats()
+        dimension_stats = {dimension: stats_repository.find_stats(dimension) for dimension, _ in STATS_DIMENSIONS}
+        asset_stats = stats_repository.find_asset_stats('library').get('', {})
+
+    logger.debug(f'Number of collections {len(romcollection_stats)}')
+    sl.append(f'{totals["num_roms"]} ROMs, {totals["num_launched"]} launched {totals["launch_count"]} times '
+              f'in total, {totals["num_favourites"]} favourites')
+    sl.append('')
 
     # --- Table header ---
     table_str = [
         ['left', 'left', 'left'],
         ['Category', 'Collection', 'ROMs'],
     ]
+    # Collections are sorted by category, categoryless collections last.
+    for collection_stats in romcollection_stats:
+        table_str.append([collection_stats['category_name'] or '', collection_stats['name'],
+                          str(collection_stats['num_roms'])])
+    sl.extend(text.render_table_str(table_str))
+
+    for dimension, dimension_name in STATS_DIMENSIONS:
+        table_str = [
+            ['left', 'right', 'right', 'right', 'right'],
+            [dimension_name, 'ROMs', 'Launched', 'Launches', 'Favourites'],
+        ]
+        for stats in dimension_stats[dimension]:
+            table_str.append([stats['name'] or 'Unknown', str(stats['num_roms']), str(stats['num_launched']),
+                              str(stats['launch_count']), str(stats['num_favourites'])])
+        sl.append('')
+        sl.extend(text.render_table_str(table_str))
+
+    table_str = [
+        ['left', 'right', 'right'],
+        ['Asset', 'ROMs', 'Coverage'],
+    ]
+    for asset_id in constants.ROM_ASSET_ID_LIST:
+        num_roms = asset_stats.get(asset_id, 0)
+        coverage = num_roms * 100 / totals['num_roms'] if totals['num_roms'] else 0
+        table_str.append([g_assetFactory.get_asset_info(asset_id).name, str(num_roms), f'{coverage:.0f}%'])
+    sl.append('')
+    sl.extend(text.render_table_str(table_str))
+
+    kodi.display_text_window_mono(window_title, '\n'.join(sl))
+
+
+@AppMediator.register('COMMAND_TIMINGS_REPORT')
+def cmd_report_command_timings(args):
+    window_title = 'Slowest commands'
+    sl = []
+    sl.append(f'Measured over the last {CommandMetrics.WINDOW_SIZE} executions per command. Times in seconds.')
+    sl.append('')
+
+    table_str = [
+        ['left', 'right', 'right', 'right', 'right', 'right', 'right', 'right'],
+        ['Command', 'Runs', 'Failed', 'Mean', 'P95', 'Max', 'Statements', 'Rows'],
+    ]
+    for stats in CommandMetrics.get_slowest():
+        table_str.append([
+            stats.command,
+            str(stats.wall_time.count()),
+            str(stats.failures),
+            f'{stats.wall_time.mean():.3f}',
+            f'{stats.wall_time.percentile(95):.3f}',
+            f'{stats.wall_time.max():.3f}',
+            f'{stats.statements.mean():.0f}',
+            f'{stats.rows.mean():.0f}'
+        ])
 
-    uow = UnitOfWork(globals.g_PATHS.DATABASE_FILE_PATH)
-    with uow:
-        category_repository       = CategoryRepository(uow)
-        romcollections_repository = ROMCollectionRepository(uow)  
-        
-        categories       = [*category_repository.find_all_categories()]      
-        collection_count = romcollections_repository.count_collections()
-        
-        # Traverse categories and sort alphabetically.
-        logger.debug(f'Number of categories {len(categories)}')
-        logger.debug(f'Number of collections {collection_count}')
-    
-        for category in categories:
-            # Get collection of this category alphabetically sorted.
-            collections_by_category = romcollections_repository.find_romcollections_by_parent(category.get_id())
-            # Render list of launchers for this category.
-            for collection in collections_by_category:
-                table_str.append([category.get_name(), collection.get_name(), str(collection.num_roms())])
-                
-        # Traverse categoryless launchers.
-        root_collections = romcollections_repository.find_root_romcollections()
-        for collection in root_collections:
-            table_str.append(['', collection.get_name(), str(collection.num_roms())])
-
-    # Generate table and print report
-    # logger.debug(unicode(table_str))
     sl.extend(text.render_table_str(table_str))
-    kodi.display_text_window_mono(window_title, '\n'.join(sl))
\ No newline at end of file
+    output_table = '\n'.join(sl)
+
+    report_path = globals.g_PATHS.COMMAND_TIMINGS_REPORT_FILE_PATH
+    logger.info(f'Writing report file "{report_path.getPath()}"')
+    report_path.writeAll(output_table)
+    kodi.display_text_window_mono(window_title, output_table)
+
+
+@AppMediator.register('SQL_TRACE_REPORT')
+def cmd_report_sql_trace(args):
+    window_title = 'SQL statement statistics'
+    sl = []
+    if not UnitOfWork.TRACE:
+        sl.append('SQL tracing is disabled. Enable it in the advanced addon settings.')
+        sl.append('')
+    sl.append(f'Statements slower than {SqlTracer.SLOW_QUERY_THRESHOLD * 1000:.0f}ms are logged in '
+              f'"{globals.g_PATHS.SLOW_QUERY_LOG_FILE_PATH.getPath()}". Times in milliseconds.')
+    sl.append('')
+
+    table_str = [
+        ['left', 'right', 'right', 'right', 'right', 'right', 'right'],
+        ['Query', 'Calls', 'Rows', 'Execute', 'Fetch', 'Max', 'Slow'],
+    ]
+    for stats in SqlTracer.get_most_expensive():
+        table_str.append([
+            stats.name,
+            str(stats.calls),
+            str(stats.rows),
+            f'{stats.execute_time * 1000:.1f}',
+            f'{stats.fetch_time * 1000:.1f}',
+            f'{stats.max_time * 1000:.1f}',
+            str(stats.slow_calls)
+        ])
+
+    sl.extend(text.render_table_str(table_str))
+    output_table = '\n'.join(sl)
+
+    report_path = globals.g_PATHS.SQL_TRACE_REPORT_FILE_PATH
+    logger.info(f'Writing report file "{report_path.getPath()}"')
+    report_path.writeAll(output_table)
+    kodi.display_text_window_mono(window_title, output_table)
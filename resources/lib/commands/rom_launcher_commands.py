@@ -587,21 +587,17 @@ def cmd_execute_rom_with_launcher(args):
     uow = UnitOfWork(globals.g_PATHS.DATABASE_FILE_PATH)
     with uow:
         rom_repository = ROMsRepository(uow)
-        romcollection_repository = ROMCollectionRepository(uow)
-        source_repository = SourcesRepository(uow)
         addon_repository = AklAddonRepository(uow)
 
-        rom = rom_repository.find_rom(rom_id)
-        logger.info(f'Executing ROM {rom.get_name()}')
-        
-        romcollections = romcollection_repository.find_romcollections_by_rom(rom.get_id())
-        source = source_repository.find(rom.get_scanned_by())
-        launchers = rom.get_launchers()
-        if source:
-            launchers.extend(source.get_launchers())
+        launch_plan = rom_repository.find_or_create_launch_plan(rom_id)
+        if launch_plan is None:
+            logger.error(f'ROM {rom_id} not found')
+            return
+        uow.commit()
         
-        for romcollection in romcollections:
-            launchers.extend(romcollection.get_launchers())
+        rom = launch_plan.get_rom()
+        logger.info(f'Executing ROM {rom.get_name()}')
+        launchers = launch_plan.get_launchers()
         
         if launchers is None or len(launchers) == 0:
             logger.warning(f'No launcher configured for ROM {rom.get_name()}')
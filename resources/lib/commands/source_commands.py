@@ -29,6 +29,7 @@ from akl.utils import kodi, io
 from resources.lib.commands.mediator import AppMediator
 from resources.lib import globals, editors
 from resources.lib.repositories import UnitOfWork, SourcesRepository, ROMsRepository, ROMsJsonFileRepository, AklAddonRepository
+from resources.lib.repositories import ROMsNFOFileRepository
 from resources.lib.domain import ROM, Source, AklAddon, AssetInfo, g_assetFactory
 
 logger = logging.getLogger(__name__)
@@ -404,16 +405,43 @@ def cmd_remove_dead_roms(args):
     kodi.notify("Not implemented yet")
 
 
+# --- Export ROM metadata to NFO files ---
 @AppMediator.register('EXPORT_ROMS')
 def cmd_export_roms(args):
-    # source_id: str = args['source_id'] if 'source_id' in args else None
-    kodi.notify("Not implemented yet")
+    source_id: str = args['source_id'] if 'source_id' in args else None
+    nfo_repository = ROMsNFOFileRepository(globals.g_PATHS.NFO_CACHE_FILE_PATH)
+
+    uow = UnitOfWork(globals.g_PATHS.DATABASE_FILE_PATH)
+    with uow:
+        source = SourcesRepository(uow).find(source_id)
+        roms = ROMsRepository(uow).find_roms_by_source(source)
+        num_of_files = nfo_repository.write_nfo_files(roms)
+
+    nfo_repository.save_cache()
+    logger.info(f'EXPORT_ROMS: exported {num_of_files} NFO files of source "{source.get_name()}"')
+    kodi.notify(kodi.translate(41198).format(num_of_files))
+    AppMediator.async_cmd('SOURCE_MANAGE_ROMS', args)
 
 
 @AppMediator.register('DELETE_ROMS_NFO')
 def cmd_delete_rom_nfos(args):
-    # source_id: str = args['source_id'] if 'source_id' in args else None
-    kodi.notify("Not implemented yet")
+    source_id: str = args['source_id'] if 'source_id' in args else None
+    nfo_repository = ROMsNFOFileRepository(globals.g_PATHS.NFO_CACHE_FILE_PATH)
+
+    uow = UnitOfWork(globals.g_PATHS.DATABASE_FILE_PATH)
+    with uow:
+        source = SourcesRepository(uow).find(source_id)
+        roms = [*ROMsRepository(uow).find_roms_by_source(source)]
+
+    if not kodi.dialog_yesno(kodi.translate(41199).format(source.get_name(), len(roms))):
+        AppMediator.async_cmd('SOURCE_MANAGE_ROMS', args)
+        return
+
+    num_of_files = nfo_repository.delete_nfo_files(roms)
+    nfo_repository.save_cache()
+    logger.info(f'DELETE_ROMS_NFO: deleted {num_of_files} NFO files of source "{source.get_name()}"')
+    kodi.notify(kodi.translate(41200).format(num_of_files))
+    AppMediator.async_cmd('SOURCE_MANAGE_ROMS', args)
 
 
 @AppMediator.register('CLEAR_SOURCE_ROMS')
@@ -504,38 +532,52 @@ def cmd_source_import_roms(args):
     AppMediator.async_cmd(selected_option, args)
 
 
+# Amount of imported ROMs stored at once while importing NFO or JSON files.
+IMPORT_BATCH_SIZE = 500
+
+
 # --- Import ROM metadata from NFO files ---
 @AppMediator.register('SOURCE_IMPORT_ROMS_NFO')
 def cmd_import_roms_nfo(args):
     source_id: str = args['source_id'] if 'source_id' in args else None
+    nfo_repository = ROMsNFOFileRepository(globals.g_PATHS.NFO_CACHE_FILE_PATH)
         
-    # >> Load ROMs, iterate and import NFO files
+    # >> Load ROMs, read and parse the NFO files concurrently and store the changed ROMs in batches
     uow = UnitOfWork(globals.g_PATHS.DATABASE_FILE_PATH)
     with uow:
         repository = ROMsRepository(uow)
         src_repository = SourcesRepository(uow)
         
         source = src_repository.find(source_id)
-        roms = repository.find_roms_by_source(source)
+        roms = [*repository.find_roms_by_source(source)]
     
         pDialog = kodi.ProgressDialog()
         pDialog.startProgress(kodi.translate(41153), num_steps=len(roms))
         num_read_NFO_files = 0
+        roms_to_update: typing.List[ROM] = []
 
         step = 0
-        for rom in roms:
+        for rom, nfo_data in nfo_repository.read_nfo_files(roms):
             step = step + 1
-            nfo_filepath = rom.get_nfo_file()
             pDialog.updateProgress(step)
-            if rom.update_with_nfo_file(nfo_filepath, verbose=False):
-                num_read_NFO_files += 1
-                repository.update_rom(rom)
+            if nfo_data is None:
+                continue
+            rom.update_with_nfo_data(nfo_data)
+            nfo_repository.mark_imported(rom)
+            roms_to_update.append(rom)
+            num_read_NFO_files += 1
+            if len(roms_to_update) >= IMPORT_BATCH_SIZE:
+                repository.update_roms_nfo_data(roms_to_update)
+                roms_to_update.clear()
+        
+        if roms_to_update:
+            repository.update_roms_nfo_data(roms_to_update)
                 
-        # >> Save ROMs XML file / Launcher/timestamp saved at the end of function
         pDialog.updateProgress(len(roms), kodi.translate(41154))
         uow.commit()
         pDialog.close()
-        
+    
+    nfo_repository.save_cache()
     kodi.notify(kodi.translate(40985).format(num_read_NFO_files))
     AppMediator.async_cmd('SOURCE_IMPORT_ROMS', args)
 
@@ -555,12 +597,24 @@ def cmd_import_roms_json(args):
         source = src_repository.find(source_id)
         collection_ids = src_repository.find_romcollection_ids_by_source(source_id)
         
-        existing_roms = [*repository.find_roms_by_source(source)]
-        existing_rom_ids = map(lambda r: r.get_id(), existing_roms)
-        existing_rom_names = map(lambda r: r.get_name(), existing_roms)
+        existing_roms = repository.find_rom_ids_and_names_by_source(source_id)
+        existing_rom_ids = set(existing_roms.keys())
+        existing_rom_names = {name: rom_id for rom_id, name in existing_roms.items()}
 
         roms_to_insert: typing.List[ROM] = []
         roms_to_update: typing.List[ROM] = []
+        
+        def _store_batch():
+            for rom_to_insert in roms_to_insert:
+                rom_to_insert.scanned_by(source.get_id())
+                repository.insert_rom(rom_to_insert)
+
+            for rom_to_update in roms_to_update:
+                rom_to_update.scanned_by(source.get_id())
+                repository.update_rom(rom_to_update)
+            
+            roms_to_insert.clear()
+            roms_to_update.clear()
 
         # >> Process file by file
         for json_file in file_list:
@@ -570,32 +624,39 @@ def cmd_import_roms_json(args):
                 continue
 
             json_file_repository = ROMsJsonFileRepository(import_FN)
-            imported_roms = json_file_repository.load_ROMs()
-            logger.debug(f"Loaded {len(imported_roms)} roms")
-    
-            for imported_rom in imported_roms:
-                if imported_rom.get_id() in existing_rom_ids:
-                    # >> ROM exists (by id). Overwrite?
-                    logger.debug('ROM found. Edit existing category.')
-                    if kodi.dialog_yesno(kodi.translate(41063).format(imported_rom.get_name())):
-                        roms_to_update.append(imported_rom)
-                elif imported_rom.get_name() in existing_rom_names:
-                    # >> ROM exists (by name). Overwrite?
-                    logger.debug('ROM found. Edit existing category.')
-                    if kodi.dialog_yesno(kodi.translate(41063).format(imported_rom.get_name())):
-                        roms_to_update.append(imported_rom)
-                else:
-                    logger.debug(f'Add new ROM {imported_rom.get_name()}')
-                    imported_rom.set_platform(source.get_platform())
-                    roms_to_insert.append(imported_rom)
-                        
-        for rom_to_insert in roms_to_insert:
-            rom_to_insert.scanned_by(source.get_id())
-            repository.insert_rom(rom_to_insert)
-
-        for rom_to_update in roms_to_update:
-            rom_to_update.scanned_by(source.get_id())
-            repository.update_rom(rom_to_update)
+            imported_roms = json_file_repository.iterate_ROMs()
+            num_of_roms = 0
+            try:
+                for imported_rom in imported_roms:
+                    num_of_roms += 1
+                    if imported_rom.get_id() in existing_rom_ids:
+                        # >> ROM exists (by id). Overwrite?
+                        logger.debug('ROM found. Edit existing ROM.')
+                        if kodi.dialog_yesno(kodi.translate(41063).format(imported_rom.get_name())):
+                            roms_to_update.append(imported_rom)
+                    elif imported_rom.get_name() in existing_rom_names:
+                        # >> ROM exists (by name). Overwrite the existing ROM?
+                        logger.debug('ROM found. Edit existing ROM.')
+                        if kodi.dialog_yesno(kodi.translate(41063).format(imported_rom.get_name())):
+                            imported_rom.set_id(existing_rom_names[imported_rom.get_name()])
+                            roms_to_update.append(imported_rom)
+                    else:
+                        logger.debug(f'Add new ROM {imported_rom.get_name()}')
+                        imported_rom.set_platform(source.get_platform())
+                        roms_to_insert.append(imported_rom)
+                        existing_rom_ids.add(imported_rom.get_id())
+                        existing_rom_names[imported_rom.get_name()] = imported_rom.get_id()
+
+                    if len(roms_to_insert) + len(roms_to_update) >= IMPORT_BATCH_SIZE:
+                        _store_batch()
+            except ValueError:
+                # >> The batches stored so far are in the same transaction, so nothing gets imported
+                logger.exception(f'Failure while reading ROMs from "{json_file}"')
+                uow.rollback()
+                kodi.notify_error(kodi.translate(41201).format(import_FN.getBase()))
+                return
+            _store_batch()
+            logger.debug(f"Loaded {num_of_roms} roms")
             
         uow.commit()
         
@@ -19,15 +19,21 @@ from __future__ import division
 
 import logging
 
+from datetime import datetime
+
 from akl import constants
 from akl.utils import kodi
 
 from resources.lib.commands.mediator import AppMediator
+from resources.lib.commands import view_rendering_commands
 from resources.lib import globals
-from resources.lib.repositories import UnitOfWork, ROMsRepository
+from resources.lib.repositories import UnitOfWork, ROMsRepository, StatisticsRepository
 
 logger = logging.getLogger(__name__)
 
+# Amount of ROMs in the recently played and most played virtual collections (LIMIT of their queries)
+VCOLLECTION_MAX_ITEMS = 100
+
 
 # -------------------------------------------------------------------------------------------------
 # ROM stats
@@ -44,15 +50,20 @@ def cmd_process_launching_of_rom(args):
     uow = UnitOfWork(globals.g_PATHS.DATABASE_FILE_PATH)
     with uow:
         repository = ROMsRepository(uow)
-        rom = repository.find_rom(rom_id)
+        repository.register_rom_launch(rom_id, datetime.now())
         
-        rom.increase_launch_count()
-        repository.update_rom(rom)
-
+        rom = repository.find_rom_with_assets(rom_id)
+        if rom is None:
+            logger.warning(f'ROM_WAS_LAUNCHED: ROM {rom_id} not found')
+            return
+        most_played_position = repository.count_roms_played_more_than(rom.get_launch_count())
         uow.commit()
-        logger.debug(f'ROM_WAS_LAUNCHED: Processed stats for ROM {rom.get_name()}')
-        AppMediator.async_cmd('RENDER_VCOLLECTION_VIEW', {'vcollection_id': constants.VCOLLECTION_RECENT_ID})
-        AppMediator.async_cmd('RENDER_VCOLLECTION_VIEW', {'vcollection_id': constants.VCOLLECTION_MOST_PLAYED_ID})
+        
+    logger.debug(f'ROM_WAS_LAUNCHED: Processed stats for ROM {rom.get_name()}')
+    view_rendering_commands.patch_vcollection_view(constants.VCOLLECTION_RECENT_ID, rom,
+                                                   0, VCOLLECTION_MAX_ITEMS)
+    view_rendering_commands.patch_vcollection_view(constants.VCOLLECTION_MOST_PLAYED_ID, rom,
+                                                   most_played_position, VCOLLECTION_MAX_ITEMS)
 
 
 @AppMediator.register('ADD_ROM_TO_FAVOURITES')
@@ -66,10 +77,28 @@ def cmd_add_rom_to_favourites(args):
     uow = UnitOfWork(globals.g_PATHS.DATABASE_FILE_PATH)
     with uow:
         repository = ROMsRepository(uow)
-        rom = repository.find_rom(rom_id)
-        rom.add_to_favourites()
-        repository.update_rom(rom)
+        repository.set_rom_favourite(rom_id)
+        rom = repository.find_rom_with_assets(rom_id)
         uow.commit()
-        
+    
+    if rom is None:
+        logger.warning(f'ADD_ROM_TO_FAVOURITES: ROM {rom_id} not found')
+        return
+    
     logger.debug(f'Added ROM {rom.get_rom_identifier()} to favourites')
-    AppMediator.async_cmd('RENDER_VCOLLECTION_VIEW', {'vcollection_id': constants.VCOLLECTION_FAVOURITES_ID})
+    view_rendering_commands.patch_vcollection_view(constants.VCOLLECTION_FAVOURITES_ID, rom)
+
+
+# -------------------------------------------------------------------------------------------------
+# Library stats
+# -------------------------------------------------------------------------------------------------
+
+@AppMediator.register('REFRESH_STATS')
+def cmd_refresh_stats(args):
+    uow = UnitOfWork(globals.g_PATHS.DATABASE_FILE_PATH)
+    with uow:
+        refreshed_dimensions = StatisticsRepository(uow).refresh_stats()
+        uow.commit()
+    
+    if refreshed_dimensions:
+        logger.debug(f'REFRESH_STATS: Aggregated library stats by {", ".join(refreshed_dimensions)}')
@@ -20,20 +20,22 @@ from __future__ import division
 import logging
 import typing
 import time
+from urllib.parse import urlencode
 
 from datetime import datetime
 from datetime import timedelta
 from datetime import date
 
 from akl import constants, settings
-from akl.utils import kodi
+from akl.utils import kodi, io
 
 from resources.lib.commands.mediator import AppMediator
 from resources.lib import globals
+from resources.lib.instrumentation import ServiceMetrics
 from resources.lib.repositories import UnitOfWork, CategoryRepository, ROMCollectionRepository, ROMsRepository
-from resources.lib.repositories import SourcesRepository, ViewRepository
+from resources.lib.repositories import SourcesRepository, ViewRepository, CategoryTreeNode
 
-from resources.lib.domain import ROM, ROMCollection, Category, Source
+from resources.lib.domain import ROM, ROMCollection, Category, Source, VirtualCategory
 from resources.lib.domain import VirtualCollectionFactory, VirtualCategoryFactory
 
 logger = logging.getLogger(__name__)
@@ -61,6 +63,7 @@ def cmd_render_views_data(args):
     
         # backwards compatibility
         views_repository.cleanup_obsolete_views()
+        views_repository.save_items_index()
     
     kodi.notify(kodi.translate(40969))
     kodi.refresh_container()
@@ -99,9 +102,13 @@ def cmd_render_view_data(args):
             _render_root_view(categories_repository, romcollections_repository, roms_repository, sources_repository,
                               views_repository, render_recursive, force_rendering=force)
         else:
-            category = categories_repository.find_category(category_id)
+            category_node = _load_category_tree(category_id, categories_repository, roms_repository) \
+                if render_recursive else None
+            category = category_node.category if category_node else categories_repository.find_category(category_id)
             _render_category_view(category, categories_repository, romcollections_repository, roms_repository,
-                                  views_repository, render_recursive, force_rendering=force, changed_since_date=changed_since_date)
+                                  views_repository, render_recursive, force_rendering=force, changed_since_date=changed_since_date,
+                                  category_node=category_node)
+        views_repository.save_items_index()
     
     do_notification = not settings.getSettingAsBool("display_hide_rendering_notifications")
     if do_notification:
@@ -125,7 +132,7 @@ def cmd_render_virtual_views(args):
         root_vcategory = VirtualCategoryFactory.create(constants.VCATEGORY_ROOT_ID)
         logger.debug('Processing root virtual category')
         _render_category_view(root_vcategory, categories_repository, romcollections_repository,
-                              roms_repository, views_repository, True, force_rendering=True)
+                              roms_repository, views_repository, force_rendering=True)
 
         for vcollection_id in constants.VCOLLECTIONS:
             vcollection = VirtualCollectionFactory.create(vcollection_id)
@@ -133,12 +140,11 @@ def cmd_render_virtual_views(args):
             collection_view_data = _render_romcollection_view(vcollection, roms_repository)
             views_repository.store_view(vcollection.get_id(), vcollection.get_type(), collection_view_data)
         
-        for vcategory_id in constants.VCATEGORIES:
-            vcategory = VirtualCategoryFactory.create(vcategory_id)
-                        
-            if do_notification:
-                kodi.notify(kodi.translate(40970).format(vcategory.get_name()))
-            _render_category_view(vcategory, categories_repository, romcollections_repository, roms_repository, views_repository)
+        vcategories = [VirtualCategoryFactory.create(vcategory_id) for vcategory_id in constants.VCATEGORIES]
+        if do_notification:
+            kodi.notify(kodi.translate(40970).format(root_vcategory.get_name()))
+        _render_vcategory_views(vcategories, roms_repository, views_repository)
+        views_repository.save_items_index()
    
     if do_notification:
         kodi.notify(kodi.translate(40965))
@@ -150,24 +156,21 @@ def cmd_render_vcategories(args):
     uow = UnitOfWork(globals.g_PATHS.DATABASE_FILE_PATH)
     do_notification = not settings.getSettingAsBool("display_hide_rendering_notifications")
     with uow:
-        categories_repository = CategoryRepository(uow)
-        romcollections_repository = ROMCollectionRepository(uow)
         roms_repository = ROMsRepository(uow)
         views_repository = ViewRepository(globals.g_PATHS)
         
         # cleanup first
         views_repository.cleanup_all_virtual_category_views()
         
-        for vcategory_id in constants.VCATEGORIES:
-            vcategory = VirtualCategoryFactory.create(vcategory_id)
-
-            if do_notification:
-                kodi.notify(kodi.translate(40970).format(vcategory.get_name()))
-            _render_category_view(vcategory, categories_repository, romcollections_repository, roms_repository, views_repository,
-                                  force_rendering=True)
+        root_vcategory = VirtualCategoryFactory.create(constants.VCATEGORY_ROOT_ID)
+        vcategories = [VirtualCategoryFactory.create(vcategory_id) for vcategory_id in constants.VCATEGORIES]
+        if do_notification:
+            kodi.notify(kodi.translate(40970).format(root_vcategory.get_name()))
+        _render_vcategory_views(vcategories, roms_repository, views_repository)
+        views_repository.save_items_index()
         
-            if do_notification:
-                kodi.notify(kodi.translate(40971).format(vcategory.get_name()))
+        if do_notification:
+            kodi.notify(kodi.translate(40971).format(root_vcategory.get_name()))
     kodi.refresh_container()
 
     
@@ -189,8 +192,6 @@ def cmd_render_vcategory(args):
     
     uow = UnitOfWork(globals.g_PATHS.DATABASE_FILE_PATH)
     with uow:
-        categories_repository = CategoryRepository(uow)
-        romcollections_repository = ROMCollectionRepository(uow)
         roms_repository = ROMsRepository(uow)
         views_repository = ViewRepository(globals.g_PATHS)
         
@@ -205,8 +206,8 @@ def cmd_render_vcategory(args):
         
         if do_notification:
             kodi.notify(kodi.translate(40970).format(vcategory.get_name()))
-        _render_category_view(vcategory, categories_repository, romcollections_repository, roms_repository, views_repository,
-                              force_rendering=True)
+        _render_vcategory_views([vcategory], roms_repository, views_repository)
+        views_repository.save_items_index()
     
         if do_notification:
             kodi.notify(kodi.translate(40971).format(vcategory.get_name()))
@@ -241,6 +242,7 @@ def cmd_render_romcollection_view_data(args):
         romcollection = romcollections_repository.find_romcollection(romcollection_id)
         collection_view_data = _render_romcollection_view(romcollection, roms_repository)
         views_repository.store_view(romcollection.get_id(), romcollection.get_type(), collection_view_data)
+        views_repository.save_items_index()
     
     if do_notification:
         kodi.notify(kodi.translate(40966))
@@ -297,6 +299,7 @@ def cmd_render_source_view_data(args):
         source = source_repository.find(source_id)
         source_view_data = _render_source_view(source, roms_repository)
         views_repository.store_view(source.get_id(), source.get_type(), source_view_data)
+        views_repository.save_items_index()
     
     if do_notification:
         kodi.notify(kodi.translate(40966))
@@ -330,12 +333,19 @@ def cmd_render_vcollection(args):
             kodi.notify(kodi.translate(40973).format(vcollection.get_name()))
         collection_view_data = _render_romcollection_view(vcollection, roms_repository)
         views_repository.store_view(vcollection.get_id(), vcollection.get_type(), collection_view_data)
+        views_repository.save_items_index()
     
         if do_notification:
             kodi.notify(kodi.translate(40971).format(vcollection.get_name()))
     kodi.refresh_container()
 
 
+#
+# Patches the list item of a single ROM in the views it is part of, instead of rendering all
+# these views again. The items index of the views tells in which views the ROM was rendered, so
+# it can also be removed from views it no longer belongs to (e.g. after changing the genre).
+# Views which are not rendered yet are rendered completely in the background.
+#
 @AppMediator.register('RENDER_ROM_VIEWS')
 def cmd_render_rom_views(args):
     rom_id = args['rom_id'] if 'rom_id' in args else None
@@ -349,31 +359,69 @@ def cmd_render_rom_views(args):
         categories_repository = CategoryRepository(uow)
         views_repository = ViewRepository(globals.g_PATHS)
 
+        rendered_views = views_repository.find_item_views(rom_id)
         rom_obj = roms_repository.find_rom(rom_id)
+        # finished ROMs are not rendered when hidden, these are only removed from the views as well
+        rendered_item = render_rom_listitem(rom_obj) if rom_obj is not None else None
+        if rendered_item is None:
+            logger.warning(f'RENDER_ROM_VIEWS: ROM {rom_id} not found or hidden. Removing it from {len(rendered_views)} views')
+            for view_path in rendered_views:
+                views_repository.delete_item_in_file(io.FileName(view_path), rom_id)
+            views_repository.save_items_index()
+            return
+        
         if do_notification:
             kodi.notify(kodi.translate(40975).format(rom_obj.get_rom_identifier()))
         
+        # (view file, item, command and arguments to render the whole view when not rendered yet)
+        view_patches: typing.List[typing.Tuple[io.FileName, dict, str, dict]] = []
         source = sources_repository.find(rom_obj.get_scanned_by())
         if source is not None:
-            source_view_data = _render_source_view(source, roms_repository)
-            views_repository.store_view(source.get_id(), source.get_type(), source_view_data)
-
-        romcollections = romcollections_repository.find_romcollections_by_rom(rom_id)
-        for romcollection in romcollections:
-            collection_view_data = _render_romcollection_view(romcollection, roms_repository)
-            views_repository.store_view(romcollection.get_id(), romcollection.get_type(), collection_view_data)
-    
+            view_patches.append((views_repository.get_view_file(source.get_id(), source.get_type()), rendered_item,
+                                 'RENDER_SOURCE_VIEW', {'source_id': source.get_id()}))
+        for category in categories_repository.find_categories_by_rom(rom_id):
+            view_patches.append((views_repository.get_view_file(category.get_id(), category.get_type()), rendered_item,
+                                 'RENDER_CATEGORY_VIEW', {'category_id': category.get_id()}))
+
+        for romcollection in romcollections_repository.find_romcollections_by_rom(rom_id):
+            rom_obj.apply_romcollection_asset_mapping(romcollection)
+            view_patches.append((views_repository.get_view_file(romcollection.get_id(), romcollection.get_type()),
+                                 render_rom_listitem(rom_obj),
+                                 'RENDER_ROMCOLLECTION_VIEW', {'romcollection_id': romcollection.get_id()}))
+        
+        # the favourites, recently and most played collections are kept up to date by the
+        # stats commands, so here the ROM is only patched where it is already part of
         for vcollection_id in constants.VCOLLECTIONS:
             vcollection = VirtualCollectionFactory.create(vcollection_id)
-            collection_view_data = _render_romcollection_view(vcollection, roms_repository)
-            views_repository.store_view(vcollection.get_id(), vcollection.get_type(), collection_view_data)
+            view_file = views_repository.get_view_file(vcollection.get_id(), vcollection.get_type())
+            if view_file.getPath() in rendered_views:
+                rom_obj.apply_romcollection_asset_mapping(vcollection)
+                view_patches.append((view_file, render_rom_listitem(rom_obj),
+                                     'RENDER_VCOLLECTION_VIEW', {'vcollection_id': vcollection_id}))
+
+        rom_obj.apply_romcollection_asset_mapping(
+            VirtualCollectionFactory.create_by_category(constants.VCATEGORY_ROOT_ID, ''))
+        rendered_item = render_rom_listitem(rom_obj)
+        for vcategory_id in constants.VCATEGORIES:
+            collection_value = VirtualCollectionFactory.get_collection_value_of_rom(vcategory_id, rom_obj)
+            view_patches.append((views_repository.get_virtual_collection_file(vcategory_id, collection_value),
+                                 rendered_item, 'RENDER_VCATEGORY_VIEW', {'vcategory_id': vcategory_id}))
+        
+        views_to_render = {}
+        for view_file, item, render_cmd, render_args in view_patches:
+            if not views_repository.upsert_item_in_file(view_file, item):
+                views_to_render[view_file.getPath()] = (render_cmd, render_args)
+        
+        patched_view_paths = set(view_file.getPath() for view_file, _, _, _ in view_patches)
+        for view_path in rendered_views:
+            if view_path not in patched_view_paths:
+                views_repository.delete_item_in_file(io.FileName(view_path), rom_id)
+        views_repository.save_items_index()
     
-        categories = categories_repository.find_categories_by_rom(rom_obj.get_id())
-        for category in categories:
-            collection_view_data = _render_category_view(category, categories_repository, romcollections_repository,
-                                                         roms_repository, views_repository, render_sub_views=False,
-                                                         force_rendering=True)
-            views_repository.store_view(romcollection.get_id(), romcollection.get_type(), collection_view_data)
+    logger.debug(f'RENDER_ROM_VIEWS: Patched {len(view_patches) - len(views_to_render)} views '
+                 f'and removed ROM from {len(set(rendered_views) - patched_view_paths)} views')
+    for render_cmd, render_args in views_to_render.values():
+        AppMediator.async_cmd(render_cmd, render_args)
     
     if do_notification:
         kodi.notify(kodi.translate(40964))
@@ -398,11 +446,16 @@ def cmd_cleanup_views(args):
         source_ids = list(src.get_id() for src in sources)
        
         views_repository.cleanup_views(category_ids + romcollection_ids + source_ids)
+        views_repository.save_items_index()
 
 
 def cmd_render_virtual_collection(vcategory_id: str, collection_value: str) -> dict:
+    # >> use the view pre-rendered together with the virtual category, if available
+    viewdata = ViewRepository(globals.g_PATHS).find_virtual_collection_items(vcategory_id, collection_value)
+    if viewdata is not None:
+        return viewdata
+    
     uow = UnitOfWork(globals.g_PATHS.DATABASE_FILE_PATH)
-    viewdata = None
     with uow:
         roms_repository = ROMsRepository(uow)
         
@@ -411,6 +464,28 @@ def cmd_render_virtual_collection(vcategory_id: str, collection_value: str) -> d
     return viewdata
 
 
+#
+# Patches the list item of a ROM in the view of a virtual collection (favourites, recently played,
+# most played) instead of rendering the whole view again. The item is moved to the given position,
+# or replaced in place when no position is given, and removed when it falls outside max_items.
+# Views which are not rendered yet are rendered completely in the background.
+#
+def patch_vcollection_view(vcollection_id: str, rom_obj: ROM, position: int = None, max_items: int = None):
+    views_repository = ViewRepository(globals.g_PATHS)
+    vcollection = VirtualCollectionFactory.create(vcollection_id)
+    
+    rom_obj.apply_romcollection_asset_mapping(vcollection)
+    rendered_item = render_rom_listitem(rom_obj)
+    if rendered_item is None or (max_items is not None and position is not None and position >= max_items):
+        patched = views_repository.delete_view_item(vcollection.get_id(), vcollection.get_type(), rom_obj.get_id())
+    else:
+        patched = views_repository.upsert_view_item(vcollection.get_id(), vcollection.get_type(), rendered_item,
+                                                    position, max_items)
+    views_repository.save_items_index()
+    if not patched:
+        AppMediator.async_cmd('RENDER_VCOLLECTION_VIEW', {'vcollection_id': vcollection_id})
+
+
 # -------------------------------------------------------------------------------------------------
 # Rendering of views (containers)
 # -------------------------------------------------------------------------------------------------
@@ -419,7 +494,11 @@ def _render_root_view(categories_repository: CategoryRepository, romcollections_
                       views_repository: ViewRepository, render_sub_views=False, force_rendering=False,
                       changed_since_date: datetime = None):
     
-    root_categories = categories_repository.find_root_categories()
+    if render_sub_views:
+        root_category_nodes = _load_category_tree(None, categories_repository, roms_repository).sub_categories
+    else:
+        root_category_nodes = [CategoryTreeNode(root_category) for root_category
+                               in categories_repository.find_root_categories()]
     root_romcollections = romcollections_repository.find_root_romcollections()
     sources = [*sources_repository.find_all()]
     root_roms = roms_repository.find_root_roms()
@@ -428,11 +507,13 @@ def _render_root_view(categories_repository: CategoryRepository, romcollections_
         'id': constants.VCATEGORY_ADDONROOT_ID,
         'name': 'Root',
         'obj_type': constants.OBJ_CATEGORY,
+        'context_menu': render_context_menu_templates(constants.VCATEGORY_ADDONROOT_ID),
         'items': []
     }
     root_items = []
     start = time.time()
-    for root_category in root_categories:
+    for root_category_node in root_category_nodes:
+        root_category = root_category_node.category
         logger.debug(f'Processing category "{root_category.get_name()}"')
         rendered_item = _render_category_listitem(root_category)
         if rendered_item:
@@ -440,7 +521,7 @@ def _render_root_view(categories_repository: CategoryRepository, romcollections_
         if render_sub_views:
             _render_category_view(root_category, categories_repository, romcollections_repository,
                                   roms_repository, views_repository, render_sub_views, force_rendering,
-                                  changed_since_date)
+                                  changed_since_date, category_node=root_category_node)
     end = time.time()
     logger.debug(f"Rendered all categories in {end - start}ms")
     
@@ -483,8 +564,10 @@ def _render_root_view(categories_repository: CategoryRepository, romcollections_
         root_items.append(rendered_item)
     if render_sub_views:
         _render_category_view(root_vcategory, categories_repository, romcollections_repository,
-                              roms_repository, views_repository, render_sub_views, force_rendering=force_rendering,
+                              roms_repository, views_repository, force_rendering=force_rendering,
                               changed_since_date=changed_since_date)
+        vcategories = [VirtualCategoryFactory.create(vcategory_id) for vcategory_id in constants.VCATEGORIES]
+        _render_vcategory_views(vcategories, roms_repository, views_repository)
     end = time.time()
     logger.debug(f"Rendered virtual categories in {end - start}ms")
     
@@ -505,26 +588,38 @@ def _render_root_view(categories_repository: CategoryRepository, romcollections_
     views_repository.store_root_view(root_data)
 
 
+#
+# Renders the view of the category. When the category is given as node of a category tree, loaded
+# with _load_category_tree(), its sub categories, ROM collections and ROMs are taken from the
+# tree instead of being queried for every category again.
+#
 def _render_category_view(category_obj: Category, categories_repository: CategoryRepository,
                           romcollections_repository: ROMCollectionRepository, roms_repository: ROMsRepository,
                           views_repository: ViewRepository, render_sub_views=False, force_rendering=False,
-                          changed_since_date: datetime = None):
+                          changed_since_date: datetime = None, category_node: CategoryTreeNode = None):
     if changed_since_date is None:
         changed_since_date = datetime.combine(datetime.today() - timedelta(days=7), datetime.min.time())
                                                        
     start = time.time()
-    sub_categories = categories_repository.find_categories_by_parent(category_obj.get_id())
-    romcollections = romcollections_repository.find_romcollections_by_parent(category_obj.get_id())
+    if category_node is not None:
+        sub_category_nodes = category_node.sub_categories
+        romcollections = category_node.romcollections
+    else:
+        sub_category_nodes = [CategoryTreeNode(sub_category) for sub_category
+                              in categories_repository.find_categories_by_parent(category_obj.get_id())]
+        romcollections = romcollections_repository.find_romcollections_by_parent(category_obj.get_id())
     
     view_data = {
         'id': category_obj.get_id(),
         'parent_id': category_obj.get_parent_id(),
         'name': category_obj.get_name(),
         'obj_type': category_obj.get_type(),
+        'context_menu': render_context_menu_templates(category_obj.get_id()),
         'items': []
     }
     view_items = []
-    for sub_category in sub_categories:
+    for sub_category_node in sub_category_nodes:
+        sub_category = sub_category_node.category
         if sub_category is None:
             continue
         logger.debug(f'Processing category "{sub_category.get_name()}", part of "{category_obj.get_name()}"')
@@ -533,7 +628,8 @@ def _render_category_view(category_obj: Category, categories_repository: Categor
             view_items.append(rendered_item)
         if render_sub_views:
             _render_category_view(sub_category, categories_repository, romcollections_repository, roms_repository,
-                                  views_repository, render_sub_views)
+                                  views_repository, render_sub_views,
+                                  category_node=sub_category_node if category_node is not None else None)
     
     for romcollection in romcollections:
         logger.debug(f"Processing romcollection '{romcollection.get_name()}'")
@@ -556,7 +652,7 @@ def _render_category_view(category_obj: Category, categories_repository: Categor
         logger.debug(f"Processed category {category_obj.get_name()}. Skipped generation due to no new changes.")
         return
 
-    roms = roms_repository.find_roms_by_category(category_obj)
+    roms = category_node.roms if category_node is not None else roms_repository.find_roms_by_category(category_obj)
     for rom in roms:
         try:
             view_items.append(render_rom_listitem(rom))
@@ -567,23 +663,77 @@ def _render_category_view(category_obj: Category, categories_repository: Categor
     view_data['items'] = view_items
     views_repository.store_view(category_obj.get_id(), category_obj.get_type(), view_data)
     end = time.time()
+    ServiceMetrics.record_render('category', end - start)
     logger.debug(f"Processed category {category_obj.get_name()} in {end - start}ms")
 
 
+#
+# Loads the category, or all categories when no id is given, with all of its descendants, ROM
+# collections and ROMs in a fixed number of queries.
+#
+def _load_category_tree(category_id: str, categories_repository: CategoryRepository,
+                        roms_repository: ROMsRepository) -> CategoryTreeNode:
+    category_tree = categories_repository.find_category_tree(category_id)
+    if category_tree is None:
+        return None
+    
+    roms_by_category = roms_repository.find_roms_by_category_tree(category_id)
+    for node in category_tree.walk():
+        node.roms = roms_by_category.get(node.category.get_id(), [])
+    return category_tree
+
+
+#
+# Renders the views of the given virtual categories and of all their virtual collections in
+# a single pass. Every ROM is loaded and rendered once and then partitioned into the virtual
+# collections of all the virtual categories at the same time.
+#
+def _render_vcategory_views(vcategories: typing.List[VirtualCategory], roms_repository: ROMsRepository,
+                            views_repository: ViewRepository):
+    start = time.time()
+    partitions: typing.Dict[str, typing.Dict[str, typing.List[dict]]] = {
+        vcategory.get_id(): {} for vcategory in vcategories
+    }
+    mapping_vcollection = VirtualCollectionFactory.create_by_category(constants.VCATEGORY_ROOT_ID, '')
+    for rom in roms_repository.find_all_roms_with_assets():
+        try:
+            rom.apply_romcollection_asset_mapping(mapping_vcollection)
+            rendered_item = render_rom_listitem(rom)
+        except Exception:
+            logger.exception(f'Exception while rendering list item ROM "{rom.get_name()}"')
+            continue
+        for vcategory_id, vcollections_items in partitions.items():
+            collection_value = VirtualCollectionFactory.get_collection_value_of_rom(vcategory_id, rom)
+            vcollections_items.setdefault(collection_value, []).append(rendered_item)
+    
+    for vcategory in vcategories:
+        view_items = []
+        for collection_value, collection_items in partitions[vcategory.get_id()].items():
+            vcollection = VirtualCollectionFactory.create_by_category(vcategory.get_id(), collection_value)
+            rendered_item = _render_romcollection_listitem(vcollection)
+            if rendered_item:
+                view_items.append(rendered_item)
+            views_repository.store_virtual_collection_view(vcategory.get_id(), collection_value,
+                                                           _get_romcollection_view_data(vcollection, collection_items))
+        
+        logger.debug(f'Storing {len(view_items)} items for virtual category "{vcategory.get_name()}" view.')
+        views_repository.store_view(vcategory.get_id(), vcategory.get_type(), {
+            'id': vcategory.get_id(),
+            'parent_id': vcategory.get_parent_id(),
+            'name': vcategory.get_name(),
+            'obj_type': vcategory.get_type(),
+            'context_menu': render_context_menu_templates(vcategory.get_id()),
+            'items': view_items
+        })
+
+    end = time.time()
+    ServiceMetrics.record_render('vcategories', end - start)
+    logger.debug(f"Processed {len(vcategories)} virtual categories in {end - start}ms")
+
+
 def _render_romcollection_view(romcollection_obj: ROMCollection, roms_repository: ROMsRepository) -> dict:
     start = time.time()
     roms = roms_repository.find_roms_by_romcollection(romcollection_obj)
-    view_data = {
-        'id': romcollection_obj.get_id(),
-        'parent_id': romcollection_obj.get_parent_id(),
-        'name': romcollection_obj.get_name(),
-        'properties': {
-            'platform': romcollection_obj.get_platform(),
-            'boxsize': romcollection_obj.get_box_sizing()
-        },
-        'obj_type': romcollection_obj.get_type(),
-        'items': []
-    }
     view_items = []
     for rom in roms:
         try:
@@ -593,19 +743,36 @@ def _render_romcollection_view(romcollection_obj: ROMCollection, roms_repository
             logger.exception(f'Exception while rendering list item ROM "{rom.get_name()}"')
         
     logger.debug(f'Found {len(view_items)} items for romcollection "{romcollection_obj.get_name()}" view.')
-    view_data['items'] = view_items
+    view_data = _get_romcollection_view_data(romcollection_obj, view_items)
     
     end = time.time()
+    ServiceMetrics.record_render('romcollection', end - start)
     logger.debug(f"Processed collection {romcollection_obj.get_name()} in {end - start}ms")
     return view_data
 
 
+def _get_romcollection_view_data(romcollection_obj: ROMCollection, view_items: typing.List[dict]) -> dict:
+    return {
+        'id': romcollection_obj.get_id(),
+        'parent_id': romcollection_obj.get_parent_id(),
+        'name': romcollection_obj.get_name(),
+        'properties': {
+            'platform': romcollection_obj.get_platform(),
+            'boxsize': romcollection_obj.get_box_sizing()
+        },
+        'obj_type': romcollection_obj.get_type(),
+        'context_menu': render_context_menu_templates(romcollection_obj.get_id()),
+        'items': view_items
+    }
+
+
 def _render_sources_view(sources: typing.List[Source], roms_repository: ROMsRepository) -> dict:
     standalone_roms = roms_repository.find_standalone_roms()
     view_data = {
         'id': '',
         'name': kodi.translate(constants.OBJ_SOURCE),
         'obj_type': constants.OBJ_SOURCE,
+        'context_menu': render_context_menu_templates(''),
         'items': []
     }
     view_items = []
@@ -647,6 +814,7 @@ def _render_sources_view(sources: typing.List[Source], roms_repository: ROMsRepo
          
 
 def _render_source_view(source: Source, roms_repository: ROMsRepository) -> dict:
+    start = time.time()
     roms = roms_repository.find_roms_by_source(source)
     view_data = {
         'id': source.get_id(),
@@ -655,6 +823,7 @@ def _render_source_view(source: Source, roms_repository: ROMsRepository) -> dict
             'boxsize': source.get_box_sizing()
         },
         'obj_type': source.get_type(),
+        'context_menu': render_context_menu_templates(source.get_id()),
         'items': []
     }
     view_items = []
@@ -666,9 +835,71 @@ def _render_source_view(source: Source, roms_repository: ROMsRepository) -> dict
         
     logger.debug(f'Found {len(view_items)} items for source "{source.get_name()}" view.')
     view_data['items'] = view_items
+    ServiceMetrics.record_render('source', time.time() - start)
     return view_data
 
 
+# -------------------------------------------------------------------------------------------------
+# Rendering of context menu templates per view
+# -------------------------------------------------------------------------------------------------
+CONTEXT_MENU_ITEM_ID = '__akl_item_id__'
+CONTEXT_MENU_ITEM_NAME = '__akl_item_name__'
+CONTEXT_MENU_IN_CATEGORY = 'in_category'
+
+
+#
+# The context menu entries of list items only differ by the id (and name) of the item, so these
+# are rendered once per view as templates per object type. When browsing, the id of each item is
+# filled in instead of translating the labels and building the urls for every single item.
+# Entries are stored as [label, action, only for items with an id].
+#
+def render_context_menu_templates(container_id: str) -> typing.Dict[str, typing.List[list]]:
+    item_id = CONTEXT_MENU_ITEM_ID
+    return {
+        str(constants.OBJ_ROM): [
+            [kodi.translate(40882), _render_context_menu_action(f'/rom/view/{item_id}'), False],
+            [kodi.translate(40883), _render_context_menu_action(f'/rom/edit/{item_id}'), False],
+            [kodi.translate(40884), _render_context_menu_action('/execute/command/link_rom', {'rom_id': item_id}), False],
+            [kodi.translate(40885), _render_context_menu_action('/execute/command/add_rom_to_favourites', {
+                'rom_id': item_id}), False]
+        ],
+        str(constants.OBJ_CATEGORY): [
+            [kodi.translate(40886), _render_context_menu_action(f'/categories/view/{item_id}'), False],
+            [kodi.translate(40887), _render_context_menu_action(f'/categories/edit/{item_id}'), False],
+            [kodi.translate(40888), _render_context_menu_action(f'/add/{item_id}/in/{container_id}'), False]
+        ],
+        str(constants.OBJ_ROMCOLLECTION): [
+            [kodi.translate(40891), _render_context_menu_action(f'/romcollection/view/{item_id}'), False],
+            [kodi.translate(40892), _render_context_menu_action(f'/romcollection/edit/{item_id}'), False],
+            [kodi.translate(40922), _render_context_menu_action('/execute/command/execute_all_rulesets', {
+                'romcollection_id': item_id}), False]
+        ],
+        str(constants.OBJ_SOURCE): [
+            [kodi.translate(40915), _render_context_menu_action(f'/source/edit/{item_id}'), True],
+            [kodi.translate(42046), _render_context_menu_action('/execute/command/scan_roms', {'source_id': item_id}), False]
+        ],
+        str(constants.OBJ_LAUNCHER): [
+            [kodi.translate(40918), _render_context_menu_action(f'/launcher/edit/{item_id}'), True],
+            [kodi.translate(40919), _render_context_menu_action(f'/launcher/delete/{item_id}'), True]
+        ],
+        str(constants.OBJ_CATEGORY_VIRTUAL): [
+            [kodi.translate(40893).format(CONTEXT_MENU_ITEM_NAME),
+             _render_context_menu_action('execute/command/render_vcategory_view', {'vcategory_id': item_id}), False]
+        ],
+        # added to all items which are not a category when the container is a category
+        CONTEXT_MENU_IN_CATEGORY: [
+            [kodi.translate(40888), _render_context_menu_action(f'/add/{container_id}'), False]
+        ]
+    }
+
+
+def _render_context_menu_action(url: str, params: dict = None) -> str:
+    if params is not None:
+        url = '{}?{}'.format(url, urlencode(params))
+    url = globals.router.url_for_path(url)
+    return f'RunPlugin({url})'
+
+
 # -------------------------------------------------------------------------------------------------
 # Rendering of list items per view
 # -------------------------------------------------------------------------------------------------
@@ -53,6 +53,26 @@ def _is_empty_or_default(input: any, default: any):
     return input == default
 
 
+# Metadata tags in ROM NFO files. One alternation so a file is scanned only once
+# instead of once per tag. Regular expression is non-greedy.
+NFO_TAGS = ['title', 'year', 'genre', 'developer', 'nplayers', 'esrb', 'pegi', 'rating', 'plot', 'trailer']
+NFO_TAGS_PATTERN = re.compile('<({})>(.*?)</\\1>'.format('|'.join(NFO_TAGS)))
+
+
+#
+# Parses the contents of a NFO file in a single pass.
+# Returns a dictionary with the unescaped value of the first occurrence of each found tag.
+#
+def parse_nfo_str(nfo_str: str) -> dict:
+    nfo_str = nfo_str.replace('\r', '').replace('\n', '')
+    nfo_data = {}
+    for match in NFO_TAGS_PATTERN.finditer(nfo_str):
+        tag = match.group(1)
+        if tag not in nfo_data:
+            nfo_data[tag] = text.unescape_XML(match.group(2))
+    return nfo_data
+
+
 # -------------------------------------------------------------------------------------------------
 # Gets all required information about an asset: path, name, etc.
 # Returns an object with all the information
@@ -281,6 +301,10 @@ class AssetPath(EntityABC):
     def set_asset_info(self, info: AssetInfo):
         self.asset_info = info
     
+    # Source the asset path belongs to, or None for asset paths stored with the owning object itself.
+    def get_source_id(self) -> str:
+        return self.get_custom_attribute('source_id')
+    
     def clear(self):
         self.entity_data['path'] = None
          
@@ -1712,7 +1736,7 @@ class ROM(MetaDataItemABC):
                  assets_data: typing.List[Asset] = None,
                  asset_paths_data: typing.List[AssetPath] = None,
                  asset_mappings: typing.List[RomAssetMapping] = [],
-                 scanned_data: dict = {},
+                 scanned_data: dict = None,
                  launchers_data: typing.List[ROMLauncherAddon] = []):
         if rom_data is None:
             rom_data = {
@@ -1742,7 +1766,7 @@ class ROM(MetaDataItemABC):
             }
     
         self.tags = tag_data
-        self.scanned_data = scanned_data
+        self.scanned_data = scanned_data if scanned_data is not None else {}
         self.launchers_data = launchers_data
 
         if self.tags is None and 'rom_tags' in rom_data:
@@ -2041,59 +2065,51 @@ class ROM(MetaDataItemABC):
         # todo: Replace with nfo_file_path.readXml() and just use XPath
 
         # --- Import data ---
-        # >> Read file, put in a string and remove line endings.
+        # >> Read file, put in a string and parse the tags.
         # >> We assume NFO files are UTF-8. Decode data to Unicode.
         # file = open(nfo_file_path, 'rt')
         nfo_str = nfo_file_path.loadFileToStr()
-        nfo_str = nfo_str.replace('\r', '').replace('\n', '')
-
-        # Search for metadata tags. Regular expression is non-greedy.
-        # See https://docs.python.org/2/library/re.html#re.findall
-        # If RE has no groups it returns a list of strings with the matches.
-        # If RE has groups then it returns a list of groups.
-        item_title = re.findall('<title>(.*?)</title>', nfo_str)
-        item_year = re.findall('<year>(.*?)</year>', nfo_str)
-        item_genre = re.findall('<genre>(.*?)</genre>', nfo_str)
-        item_developer = re.findall('<developer>(.*?)</developer>', nfo_str)
-        item_nplayers = re.findall('<nplayers>(.*?)</nplayers>', nfo_str)
-        item_esrb = re.findall('<esrb>(.*?)</esrb>', nfo_str)
-        item_pegi = re.findall('<pegi>(.*?)</pegi>', nfo_str)
-        item_rating = re.findall('<rating>(.*?)</rating>', nfo_str)
-        item_plot = re.findall('<plot>(.*?)</plot>', nfo_str)
-        item_trailer = re.findall('<trailer>(.*?)</trailer>', nfo_str)
-
-        # >> Future work: ESRB and maybe nplayer fields must be sanitized.
-        if len(item_title) > 0:
-            self.set_name(text.unescape_XML(item_title[0]))
-        if len(item_year) > 0:
-            self.set_releaseyear(text.unescape_XML(item_year[0]))
-        if len(item_genre) > 0:
-            self.set_genre(text.unescape_XML(item_genre[0]))
-        if len(item_developer) > 0:
-            self.set_developer(text.unescape_XML(item_developer[0]))
-        if len(item_rating) > 0:
-            self.set_rating(text.unescape_XML(item_rating[0]))
-        if len(item_plot) > 0:
-            self.set_plot(text.unescape_XML(item_plot[0]))
-        if len(item_nplayers) > 0:
-            self.set_number_of_players(text.unescape_XML(item_nplayers[0]))
-        if len(item_esrb) > 0:
-            self.set_esrb_rating(text.unescape_XML(item_esrb[0]))
-        if len(item_pegi) > 0:
-            self.set_pegi_rating(text.unescape_XML(item_pegi[0]))
-        if len(item_trailer) > 0:
-            self.set_trailer(text.unescape_XML(item_trailer[0]))
+        self.update_with_nfo_data(parse_nfo_str(nfo_str))
 
         if verbose:
             kodi.notify(kodi.translate(41046).format(nfo_file_path.getPath()))
 
         return True
+
+    #
+    # Applies the tag values of a parsed NFO file (see parse_nfo_str()).
+    #
+    def update_with_nfo_data(self, nfo_data: dict):
+        # >> Future work: ESRB and maybe nplayer fields must be sanitized.
+        if 'title' in nfo_data:
+            self.set_name(nfo_data['title'])
+        if 'year' in nfo_data:
+            self.set_releaseyear(nfo_data['year'])
+        if 'genre' in nfo_data:
+            self.set_genre(nfo_data['genre'])
+        if 'developer' in nfo_data:
+            self.set_developer(nfo_data['developer'])
+        if 'rating' in nfo_data:
+            self.set_rating(nfo_data['rating'])
+        if 'plot' in nfo_data:
+            self.set_plot(nfo_data['plot'])
+        if 'nplayers' in nfo_data:
+            self.set_number_of_players(nfo_data['nplayers'])
+        if 'esrb' in nfo_data:
+            self.set_esrb_rating(nfo_data['esrb'])
+        if 'pegi' in nfo_data:
+            self.set_pegi_rating(nfo_data['pegi'])
+        if 'trailer' in nfo_data:
+            self.set_trailer(nfo_data['trailer'])
         
     def export_to_NFO_file(self, nfo_FileName: io.FileName):
         # --- Get NFO file name ---
         logger.debug('ROM.export_to_NFO_file() Exporting ROM NFO "{0}"'.format(nfo_FileName.getPath()))
 
         # If NFO file does not exist then create them. If it exists, overwrite.
+        nfo_FileName.writeAll(self.get_NFO_str())
+
+    def get_NFO_str(self) -> str:
         nfo_content = []
         nfo_content.append('<?xml version="1.0" encoding="utf-8" standalone="yes"?>\n')
         nfo_content.append('<!-- Exported by AKL on {0} -->\n'.format(time.strftime("%Y-%m-%d %H:%M:%S")))
@@ -2110,8 +2126,7 @@ class ROM(MetaDataItemABC):
         nfo_content.append(text.XML_line('trailer', self.get_trailer()))
         
         nfo_content.append('</ROM>\n')
-        full_string = ''.join(nfo_content)
-        nfo_FileName.writeAll(full_string)
+        return ''.join(nfo_content)
     
     # 
     # Updates an ROM entity with the API object given.
@@ -2224,10 +2239,27 @@ class ROM(MetaDataItemABC):
             # romcollection.import_data_dic(launcher_settings['romcollection'])
             # metadata_updated = True
      
+    #
+    # Asset paths of the source are inherited by reference. Only the overrides of this
+    # ROM are kept and stored with the ROM itself.
+    #
     def apply_source_asset_paths(self, source: Source):
+        overrides = self.get_asset_path_overrides()
         self.asset_paths = {}
         for assetpath in source.get_asset_paths():
             self.asset_paths[assetpath.get_asset_info_id()] = assetpath
+        for assetpath in overrides:
+            self.asset_paths[assetpath.get_asset_info_id()] = assetpath
+
+    def get_asset_path_overrides(self) -> typing.List[AssetPath]:
+        return [asset_path for asset_path in self.asset_paths.values() if asset_path.get_source_id() is None]
+
+    def set_asset_path(self, asset_info: AssetInfo, path: str):
+        asset_path = self.asset_paths.get(asset_info.id)
+        if asset_path is not None and asset_path.get_source_id() is not None:
+            # Never change the inherited path of the source, store an override for this ROM instead.
+            del self.asset_paths[asset_info.id]
+        super(ROM, self).set_asset_path(asset_info, path)
     
     def apply_romcollection_asset_mapping(self, romcollection: ROMCollection):
         mappable_assets = romcollection.get_ROM_mappable_asset_list()
@@ -2260,6 +2292,72 @@ class ROM(MetaDataItemABC):
         return json.dumps(self.entity_data)
 
 
+#
+# Precomputed launch plan of a ROM. Holds the resolved launchers of the ROM, its collections
+# and its source together with their settings and the ROM data needed to launch it, so that
+# launching does not have to load all of these aggregates again.
+#
+class ROMLaunchPlan(object):
+    
+    # ROM fields that change with every launch and are not part of the stored plan.
+    LAUNCH_STATS_FIELDS = ['is_favourite', 'launch_count', 'last_launch_timestamp']
+
+    def __init__(self, plan_data: dict):
+        self.plan_data = plan_data
+
+    def get_rom_id(self) -> str:
+        return self.plan_data['rom']['id']
+
+    def get_rom(self) -> ROM:
+        return ROM(self.plan_data['rom'], {}, [], [], [], self.plan_data['scanned_data'], self.get_launchers())
+
+    def get_rom_dto_data(self) -> dict:
+        return self.plan_data['rom_dto']
+
+    def get_launchers(self) -> typing.List[ROMLauncherAddon]:
+        return [ROMLauncherAddonFactory.create(AklAddon(launcher_data.copy()), launcher_data)
+                for launcher_data in self.plan_data['launchers']]
+
+    def get_default_launcher_id(self) -> str:
+        return self.plan_data['default_launcher_id']
+
+    def get_launcher_settings(self, launcher_id: str) -> dict:
+        return self.plan_data['launcher_settings'].get(launcher_id)
+
+    def apply_launch_stats(self, launch_stats: dict):
+        for field in self.LAUNCH_STATS_FIELDS:
+            if field not in launch_stats:
+                continue
+            self.plan_data['rom'][field] = launch_stats[field]
+            if field in self.plan_data['rom_dto']:
+                self.plan_data['rom_dto'][field] = launch_stats[field]
+
+    def to_json(self) -> str:
+        return json.dumps(self.plan_data)
+
+    @staticmethod
+    def from_json(plan_json: str) -> ROMLaunchPlan:
+        return ROMLaunchPlan(json.loads(plan_json))
+
+    @staticmethod
+    def create(rom: ROM, launchers: typing.List[ROMLauncherAddon]) -> ROMLaunchPlan:
+        launcher_settings = {}
+        for launcher in launchers:
+            settings_data = launcher.get_settings()
+            settings_data['name'] = launcher.get_name()
+            launcher_settings[launcher.get_id()] = settings_data
+
+        default_launcher = next((launcher for launcher in launchers if launcher.is_default()), None)
+        return ROMLaunchPlan({
+            'rom': rom.get_data_dic(),
+            'scanned_data': rom.scanned_data,
+            'rom_dto': rom.create_dto().get_data_dic(),
+            'launchers': [launcher.get_data_dic() for launcher in launchers],
+            'default_launcher_id': default_launcher.get_id() if default_launcher else None,
+            'launcher_settings': launcher_settings
+        })
+
+
 # -------------------------------------------------------------------------------------------------
 # OBJECT FACTORIES
 # -------------------------------------------------------------------------------------------------
@@ -2677,6 +2775,17 @@ g_assetFactory = AssetInfoFactory()
 # generated based on either certain flags or conditions of the ROMs. 
 class VirtualCollectionFactory(object):
     
+    # ROM fields (vw_roms columns) which the virtual categories are grouped by
+    VCATEGORY_ROM_FIELDS = {
+        constants.VCATEGORY_GENRE_ID: 'm_genre',
+        constants.VCATEGORY_DEVELOPER_ID: 'm_developer',
+        constants.VCATEGORY_ESRB_ID: 'esrb',
+        constants.VCATEGORY_PEGI_ID: 'pegi',
+        constants.VCATEGORY_YEARS_ID: 'm_year',
+        constants.VCATEGORY_NPLAYERS_ID: 'nplayers',
+        constants.VCATEGORY_RATING_ID: 'm_rating'
+    }
+
     @staticmethod
     def create(vcollection_id: str) -> VirtualCollection:
         
@@ -2731,6 +2840,28 @@ class VirtualCollectionFactory(object):
         
         return None
 
+    #
+    # Normalizes a raw database value into the value of a virtual collection.
+    #
+    @staticmethod
+    def get_collection_value(value) -> str:
+        if value is None or str(value) == '':
+            return 'Undefined'
+        return str(value)
+
+    #
+    # Returns the value of the virtual collection in the given virtual category which
+    # the ROM belongs to. Mirrors the SELECT_VCOLLECTION_* and SELECT_BY_* queries.
+    #
+    @staticmethod
+    def get_collection_value_of_rom(vcategory_id: str, rom: ROM) -> str:
+        if vcategory_id == constants.VCATEGORY_TITLE_ID:
+            name = rom.get_name()
+            return VirtualCollectionFactory.get_collection_value(name[:1].upper() if name else None)
+        
+        field = VirtualCollectionFactory.VCATEGORY_ROM_FIELDS[vcategory_id]
+        return VirtualCollectionFactory.get_collection_value(rom.get_custom_attribute(field))
+
     @staticmethod
     def create_by_category(vcategory_id: str, collection_value: str) -> VirtualCollection:
 
@@ -58,6 +58,10 @@ class AKL_Paths(object):
         self.DATABASE_FILE_PATH = self.ADDON_DATA_DIR.pjoin('akl.db')
         # --- datetime peek file for automatic scanning ---
         self.SCAN_INDICATOR_FILE = self.ADDON_DATA_DIR.pjoin('auto_scan.txt')
+        # --- datetime peek file for database maintenance ---
+        self.MAINTENANCE_INDICATOR_FILE = self.ADDON_DATA_DIR.pjoin('db_maintenance.txt')
+        # --- (mtime, size) of imported/exported ROM NFO files ---
+        self.NFO_CACHE_FILE_PATH = self.ADDON_DATA_DIR.pjoin('nfo_cache.json')
 
         # --- Offline scraper databases ---
         self.GAMEDB_INFO_DIR = self.ADDON_CODE_DIR.pjoin('data-AOS')
@@ -78,6 +82,7 @@ class AKL_Paths(object):
         self.SOURCES_VIEW_PATH = self.ADDON_DATA_DIR.pjoin('sources.json')
         self.GENERATED_VIEWS_DIR = self.ADDON_DATA_DIR.pjoin('db_generated_views')
         self.VIEWS_DIR = self.ADDON_DATA_DIR.pjoin('db_views')
+        self.VIEWS_INDEX_FILE_PATH = self.ADDON_DATA_DIR.pjoin('views_index.json')
         
         # Reports
         self.REPORTS_DIR = self.ADDON_DATA_DIR.pjoin('reports')
@@ -86,6 +91,10 @@ class AKL_Paths(object):
         self.ROM_SYNC_REPORT_FILE_PATH = self.REPORTS_DIR.pjoin('report_ROM_sync_status.txt')
         self.ROM_ART_INTEGRITY_REPORT_FILE_PATH = self.REPORTS_DIR.pjoin('report_ROM_artwork_integrity.txt')
         self.ROM_REDUNDANT_FILES_REPORT_FILE_PATH = self.REPORTS_DIR.pjoin('report_ROM_redundant_files.txt')
+        self.COMMAND_TIMINGS_REPORT_FILE_PATH = self.REPORTS_DIR.pjoin('report_command_timings.txt')
+        self.SQL_TRACE_REPORT_FILE_PATH = self.REPORTS_DIR.pjoin('report_sql_statements.txt')
+        self.SLOW_QUERY_LOG_FILE_PATH = self.REPORTS_DIR.pjoin('slow_queries.log')
+        self.DB_MAINTENANCE_REPORT_FILE_PATH = self.REPORTS_DIR.pjoin('report_database_maintenance.txt')
 
     def build(self):
         # --- Addon data paths creation ---
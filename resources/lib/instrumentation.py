@@ -0,0 +1,493 @@
+# -*- coding: utf-8 -*-
+#
+# Advanced Kodi Launcher: Instrumentation of commands and database access
+#
+# Copyright (c) Chrisism <crizizz@gmail.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# Collects timings and database counters per executed command in rolling
+# histograms, so slow commands can be found on a running system.
+# Optionally runs commands under cProfile and stores the .prof files in the reports dir.
+#
+
+# --- Python standard library ---
+from __future__ import unicode_literals
+from __future__ import division
+
+import logging
+import typing
+import threading
+import time
+import cProfile
+
+from collections import deque
+from datetime import datetime
+
+from resources.lib import globals
+
+logger = logging.getLogger(__name__)
+
+
+#
+# Keeps the last N samples of a single measurement.
+#
+class RollingHistogram(object):
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._total_count = 0
+        self._total_sum = 0.0
+
+    def add(self, value: float):
+        self._samples.append(value)
+        self._total_count += 1
+        self._total_sum += value
+
+    def count(self) -> int:
+        return self._total_count
+
+    def total(self) -> float:
+        return self._total_sum
+
+    def samples(self) -> typing.List[float]:
+        return list(self._samples)
+
+    def mean(self) -> float:
+        if not self._samples:
+            return 0.0
+        return sum(self._samples) / len(self._samples)
+
+    def max(self) -> float:
+        if not self._samples:
+            return 0.0
+        return max(self._samples)
+
+    def percentile(self, percentage: float) -> float:
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(percentage / 100.0 * len(ordered)))
+        return ordered[index]
+
+    def buckets(self, bounds: typing.List[float]) -> typing.List[int]:
+        # counts per bucket, last bucket holds everything above the highest bound
+        counts = [0] * (len(bounds) + 1)
+        for sample in self._samples:
+            for idx, bound in enumerate(bounds):
+                if sample <= bound:
+                    counts[idx] += 1
+                    break
+            else:
+                counts[-1] += 1
+        return counts
+
+
+# -------------------------------------------------------------------------------------------------
+# Database counters per thread. UnitOfWork reports every statement and fetched row here.
+# -------------------------------------------------------------------------------------------------
+_db_counters = threading.local()
+
+
+def count_statement():
+    _db_counters.statements = getattr(_db_counters, 'statements', 0) + 1
+
+
+def count_rows(amount: int):
+    _db_counters.rows = getattr(_db_counters, 'rows', 0) + amount
+
+
+def get_db_counters() -> typing.Tuple[int, int]:
+    return getattr(_db_counters, 'statements', 0), getattr(_db_counters, 'rows', 0)
+
+
+#
+# Measurements of a single command.
+#
+class CommandStats(object):
+
+    def __init__(self, command: str, window_size: int):
+        self.command = command
+        self.wall_time = RollingHistogram(window_size)
+        self.statements = RollingHistogram(window_size)
+        self.rows = RollingHistogram(window_size)
+        self.failures = 0
+        self.last_executed = None
+
+    def add(self, duration: float, statements: int, rows: int, failed: bool):
+        self.wall_time.add(duration)
+        self.statements.add(statements)
+        self.rows.add(rows)
+        if failed:
+            self.failures += 1
+        self.last_executed = datetime.now()
+
+
+#
+# Registry of command measurements. Used by the AppMediator around each dispatched command.
+#
+class CommandMetrics(object):
+
+    WINDOW_SIZE = 200
+    PROFILING = False
+
+    _stats: typing.Dict[str, CommandStats] = {}
+    _lock = threading.Lock()
+    _profiling_thread = threading.local()
+
+    @classmethod
+    def execute(cls, command: str, func: typing.Callable, args):
+        statements_start, rows_start = get_db_counters()
+        failed = False
+        start = time.perf_counter()
+        try:
+            if cls.PROFILING and not getattr(cls._profiling_thread, 'active', False):
+                return cls._execute_profiled(command, func, args)
+            return func(args)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            statements_end, rows_end = get_db_counters()
+            cls.record(command, duration, statements_end - statements_start, rows_end - rows_start, failed)
+
+    @classmethod
+    def record(cls, command: str, duration: float, statements: int = 0, rows: int = 0, failed: bool = False):
+        with cls._lock:
+            if command not in cls._stats:
+                cls._stats[command] = CommandStats(command, cls.WINDOW_SIZE)
+            cls._stats[command].add(duration, statements, rows, failed)
+        logger.debug(f'Command "{command}" took {duration:.3f}s, {statements} statements, {rows} rows')
+
+    @classmethod
+    def get_stats(cls) -> typing.List[CommandStats]:
+        with cls._lock:
+            return list(cls._stats.values())
+
+    @classmethod
+    def get_slowest(cls, limit: int = 25) -> typing.List[CommandStats]:
+        stats = cls.get_stats()
+        stats.sort(key=lambda s: s.wall_time.percentile(95), reverse=True)
+        return stats[:limit]
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._stats = {}
+
+    @classmethod
+    def _execute_profiled(cls, command: str, func: typing.Callable, args):
+        profiler = cProfile.Profile()
+        cls._profiling_thread.active = True
+        try:
+            return profiler.runcall(func, args)
+        finally:
+            cls._profiling_thread.active = False
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            profile_file = globals.g_PATHS.REPORTS_DIR.pjoin(f'profile_{command.lower()}_{timestamp}.prof')
+            try:
+                profiler.dump_stats(profile_file.getPathTranslated())
+                logger.info(f'Stored profile of command "{command}" in "{profile_file.getPath()}"')
+            except Exception:
+                logger.exception(f'Failed to store profile of command "{command}"')
+
+
+#
+# Aggregated measurements of a single SQL statement.
+#
+class QueryStats(object):
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.rows = 0
+        self.execute_time = 0.0
+        self.fetch_time = 0.0
+        self.max_time = 0.0
+        self.slow_calls = 0
+
+    def total_time(self) -> float:
+        return self.execute_time + self.fetch_time
+
+
+#
+# Traces SQL statements executed through the UnitOfWork, aggregated by the name
+# of the query constant in queries.py. Statements slower than the threshold are
+# written to the slow query log, together with their query plan.
+#
+class SqlTracer(object):
+
+    SLOW_QUERY_THRESHOLD = 0.25
+    EXPLAIN_SLOW_QUERIES = True
+
+    _stats: typing.Dict[str, QueryStats] = {}
+    _query_names: typing.Dict[str, str] = None
+    _explained = set()
+    _lock = threading.Lock()
+    _last_query = threading.local()
+
+    @classmethod
+    def get_query_name(cls, sql: str) -> str:
+        if cls._query_names is None:
+            from resources.lib import queries
+            cls._query_names = {}
+            for name, value in vars(queries).items():
+                if name.isupper() and isinstance(value, str) and value not in cls._query_names:
+                    cls._query_names[value] = name
+
+        if sql in cls._query_names:
+            return cls._query_names[sql]
+        # not a constant, use the normalised statement itself
+        normalised = ' '.join(sql.split())
+        return normalised if len(normalised) <= 80 else f'{normalised[:77]}...'
+
+    @classmethod
+    def trace_execute(cls, sql: str, args, duration: float, explain: typing.Callable = None):
+        name = cls.get_query_name(sql)
+        cls._last_query.name = name
+        cls._last_query.sql = sql
+        cls._last_query.args = args
+        cls._last_query.explain = explain
+        cls._last_query.duration = duration
+        is_slow = duration >= cls.SLOW_QUERY_THRESHOLD
+        cls._last_query.logged = is_slow
+        with cls._lock:
+            if name not in cls._stats:
+                cls._stats[name] = QueryStats(name)
+            stats = cls._stats[name]
+            stats.calls += 1
+            stats.execute_time += duration
+            stats.max_time = max(stats.max_time, duration)
+            if is_slow:
+                stats.slow_calls += 1
+
+        if is_slow:
+            cls._log_slow_query(name, sql, args, duration, 0, explain)
+
+    @classmethod
+    def trace_fetch(cls, duration: float, rows: int):
+        name = getattr(cls._last_query, 'name', None)
+        if name is None:
+            return
+        cls._last_query.name = None
+
+        total_duration = cls._last_query.duration + duration
+        with cls._lock:
+            stats = cls._stats[name]
+            stats.rows += rows
+            stats.fetch_time += duration
+            stats.max_time = max(stats.max_time, total_duration)
+            is_slow = total_duration >= cls.SLOW_QUERY_THRESHOLD and not cls._last_query.logged
+            if is_slow:
+                stats.slow_calls += 1
+
+        if is_slow:
+            cls._log_slow_query(name, cls._last_query.sql, cls._last_query.args, total_duration, rows,
+                                cls._last_query.explain)
+
+    @classmethod
+    def get_stats(cls) -> typing.List[QueryStats]:
+        with cls._lock:
+            return list(cls._stats.values())
+
+    @classmethod
+    def get_most_expensive(cls, limit: int = 50) -> typing.List[QueryStats]:
+        stats = cls.get_stats()
+        stats.sort(key=lambda s: s.total_time(), reverse=True)
+        return stats[:limit]
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._stats = {}
+            cls._explained = set()
+
+    @classmethod
+    def _log_slow_query(cls, name: str, sql: str, args, duration: float, rows: int, explain: typing.Callable):
+        lines = [f'[{datetime.now()}] {name} took {duration * 1000:.1f}ms, {rows} rows']
+        if name not in cls._explained:
+            lines.append(f'    SQL: {" ".join(sql.split())}')
+            lines.append(f'    ARGS: {",".join(map(str, args))}')
+            if cls.EXPLAIN_SLOW_QUERIES and explain is not None and sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+                try:
+                    for plan_line in explain(sql, args):
+                        lines.append(f'    PLAN: {plan_line}')
+                except Exception as ex:
+                    lines.append(f'    PLAN: not available ({ex})')
+            cls._explained.add(name)
+
+        logger.warning(lines[0])
+        try:
+            globals.g_PATHS.SLOW_QUERY_LOG_FILE_PATH.writeAll('\n'.join(lines) + '\n', flags='a')
+        except Exception:
+            logger.exception('Failed to write slow query log')
+
+
+#
+# Live metrics of the running service, exposed through the webservice.
+#
+class ServiceMetrics(object):
+
+    WINDOW_SIZE = 500
+    QUANTILES = [50, 90, 99]
+
+    queue_depth_provider: typing.Callable[[], int] = None
+
+    _requests: typing.Dict[str, RollingHistogram] = {}
+    _request_errors: typing.Dict[str, int] = {}
+    _queue_wait = RollingHistogram(WINDOW_SIZE)
+    _render_durations: typing.Dict[str, RollingHistogram] = {}
+    _cache_lookups: typing.Dict[str, typing.List[int]] = {}
+    _sessions_opened = 0
+    _sessions_active = 0
+    _lock = threading.Lock()
+
+    @classmethod
+    def record_request(cls, route: str, duration: float, status: int):
+        with cls._lock:
+            if route not in cls._requests:
+                cls._requests[route] = RollingHistogram(cls.WINDOW_SIZE)
+                cls._request_errors[route] = 0
+            cls._requests[route].add(duration)
+            if status >= 400:
+                cls._request_errors[route] += 1
+
+    @classmethod
+    def record_queue_wait(cls, duration: float):
+        with cls._lock:
+            cls._queue_wait.add(duration)
+
+    @classmethod
+    def record_render(cls, view_type: str, duration: float):
+        with cls._lock:
+            if view_type not in cls._render_durations:
+                cls._render_durations[view_type] = RollingHistogram(cls.WINDOW_SIZE)
+            cls._render_durations[view_type].add(duration)
+
+    @classmethod
+    def record_cache_lookup(cls, cache_name: str, hit: bool):
+        with cls._lock:
+            if cache_name not in cls._cache_lookups:
+                cls._cache_lookups[cache_name] = [0, 0]
+            cls._cache_lookups[cache_name][0 if hit else 1] += 1
+
+    @classmethod
+    def session_opened(cls):
+        with cls._lock:
+            cls._sessions_opened += 1
+            cls._sessions_active += 1
+
+    @classmethod
+    def session_closed(cls):
+        with cls._lock:
+            cls._sessions_active -= 1
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._requests = {}
+            cls._request_errors = {}
+            cls._queue_wait = RollingHistogram(cls.WINDOW_SIZE)
+            cls._render_durations = {}
+            cls._cache_lookups = {}
+            cls._sessions_opened = 0
+            cls._sessions_active = 0
+
+    @classmethod
+    def get_metrics(cls) -> dict:
+        queue_depth = cls.queue_depth_provider() if cls.queue_depth_provider else 0
+        with cls._lock:
+            metrics = {
+                'requests': {
+                    route: dict(cls._histogram_data(histogram), errors=cls._request_errors[route])
+                    for route, histogram in cls._requests.items()
+                },
+                'queue': dict(cls._histogram_data(cls._queue_wait), depth=queue_depth),
+                'db_sessions': {
+                    'opened': cls._sessions_opened,
+                    'active': cls._sessions_active
+                },
+                'renders': {
+                    view_type: cls._histogram_data(histogram)
+                    for view_type, histogram in cls._render_durations.items()
+                },
+                'caches': {
+                    cache_name: {
+                        'hits': hits,
+                        'misses': misses,
+                        'hit_rate': hits / (hits + misses) if hits + misses > 0 else 0.0
+                    }
+                    for cache_name, (hits, misses) in cls._cache_lookups.items()
+                }
+            }
+        metrics['commands'] = {
+            stats.command: cls._histogram_data(stats.wall_time) for stats in CommandMetrics.get_stats()
+        }
+        return metrics
+
+    @classmethod
+    def get_metrics_as_prometheus(cls) -> str:
+        metrics = cls.get_metrics()
+        lines = []
+
+        def add_summary(name: str, help_text: str, label: str, entries: dict):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} summary')
+            for key, data in entries.items():
+                labels = f'{label}="{key}",' if label else ''
+                for quantile in cls.QUANTILES:
+                    lines.append(f'{name}{{{labels}quantile="{quantile / 100}"}} {data[f"p{quantile}"]}')
+                total_labels = f'{{{labels.rstrip(",")}}}' if labels else ''
+                lines.append(f'{name}_sum{total_labels} {data["sum"]}')
+                lines.append(f'{name}_count{total_labels} {data["count"]}')
+
+        def add_gauge(name: str, help_text: str, value, metric_type: str = 'gauge'):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            lines.append(f'{name} {value}')
+
+        add_summary('akl_http_request_duration_seconds', 'Webservice request latency per route.', 'route',
+                    metrics['requests'])
+        lines.append('# HELP akl_http_request_errors_total Webservice requests answered with an error status.')
+        lines.append('# TYPE akl_http_request_errors_total counter')
+        for route, data in metrics['requests'].items():
+            lines.append(f'akl_http_request_errors_total{{route="{route}"}} {data["errors"]}')
+
+        add_gauge('akl_command_queue_depth', 'Number of commands waiting in the service queue.', metrics['queue']['depth'])
+        add_summary('akl_command_queue_wait_seconds', 'Time commands waited in the service queue.', None,
+                    {'': metrics['queue']})
+        add_summary('akl_command_duration_seconds', 'Execution time per command.', 'command', metrics['commands'])
+
+        add_gauge('akl_db_sessions_opened_total', 'Number of opened database sessions.',
+                  metrics['db_sessions']['opened'], 'counter')
+        add_gauge('akl_db_sessions_active', 'Number of currently open database sessions.', metrics['db_sessions']['active'])
+
+        add_summary('akl_view_render_duration_seconds', 'Rendering time per view type.', 'view_type', metrics['renders'])
+
+        lines.append('# HELP akl_cache_lookups_total Cache lookups by result.')
+        lines.append('# TYPE akl_cache_lookups_total counter')
+        for cache_name, data in metrics['caches'].items():
+            lines.append(f'akl_cache_lookups_total{{cache="{cache_name}",result="hit"}} {data["hits"]}')
+            lines.append(f'akl_cache_lookups_total{{cache="{cache_name}",result="miss"}} {data["misses"]}')
+
+        return '\n'.join(lines) + '\n'
+
+    @classmethod
+    def _histogram_data(cls, histogram: RollingHistogram) -> dict:
+        data = {
+            'count': histogram.count(),
+            'sum': histogram.total(),
+            'mean': histogram.mean(),
+            'max': histogram.max()
+        }
+        for quantile in cls.QUANTILES:
+            data[f'p{quantile}'] = histogram.percentile(quantile)
+        return data
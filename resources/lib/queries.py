@@ -8,6 +8,7 @@ INSERT_METADATA = "INSERT INTO metadata (id,year,genre,developer,rating,plot,ext
 INSERT_ASSET = "INSERT INTO assets (id, filepath, asset_type) VALUES (?,?,?)"
 INSERT_ASSET_PATH = "INSERT INTO assetpaths (id, path, asset_type) VALUES (?,?,?)"
 UPDATE_METADATA = "UPDATE metadata SET year=?, genre=?, developer=?, rating=?, plot=?, extra=?, finished=? WHERE id=?"
+UPDATE_METADATA_NFO_DATA = "UPDATE metadata SET year=?, genre=?, developer=?, rating=?, plot=? WHERE id=?"
 UPDATE_ASSET = "UPDATE assets SET filepath = ?, asset_type = ? WHERE id = ?"
 UPDATE_ASSET_PATH = "UPDATE assetpaths SET path = ?, asset_type = ? WHERE id = ?"
 
@@ -23,6 +24,7 @@ DELETE_ASSET_MAPPING = "DELETE FROM assetmappings WHERE id = ?"
 
 # CATEGORIES
 SELECT_CATEGORY = "SELECT * FROM vw_categories WHERE id = ?"
+SELECT_CATEGORY_IDS = "SELECT id FROM categories"
 SELECT_CATEGORY_ASSETS = "SELECT * FROM vw_category_assets WHERE category_id = ?"
 SELECT_CATEGORIES = "SELECT * FROM vw_categories ORDER BY m_name"
 SELECT_ALL_CATEGORY_ASSETS = "SELECT * FROM vw_category_assets"
@@ -48,6 +50,40 @@ SELECT_CATEGORY_ASSET_MAPPINGS_BY_PARENT = """
     WHERE c.parent_id = ?
     """
 
+# The category with all of its descendants, or all categories when no category id is given.
+# Every query of the category tree starts with this CTE and takes the category id twice.
+CATEGORY_TREE_CTE = """
+    WITH RECURSIVE category_tree(id) AS (
+        SELECT id FROM categories WHERE (? IS NULL AND parent_id IS NULL) OR id = ?
+        UNION
+        SELECT c.id FROM categories AS c INNER JOIN category_tree AS t ON c.parent_id = t.id
+    )
+"""
+SELECT_CATEGORY_TREE = CATEGORY_TREE_CTE + "SELECT * FROM vw_categories WHERE id IN category_tree ORDER BY m_name"
+SELECT_CATEGORY_TREE_ASSETS = CATEGORY_TREE_CTE + "SELECT * FROM vw_category_assets WHERE category_id IN category_tree"
+SELECT_CATEGORY_TREE_ASSET_MAPPINGS = CATEGORY_TREE_CTE + """
+    SELECT am.*, mm.metadata_id FROM assetmappings AS am
+    INNER JOIN metadata_assetmappings AS mm ON mm.assetmapping_id = am.id
+    INNER JOIN categories AS c ON mm.metadata_id = c.metadata_id
+    WHERE c.id IN category_tree
+    """
+SELECT_CATEGORY_TREE_ROMCOLLECTIONS = CATEGORY_TREE_CTE + \
+    "SELECT * FROM vw_romcollections WHERE parent_id IN category_tree ORDER BY m_name"
+SELECT_CATEGORY_TREE_ROMCOLLECTION_ASSETS = CATEGORY_TREE_CTE + \
+    "SELECT * FROM vw_romcollection_assets WHERE parent_id IN category_tree"
+SELECT_CATEGORY_TREE_ROMCOLLECTION_ASSET_MAPPINGS = CATEGORY_TREE_CTE + """
+    SELECT am.*, mm.metadata_id FROM assetmappings AS am
+    INNER JOIN metadata_assetmappings AS mm ON mm.assetmapping_id = am.id
+    INNER JOIN romcollections AS rc ON mm.metadata_id = rc.metadata_id
+    WHERE rc.parent_id IN category_tree
+    """
+SELECT_CATEGORY_TREE_ROMCOLLECTION_ROM_ASSET_MAPPINGS = CATEGORY_TREE_CTE + """
+    SELECT am.*, rm.romcollection_id FROM assetmappings AS am
+    INNER JOIN romcollection_roms_assetmappings AS rm ON rm.assetmapping_id = am.id
+    INNER JOIN romcollections AS rc ON rm.romcollection_id = rc.id
+    WHERE rc.parent_id IN category_tree
+    """
+
 SELECT_CATEGORIES_BY_ROM = "SELECT c.* FROM vw_categories AS c INNER JOIN roms_in_category AS rc ON rc.category_id = c.id WHERE rc.rom_id = ?"
 SELECT_CATEGORIES_ASSETS_BY_ROM = "SELECT ca.* FROM vw_category_assets AS ca INNER JOIN roms_in_category AS rc ON rc.category_id = ca.category_id WHERE rc.rom_id = ?"
 SELECT_CATEGORY_ASSET_MAPPINGS_BY_ROM = """
@@ -73,6 +109,7 @@ UPDATE_CATEGORY_PARENT = "UPDATE categories SET parent_id = ? WHERE id = ?"
 #
 COUNT_ROMCOLLECTIONS = "SELECT COUNT(*) as count FROM vw_romcollections"
 SELECT_ROMCOLLECTION = "SELECT * FROM vw_romcollections WHERE id = ?"
+SELECT_ROMCOLLECTION_IDS = "SELECT id FROM romcollections"
 SELECT_ROMCOLLECTIONS = "SELECT * FROM vw_romcollections ORDER BY m_name"
 SELECT_ROOT_ROMCOLLECTIONS = "SELECT * FROM vw_romcollections WHERE parent_id IS NULL ORDER BY m_name"
 SELECT_ROMCOLLECTIONS_BY_PARENT = "SELECT * FROM vw_romcollections WHERE parent_id = ? ORDER BY m_name"
@@ -259,6 +296,8 @@ DELETE_ALL_RULES_FROM_RULESET = "DELETE FROM import_rule WHERE ruleset_id = ?"
 #
 SELECT_ROM = "SELECT * FROM vw_roms WHERE id = ?"
 SELECT_ROM_ASSETS = "SELECT * FROM vw_rom_assets WHERE rom_id = ?"
+SELECT_ALL_ROMS = "SELECT * FROM vw_roms"
+SELECT_ALL_ROM_ASSETS = "SELECT * FROM vw_rom_assets"
 SELECT_ROM_ASSETPATHS = "SELECT * FROM vw_rom_asset_paths WHERE rom_id = ?"
 SELECT_ROM_TAGS = "SELECT * FROM vw_rom_tags WHERE rom_id = ?"
 SELECT_ROM_ASSET_MAPPINGS = """
@@ -307,7 +346,31 @@ SELECT_ROM_ASSET_MAPPINGS_BY_CATEGORY = """
     AND rc.category_id = ?
 """
 
+SELECT_ROMS_BY_CATEGORY_TREE = CATEGORY_TREE_CTE + """
+    SELECT r.*, rc.category_id AS tree_category_id FROM vw_roms AS r
+    INNER JOIN roms_in_category AS rc ON rc.rom_id = r.id
+    WHERE rc.category_id IN category_tree
+"""
+CATEGORY_TREE_ROMS_CTE = CATEGORY_TREE_CTE + """
+    , category_tree_roms(rom_id) AS (
+        SELECT DISTINCT(rc.rom_id) FROM roms_in_category AS rc WHERE rc.category_id IN category_tree
+    )
+"""
+SELECT_ROM_ASSETS_BY_CATEGORY_TREE = CATEGORY_TREE_ROMS_CTE + \
+    "SELECT ra.* FROM vw_rom_assets AS ra WHERE ra.rom_id IN category_tree_roms"
+SELECT_ROM_ASSETPATHS_BY_CATEGORY_TREE = CATEGORY_TREE_ROMS_CTE + \
+    "SELECT rap.* FROM vw_rom_asset_paths AS rap WHERE rap.rom_id IN category_tree_roms"
+SELECT_ROM_TAGS_BY_CATEGORY_TREE = CATEGORY_TREE_ROMS_CTE + \
+    "SELECT rt.* FROM vw_rom_tags AS rt WHERE rt.rom_id IN category_tree_roms"
+SELECT_ROM_ASSET_MAPPINGS_BY_CATEGORY_TREE = CATEGORY_TREE_ROMS_CTE + """
+    SELECT am.*, mm.metadata_id FROM assetmappings AS am
+    INNER JOIN metadata_assetmappings AS mm ON mm.assetmapping_id = am.id
+    INNER JOIN roms AS r ON mm.metadata_id = r.metadata_id
+    WHERE r.id IN category_tree_roms
+"""
+
 SELECT_ROMS_BY_SOURCE = "SELECT r.* FROM vw_roms AS r WHERE r.scanned_by_id = ?"
+SELECT_ROM_IDS_AND_NAMES_BY_SOURCE = "SELECT id, name FROM roms WHERE scanned_by_id = ?"
 SELECT_ROM_ASSETS_BY_SOURCE = "SELECT ra.* FROM vw_rom_assets AS ra INNER JOIN roms AS r ON r.id = ra.rom_id AND r.scanned_by_id = ?"
 SELECT_ROM_ASSETPATHS_BY_SOURCE = """
     SELECT rap.* FROM vw_rom_asset_paths AS rap INNER JOIN roms AS r ON r.id = rap.rom_id AND r.scanned_by_id = ?
@@ -381,8 +444,8 @@ SELECT_RATING_BY_COLLECTION = """
 INSERT_ROM = """
     INSERT INTO roms (
         id, metadata_id, name, num_of_players, num_of_players_online, esrb_rating, pegi_rating,
-        platform, box_size, nointro_status, cloneof, rom_status, scanned_by_id)
-    VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)
+        platform, box_size, nointro_status, cloneof, rom_status, scanned_by_id, scanned_data)
+    VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)
     """
 
 SELECT_MY_FAVOURITES = "SELECT * FROM vw_roms WHERE is_favourite = 1"
@@ -433,38 +496,23 @@ SELECT_BY_RATING_ASSETS = "SELECT ra.* FROM vw_rom_assets AS ra INNER JOIN vw_ro
                                 
 INSERT_ROM_ASSET = "INSERT INTO rom_assets (rom_id, asset_id) VALUES (?, ?)"
 INSERT_ROM_ASSET_PATH = "INSERT INTO rom_assetpaths (rom_id, assetpaths_id) VALUES (?, ?)"
-INSERT_ROM_SCANNED_DATA = "INSERT INTO scanned_roms_data (rom_id, data_key, data_value) VALUES (?, ?, ?)"
 
 UPDATE_ROM = """
     UPDATE roms
     SET name=?, num_of_players=?, num_of_players_online=?, esrb_rating=?, pegi_rating=?, platform=?, box_size=?,
     nointro_status=?, cloneof=?, rom_status=?, launch_count=?, last_launch_timestamp=?,
-    is_favourite=?, scanned_by_id=?, updated_on=CURRENT_TIMESTAMP WHERE id =?
+    is_favourite=?, scanned_by_id=?, scanned_data=?, updated_on=CURRENT_TIMESTAMP WHERE id =?
+    """
+UPDATE_ROM_NFO_DATA = """
+    UPDATE roms
+    SET name=?, num_of_players=?, esrb_rating=?, pegi_rating=?, updated_on=CURRENT_TIMESTAMP WHERE id =?
     """
+UPDATE_ROM_LAUNCH_STATS = "UPDATE roms SET launch_count = launch_count + 1, last_launch_timestamp = ? WHERE id = ?"
+UPDATE_ROM_FAVOURITE = "UPDATE roms SET is_favourite = ? WHERE id = ?"
+COUNT_ROMS_PLAYED_MORE_THAN = "SELECT COUNT(*) AS amount FROM roms WHERE launch_count > ?"
 DELETE_ROM = "DELETE FROM roms WHERE id = ?"
 DELETE_ROMS_BY_COLLECTION = "DELETE FROM roms WHERE id IN (SELECT rc.rom_id FROM roms_in_romcollection AS rc WHERE rc.romcollection_id = ?)"
 
-SELECT_ROM_SCANNED_DATA = "SELECT s.* FROM scanned_roms_data AS s WHERE s.rom_id = ?"
-SELECT_ROM_SCANNED_DATA_BY_SET = """
-    SELECT s.* FROM scanned_roms_data AS s INNER JOIN roms_in_romcollection AS rs
-    ON rs.rom_id = s.rom_id AND rs.romcollection_id = ?
-    """
-SELECT_ROM_SCANNED_DATA_BY_CATEGORY = """
-    SELECT s.* FROM scanned_roms_data AS s INNER JOIN roms_in_category AS rc
-    ON rc.rom_id = s.rom_id AND rc.category_id = ?
-    """
-SELECT_ROM_SCANNED_DATA_BY_SOURCE = """
-    SELECT s.* FROM scanned_roms_data AS s INNER JOIN roms AS r ON r.id = s.rom_id AND r.scanned_by_id = ?
-    """
-SELECT_ROM_SCANNED_DATA_BY_ROOT_CATEGORY = """
-    SELECT s.* FROM scanned_roms_data AS s INNER JOIN roms_in_category AS rc
-    ON rc.rom_id = s.rom_id AND rc.category_id IS NULL
-    """
-SELECT_STANDALONE_ROM_SCANNED_DATA = """
-    SELECT s.* FROM scanned_roms_data AS s INNER JOIN roms AS r ON r.id = s.rom_id AND r.scanned_by_id = ''
-"""
-DELETE_SCANNED_DATA = "DELETE FROM scanned_roms_data WHERE rom_id = ?"
-
 SELECT_TAGS = "SELECT * FROM tags"
 INSERT_TAG = "INSERT INTO tags (id, tag) VALUES (?,?)"
 ADD_TAG_TO_ROM = "INSERT INTO metatags (metadata_id, tag_id) VALUES (?,?)"
@@ -527,6 +575,87 @@ UPDATE_ROMCOLLECTION_LAUNCHER = "UPDATE romcollection_launchers SET is_default =
 DELETE_ROMCOLLECTION_LAUNCHERS = "DELETE FROM romcollection_launchers WHERE romcollection_id = ?"
 DELETE_ROMCOLLECTION_LAUNCHER = "DELETE FROM romcollection_launchers WHERE romcollection_id = ? AND launcher_id = ?"
 
+SELECT_SOURCE_LAUNCHERS_BY_ROM = """
+    SELECT sl.* FROM vw_source_launchers AS sl
+    INNER JOIN roms AS r ON r.scanned_by_id = sl.source_id
+    WHERE r.id = ?
+    """
+
+# Launch plans
+SELECT_ROM_LAUNCH_PLAN = """
+    SELECT lp.launch_plan, r.is_favourite, r.launch_count, r.last_launch_timestamp
+    FROM rom_launch_plans AS lp INNER JOIN roms AS r ON r.id = lp.rom_id
+    WHERE lp.rom_id = ?
+    """
+INSERT_ROM_LAUNCH_PLAN = "INSERT OR REPLACE INTO rom_launch_plans (rom_id, launch_plan) VALUES (?,?)"
+
+#
+# StatisticsRepository -> Aggregated library stats
+#
+# ROMs per key of every stats dimension. Used as subquery {dimension_roms} of the aggregations.
+LIBRARY_STATS_DIMENSION_ROMS = {
+    'library': "SELECT '' AS dimension_key, id AS rom_id FROM roms",
+    'category': """
+        SELECT category_id AS dimension_key, rom_id FROM roms_in_category
+        UNION
+        SELECT rc.parent_id AS dimension_key, rr.rom_id FROM roms_in_romcollection AS rr
+            INNER JOIN romcollections AS rc ON rc.id = rr.romcollection_id
+        WHERE rc.parent_id IS NOT NULL
+        """,
+    'romcollection': "SELECT romcollection_id AS dimension_key, rom_id FROM roms_in_romcollection",
+    'source': "SELECT scanned_by_id AS dimension_key, id AS rom_id FROM roms WHERE scanned_by_id IS NOT NULL",
+    'platform': """
+        SELECT COALESCE(NULLIF(r.platform, ''), s.platform, '') AS dimension_key, r.id AS rom_id
+        FROM roms AS r LEFT JOIN sources AS s ON s.id = r.scanned_by_id
+        """,
+    'genre': """
+        SELECT COALESCE(m.genre, '') AS dimension_key, r.id AS rom_id
+        FROM roms AS r INNER JOIN metadata AS m ON m.id = r.metadata_id
+        """,
+    'year': """
+        SELECT COALESCE(m.year, '') AS dimension_key, r.id AS rom_id
+        FROM roms AS r INNER JOIN metadata AS m ON m.id = r.metadata_id
+        """
+}
+INSERT_LIBRARY_STATS = """
+    INSERT INTO library_stats (dimension, dimension_key, num_roms, num_launched, launch_count, num_favourites)
+    SELECT ?, d.dimension_key, COUNT(*), SUM(r.launch_count > 0), SUM(r.launch_count), SUM(r.is_favourite > 0)
+    FROM ({dimension_roms}) AS d INNER JOIN roms AS r ON r.id = d.rom_id
+    GROUP BY d.dimension_key
+    """
+INSERT_LIBRARY_ASSET_STATS = """
+    INSERT INTO library_asset_stats (dimension, dimension_key, asset_type, num_roms)
+    SELECT ?, d.dimension_key, ra.asset_type, COUNT(*)
+    FROM ({dimension_roms}) AS d
+        INNER JOIN (
+            SELECT DISTINCT ra.rom_id, a.asset_type FROM rom_assets AS ra
+                INNER JOIN assets AS a ON a.id = ra.asset_id
+            WHERE a.filepath <> ''
+        ) AS ra ON ra.rom_id = d.rom_id
+    GROUP BY d.dimension_key, ra.asset_type
+    """
+DELETE_LIBRARY_STATS = "DELETE FROM library_stats WHERE dimension = ?"
+DELETE_LIBRARY_ASSET_STATS = "DELETE FROM library_asset_stats WHERE dimension = ?"
+SELECT_LIBRARY_STATS_DIRTY = "SELECT dimension FROM library_stats_dirty"
+DELETE_LIBRARY_STATS_DIRTY = "DELETE FROM library_stats_dirty"
+SELECT_LIBRARY_STATS = """
+    SELECT ls.*, COALESCE(c.name, rc.name, s.name, ls.dimension_key) AS name
+    FROM library_stats AS ls
+        LEFT JOIN categories AS c ON ls.dimension = 'category' AND c.id = ls.dimension_key
+        LEFT JOIN romcollections AS rc ON ls.dimension = 'romcollection' AND rc.id = ls.dimension_key
+        LEFT JOIN sources AS s ON ls.dimension = 'source' AND s.id = ls.dimension_key
+    WHERE ls.dimension = ?
+    ORDER BY name COLLATE NOCASE
+    """
+SELECT_LIBRARY_ASSET_STATS = "SELECT * FROM library_asset_stats WHERE dimension = ?"
+SELECT_ROMCOLLECTION_STATS = """
+    SELECT rc.id, rc.name, c.name AS category_name, COALESCE(ls.num_roms, 0) AS num_roms
+    FROM romcollections AS rc
+        LEFT JOIN categories AS c ON c.id = rc.parent_id
+        LEFT JOIN library_stats AS ls ON ls.dimension = 'romcollection' AND ls.dimension_key = rc.id
+    ORDER BY c.name IS NULL, c.name COLLATE NOCASE, rc.name COLLATE NOCASE
+    """
+
 SELECT_LAUNCHER = """
     SELECT l.*,
         a.id AS associated_addon_id,
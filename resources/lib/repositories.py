@@ -1,23 +1,38 @@
 # -*- coding: utf-8 -*-
 import logging
 import typing
+import os
+import hashlib
+import gzip
+import zlib
 
 import json
+import time
 import datetime
+import random
+import socket
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
 from distutils.version import LooseVersion
 
 import sqlite3
 from sqlite3.dbapi2 import Cursor
+from xml.etree import ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
 
 from akl.utils import text, io, kodi
 from akl import constants
 
-from resources.lib import globals
+from resources.lib import globals, instrumentation
+from resources.lib.instrumentation import SqlTracer, ServiceMetrics
 from resources.lib import queries as qry
 from resources.lib.domain import MetaDataItemABC, Category, ROMCollection, ROM, VirtualCollection, RuleSet, Rule
 from resources.lib.domain import Asset, AssetPath, AssetMapping, RomAssetMapping
 from resources.lib.domain import VirtualCategoryFactory, VirtualCollectionFactory, ROMLauncherAddonFactory, g_assetFactory
-from resources.lib.domain import Source, ROMLauncherAddon, AklAddon
+from resources.lib.domain import Source, ROMLauncherAddon, AklAddon, ROMLaunchPlan, parse_nfo_str
 
 
 # #################################################################################################
@@ -35,9 +50,14 @@ from resources.lib.domain import Source, ROMLauncherAddon, AklAddon
 #
 class ViewRepository(object):
 
+    # Views of at least this size (in bytes) are stored gzip compressed. Disabled when None.
+    COMPRESSION_THRESHOLD: typing.Optional[int] = None
+    COMPRESSION_LEVEL = 6
+
     def __init__(self, paths: globals.AKL_Paths):
         self.paths = paths
         self.logger = logging.getLogger(__name__)
+        self._items_index_changes: typing.Dict[str, typing.Optional[typing.List[str]]] = {}
 
     def find_root_items(self):
         repository_file = self.paths.ROOT_PATH
@@ -47,10 +67,10 @@ class ViewRepository(object):
             return None
 
         try:
-            item_data = repository_file.readJson()
+            item_data = self._read_view(repository_file)
         except ValueError as ex:
             statinfo = repository_file.stat()
-            self.logger.error('find_root_items(): ValueError exception in file.readJson() function', exc_info=ex)
+            self.logger.error('find_root_items(): ValueError exception in _read_view() function', exc_info=ex)
             self.logger.error('find_root_items(): Dir  {}'.format(repository_file.getPath()))
             self.logger.error('find_root_items(): Size {}'.format(statinfo.st_size))
             return None
@@ -65,10 +85,10 @@ class ViewRepository(object):
             return None
 
         try:
-            item_data = repository_file.readJson()
+            item_data = self._read_view(repository_file)
         except ValueError as ex:
             statinfo = repository_file.stat()
-            self.logger.error('find_sources_items(): ValueError exception in file.readJson() function', exc_info=ex)
+            self.logger.error('find_sources_items(): ValueError exception in _read_view() function', exc_info=ex)
             self.logger.error('find_sources_items(): Dir  {}'.format(repository_file.getPath()))
             self.logger.error('find_sources_items(): Size {}'.format(statinfo.st_size))
             return None
@@ -76,14 +96,16 @@ class ViewRepository(object):
         return item_data
 
     def find_items(self, view_id, obj_type: int) -> typing.Any:
-        
-        repository_file = self._assemble_view_file_name(view_id, obj_type)
+        repository_file = self.get_view_file(view_id, obj_type)
+        return self.find_items_in_file(repository_file)
+
+    def find_items_in_file(self, repository_file: io.FileName) -> typing.Any:
         self.logger.debug('find_items(): Loading path data from file {}'.format(repository_file.getPath()))
         try:
-            item_data = repository_file.readJson()
+            item_data = self._read_view(repository_file)
         except ValueError as ex:
             statinfo = repository_file.stat()
-            self.logger.error('find_items(): ValueError exception in file.readJson() function', exc_info=ex)
+            self.logger.error('find_items(): ValueError exception in _read_view() function', exc_info=ex)
             self.logger.error('find_items(): Dir  {}'.format(repository_file.getPath()))
             self.logger.error('find_items(): Size {}'.format(statinfo.st_size))
             return None
@@ -93,23 +115,208 @@ class ViewRepository(object):
     def store_root_view(self, view_data):
         repository_file = self.paths.ROOT_PATH
         self.logger.debug(f'store_root_view(): Storing data in file {repository_file.getPath()}')
-        repository_file.writeJson(view_data)
+        self._write_view(repository_file, view_data)
 
     def store_sources_view(self, view_data):
         repository_file = self.paths.SOURCES_VIEW_PATH
         self.logger.debug(f'store_sources_view(): Storing data in file {repository_file.getPath()}')
-        repository_file.writeJson(view_data)
+        self._write_view(repository_file, view_data)
 
     def store_view(self, view_id: str, object_type: int, view_data):        
-        repository_file = self._assemble_view_file_name(view_id, object_type)
+        repository_file = self.get_view_file(view_id, object_type)
         if view_data is None:
             if repository_file.exists():
                 self.logger.debug(f'store_view(): No data for file {repository_file.getPath()}. Removing file')
-                repository_file.unlink()
+                self._remove_view(repository_file)
             return
 
         self.logger.debug(f'store_view(): Storing data in file {repository_file.getPath()}')
-        repository_file.writeJson(view_data)
+        self._write_view(repository_file, view_data)
+        self._index_view_items(repository_file, view_data['items'])
+
+    #
+    # Inserts or replaces the list item with the same id in a stored view. The item is moved to
+    # the given position, or replaced in place (appended when new) when no position is given.
+    # Returns False when the view is not rendered yet.
+    #
+    def upsert_view_item(self, view_id: str, object_type: int, item: dict, position: int = None,
+                         max_items: int = None) -> bool:
+        repository_file = self.get_view_file(view_id, object_type)
+        return self.upsert_item_in_file(repository_file, item, position, max_items)
+
+    def upsert_item_in_file(self, repository_file: io.FileName, item: dict, position: int = None,
+                            max_items: int = None) -> bool:
+        if not repository_file.exists():
+            return False
+        view_data = self.find_items_in_file(repository_file)
+        if view_data is None:
+            return False
+
+        items: typing.List[dict] = view_data['items']
+        current_position = next((idx for idx, view_item in enumerate(items)
+                                 if view_item and view_item['id'] == item['id']), None)
+        if current_position is not None and position is None:
+            if items[current_position] == item:
+                return True
+            items[current_position] = item
+        else:
+            if current_position is not None:
+                del items[current_position]
+            items.insert(len(items) if position is None else position, item)
+        if max_items is not None:
+            del items[max_items:]
+
+        self.logger.debug(f'upsert_item_in_file(): Storing item "{item["id"]}" in file {repository_file.getPath()}')
+        self._write_view(repository_file, view_data)
+        self._index_view_items(repository_file, items)
+        return True
+
+    #
+    # Removes the list item with the given id from a stored view.
+    # Returns False when the view is not rendered yet.
+    #
+    def delete_view_item(self, view_id: str, object_type: int, item_id: str) -> bool:
+        repository_file = self.get_view_file(view_id, object_type)
+        return self.delete_item_in_file(repository_file, item_id)
+
+    def delete_item_in_file(self, repository_file: io.FileName, item_id: str) -> bool:
+        if not repository_file.exists():
+            return False
+        view_data = self.find_items_in_file(repository_file)
+        if view_data is None:
+            return False
+
+        items: typing.List[dict] = view_data['items']
+        remaining_items = [view_item for view_item in items if not view_item or view_item['id'] != item_id]
+        if len(remaining_items) != len(items):
+            view_data['items'] = remaining_items
+            self.logger.debug(f'delete_item_in_file(): Removing item "{item_id}" from file {repository_file.getPath()}')
+            self._write_view(repository_file, view_data)
+            self._index_view_items(repository_file, remaining_items)
+        return True
+
+    #
+    # The items index maps the ids of the items to the view files (and positions) they are rendered
+    # in, so a single ROM can be patched in its views without rendering these views again.
+    # It holds the item ids per view, to drop the entries of a view that changed, and the inverted
+    # map of item id to the views and positions, to look up an item without going through all views.
+    # It is kept up to date while storing views and is written with save_items_index().
+    #
+    def find_item_views(self, item_id: str) -> typing.Dict[str, int]:
+        item_views = dict(self._read_items_index()['items'].get(item_id, {}))
+        # views changed by this repository that are not saved in the index yet
+        for view_path, item_ids in self._items_index_changes.items():
+            item_views.pop(view_path, None)
+            if item_ids is not None and item_id in item_ids:
+                item_views[view_path] = item_ids.index(item_id)
+        return item_views
+
+    def save_items_index(self):
+        if not self._items_index_changes:
+            return
+        # merged with the stored index, since other commands can render views at the same time
+        items_index = self._read_items_index()
+        views_index, items_by_id = items_index['views'], items_index['items']
+        for view_path, item_ids in self._items_index_changes.items():
+            for item_id in views_index.pop(view_path, []):
+                item_views = items_by_id.get(item_id)
+                if item_views is not None:
+                    item_views.pop(view_path, None)
+                    if not item_views:
+                        del items_by_id[item_id]
+            if item_ids is None:
+                continue
+            views_index[view_path] = item_ids
+            for position, item_id in enumerate(item_ids):
+                if item_id is not None:
+                    items_by_id.setdefault(item_id, {})[view_path] = position
+        
+        self.logger.debug(f'save_items_index(): Storing {len(self._items_index_changes)} changed views in the index')
+        self._write_file_atomically(self.paths.VIEWS_INDEX_FILE_PATH, json.dumps(items_index).encode('utf-8'))
+        self._items_index_changes = {}
+
+    def _read_items_index(self) -> dict:
+        index_file = self.paths.VIEWS_INDEX_FILE_PATH
+        if index_file.exists():
+            try:
+                items_index = index_file.readJson()
+                if 'views' in items_index and 'items' in items_index:
+                    return items_index
+                self.logger.error('_read_items_index(): Views index file without views and items, ignoring it')
+            except (ValueError, AttributeError, TypeError) as ex:
+                self.logger.error('_read_items_index(): Invalid views index file', exc_info=ex)
+        return {'views': {}, 'items': {}}
+
+    #
+    # Views are written to a temporary file first and then renamed over the existing view, so readers
+    # always see either the previous or the new view completely. Views with unchanged content are not
+    # written at all. Returns True when the view file was written.
+    #
+    def _write_view(self, repository_file: io.FileName, view_data) -> bool:
+        view_bytes = json.dumps(view_data).encode('utf-8')
+        content_hash = hashlib.sha1(view_bytes).hexdigest()
+        # the storage mode is part of the version, so views are converted when compression is toggled
+        if self.COMPRESSION_THRESHOLD is not None and len(view_bytes) >= self.COMPRESSION_THRESHOLD:
+            view_bytes = gzip.compress(view_bytes, compresslevel=self.COMPRESSION_LEVEL, mtime=0)
+            content_hash = f'gz:{content_hash}'
+        
+        current_version = self._find_view_version(repository_file)
+        if current_version is not None and current_version[1] == content_hash and repository_file.exists():
+            self.logger.debug(f'_write_view(): Content of {repository_file.getPath()} is unchanged. Skipping')
+            return False
+
+        generation = current_version[0] + 1 if current_version is not None else 1
+        self._write_file_atomically(repository_file, view_bytes)
+        self._write_file_atomically(self.get_view_version_file(repository_file),
+                                    json.dumps({'generation': generation, 'hash': content_hash}).encode('utf-8'))
+        ViewCache.invalidate(repository_file)
+        return True
+
+    #
+    # Every stored view has a small version file next to it, with the hash of the view content and a
+    # generation number that is increased on every change.
+    #
+    def _find_view_version(self, repository_file: io.FileName) -> typing.Optional[typing.Tuple[int, str]]:
+        version_file = self.get_view_version_file(repository_file)
+        if not version_file.exists():
+            return None
+        try:
+            version_data = json.loads(version_file.loadFileToStr())
+            return version_data['generation'], version_data['hash']
+        except (ValueError, KeyError, TypeError) as ex:
+            self.logger.warning(f'_find_view_version(): Ignoring invalid version file {version_file.getPath()}: {ex}')
+            return None
+
+    def _read_view(self, repository_file: io.FileName) -> typing.Any:
+        with open(repository_file.getPathTranslated(), 'rb') as file:
+            view_bytes = file.read()
+        try:
+            return json.loads(decode_view_bytes(view_bytes))
+        except (EOFError, gzip.BadGzipFile, zlib.error) as ex:
+            raise ValueError(f'Invalid compressed view: {ex}') from ex
+
+    def _write_file_atomically(self, target_file: io.FileName, data: bytes):
+        target_path = target_file.getPathTranslated()
+        file_descriptor, temp_path = tempfile.mkstemp(
+            prefix=f'.{os.path.basename(target_path)}.', suffix='.tmp', dir=os.path.dirname(target_path))
+        try:
+            with os.fdopen(file_descriptor, 'wb') as temp_file:
+                temp_file.write(data)
+            os.replace(temp_path, target_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _remove_view(self, repository_file: io.FileName):
+        repository_file.unlink()
+        self.get_view_version_file(repository_file).unlink()
+        ViewCache.invalidate(repository_file)
+        self._index_view_items(repository_file, None)
+
+    def _index_view_items(self, repository_file: io.FileName, items: typing.Optional[typing.List[dict]]):
+        self._items_index_changes[repository_file.getPath()] = \
+            None if items is None else [item['id'] if item else None for item in items]
 
     def cleanup_views(self, view_ids_to_keep: typing.List[str]):
         view_files = self.paths.VIEWS_DIR.scanFilesInPath('*.json')
@@ -117,27 +324,46 @@ class ViewRepository(object):
             view_id = view_file.getBaseNoExt().replace('collection_', '').replace('category_', '').replace('source_', '')
             if view_id not in view_ids_to_keep:
                 self.logger.info(f'Removing file for view "{view_id}"')
-                view_file.unlink()
+                self._remove_view(view_file)
 
     def cleanup_obsolete_views(self):
         view_files = self.paths.VIEWS_DIR.scanFilesInPath('view*.json')
         for view_file in view_files:
             self.logger.info(f'Removing file: "{view_file}"')
-            view_file.unlink()
+            self._remove_view(view_file)
 
     def cleanup_virtual_category_views(self, view_id):
         view_files = self.paths.GENERATED_VIEWS_DIR.scanFilesInPath(f'category_{view_id}_*.json')
+        view_files.extend(self.paths.GENERATED_VIEWS_DIR.scanFilesInPath(f'collection_{view_id}_*.json'))
         self.logger.info(f'Removing {len(view_files)} files for virtual category "{view_id}"')
         for view_file in view_files:
-            view_file.unlink()
+            self._remove_view(view_file)
  
     def cleanup_all_virtual_category_views(self):
         view_files = self.paths.GENERATED_VIEWS_DIR.scanFilesInPath('category_*.json')
+        for vcategory_id in constants.VCATEGORIES:
+            view_files.extend(self.paths.GENERATED_VIEWS_DIR.scanFilesInPath(f'collection_{vcategory_id}_*.json'))
         self.logger.info(f'Removing {len(view_files)} files for all virtual categories')
         for view_file in view_files:
-            view_file.unlink()
+            self._remove_view(view_file)
+
+    #
+    # Views of the virtual collections in a virtual category (genre, year, etc.) are stored
+    # by a hash of the collection value, since the value itself can not be used in a file name.
+    #
+    def find_virtual_collection_items(self, vcategory_id: str, collection_value: str) -> typing.Any:
+        repository_file = self.get_virtual_collection_file(vcategory_id, collection_value)
+        if not repository_file.exists():
+            return None
+        return self.find_items_in_file(repository_file)
+
+    def store_virtual_collection_view(self, vcategory_id: str, collection_value: str, view_data):
+        repository_file = self.get_virtual_collection_file(vcategory_id, collection_value)
+        self.logger.debug(f'store_virtual_collection_view(): Storing data in file {repository_file.getPath()}')
+        self._write_view(repository_file, view_data)
+        self._index_view_items(repository_file, view_data['items'])
             
-    def _assemble_view_file_name(self, view_id, obj_type):
+    def get_view_file(self, view_id, obj_type) -> io.FileName:
         
         if obj_type == constants.OBJ_CATEGORY:
             return self.paths.VIEWS_DIR.pjoin(f'category_{view_id}.json')
@@ -151,8 +377,102 @@ class ViewRepository(object):
             return self.paths.GENERATED_VIEWS_DIR.pjoin(f'collection_{view_id}.json')
         
         return self.paths.VIEWS_DIR.pjoin(f'view_{view_id}.json')
+
+    def get_view_version_file(self, repository_file: io.FileName) -> io.FileName:
+        return repository_file.changeExtension('.version')
+
+    def get_virtual_collection_file(self, vcategory_id: str, collection_value: str) -> io.FileName:
+        value_hash = hashlib.md5(str(collection_value).encode('utf-8')).hexdigest()
+        return self.paths.GENERATED_VIEWS_DIR.pjoin(f'collection_{vcategory_id}_{value_hash}.json')
     
         
+#
+# Views can be stored gzip compressed (see ViewRepository.COMPRESSION_THRESHOLD). Compressed
+# files are recognized by their header, so views in both formats can be read at any time.
+#
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def decode_view_bytes(view_bytes: bytes) -> bytes:
+    if view_bytes[:2] == GZIP_MAGIC:
+        return gzip.decompress(view_bytes)
+    return view_bytes
+
+
+#
+# ViewCache keeps the content of the most recently requested view files in the memory of the
+# service, so these can be served without reading them from disk again. Entries are validated
+# against the modification time and size of the file, which makes views stored by other processes
+# visible as well. The same values are used as ETag of the served view.
+#
+class ViewCache(object):
+    
+    MAX_VIEWS = 64
+    
+    _lock = threading.Lock()
+    _views: typing.Dict[str, typing.Tuple[str, bytes]] = OrderedDict()
+    
+    @classmethod
+    def get(cls, view_file: io.FileName) -> typing.Optional[typing.Tuple[str, bytes]]:
+        view_path = view_file.getPathTranslated()
+        try:
+            file_stat = os.stat(view_path)
+        except OSError:
+            return None
+        etag = f'"{file_stat.st_mtime_ns:x}-{file_stat.st_size:x}"'
+        
+        with cls._lock:
+            cached_view = cls._views.get(view_path)
+            if cached_view is not None and cached_view[0] == etag:
+                cls._views.move_to_end(view_path)
+                ServiceMetrics.record_cache_lookup('views', True)
+                return cached_view
+        
+        ServiceMetrics.record_cache_lookup('views', False)
+        try:
+            with open(view_path, 'rb') as file:
+                cached_view = (etag, decode_view_bytes(file.read()))
+        except (OSError, EOFError, zlib.error):
+            return None
+        
+        with cls._lock:
+            cls._views[view_path] = cached_view
+            cls._views.move_to_end(view_path)
+            while len(cls._views) > cls.MAX_VIEWS:
+                cls._views.popitem(last=False)
+        return cached_view
+
+    @classmethod
+    def invalidate(cls, view_file: io.FileName):
+        with cls._lock:
+            cls._views.pop(view_file.getPathTranslated(), None)
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._views.clear()
+
+
+#
+# Gives the path of the file on the local filesystem, so it can be streamed with the standard
+# library. Files on other filesystems of Kodi (smb://, nfs://) are copied to a temporary file first.
+#
+@contextmanager
+def local_file_path(file_path: io.FileName) -> typing.Iterator[str]:
+    path = file_path.getPathTranslated()
+    if '://' not in path:
+        yield path
+        return
+    
+    temp_dir = tempfile.mkdtemp()
+    try:
+        temp_file = io.FileName(os.path.join(temp_dir, file_path.getBase()))
+        file_path.copy(temp_file)
+        yield temp_file.getPathTranslated()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
 #
 # XmlConfigurationRepository works with original XML configuration files, which contained the 
 # categories and launchers. This repository is to read these files and migrate to current solution.
@@ -165,85 +485,147 @@ class XmlConfigurationRepository(object):
         self.logger = logging.getLogger(__name__)
 
     def get_categories(self) -> typing.Iterator[Category]:
-        # --- Parse using cElementTree ---
-        # >> If there are issues in the XML file (for example, invalid XML chars) ET.parse will fail
-        self.logger.debug('XmlRepository.get_categories() Loading {0}'.format(self.file_path.getPath()))
+        return (item for item in self.get_items() if isinstance(item, Category))
 
-        xml_root = self.file_path.readXml()
-        if xml_root is None:
-            return None
-
-        # >> Process tags in XML configuration file
-        for root_element in xml_root:
-            if self.debug: 
-                self.logger.debug('>>> Root child tag <{0}>'.format(root_element.tag))
+    def get_launchers(self) -> typing.Iterator[ROMCollection]:
+        return (item for item in self.get_items() if isinstance(item, ROMCollection))
 
-            if not root_element.tag == 'category':
-                continue
+    def get_items(self) -> typing.Iterator[typing.Union[Category, ROMCollection]]:
+        # --- Parse incrementally using iterparse ---
+        # >> Categories and launchers are yielded in document order while the file is read. Every
+        # >> processed element is removed from the tree, so memory stays bounded for huge files.
+        # >> If there are issues in the XML file (for example, invalid XML chars) the ParseError is
+        # >> raised after the items before it have been yielded.
+        self.logger.debug('XmlRepository.get_items() Loading {0}'.format(self.file_path.getPath()))
 
-            assets = []
-            category_temp = {}
-            for root_child in root_element:
-                # >> By default read strings
-                text_XML_line = root_child.text if root_child.text is not None else ''
-                text_XML_line = text.unescape_XML(text_XML_line)
-                xml_tag  = root_child.tag
-                if self.debug: 
-                    self.logger.debug('>>> "{0:<11s}" --> "{1}"'.format(xml_tag, text_XML_line))
-                category_temp[xml_tag] = text_XML_line
-                                
-                if xml_tag.startswith('s_'):
-                    asset_info = g_assetFactory.get_asset_info(xml_tag[2:])
-                    asset_data = { 'filepath': text_XML_line, 'asset_type': asset_info.id }
-                    assets.append(Asset(asset_data))
-                
-            # --- Add category to categories dictionary ---
-            self.logger.debug('Adding category "{0}" to import list'.format(category_temp['m_name']))
-            yield Category(category_temp, assets)
-
-    def get_launchers(self) -> typing.Iterator[ROMCollection]:    
-        # --- Parse using cElementTree ---
-        # >> If there are issues in the XML file (for example, invalid XML chars) ET.parse will fail
-        self.logger.debug('XmlRepository.get_launchers() Loading {0}'.format(self.file_path.getPath()))
+        xml_root = None
+        depth = 0
+        try:
+            with local_file_path(self.file_path) as xml_path:
+                for event, element in ET.iterparse(xml_path, events=('start', 'end')):
+                    if event == 'start':
+                        if xml_root is None:
+                            xml_root = element
+                        depth += 1
+                        continue
+                    
+                    depth -= 1
+                    if depth != 1:
+                        continue
+                    
+                    if self.debug: 
+                        self.logger.debug('>>> Root child tag <{0}>'.format(element.tag))
+                    if element.tag == 'category':
+                        yield self._parse_category(element)
+                    elif element.tag == 'launcher':
+                        yield self._parse_launcher(element)
+                    xml_root.clear()
+        except ET.ParseError:
+            self.logger.exception('XmlRepository.get_items() Failed parsing {0}'.format(self.file_path.getPath()))
+            raise
 
-        xml_root = self.file_path.readXml()
-        if xml_root is None:
-            return None
-            
-        # >> Process tags in XML configuration file
-        for root_element in xml_root:
+    def _parse_category(self, root_element) -> Category:
+        assets = []
+        category_temp = {}
+        for root_child in root_element:
+            # >> By default read strings
+            text_XML_line = root_child.text if root_child.text is not None else ''
+            text_XML_line = text.unescape_XML(text_XML_line)
+            xml_tag  = root_child.tag
             if self.debug: 
-                self.logger.debug('>>> Root child tag <{0}>'.format(root_element.tag))
+                self.logger.debug('>>> "{0:<11s}" --> "{1}"'.format(xml_tag, text_XML_line))
+            category_temp[xml_tag] = text_XML_line
+                            
+            if xml_tag.startswith('s_'):
+                asset_info = g_assetFactory.get_asset_info(xml_tag[2:])
+                asset_data = { 'filepath': text_XML_line, 'asset_type': asset_info.id }
+                assets.append(Asset(asset_data))
+            
+        # --- Add category to categories dictionary ---
+        self.logger.debug('Adding category "{0}" to import list'.format(category_temp['m_name']))
+        return Category(category_temp, assets)
 
-            if not root_element.tag == 'launcher':
-                continue
+    def _parse_launcher(self, root_element) -> ROMCollection:
+        assets = []
+        asset_paths = []
+        launcher_temp = {}
+        for root_child in root_element:
+            # >> By default read strings
+            text_XML_line = root_child.text if root_child.text is not None else ''
+            text_XML_line = text.unescape_XML(text_XML_line)
+            xml_tag  = root_child.tag
+            if self.debug: 
+                self.logger.debug('>>> "{0:<11s}" --> "{1}"'.format(xml_tag, text_XML_line))
+            if xml_tag == 'categoryID': xml_tag = 'parent_id'                
+            launcher_temp[xml_tag] = text_XML_line
             
-            assets = []
-            asset_paths = []
-            launcher_temp = {}
-            for root_child in root_element:
-                # >> By default read strings
-                text_XML_line = root_child.text if root_child.text is not None else ''
-                text_XML_line = text.unescape_XML(text_XML_line)
-                xml_tag  = root_child.tag
-                if self.debug: 
-                    self.logger.debug('>>> "{0:<11s}" --> "{1}"'.format(xml_tag, text_XML_line))
-                if xml_tag == 'categoryID': xml_tag = 'parent_id'                
-                launcher_temp[xml_tag] = text_XML_line
+            if xml_tag.startswith('s_'):
+                asset_info = g_assetFactory.get_asset_info(xml_tag[2:])
+                asset_data = { 'filepath': text_XML_line, 'asset_type': asset_info.id }
+                assets.append(Asset(asset_data))
                 
-                if xml_tag.startswith('s_'):
-                    asset_info = g_assetFactory.get_asset_info(xml_tag[2:])
-                    asset_data = { 'filepath': text_XML_line, 'asset_type': asset_info.id }
-                    assets.append(Asset(asset_data))
-                    
-                if xml_tag.startswith('path_'):
-                    asset_info = g_assetFactory.get_asset_info_by_pathkey(xml_tag)
-                    asset_path_data = { 'path': text_XML_line, 'asset_type': asset_info.id }
-                    asset_paths.append(AssetPath(asset_path_data))
-                    
-            # --- Add launcher to launchers collection ---
-            self.logger.debug('Adding launcher "{0}" to import list'.format(launcher_temp['m_name']))
-            yield ROMCollection(launcher_temp, assets, asset_paths, [], [])
+            if xml_tag.startswith('path_'):
+                asset_info = g_assetFactory.get_asset_info_by_pathkey(xml_tag)
+                asset_path_data = { 'path': text_XML_line, 'asset_type': asset_info.id }
+                asset_paths.append(AssetPath(asset_path_data))
+                
+        # --- Add launcher to launchers collection ---
+        self.logger.debug('Adding launcher "{0}" to import list'.format(launcher_temp['m_name']))
+        return ROMCollection(launcher_temp, assets, asset_paths, [], [])
+
+
+# -------------------------------------------------------------------------------------------------
+# Writes a XML configuration file element by element straight to disk. The output is indented
+# the same way as minidom's toprettyxml(indent='  ') but the document is never held in memory.
+# Every element written under the root only contains simple text elements.
+# -------------------------------------------------------------------------------------------------
+class XmlConfigurationWriter(object):
+
+    def __init__(self, file_path: io.FileName, root_tag='advanced_emulator_launcher_configuration', indent='  '):
+        self.file_path = file_path
+        self.root_tag = root_tag
+        self.indent = indent
+        self.elements_written = 0
+        self.logger = logging.getLogger(__name__)
+
+    def __enter__(self):
+        self.logger.debug('XmlConfigurationWriter() Writing {0}'.format(self.file_path.getPath()))
+        self.file_path.open('w')
+        self.file_path.write('<?xml version="1.0" ?>\n')
+        return self
+
+    def __exit__(self, type, value, traceback):
+        try:
+            if self.elements_written == 0:
+                self.file_path.write(f'<{self.root_tag}/>\n')
+            else:
+                self.file_path.write(f'</{self.root_tag}>\n')
+        finally:
+            self.file_path.close()
+
+    def write_element(self, tag: str, children: typing.List[typing.Tuple[str, typing.Any]]):
+        if self.elements_written == 0:
+            self.file_path.write(f'<{self.root_tag}>\n')
+        
+        lines = []
+        if len(children) == 0:
+            lines.append(f'{self.indent}<{tag}/>')
+        else:
+            lines.append(f'{self.indent}<{tag}>')
+            for child_tag, child_value in children:
+                # data which is not string must be converted to string
+                if child_value is None or child_value == '':
+                    lines.append(f'{self.indent * 2}<{child_tag}/>')
+                else:
+                    lines.append(f'{self.indent * 2}<{child_tag}>{self._escape(str(child_value))}</{child_tag}>')
+            lines.append(f'{self.indent}</{tag}>')
+        lines.append('')
+        
+        self.file_path.write('\n'.join(lines))
+        self.elements_written += 1
+
+    def _escape(self, value: str) -> str:
+        return value.replace('&', '&amp;').replace('<', '&lt;').replace('"', '&quot;').replace('>', '&gt;')
 
 
 # -------------------------------------------------------------------------------------------------
@@ -270,45 +652,46 @@ class ROMsJsonFileRepository(object):
             self.logger.warning('Launcher JSON not found "{0}"'.format(self.file_path.getPath()))
             return []
 
-        roms_data = []
-        # --- Parse using json module ---
         # >> On Github issue #8 a user had an empty JSON file for ROMs. This raises
         #    exception exceptions.ValueError and launcher cannot be deleted. Deal
         #    with this exception so at least launcher can be rescanned.
-        self.logger.debug('ROMsJsonFileRepository.find_by_launcher(): Loading roms from file {0}'.format(self.file_path.getPath()))
         try:
-            roms_data = self.file_path.readJson()
+            return [*self.iterate_ROMs()]
         except ValueError:
             statinfo = self.file_path.stat()
-            self.logger.error('ROMsJsonFileRepository.find_by_launcher(): ValueError exception in json.load() function')
-            self.logger.error('ROMsJsonFileRepository.find_by_launcher(): Dir  {0}'.format(self.file_path.getPath()))
-            self.logger.error('ROMsJsonFileRepository.find_by_launcher(): Size {0}'.format(statinfo.st_size))
+            self.logger.error('ROMsJsonFileRepository.load_ROMs(): ValueError exception while parsing JSON')
+            self.logger.error('ROMsJsonFileRepository.load_ROMs(): Dir  {0}'.format(self.file_path.getPath()))
+            self.logger.error('ROMsJsonFileRepository.load_ROMs(): Size {0}'.format(statinfo.st_size))
             return None
 
-        # --- Extract roms from JSON data structure and ensure version is correct ---
-        if roms_data and isinstance(roms_data, list) and 'control' in roms_data[0]:
-            control_str = roms_data[0]['control']
-            version_int = roms_data[0]['version']
-            roms_data = roms_data[1]
-
-        roms = []
-        if isinstance(roms_data, list):
-            for rom_data in roms_data:
-                assets = self._get_assets_from_romdata(rom_data)
-                compatible_rom_data = self._alter_dictionary_for_compatibility(rom_data)
-                scanned_data = self._get_scanned_data_from_romdata(rom_data)
-                r = ROM(rom_data, assets, scanned_data=scanned_data)
-                key = r.get_id()
-                roms.append(r)
-        else:
-            for key in roms_data:
-                assets = self._get_assets_from_romdata(roms_data[key])
-                compatible_rom_data = self._alter_dictionary_for_compatibility(roms_data[key])
-                scanned_data = self._get_scanned_data_from_romdata(roms_data[key])
-                r = ROM(compatible_rom_data, assets, scanned_data=scanned_data)
-                roms.append(r)
-
-        return roms
+    #
+    # Reads the ROM database incrementally and yields the ROMs one at a time, so only the
+    # ROM being processed is kept in memory. Raises ValueError when the file is not valid JSON.
+    # Supported layouts are a list or dictionary of ROMs, optionally wrapped in a list
+    # with a control header first: [{ "control": ..., "version": ... }, { ROMs }]
+    #
+    def iterate_ROMs(self) -> typing.Iterator[ROM]:
+        self.logger.debug('ROMsJsonFileRepository.iterate_ROMs(): Loading roms from file {0}'.format(self.file_path.getPath()))
+        with local_file_path(self.file_path) as json_path, open(json_path, 'r', encoding='utf-8') as json_file:
+            reader = JsonStreamReader(json_file)
+            if reader.enter_container() == '[' and reader.next_value():
+                first_data = reader.read_value()
+                if isinstance(first_data, dict) and 'control' in first_data:
+                    self.logger.debug('ROMsJsonFileRepository.iterate_ROMs(): Version {0}'.format(first_data['version']))
+                    if not reader.next_value():
+                        return
+                    reader.enter_container()
+                else:
+                    yield self._create_ROM(first_data)
+            
+            while reader.next_value():
+                yield self._create_ROM(reader.read_value())
+
+    def _create_ROM(self, rom_data: dict) -> ROM:
+        assets = self._get_assets_from_romdata(rom_data)
+        compatible_rom_data = self._alter_dictionary_for_compatibility(rom_data)
+        scanned_data = self._get_scanned_data_from_romdata(rom_data)
+        return ROM(compatible_rom_data, assets_data=assets, scanned_data=scanned_data)
     
     def _get_assets_from_romdata(self, rom_data: dict) -> typing.List[Asset]:
         assets = []
@@ -320,7 +703,8 @@ class ROMsJsonFileRepository(object):
         return assets
 
     def _get_scanned_data_from_romdata(self, rom_data: dict) -> dict:
-        scanned_data = { 'file': rom_data['filepath'] }
+        # >> older AEL versions stored the ROM file as 'filename'
+        scanned_data = { 'file': rom_data['filepath'] if 'filepath' in rom_data else rom_data.get('filename') }
         return scanned_data
  
     def _alter_dictionary_for_compatibility(self, rom_data: dict) -> dict:
@@ -328,16 +712,262 @@ class ROMsJsonFileRepository(object):
         return rom_data
 
 
+# -------------------------------------------------------------------------------------------------
+# Incremental JSON reader. Reads a file in chunks and decodes the values inside a list or
+# dictionary one at a time, so huge JSON files never have to be loaded completely.
+# -------------------------------------------------------------------------------------------------
+class JsonStreamReader(object):
+    
+    CHUNK_SIZE = 64 * 1024
+    
+    def __init__(self, file_obj: typing.TextIO):
+        self.file_obj = file_obj
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+        # >> opened lists and dictionaries with the amount of values read in each
+        self.containers = []
+
+    #
+    # Enters the next list or dictionary in the file. Returns '[' or '{'.
+    #
+    def enter_container(self) -> str:
+        container_start = self._next_char()
+        if container_start not in ('[', '{'):
+            raise ValueError(f'Expected a JSON list or object at position {self.position}')
+        self.position += 1
+        self.containers.append([container_start, 0])
+        return container_start
+
+    #
+    # Moves to the next value in the current container. Returns False and leaves the
+    # container when all values are read. In dictionaries the key is skipped.
+    #
+    def next_value(self) -> bool:
+        container = self.containers[-1]
+        container_end = ']' if container[0] == '[' else '}'
+        char = self._next_char()
+        if char == container_end:
+            self.position += 1
+            self.containers.pop()
+            return False
+        
+        if container[1] > 0:
+            self._expect(',')
+        if container[0] == '{':
+            self._decode_value()
+            self._expect(':')
+        container[1] += 1
+        return True
+
+    def read_value(self) -> typing.Any:
+        return self._decode_value()
+
+    def _decode_value(self):
+        self._next_char()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                # >> a value ending with the buffer, like a number, could continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.position = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            self._read_chunk()
+
+    def _expect(self, char: str):
+        if self._next_char() != char:
+            raise ValueError(f'Expected "{char}" at position {self.position}')
+        self.position += 1
+
+    def _next_char(self) -> str:
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position].isspace():
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if self.eof:
+                raise ValueError('Unexpected end of JSON data')
+            self._read_chunk()
+
+    def _read_chunk(self):
+        # >> drop the part of the buffer which is already processed
+        self.buffer = self.buffer[self.position:]
+        self.position = 0
+        chunk = self.file_obj.read(self.CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+        self.buffer += chunk
+
+
+# -------------------------------------------------------------------------------------------------
+# Reads, writes and deletes the NFO files of ROMs in bulk. File access is done in a thread pool.
+# For each imported ROM the (path, mtime, size) of its NFO file and a hash of the NFO fields of the
+# ROM are kept in a cache file by ROM id. NFO files are only skipped while reading when neither the
+# file nor the ROM changed since the import, so cleared, rescanned or edited ROMs are read again.
+# -------------------------------------------------------------------------------------------------
+class ROMsNFOFileRepository(object):
+    MAX_WORKERS = 8
+    BATCH_SIZE = 250
+
+    def __init__(self, cache_file_path: io.FileName = None):
+        self.cache_file_path = cache_file_path
+        self.logger = logging.getLogger(__name__)
+        self.cache = self._load_cache()
+        # (path, mtime, size) of the NFO files read, until the ROM is marked as imported
+        self._read_signatures: typing.Dict[str, list] = {}
+
+    #
+    # Yields the ROMs in the same order together with the parsed data of their NFO file.
+    # The data is None for ROMs without a NFO file or with an unchanged NFO file and ROM.
+    #
+    def read_nfo_files(self, roms: typing.Iterable[ROM]) -> typing.Iterator[typing.Tuple[ROM, typing.Optional[dict]]]:
+        with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
+            for batch in self._batches(roms):
+                yield from zip(batch, executor.map(self._read_nfo_file, batch))
+
+    #
+    # Remembers that the ROM is updated with the data of its NFO file, so the file is skipped the next
+    # time as long as both stay unchanged.
+    #
+    def mark_imported(self, rom: ROM):
+        signature = self._read_signatures.pop(rom.get_id(), None)
+        if signature is not None:
+            self.cache[rom.get_id()] = signature + [self._get_rom_hash(rom)]
+
+    #
+    # Exports the NFO files of the given ROMs. Returns the amount of written files.
+    #
+    def write_nfo_files(self, roms: typing.Iterable[ROM]) -> int:
+        num_of_files = 0
+        with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
+            for batch in self._batches(roms):
+                # >> Exported files are not imported yet, so they are read on the next import
+                for rom in batch:
+                    self.cache.pop(rom.get_id(), None)
+                nfo_files = [(rom.get_nfo_file(), rom.get_NFO_str()) for rom in batch]
+                num_of_files += sum(executor.map(self._write_nfo_file, nfo_files))
+        return num_of_files
+
+    #
+    # Deletes the NFO files of the given ROMs. Returns the amount of deleted files.
+    #
+    def delete_nfo_files(self, roms: typing.Iterable[ROM]) -> int:
+        num_of_files = 0
+        with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
+            for batch in self._batches(roms):
+                for rom in batch:
+                    self.cache.pop(rom.get_id(), None)
+                nfo_files = [rom.get_nfo_file() for rom in batch]
+                num_of_files += sum(executor.map(self._delete_nfo_file, nfo_files))
+        return num_of_files
+
+    def save_cache(self):
+        if self.cache_file_path is None:
+            return
+        self.cache_file_path.writeAll(json.dumps(self.cache))
+
+    def _load_cache(self) -> dict:
+        if self.cache_file_path is None or not self.cache_file_path.exists():
+            return {}
+        try:
+            return json.loads(self.cache_file_path.loadFileToStr())
+        except ValueError:
+            self.logger.warning(f'Ignoring invalid NFO cache file "{self.cache_file_path.getPath()}"')
+            return {}
+
+    def _batches(self, roms: typing.Iterable[ROM]) -> typing.Iterator[typing.List[ROM]]:
+        batch = []
+        for rom in roms:
+            batch.append(rom)
+            if len(batch) >= self.BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _get_rom_hash(self, rom: ROM) -> str:
+        # Values are compared as text, ROMs loaded from the database can hold numbers instead
+        nfo_values = [rom.get_name(), rom.get_releaseyear(), rom.get_genre(), rom.get_developer(),
+                      rom.get_number_of_players(), rom.get_esrb_rating(), rom.get_pegi_rating(),
+                      rom.get_rating(), rom.get_plot(), rom.get_trailer()]
+        nfo_str = json.dumps(['' if value is None else str(value) for value in nfo_values])
+        return hashlib.md5(nfo_str.encode('utf-8')).hexdigest()
+
+    def _read_nfo_file(self, rom: ROM) -> typing.Optional[dict]:
+        nfo_file = rom.get_nfo_file()
+        if nfo_file is None or not nfo_file.exists():
+            return None
+        try:
+            file_stat = nfo_file.stat()
+            signature = [nfo_file.getPath(), file_stat.st_mtime, file_stat.st_size]
+            if self.cache.get(rom.get_id()) == signature + [self._get_rom_hash(rom)]:
+                return None
+            nfo_data = parse_nfo_str(nfo_file.loadFileToStr())
+        except Exception:
+            self.logger.exception(f'Failure while reading NFO file "{nfo_file.getPath()}"')
+            return None
+
+        self._read_signatures[rom.get_id()] = signature
+        return nfo_data
+
+    def _write_nfo_file(self, nfo_file_and_content: typing.Tuple[io.FileName, str]) -> bool:
+        nfo_file, nfo_content = nfo_file_and_content
+        if nfo_file is None:
+            return False
+        try:
+            nfo_file.writeAll(nfo_content)
+        except Exception:
+            self.logger.exception(f'Failure while writing NFO file "{nfo_file.getPath()}"')
+            return False
+        return True
+
+    def _delete_nfo_file(self, nfo_file: io.FileName) -> bool:
+        if nfo_file is None or not nfo_file.exists():
+            return False
+        try:
+            nfo_file.unlink()
+        except Exception:
+            self.logger.exception(f'Failure while deleting NFO file "{nfo_file.getPath()}"')
+            return False
+        return True
+
+
 #
 # UnitOfWork to be used with sqlite repositories.
 # Can be used to create database scopes/sessions (unit of work pattern).
 #
 class UnitOfWork(object):
     VERBOSE = False
-
-    def __init__(self, db_path: io.FileName):
+    AUTO_VACUUM_INCREMENTAL = 2
+    TRACE = False
+    # Run migrations inside one transaction on the live database file, using a
+    # backup API snapshot for recovery instead of working on a temporary copy.
+    IN_PLACE_MIGRATIONS = False
+    # Pages copied per backup step while taking the snapshot. -1 copies all at once.
+    MIGRATION_BACKUP_PAGES = -1
+    # Write-ahead logging lets the plugin read while the service writes. None keeps the file's mode.
+    JOURNAL_MODE = 'WAL'
+    # Seconds a connection waits for the lock of another connection before failing
+    BUSY_TIMEOUT = 5.0
+    # Extra attempts, with an exponential and jittered delay, when the database stays locked
+    BUSY_RETRIES = 3
+    BUSY_RETRY_DELAY = 0.1
+    # When set, the writes of a session are not executed on the own connection but handed over
+    # as a list of [sql, args] on commit, so the service can be the single writer of the database.
+    WRITE_FORWARDER: typing.Callable[[typing.List[list]], None] = None
+    _KNOWN_WRITES: typing.FrozenSet[str] = None
+    _WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+    def __init__(self, db_path: io.FileName, forward_writes: bool = True):
         self._db_path = db_path
         self._commit = False
+        # sessions of the single writer itself never forward their writes
+        self._forward_writes = forward_writes
+        self._forwarded_writes: typing.List[list] = None
         self.logger = logging.getLogger(__name__)
     
     def check_database(self) -> bool:
@@ -369,10 +999,12 @@ class UnitOfWork(object):
         return db_version
 
     def create_empty_database(self, schema_file_path: io.FileName):
-        self.open_session()
+        # auto_vacuum of the schema only applies when set before the journal mode creates the file
+        self.open_session(journal_mode=False)
         
         sql_statements = schema_file_path.loadFileToStr()
         self.execute_script(sql_statements)
+        self._set_journal_mode()
         self.conn.execute("INSERT INTO akl_version VALUES(?, ?)", [globals.addon_id, globals.addon_version])
 
         self.commit()
@@ -380,7 +1012,7 @@ class UnitOfWork(object):
         
     def reset_database(self, schema_file_path: io.FileName):
         if self._db_path.exists():
-            self._db_path.unlink()
+            self._unlink_database(self._db_path)
         
         # cleanup collection json files
         if globals.g_PATHS.VIEWS_DIR.exists():
@@ -394,9 +1026,17 @@ class UnitOfWork(object):
             
         self.create_empty_database(schema_file_path)
 
-    def migrate_database(self, migration_files: typing.List[io.FileName], new_db_version, skip_scripts_execution=False):
+    def migrate_database(self, migration_files: typing.List[io.FileName], new_db_version,
+                         skip_scripts_execution=False, in_place: bool = None):
+        if in_place is None:
+            in_place = self.IN_PLACE_MIGRATIONS
+        if in_place and not skip_scripts_execution:
+            self.migrate_database_in_place(migration_files, new_db_version)
+            return
+        
         if not skip_scripts_execution:
             # make copy of existing database file to execute migration on.
+            self._checkpoint_database()
             temp_filepath = self._db_path.changeExtension(f".{new_db_version}.db")
             backup_filepath = self._db_path.changeExtension(".db.bak")
             if temp_filepath.exists():
@@ -442,11 +1082,185 @@ class UnitOfWork(object):
 
         # restore file after migrations
         if not skip_scripts_execution:
-            self._db_path.unlink()
+            self._unlink_database(self._db_path)
             temp_filepath.copy(self._db_path)
             if not any_failed:
                 temp_filepath.unlink()
 
+    def migrate_database_in_place(self, migration_files: typing.List[io.FileName], new_db_version) -> bool:
+        """
+        Executes all migration scripts in a single transaction directly on the database file.
+        A snapshot is taken first with the sqlite backup API and is only copied back when
+        the migration fails.
+        """
+        backup_filepath = self._db_path.changeExtension(".db.bak")
+        if backup_filepath.exists():
+            backup_filepath.unlink()
+        
+        check_version = LooseVersion("1.3.99")
+        failed_migration_file = None
+        
+        self.open_session()
+        # manage the transaction ourselves, the sqlite3 module would commit implicitly
+        self.conn.isolation_level = None
+        try:
+            self._snapshot_database(self.conn, backup_filepath)
+            self.conn.execute("BEGIN")
+            for migration_file in migration_files:
+                self.logger.info(f'Executing migration script: {migration_file.getPath()}')
+                failed_migration_file = migration_file
+                for statement in self._split_migration_script(migration_file.loadFileToStr()):
+                    self.execute(statement)
+                
+                if self.get_version_from_migration_file(migration_file) > check_version:
+                    self.execute(qry.AKL_INSERT_MIGRATION, migration_file.getBase(), str(new_db_version),
+                                 datetime.datetime.now(), True)
+            failed_migration_file = None
+            
+            self.logger.info(f'Updating database schema version of app {globals.addon_id} to {new_db_version}')
+            self.execute(qry.AKL_UPDATE_VERSION, str(new_db_version), globals.addon_id)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.logger.exception("Failure with in-place database migration. Restoring snapshot.")
+            kodi.notify_error(kodi.translate(40954))
+            if self.conn.in_transaction:
+                self.conn.execute("ROLLBACK")
+            self._restore_database(self.conn, backup_filepath)
+            
+            if failed_migration_file is not None and \
+                    self.get_version_from_migration_file(failed_migration_file) > check_version:
+                self.execute(qry.AKL_INSERT_MIGRATION, failed_migration_file.getBase(), str(new_db_version),
+                             datetime.datetime.now(), False)
+            return False
+        finally:
+            self.close_session()
+        return True
+    
+    def _snapshot_database(self, conn: sqlite3.Connection, backup_filepath: io.FileName):
+        start = time.perf_counter()
+        snapshot_conn = sqlite3.connect(backup_filepath.getPathTranslated())
+        try:
+            conn.backup(snapshot_conn, pages=self.MIGRATION_BACKUP_PAGES, progress=self._log_backup_progress)
+        finally:
+            snapshot_conn.close()
+        self.logger.info(f'Database snapshot created in {time.perf_counter() - start:.3f}s: {backup_filepath.getPath()}')
+    
+    def _restore_database(self, conn: sqlite3.Connection, backup_filepath: io.FileName):
+        snapshot_conn = sqlite3.connect(backup_filepath.getPathTranslated())
+        try:
+            snapshot_conn.backup(conn, pages=self.MIGRATION_BACKUP_PAGES)
+        finally:
+            snapshot_conn.close()
+        self.logger.info(f'Database restored from snapshot {backup_filepath.getPath()}')
+
+    def _checkpoint_database(self):
+        # Moves the changes still in the write-ahead log into the database file, so a copy is complete
+        self.open_session()
+        try:
+            self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        finally:
+            self.close_session()
+
+    def _unlink_database(self, db_path: io.FileName):
+        db_path.unlink()
+        # a stale write-ahead log would otherwise be applied to the next file with this name
+        for suffix in ['-wal', '-shm']:
+            journal_path = io.FileName(db_path.getPath() + suffix)
+            if journal_path.exists():
+                journal_path.unlink()
+
+    def _log_backup_progress(self, status, remaining, total):
+        self.logger.debug(f'Database snapshot: copied {total - remaining} of {total} pages')
+
+    def _split_migration_script(self, sql_statements: str) -> typing.Iterator[str]:
+        # Splits a script into single statements, leaving out the transaction control
+        # statements from the script itself since the whole migration runs in one transaction.
+        statement = ''
+        for line in sql_statements.splitlines(keepends=True):
+            if not statement and (not line.strip() or line.lstrip().startswith('--')):
+                continue
+            statement += line
+            if not sqlite3.complete_statement(statement):
+                continue
+            keyword = statement.lstrip().split(None, 1)[0].rstrip(';').upper()
+            if keyword not in ('BEGIN', 'COMMIT', 'END'):
+                yield statement
+            statement = ''
+        if statement.strip():
+            yield statement
+
+    def get_storage_statistics(self) -> dict:
+        """
+        Returns the page counts of the database file together with an estimate of the
+        fragmentation, the fraction of b-tree pages that do not follow their predecessor.
+        The fragmentation is None when sqlite is compiled without the dbstat table.
+        """
+        self.open_session()
+        try:
+            statistics = {}
+            for pragma in ['page_size', 'page_count', 'freelist_count', 'auto_vacuum']:
+                self.execute(f'PRAGMA {pragma}')
+                statistics[pragma] = self.single_result()[pragma]
+            statistics['file_size'] = statistics['page_size'] * statistics['page_count']
+            statistics['freelist_ratio'] = statistics['freelist_count'] / statistics['page_count'] \
+                if statistics['page_count'] else 0.0
+            statistics['fragmentation'] = self._get_fragmentation()
+        finally:
+            self.close_session()
+        return statistics
+
+    def get_freelist_ratio(self) -> float:
+        # Only reads the header pragmas, without scanning the pages like get_storage_statistics()
+        self.open_session()
+        try:
+            self.execute('PRAGMA freelist_count')
+            freelist_count = self.single_result()['freelist_count']
+            self.execute('PRAGMA page_count')
+            page_count = self.single_result()['page_count']
+        finally:
+            self.close_session()
+        return freelist_count / page_count if page_count else 0.0
+
+    def _get_fragmentation(self) -> typing.Optional[float]:
+        try:
+            pages_cursor = self.conn.execute("SELECT name, pageno FROM dbstat ORDER BY name, path")
+        except sqlite3.OperationalError:
+            return None
+        
+        pages = 0
+        out_of_order = 0
+        previous_name, previous_page = None, None
+        for page in pages_cursor:
+            if page['name'] == previous_name and page['pageno'] != previous_page + 1:
+                out_of_order += 1
+            previous_name, previous_page = page['name'], page['pageno']
+            pages += 1
+        pages_cursor.close()
+        return out_of_order / pages if pages else 0.0
+
+    def optimize_database(self, full_vacuum=False):
+        """
+        Releases free pages with an incremental vacuum and refreshes the query planner statistics.
+        Databases not yet using incremental auto-vacuum, or when full_vacuum is requested, are
+        rebuilt once with a full VACUUM, which also removes the fragmentation.
+        """
+        self.open_session()
+        # VACUUM cannot run inside a transaction
+        self.conn.isolation_level = None
+        try:
+            self.execute('PRAGMA auto_vacuum')
+            if full_vacuum or self.single_result()['auto_vacuum'] != self.AUTO_VACUUM_INCREMENTAL:
+                self.logger.info('Rebuilding database with incremental auto-vacuum')
+                self.execute(f'PRAGMA auto_vacuum = {self.AUTO_VACUUM_INCREMENTAL}')
+                self.execute('VACUUM')
+            else:
+                # every step of the pragma releases one page, execute() would only do the first step
+                self.execute_script('PRAGMA incremental_vacuum;')
+            self.execute('ANALYZE')
+            self.execute('PRAGMA optimize')
+        finally:
+            self.close_session()
+
     def get_migrations_history(self):
         self.open_session()
         
@@ -479,40 +1293,143 @@ class UnitOfWork(object):
             return LooseVersion(file.getBaseNoExt())
         return LooseVersion(file.getBaseNoExt().split("_")[0])
 
-    def open_session(self, db_path: io.FileName = None):
+    def open_session(self, db_path: io.FileName = None, journal_mode=True):
         if db_path is None:
             db_path = self._db_path
-        self.conn = sqlite3.connect(db_path.getPathTranslated())
+        self.conn = sqlite3.connect(db_path.getPathTranslated(), timeout=self.BUSY_TIMEOUT)
+        if journal_mode:
+            self._set_journal_mode()
         self.conn.row_factory = UnitOfWork.dict_factory
         self.cursor = self.conn.cursor()
+        self._forwarded_writes = [] if self._forward_writes and UnitOfWork.WRITE_FORWARDER is not None else None
+        ServiceMetrics.session_opened()
+
+    def _set_journal_mode(self):
+        if not self.JOURNAL_MODE:
+            return
+        try:
+            self.conn.execute(f'PRAGMA journal_mode={self.JOURNAL_MODE}')
+        except sqlite3.OperationalError as ex:
+            self.logger.warning(f'Could not set journal mode {self.JOURNAL_MODE}: {ex}')
 
     def commit(self):
         self._commit = True
 
     def rollback(self):
         self._commit = False
+        if self._forwarded_writes:
+            self._forwarded_writes = []
         self.conn.rollback()
 
     def close_session(self):
-        if self._commit:
-            self.conn.commit()
-
-        self.cursor.close()
-        self.conn.close()
+        forwarded_writes = self._forwarded_writes
+        self._forwarded_writes = None
+        try:
+            if self._commit and forwarded_writes:
+                self._store_forwarded_writes(forwarded_writes)
+            elif self._commit:
+                self._retry_when_busy(self.conn.commit)
+        finally:
+            self.cursor.close()
+            self.conn.close()
+            ServiceMetrics.session_closed()
+
+    @classmethod
+    def is_known_write(cls, sql: str) -> bool:
+        # Only the write statements from the queries module can be forwarded to and executed by the service
+        if cls._KNOWN_WRITES is None:
+            cls._KNOWN_WRITES = frozenset(
+                value for name, value in vars(qry).items()
+                if name.isupper() and isinstance(value, str) and value.lstrip().upper().startswith(cls._WRITE_STATEMENTS))
+        return sql in cls._KNOWN_WRITES
+
+    def _forward_write(self, sql, args_list: typing.Iterable[tuple]) -> bool:
+        if UnitOfWork.is_known_write(sql):
+            self._forwarded_writes.extend([sql, list(args)] for args in args_list)
+            return True
+        
+        is_read = sql.lstrip().upper().startswith(('SELECT', 'WITH'))
+        if not is_read or self._forwarded_writes:
+            # Reads must see the writes done so far and other writes can't be forwarded, so the
+            # rest of the session runs on the own connection.
+            forwarded_writes = self._forwarded_writes
+            self._forwarded_writes = None
+            for forwarded_sql, forwarded_args in forwarded_writes:
+                self.execute(forwarded_sql, *forwarded_args)
+        return False
+
+    def _store_forwarded_writes(self, forwarded_writes: typing.List[list]):
+        try:
+            UnitOfWork.WRITE_FORWARDER(forwarded_writes)
+        except ConnectionError as ex:
+            self.logger.warning(f'Service not available to store {len(forwarded_writes)} writes, writing locally: {ex}')
+            for sql, args in forwarded_writes:
+                self.execute(sql, *args)
+            self._retry_when_busy(self.conn.commit)
+        except socket.timeout as ex:
+            # The service might still commit the writes, storing them locally as well could apply them twice
+            self.logger.error(f'Service did not answer in time to store {len(forwarded_writes)} writes, not writing locally: {ex}')
+
+    def _retry_when_busy(self, operation: typing.Callable, *args):
+        attempt = 0
+        while True:
+            try:
+                return operation(*args)
+            except sqlite3.OperationalError as ex:
+                message = str(ex)
+                if attempt >= self.BUSY_RETRIES or ('locked' not in message and 'busy' not in message):
+                    raise
+                attempt += 1
+                # jitter so writers that were blocked together don't retry at the same moment again
+                delay = self.BUSY_RETRY_DELAY * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+                self.logger.warning(f'Database busy ({message}), retry {attempt}/{self.BUSY_RETRIES} in {delay:.3f}s')
+                time.sleep(delay)
 
     def execute(self, sql, *args) -> Cursor:
+        if self._forwarded_writes is not None and self._forward_write(sql, [args]):
+            return self.cursor
         if self.VERBOSE:
             self.logger.debug(f'[SQL] {sql}')
             sql_args_str = ','.join(map(str, args))
             self.logger.debug(f'[SQL] ARGS: {sql_args_str}')
+        instrumentation.count_statement()
         try:
-            return self.cursor.execute(sql, args)
+            if not self.TRACE:
+                return self._retry_when_busy(self.cursor.execute, sql, args)
+            start = time.perf_counter()
+            cursor = self._retry_when_busy(self.cursor.execute, sql, args)
+            SqlTracer.trace_execute(sql, args, time.perf_counter() - start, self._explain_query_plan)
+            return cursor
         except Exception as ex:
             self.logger.error(f'Error while executing query: {sql}', exc_info=ex)
             sql_args_str = ','.join(map(str, args))
             self.logger.error(f'Used arguments: {sql_args_str}')
             raise
 
+    def execute_many(self, sql, args_list: typing.List[tuple]) -> Cursor:
+        if self._forwarded_writes is not None and self._forward_write(sql, args_list):
+            return self.cursor
+        if self.VERBOSE:
+            self.logger.debug(f'[SQL] {sql}')
+            self.logger.debug(f'[SQL] {len(args_list)} sets of arguments')
+        instrumentation.count_statement()
+        try:
+            if not self.TRACE or len(args_list) == 0:
+                return self._retry_when_busy(self.cursor.executemany, sql, args_list)
+            start = time.perf_counter()
+            cursor = self._retry_when_busy(self.cursor.executemany, sql, args_list)
+            SqlTracer.trace_execute(sql, args_list[0], time.perf_counter() - start, self._explain_query_plan)
+            return cursor
+        except Exception as ex:
+            self.logger.error(f'Error while executing query: {sql}', exc_info=ex)
+            raise
+
+    def _explain_query_plan(self, sql, args) -> typing.List[str]:
+        plan_cursor = self.conn.execute(f'EXPLAIN QUERY PLAN {sql}', args)
+        plan_lines = [plan_row['detail'] for plan_row in plan_cursor.fetchall()]
+        plan_cursor.close()
+        return plan_lines
+
     def execute_single_session(self, db_path, sql, args):
         self.open_session(db_path)
         self.execute(sql, *args)
@@ -523,10 +1440,21 @@ class UnitOfWork(object):
         self.conn.executescript(sql_statements)
             
     def single_result(self) -> dict:
-        return self.cursor.fetchone()
+        start = time.perf_counter()
+        result = self.cursor.fetchone()
+        row_count = 1 if result is not None else 0
+        instrumentation.count_rows(row_count)
+        if self.TRACE:
+            SqlTracer.trace_fetch(time.perf_counter() - start, row_count)
+        return result
 
     def result_set(self) -> typing.List[dict]:
-        return self.cursor.fetchall()
+        start = time.perf_counter()
+        results = self.cursor.fetchall()
+        instrumentation.count_rows(len(results))
+        if self.TRACE:
+            SqlTracer.trace_fetch(time.perf_counter() - start, len(results))
+        return results
 
     def result_id(self):
         return self.cursor.lastrowid
@@ -547,6 +1475,24 @@ class UnitOfWork(object):
         return d
 
 
+#
+# Category with its sub categories, ROM collections and ROMs, as loaded by
+# CategoryRepository.find_category_tree() and ROMsRepository.find_roms_by_category_tree().
+#
+class CategoryTreeNode(object):
+
+    def __init__(self, category: Category):
+        self.category = category
+        self.sub_categories: typing.List[CategoryTreeNode] = []
+        self.romcollections: typing.List[ROMCollection] = []
+        self.roms: typing.List[ROM] = []
+
+    def walk(self) -> typing.Iterator['CategoryTreeNode']:
+        yield self
+        for sub_category in self.sub_categories:
+            yield from sub_category.walk()
+
+
 #
 # CategoryRepository -> Category from SQLite DB
 #
@@ -632,6 +1578,72 @@ class CategoryRepository(object):
                         
             yield Category(category_data, assets, asset_mappings)
 
+    #
+    # Loads the category, or all categories when no id is given, with all of its descendants
+    # and their ROM collections in a fixed number of queries, regardless of the depth of the tree.
+    #
+    def find_category_tree(self, category_id: str = None) -> CategoryTreeNode:
+        tree_args = (category_id, category_id)
+        self._uow.execute(qry.SELECT_CATEGORY_TREE, *tree_args)
+        result_set = self._uow.result_set()
+
+        self._uow.execute(qry.SELECT_CATEGORY_TREE_ASSETS, *tree_args)
+        assets_by_category: typing.Dict[str, typing.List[Asset]] = {}
+        for asset_data in self._uow.result_set():
+            assets_by_category.setdefault(asset_data['category_id'], []).append(Asset(asset_data))
+
+        self._uow.execute(qry.SELECT_CATEGORY_TREE_ASSET_MAPPINGS, *tree_args)
+        asset_mappings_by_metadata: typing.Dict[str, typing.List[AssetMapping]] = {}
+        for mapping_data in self._uow.result_set():
+            asset_mappings_by_metadata.setdefault(mapping_data['metadata_id'], []).append(AssetMapping(mapping_data))
+
+        self._uow.execute(qry.SELECT_CATEGORY_TREE_ROMCOLLECTIONS, *tree_args)
+        romcollections_result_set = self._uow.result_set()
+
+        self._uow.execute(qry.SELECT_CATEGORY_TREE_ROMCOLLECTION_ASSETS, *tree_args)
+        assets_by_romcollection: typing.Dict[str, typing.List[Asset]] = {}
+        for asset_data in self._uow.result_set():
+            assets_by_romcollection.setdefault(asset_data['romcollection_id'], []).append(Asset(asset_data))
+
+        self._uow.execute(qry.SELECT_CATEGORY_TREE_ROMCOLLECTION_ASSET_MAPPINGS, *tree_args)
+        for mapping_data in self._uow.result_set():
+            asset_mappings_by_metadata.setdefault(mapping_data['metadata_id'], []).append(AssetMapping(mapping_data))
+
+        self._uow.execute(qry.SELECT_CATEGORY_TREE_ROMCOLLECTION_ROM_ASSET_MAPPINGS, *tree_args)
+        rom_asset_mappings_by_romcollection: typing.Dict[str, typing.List[RomAssetMapping]] = {}
+        for mapping_data in self._uow.result_set():
+            rom_asset_mappings_by_romcollection.setdefault(mapping_data['romcollection_id'], []).append(
+                RomAssetMapping(mapping_data))
+
+        nodes: typing.Dict[str, CategoryTreeNode] = {}
+        for category_data in result_set:
+            nodes[category_data['id']] = CategoryTreeNode(Category(
+                category_data,
+                assets_by_category.get(category_data['id'], []),
+                asset_mappings_by_metadata.get(category_data['metadata_id'], [])))
+
+        tree = nodes.get(category_id) if category_id else CategoryTreeNode(Category({'m_name': 'Root'}))
+        if tree is None:
+            return None
+
+        for category_data in result_set:
+            if category_data['id'] == category_id:
+                continue
+            nodes.get(category_data['parent_id'], tree).sub_categories.append(nodes[category_data['id']])
+
+        for romcollection_data in romcollections_result_set:
+            nodes[romcollection_data['parent_id']].romcollections.append(ROMCollection(
+                romcollection_data,
+                assets_by_romcollection.get(romcollection_data['id'], []),
+                asset_mappings=asset_mappings_by_metadata.get(romcollection_data['metadata_id'], []),
+                rom_asset_mappings=rom_asset_mappings_by_romcollection.get(romcollection_data['id'], [])))
+
+        return tree
+
+    def find_all_category_ids(self) -> typing.List[str]:
+        self._uow.execute(qry.SELECT_CATEGORY_IDS)
+        return [category_data['id'] for category_data in self._uow.result_set()]
+
     def find_all_categories(self) -> typing.Iterator[Category]:
         self._uow.execute(qry.SELECT_CATEGORIES)
         result_set = self._uow.result_set()
@@ -824,6 +1836,10 @@ class ROMCollectionRepository(object):
                     
         return ROMCollection(romcollection_data, assets, asset_mappings, rom_asset_mappings, launchers)
     
+    def find_all_romcollection_ids(self) -> typing.List[str]:
+        self._uow.execute(qry.SELECT_ROMCOLLECTION_IDS)
+        return [romcollection_data['id'] for romcollection_data in self._uow.result_set()]
+
     def find_all_romcollections(self) -> typing.Iterator[ROMCollection]:
         self._uow.execute(qry.SELECT_ROMCOLLECTIONS)
         result_set = self._uow.result_set()
@@ -922,9 +1938,7 @@ class ROMCollectionRepository(object):
         result_set = self._uow.result_set()
         
         for result in result_set:
-            option_value = str(result['option_value'])
-            if not option_value:
-                option_value = 'Undefined'
+            option_value = VirtualCollectionFactory.get_collection_value(result['option_value'])
             yield VirtualCollectionFactory.create_by_category(vcategory_id, option_value)
             
     def find_romcollections_by_rom(self, rom_id: str) -> typing.Iterator[ROMCollection]:
@@ -1277,15 +2291,12 @@ class ROMsRepository(object):
                     
         self._uow.execute(qry.SELECT_ROM_ASSET_MAPPINGS_BY_ROOT_CATEGORY)
         asset_mappings_result_set = self._uow.result_set()
-        
-        self._uow.execute(qry.SELECT_ROM_SCANNED_DATA_BY_ROOT_CATEGORY)
-        scanned_data_result_set = self._uow.result_set()
 
         self._uow.execute(qry.SELECT_ROM_TAGS_BY_ROOT_CATEGORY)
         tags_data_set = self._uow.result_set()
 
         return self._process_roms_data(result_set, assets_result_set, asset_paths_result_set, asset_mappings_result_set,
-                                       scanned_data_result_set, tags_data_set)
+                                       tags_data_set)
  
     def find_roms_by_category(self, category: Category) -> typing.Iterator[ROM]:
         category_id = category.get_id() if category else None
@@ -1301,15 +2312,52 @@ class ROMsRepository(object):
         
         self._uow.execute(qry.SELECT_ROM_ASSET_MAPPINGS_BY_CATEGORY, category_id)
         asset_mappings_result_set = self._uow.result_set()
-                    
-        self._uow.execute(qry.SELECT_ROM_SCANNED_DATA_BY_CATEGORY, category_id)
-        scanned_data_result_set = self._uow.result_set()
 
         self._uow.execute(qry.SELECT_ROM_TAGS_BY_CATEGORY, category_id)
         tags_data_set = self._uow.result_set()
      
         return self._process_roms_data(result_set, assets_result_set, asset_paths_result_set, asset_mappings_result_set, 
-                                       scanned_data_result_set, tags_data_set)
+                                       tags_data_set)
+
+    #
+    # Loads the ROMs of the category and of all of its descendants, grouped by category id.
+    #
+    def find_roms_by_category_tree(self, category_id: str = None) -> typing.Dict[str, typing.List[ROM]]:
+        tree_args = (category_id, category_id)
+        self._uow.execute(qry.SELECT_ROMS_BY_CATEGORY_TREE, *tree_args)
+        result_set = self._uow.result_set()
+
+        self._uow.execute(qry.SELECT_ROM_ASSETS_BY_CATEGORY_TREE, *tree_args)
+        assets_by_rom: typing.Dict[str, typing.List[Asset]] = {}
+        for asset_data in self._uow.result_set():
+            assets_by_rom.setdefault(asset_data['rom_id'], []).append(Asset(asset_data))
+
+        self._uow.execute(qry.SELECT_ROM_ASSETPATHS_BY_CATEGORY_TREE, *tree_args)
+        asset_paths_by_rom: typing.Dict[str, typing.List[AssetPath]] = {}
+        for asset_path_data in self._uow.result_set():
+            asset_paths_by_rom.setdefault(asset_path_data['rom_id'], []).append(AssetPath(asset_path_data))
+
+        self._uow.execute(qry.SELECT_ROM_ASSET_MAPPINGS_BY_CATEGORY_TREE, *tree_args)
+        asset_mappings_by_metadata: typing.Dict[str, typing.List[RomAssetMapping]] = {}
+        for mapping_data in self._uow.result_set():
+            asset_mappings_by_metadata.setdefault(mapping_data['metadata_id'], []).append(RomAssetMapping(mapping_data))
+
+        self._uow.execute(qry.SELECT_ROM_TAGS_BY_CATEGORY_TREE, *tree_args)
+        tags_by_rom: typing.Dict[str, dict] = {}
+        for tag in self._uow.result_set():
+            tags_by_rom.setdefault(tag['rom_id'], {})[tag['tag']] = tag['id']
+
+        roms_by_category: typing.Dict[str, typing.List[ROM]] = {}
+        for rom_data in result_set:
+            rom_id = rom_data['id']
+            roms_by_category.setdefault(rom_data.pop('tree_category_id'), []).append(ROM(
+                rom_data,
+                dict(tags_by_rom.get(rom_id, {})),
+                list(assets_by_rom.get(rom_id, [])),
+                list(asset_paths_by_rom.get(rom_id, [])),
+                list(asset_mappings_by_metadata.get(rom_data['metadata_id'], [])),
+                self._pop_scanned_data(rom_data)))
+        return roms_by_category
 
     def find_roms_by_romcollection(self, romcollection: ROMCollection) -> typing.Iterator[ROM]:
         is_virtual = romcollection.get_type() == constants.OBJ_COLLECTION_VIRTUAL
@@ -1333,7 +2381,6 @@ class ROMsRepository(object):
                     
             asset_paths_result_set = []
             asset_mappings_result_set = []
-            scanned_data_result_set = []
             tags_data_set = {}
         else:
             self._uow.execute(qry.SELECT_ROMS_BY_SET, romcollection_id)
@@ -1348,14 +2395,46 @@ class ROMsRepository(object):
             self._uow.execute(qry.SELECT_ROM_ASSET_MAPPINGS_BY_SET, romcollection_id)
             asset_mappings_result_set = self._uow.result_set()
 
-            self._uow.execute(qry.SELECT_ROM_SCANNED_DATA_BY_SET, romcollection_id)
-            scanned_data_result_set = self._uow.result_set()
-
             self._uow.execute(qry.SELECT_ROM_TAGS_BY_SET, romcollection_id)
             tags_data_set = self._uow.result_set()
                         
         return self._process_roms_data(result_set, assets_result_set, asset_paths_result_set, asset_mappings_result_set, 
-                                       scanned_data_result_set, tags_data_set)
+                                       tags_data_set)
+
+    #
+    # Loads all ROMs with their assets using one query for each. Assets are grouped
+    # by ROM up front, so this scales linearly with the size of the library.
+    #
+    def find_all_roms_with_assets(self) -> typing.Iterator[ROM]:
+        self._uow.execute(qry.SELECT_ALL_ROM_ASSETS)
+        assets_by_rom: typing.Dict[str, typing.List[Asset]] = {}
+        for asset_data in self._uow.result_set():
+            assets_by_rom.setdefault(asset_data['rom_id'], []).append(Asset(asset_data))
+
+        self._uow.execute(qry.SELECT_ALL_ROMS)
+        for rom_data in self._uow.result_set():
+            yield ROM(rom_data, {}, assets_by_rom.get(rom_data['id'], []), [], [], self._pop_scanned_data(rom_data))
+
+    #
+    # Loads the ROM with only its assets, which is all that is needed to render its list item.
+    #
+    def find_rom_with_assets(self, rom_id: str) -> typing.Optional[ROM]:
+        self._uow.execute(qry.SELECT_ROM, rom_id)
+        rom_data = self._uow.single_result()
+        if rom_data is None:
+            return None
+
+        self._uow.execute(qry.SELECT_ROM_ASSETS, rom_id)
+        assets = [Asset(asset_data) for asset_data in self._uow.result_set()]
+        return ROM(rom_data, {}, assets, [], [], self._pop_scanned_data(rom_data))
+
+    def count_roms_played_more_than(self, launch_count: int) -> int:
+        self._uow.execute(qry.COUNT_ROMS_PLAYED_MORE_THAN, launch_count)
+        return self._uow.single_result()['amount']
+
+    def find_rom_ids_and_names_by_source(self, source_id: str) -> typing.Dict[str, str]:
+        self._uow.execute(qry.SELECT_ROM_IDS_AND_NAMES_BY_SOURCE, source_id)
+        return {rom_data['id']: rom_data['name'] for rom_data in self._uow.result_set()}
 
     def find_roms_by_source(self, source: Source) -> typing.Iterator[ROM]:
         source_id = source.get_id()
@@ -1372,14 +2451,11 @@ class ROMsRepository(object):
         self._uow.execute(qry.SELECT_ROM_ASSET_MAPPINGS_BY_SOURCE, source_id)
         asset_mappings_result_set = self._uow.result_set()
 
-        self._uow.execute(qry.SELECT_ROM_SCANNED_DATA_BY_SOURCE, source_id)
-        scanned_data_result_set = self._uow.result_set()
-
         self._uow.execute(qry.SELECT_ROM_TAGS_BY_SOURCE, source_id)
         tags_data_set = self._uow.result_set()
                         
         return self._process_roms_data(result_set, assets_result_set, asset_paths_result_set, asset_mappings_result_set, 
-                                       scanned_data_result_set, tags_data_set)
+                                       tags_data_set)
   
     def find_standalone_roms(self) -> typing.Iterator[ROM]:
         
@@ -1395,18 +2471,17 @@ class ROMsRepository(object):
         self._uow.execute(qry.SELECT_STANDALONE_ROM_ASSET_MAPPINGS)
         asset_mappings_result_set = self._uow.result_set()
 
-        self._uow.execute(qry.SELECT_STANDALONE_ROM_SCANNED_DATA)
-        scanned_data_result_set = self._uow.result_set()
-
         self._uow.execute(qry.SELECT_STANDALONE_ROM_TAGS)
         tags_data_set = self._uow.result_set()
                
         return self._process_roms_data(result_set, assets_result_set, asset_paths_result_set, asset_mappings_result_set, 
-                                       scanned_data_result_set, tags_data_set)
+                                       tags_data_set)
         
     def find_rom(self, rom_id: str) -> ROM:
         self._uow.execute(qry.SELECT_ROM, rom_id)
         rom_data = self._uow.single_result()
+        if rom_data is None:
+            return None
 
         self._uow.execute(qry.SELECT_ROM_ASSETS, rom_id)
         assets_result_set = self._uow.result_set()
@@ -1426,10 +2501,8 @@ class ROMsRepository(object):
         for mapping_data in asset_mappings_result_set:
             asset_mappings.append(RomAssetMapping(mapping_data))
 
-        self._uow.execute(qry.SELECT_ROM_SCANNED_DATA, rom_id)
-        scanned_data_result_set = self._uow.result_set()
-        scanned_data = {entry['data_key']: entry['data_value'] for entry in scanned_data_result_set}
-        
+        scanned_data = self._pop_scanned_data(rom_data)
+
         self._uow.execute(qry.SELECT_ROM_LAUNCHERS, rom_id)
         launchers_data = self._uow.result_set()
         launchers = []
@@ -1446,6 +2519,54 @@ class ROMsRepository(object):
                   
         return ROM(rom_data, tags, assets, asset_paths, asset_mappings, scanned_data, launchers)
 
+    #
+    # Launch plans are stored per ROM and removed by database triggers as soon as the ROM, its
+    # collections, its source or any of their launchers change. See ROMLaunchPlan.
+    #
+    def find_launch_plan(self, rom_id: str) -> typing.Optional[ROMLaunchPlan]:
+        self._uow.execute(qry.SELECT_ROM_LAUNCH_PLAN, rom_id)
+        plan_data = self._uow.single_result()
+        if plan_data is None:
+            return None
+
+        launch_plan = ROMLaunchPlan.from_json(plan_data['launch_plan'])
+        launch_plan.apply_launch_stats(plan_data)
+        return launch_plan
+
+    #
+    # Returns the stored launch plan of the ROM or resolves and stores a new one.
+    # The caller needs to commit the unit of work to keep a newly created plan.
+    #
+    def find_or_create_launch_plan(self, rom_id: str) -> typing.Optional[ROMLaunchPlan]:
+        launch_plan = self.find_launch_plan(rom_id)
+        if launch_plan is not None:
+            return launch_plan
+
+        launch_plan = self.create_launch_plan(rom_id)
+        if launch_plan is not None:
+            self.insert_launch_plan(rom_id, launch_plan)
+        return launch_plan
+
+    #
+    # Resolves the launch plan of the ROM without storing it.
+    #
+    def create_launch_plan(self, rom_id: str) -> typing.Optional[ROMLaunchPlan]:
+        rom = self.find_rom(rom_id)
+        if rom is None:
+            return None
+
+        launchers = [*rom.get_launchers()]
+        for query in [qry.SELECT_SOURCE_LAUNCHERS_BY_ROM, qry.SELECT_ROMCOLLECTION_LAUNCHERS_BY_ROM]:
+            self._uow.execute(query, rom_id)
+            for launcher_data in self._uow.result_set():
+                addon = AklAddon(launcher_data.copy())
+                launchers.append(ROMLauncherAddonFactory.create(addon, launcher_data))
+
+        return ROMLaunchPlan.create(rom, launchers)
+
+    def insert_launch_plan(self, rom_id: str, launch_plan: ROMLaunchPlan):
+        self._uow.execute(qry.INSERT_ROM_LAUNCH_PLAN, rom_id, launch_plan.to_json())
+
     def find_all_tags(self) -> dict:
         self._uow.execute(qry.SELECT_TAGS)
         tag_data = self._uow.result_set()
@@ -1481,13 +2602,14 @@ class ROMsRepository(object):
                           rom_obj.get_nointro_status(),
                           rom_obj.get_clone(),
                           rom_obj.get_rom_status(),
-                          rom_obj.get_scanned_by())
+                          rom_obj.get_scanned_by(),
+                          json.dumps(rom_obj.get_scanned_data()))
         
         rom_assets = rom_obj.get_assets()
         for asset in rom_assets:
             self._insert_asset(asset, rom_obj)
             
-        for asset_path in rom_obj.get_asset_paths():
+        for asset_path in rom_obj.get_asset_path_overrides():
             if not asset_path.get_id():
                 self._insert_asset_path(asset_path, rom_obj)
             else:
@@ -1499,9 +2621,37 @@ class ROMsRepository(object):
         tag_data = rom_obj.get_tag_data()
         self._insert_tags(tag_data, metadata_id)
 
-        self._update_scanned_data(rom_obj.get_id(), rom_obj.scanned_data)
         self._update_launchers(rom_obj.get_id(), rom_obj.get_launchers())
 
+    #
+    # Stores only the fields that can be imported from NFO files, batched for all given ROMs.
+    #
+    def update_roms_nfo_data(self, roms: typing.List[ROM]):
+        self.logger.info(f'Updating NFO data of {len(roms)} ROMs')
+        self._uow.execute_many(qry.UPDATE_METADATA_NFO_DATA, [(
+            rom_obj.get_releaseyear(),
+            rom_obj.get_genre(),
+            rom_obj.get_developer(),
+            rom_obj.get_rating(),
+            rom_obj.get_plot(),
+            rom_obj.get_custom_attribute('metadata_id')) for rom_obj in roms])
+
+        self._uow.execute_many(qry.UPDATE_ROM_NFO_DATA, [(
+            rom_obj.get_name(),
+            rom_obj.get_number_of_players(),
+            rom_obj.get_esrb_rating(),
+            rom_obj.get_pegi_rating(),
+            rom_obj.get_id()) for rom_obj in roms])
+
+        for rom_obj in roms:
+            trailer = rom_obj.get_asset(constants.ASSET_TRAILER_ID)
+            if trailer is None:
+                continue
+            if not trailer.get_id():
+                self._insert_asset(trailer, rom_obj)
+            else:
+                self._update_asset(trailer, rom_obj)
+
     def update_rom(self, rom_obj: ROM):
         self.logger.info(f"Updating ROM '{rom_obj.get_rom_identifier()}'")
         
@@ -1530,6 +2680,7 @@ class ROMsRepository(object):
                           rom_obj.get_last_launch_date(),
                           rom_obj.is_favourite(),
                           rom_obj.get_scanned_by(),
+                          json.dumps(rom_obj.get_scanned_data()),
                           rom_obj.get_id())
         
         for asset in rom_obj.get_assets():
@@ -1538,7 +2689,7 @@ class ROMsRepository(object):
             else:
                 self._update_asset(asset, rom_obj)
         
-        for asset_path in rom_obj.get_asset_paths():
+        for asset_path in rom_obj.get_asset_path_overrides():
             if not asset_path.get_id():
                 self._insert_asset_path(asset_path, rom_obj)
             else:
@@ -1553,9 +2704,17 @@ class ROMsRepository(object):
         tag_data = rom_obj.get_tag_data()
         self._update_tags(tag_data, rom_obj.get_custom_attribute('metadata_id'))
 
-        self._update_scanned_data(rom_obj.get_id(), rom_obj.scanned_data)
         self._update_launchers(rom_obj.get_id(), rom_obj.get_launchers())
               
+    #
+    # Atomically registers a launch of the ROM without loading or rewriting the whole ROM.
+    #
+    def register_rom_launch(self, rom_id: str, launch_timestamp: datetime.datetime):
+        self._uow.execute(qry.UPDATE_ROM_LAUNCH_STATS, launch_timestamp, rom_id)
+
+    def set_rom_favourite(self, rom_id: str, is_favourite=True):
+        self._uow.execute(qry.UPDATE_ROM_FAVOURITE, is_favourite, rom_id)
+
     def delete_rom(self, rom_id: str):
         self.logger.info("ROMsRepository.delete_rom(): Deleting ROM '{}'".format(rom_id))
         self._uow.execute(qry.DELETE_ROM, rom_id)
@@ -1574,28 +2733,32 @@ class ROMsRepository(object):
     def delete_tag(self, tag_id: str):
         self._uow.execute(qry.DELETE_TAG, tag_id)
 
+    #
+    # Groups the related rows by ROM up front, so building the ROMs scales linearly
+    # with the size of the result sets.
+    #
     def _process_roms_data(self, result_set, assets_result_set, asset_paths_result_set,
-                           asset_mappings_result_set, scanned_data_result_set, tags_data_set) -> typing.Iterator[ROM]:
-         
+                           asset_mappings_result_set, tags_data_set) -> typing.Iterator[ROM]:
+        assets_by_rom: typing.Dict[str, typing.List[Asset]] = {}
+        for asset_data in assets_result_set:
+            assets_by_rom.setdefault(asset_data['rom_id'], []).append(Asset(asset_data))
+        asset_paths_by_rom: typing.Dict[str, typing.List[AssetPath]] = {}
+        for asset_paths_data in asset_paths_result_set:
+            asset_paths_by_rom.setdefault(asset_paths_data['rom_id'], []).append(AssetPath(asset_paths_data))
+        asset_mappings_by_metadata: typing.Dict[str, typing.List[dict]] = {}
+        for mapping_data in asset_mappings_result_set:
+            asset_mappings_by_metadata.setdefault(mapping_data['metadata_id'], []).append(mapping_data)
+        tags_by_rom: typing.Dict[str, dict] = {}
+        for tag in tags_data_set:
+            tags_by_rom.setdefault(tag['rom_id'], {})[tag['tag']] = tag['id']
+
         for rom_data in result_set:
-            assets = []
-            asset_paths = []
-            asset_mappings = []
-            tags = {}
-            for asset_data in filter(lambda a: a['rom_id'] == rom_data['id'], assets_result_set):
-                assets.append(Asset(asset_data))    
-            for asset_paths_data in filter(lambda a: a['rom_id'] == rom_data['id'], asset_paths_result_set):
-                asset_paths.append(AssetPath(asset_paths_data))
-            for mapping_data in filter(lambda a: a['metadata_id'] == rom_data['metadata_id'], asset_mappings_result_set):
-                asset_mappings.append(RomAssetMapping(mapping_data))    
-            for tag in filter(lambda t: t['rom_id'] == rom_data['id'], tags_data_set):
-                tags[tag['tag']] = tag['id']
-                
-            scanned_data = {
-                entry['data_key']: entry['data_value']
-                for entry in filter(lambda s: s['rom_id'] == rom_data['id'], scanned_data_result_set)
-            }
-            yield ROM(rom_data, tags, assets, asset_paths, asset_mappings, scanned_data) 
+            rom_id = rom_data['id']
+            asset_mappings = [RomAssetMapping(mapping_data)
+                              for mapping_data in asset_mappings_by_metadata.get(rom_data['metadata_id'], [])]
+            scanned_data = self._pop_scanned_data(rom_data)
+            yield ROM(rom_data, dict(tags_by_rom.get(rom_id, {})), list(assets_by_rom.get(rom_id, [])),
+                      list(asset_paths_by_rom.get(rom_id, [])), asset_mappings, scanned_data)
 
     def _insert_asset(self, asset: Asset, rom_obj: ROM):
         asset_db_id = text.misc_generate_random_SID()
@@ -1640,10 +2803,12 @@ class ROMsRepository(object):
             else:
                 self._uow.execute(qry.UPDATE_ROM_LAUNCHER, rom_launcher.is_default(), rom_id, rom_launcher.get_id())
      
-    def _update_scanned_data(self, rom_id: str, scanned_data: dict):
-        self._uow.execute(qry.DELETE_SCANNED_DATA, rom_id)
-        for key, value in scanned_data.items():
-            self._uow.execute(qry.INSERT_ROM_SCANNED_DATA, rom_id, key, value)
+    #
+    # Scanned data is stored as a single JSON object with the ROM itself.
+    #
+    def _pop_scanned_data(self, rom_data: dict) -> dict:
+        scanned_data = rom_data.pop('scanned_data', None)
+        return json.loads(scanned_data) if scanned_data else {}
 
     def _update_tags(self, tag_data: dict, metadata_id: str):
         self._uow.execute(qry.DELETE_EXISTING_ROM_TAGS, metadata_id)
@@ -1934,3 +3099,59 @@ class LaunchersRepository(object):
     def delete_launcher(self, launcher: ROMLauncherAddon):
         self.logger.info(f"LaunchersRepository.delete_launcher(): Deleting source '{launcher.get_id()}'")
         self._uow.execute(qry.DELETE_LAUNCHER, launcher.get_id())
+
+
+#
+# StatisticsRepository keeps aggregated stats of the library (ROM counts, launch totals and asset
+# coverage) per category, collection, source, platform, genre and year in the library_stats tables.
+# Triggers mark the dimensions that changed, so refresh_stats() only aggregates these again.
+# Launch totals are updated in place by a trigger when ROMs are launched.
+#
+class StatisticsRepository(object):
+
+    DIMENSIONS = list(qry.LIBRARY_STATS_DIMENSION_ROMS.keys())
+    ASSETS = 'assets'
+
+    def __init__(self, uow: UnitOfWork):
+        self._uow = uow
+        self.logger = logging.getLogger(__name__)
+
+    def refresh_stats(self) -> typing.List[str]:
+        self._uow.execute(qry.SELECT_LIBRARY_STATS_DIRTY)
+        dirty = set(row['dimension'] for row in self._uow.result_set())
+        if not dirty:
+            return []
+
+        dimensions = self.DIMENSIONS if self.ASSETS in dirty else [d for d in self.DIMENSIONS if d in dirty]
+        for dimension in dimensions:
+            dimension_roms = qry.LIBRARY_STATS_DIMENSION_ROMS[dimension]
+            if dimension in dirty:
+                self._uow.execute(qry.DELETE_LIBRARY_STATS, dimension)
+                self._uow.execute(qry.INSERT_LIBRARY_STATS.format(dimension_roms=dimension_roms), dimension)
+            self._uow.execute(qry.DELETE_LIBRARY_ASSET_STATS, dimension)
+            self._uow.execute(qry.INSERT_LIBRARY_ASSET_STATS.format(dimension_roms=dimension_roms), dimension)
+        self._uow.execute(qry.DELETE_LIBRARY_STATS_DIRTY)
+
+        self.logger.debug(f'StatisticsRepository.refresh_stats(): Aggregated {", ".join(sorted(dirty))}')
+        return dimensions
+
+    def find_totals(self) -> dict:
+        stats = self.find_stats('library')
+        if len(stats) == 0:
+            return {'num_roms': 0, 'num_launched': 0, 'launch_count': 0, 'num_favourites': 0}
+        return stats[0]
+
+    def find_stats(self, dimension: str) -> typing.List[dict]:
+        self._uow.execute(qry.SELECT_LIBRARY_STATS, dimension)
+        return self._uow.result_set()
+
+    def find_asset_stats(self, dimension: str) -> typing.Dict[str, typing.Dict[str, int]]:
+        self._uow.execute(qry.SELECT_LIBRARY_ASSET_STATS, dimension)
+        asset_stats = {}
+        for row in self._uow.result_set():
+            asset_stats.setdefault(row['dimension_key'], {})[row['asset_type']] = row['num_roms']
+        return asset_stats
+
+    def find_romcollection_stats(self) -> typing.List[dict]:
+        self._uow.execute(qry.SELECT_ROMCOLLECTION_STATS)
+        return self._uow.result_set()
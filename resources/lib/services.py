@@ -2,6 +2,8 @@ import threading
 import logging
 import sys
 import json
+import time
+import queue
 
 from datetime import datetime
 from distutils.version import LooseVersion
@@ -9,8 +11,9 @@ from distutils.version import LooseVersion
 import xbmc
 
 from resources.lib import globals
-from resources.lib.repositories import UnitOfWork
+from resources.lib.repositories import UnitOfWork, ViewRepository
 from resources.lib.webservice import WebService
+from resources.lib.instrumentation import CommandMetrics, SqlTracer, ServiceMetrics
 from resources.lib.commands.mediator import AppMediator
 import resources.lib.commands
         
@@ -22,14 +25,36 @@ logger = logging.getLogger(__name__)
 
 class AppService(object):
 
+    # Seconds without any service actions before database maintenance is considered.
+    MAINTENANCE_IDLE_SECONDS = 300
+    # Fraction of free pages in the database file that triggers maintenance before the period ends.
+    MAINTENANCE_MAX_FREELIST_RATIO = 0.1
+    # Seconds to wait for new service actions before checking for idle work like maintenance.
+    IDLE_CHECK_SECONDS = 5.0
+    # Seconds without new service actions before the changed library stats are aggregated again.
+    STATS_REFRESH_DELAY_SECONDS = 1.0
+
     def __init__(self):
 
         threading.Thread.name = 'akl'
 
         globals.g_bootstrap_instances()
 
-        self.queue = []
-        self.monitor = AppMonitor(addon_id=globals.addon_id, action=self.queue.append)
+        self.queue = queue.Queue()
+        self.last_activity = time.time()
+        self.stats_refresh_pending = False
+        self.monitor = AppMonitor(addon_id=globals.addon_id, action=self._queue_service_action)
+        AppMediator.set_async_dispatcher(self._queue_service_action)
+        ServiceMetrics.queue_depth_provider = lambda: self.queue.qsize()
+
+    def _queue_service_action(self, action_data):
+        action_data['queued_at'] = time.perf_counter()
+        self.queue.put(action_data)
+
+    def _wait_for_abort(self):
+        self.monitor.waitForAbort()
+        # wake up the service loop so it can end right away
+        self.queue.put(None)
 
     def _execute_service_actions(self, action_data):
         cmd = action_data['action']
@@ -49,6 +74,7 @@ class AppService(object):
         logger.debug(f'addon.version  "{globals.addon_version}"')
         logger.debug("Starting AKL service")
 
+        _apply_advanced_settings()
         uow = UnitOfWork(globals.g_PATHS.DATABASE_FILE_PATH)
         if not uow.check_database():
             logger.info("No database present. Going to create database file.")
@@ -72,22 +98,38 @@ class AppService(object):
                 
         logger.debug("Processing service events")
         kodi.set_windowprop('akl_server_state', 'STARTED')
+        self._process_service_actions()
+        self.shutdown()
+
+    def _process_service_actions(self):
+        # Blocks on the queue, so queued actions run as soon as they arrive. A separate
+        # thread waits for the abort request and wakes up the loop with an empty action.
+        abort_watcher = threading.Thread(target=self._wait_for_abort, name='akl-abort-watcher', daemon=True)
+        abort_watcher.start()
         while not self.monitor.abortRequested():
-            
             self.monitor.process_events()
-            while len(self.queue) and (not self.monitor.abortRequested()):
-                data = self.queue.pop(0)
-                self._execute_service_actions(data)
-
-            if self.monitor.waitForAbort(0.5):
+            # stats are refreshed once a series of actions is done, not after every single action
+            timeout = self.STATS_REFRESH_DELAY_SECONDS if self.stats_refresh_pending else self.IDLE_CHECK_SECONDS
+            try:
+                data = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                self._refresh_stats_when_pending()
+                self._run_maintenance_when_idle()
+                continue
+            
+            if data is None or self.monitor.abortRequested():
                 # abort requested, end service
                 break
-    
-        self.shutdown()
+            if 'queued_at' in data:
+                ServiceMetrics.record_queue_wait(time.perf_counter() - data['queued_at'])
+            self._execute_service_actions(data)
+            self.last_activity = time.time()
+            self.stats_refresh_pending = True
 
     def shutdown(self):
         logger.debug("Shutting down AKL service")
         kodi.set_windowprop('akl_server_state', 'STOPPING')
+        AppMediator.set_async_dispatcher(None)
         
         self.webservice.stop()
         del self.monitor
@@ -161,6 +203,42 @@ class AppService(object):
             logger.info(f'Skipping automatic scan and view generation. Last scan was {now-then} days ago')
         return too_long_ago
 
+    def _refresh_stats_when_pending(self):
+        if not self.stats_refresh_pending:
+            return
+        self.stats_refresh_pending = False
+        self._execute_service_actions({'action': 'REFRESH_STATS', 'data': None})
+
+    def _run_maintenance_when_idle(self):
+        if self.last_activity is None or time.time() - self.last_activity < self.MAINTENANCE_IDLE_SECONDS:
+            return
+        # check only once per idle period
+        self.last_activity = None
+        if self._database_maintenance_is_due():
+            self._execute_service_actions({'action': 'DATABASE_MAINTENANCE', 'data': None})
+
+    def _database_maintenance_is_due(self):
+        days_period = settings.getSettingAsInt('db_maintenance_days_period')
+        if not days_period:
+            return False
+
+        if globals.g_PATHS.MAINTENANCE_INDICATOR_FILE.exists():
+            modification_timestamp = globals.g_PATHS.MAINTENANCE_INDICATOR_FILE.stat().st_mtime
+            days_ago = datetime.now().toordinal() - datetime.fromtimestamp(modification_timestamp).toordinal()
+            if days_ago >= days_period:
+                logger.info(f'Triggering database maintenance. Last maintenance was {days_ago} days ago')
+                return True
+        else:
+            logger.info('Triggering database maintenance. No maintenance done yet')
+            return True
+
+        uow = UnitOfWork(globals.g_PATHS.DATABASE_FILE_PATH)
+        freelist_ratio = uow.get_freelist_ratio()
+        if freelist_ratio > self.MAINTENANCE_MAX_FREELIST_RATIO:
+            logger.info(f'Triggering database maintenance. {freelist_ratio * 100:.0f}% of the database is free pages')
+            return True
+        return False
+
     def _get_modification_timestamp(self):
         if not globals.g_PATHS.SCAN_INDICATOR_FILE.exists():
             return None
@@ -180,6 +258,9 @@ class AppMonitor(xbmc.Monitor):
     def process_events(self):
         pass
 
+    def onSettingsChanged(self):
+        _apply_advanced_settings()
+
     def onNotification(self, sender, method, data):
         if sender != self.addon_id:
             return
@@ -196,3 +277,15 @@ class AppMonitor(xbmc.Monitor):
             'data': data_obj
         }
         self.action(action_data)
+
+
+def _apply_advanced_settings():
+    CommandMetrics.PROFILING = settings.getSettingAsBool('profile_commands')
+    UnitOfWork.TRACE = settings.getSettingAsBool('trace_sql')
+    UnitOfWork.IN_PLACE_MIGRATIONS = settings.getSettingAsBool('migrate_in_place')
+    UnitOfWork.BUSY_TIMEOUT = settings.getSettingAsInt('db_busy_timeout') or UnitOfWork.BUSY_TIMEOUT
+    slow_query_threshold = settings.getSettingAsInt('sql_slow_query_threshold')
+    if slow_query_threshold:
+        SqlTracer.SLOW_QUERY_THRESHOLD = slow_query_threshold / 1000.0
+    view_compression_threshold = settings.getSettingAsInt('view_compression_threshold')
+    ViewRepository.COMPRESSION_THRESHOLD = view_compression_threshold * 1024 if view_compression_threshold else None
@@ -25,7 +25,10 @@ from __future__ import division
 
 import logging
 import typing
-from urllib.parse import urlencode
+import json
+from collections import OrderedDict
+from urllib.parse import urlencode, quote
+from http.client import HTTPConnection, HTTPException
 
 # AKL modules
 from akl import constants, settings
@@ -39,13 +42,25 @@ from resources.lib.repositories import ViewRepository, UnitOfWork, ROMsRepositor
 
 logger = logging.getLogger(__name__)
 
+# Seconds to wait for the service before reading the view from disk
+VIEW_SERVICE_TIMEOUT = 1.0
+# Seconds to wait for the service to store the writes of a plugin session
+WRITES_SERVICE_TIMEOUT = 30.0
+# Amount of views received from the service that are kept together with their ETag
+SERVICE_VIEWS_MAX = 16
+
+# view route -> (ETag, view content) of the views received from the service
+_service_views: typing.Dict[str, typing.Tuple[str, bytes]] = OrderedDict()
+
 
 #
 # Root view items
 #
 def qry_get_root_items():
-    views_repository = ViewRepository(globals.g_PATHS)
-    container = views_repository.find_root_items()
+    container = _qry_view_from_service('root')
+    if container is None:
+        views_repository = ViewRepository(globals.g_PATHS)
+        container = views_repository.find_root_items()
     
     if container is None:
         container = {
@@ -152,11 +167,81 @@ def qry_get_root_items():
 # View pre-rendered items.
 #
 def qry_get_view_items(view_id: str, obj_type: int):
-    views_repository = ViewRepository(globals.g_PATHS)
-    container = views_repository.find_items(view_id, obj_type)
+    container = _qry_view_from_service(f'{obj_type}/{quote(view_id)}')
+    if container is None:
+        views_repository = ViewRepository(globals.g_PATHS)
+        container = views_repository.find_items(view_id, obj_type)
     return container
 
 
+#
+# Gets the view from the memory of the running service, so that hot views are not read from
+# disk by every plugin invocation. Returns None when the service or view is not available.
+# Views received before are requested with their ETag, so unchanged views are not sent again.
+#
+def _qry_view_from_service(view_route: str) -> typing.Any:
+    conn = HTTPConnection(globals.WEBSERVER_HOST, _service_port(), timeout=VIEW_SERVICE_TIMEOUT)
+    try:
+        known_view = _service_views.get(view_route)
+        headers = {'If-None-Match': known_view[0]} if known_view is not None else {}
+        conn.request('GET', f'/query/view/{view_route}', headers=headers)
+        response = conn.getresponse()
+        if response.status == 304 and known_view is not None:
+            response.read()
+            _service_views.move_to_end(view_route)
+            view_bytes = known_view[1]
+        elif response.status == 200:
+            view_bytes = response.read()
+            _remember_service_view(view_route, response.getheader('ETag'), view_bytes)
+        else:
+            logger.debug(f'View "{view_route}" not served by service (status {response.status})')
+            return None
+        # parsed on every call, callers add their own items to the returned container
+        return json.loads(view_bytes)
+    except (OSError, HTTPException, ValueError) as ex:
+        logger.debug(f'View "{view_route}" not served by service: {ex}')
+        return None
+    finally:
+        conn.close()
+
+
+def _remember_service_view(view_route: str, etag: typing.Optional[str], view_bytes: bytes):
+    if etag is None:
+        _service_views.pop(view_route, None)
+        return
+    _service_views[view_route] = (etag, view_bytes)
+    _service_views.move_to_end(view_route)
+    while len(_service_views) > SERVICE_VIEWS_MAX:
+        _service_views.popitem(last=False)
+
+
+#
+# Lets the running service execute the writes of a database session (UnitOfWork.WRITE_FORWARDER).
+# Raises ConnectionError when the service is not running or did not store the writes, so the
+# writes are done locally instead. A timeout is raised as is, the service might still store them.
+#
+def store_writes_in_service(writes: typing.List[list]):
+    conn = HTTPConnection(globals.WEBSERVER_HOST, _service_port(), timeout=WRITES_SERVICE_TIMEOUT)
+    try:
+        # datetimes are sent as str(), the same text the sqlite3 module would store
+        conn.request('POST', '/store/writes', json.dumps({'writes': writes}, default=str),
+                     {'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        response.read()
+        if not 200 <= response.status < 300:
+            # the service rolled back its session, nothing of the writes is stored
+            raise ConnectionError(f'Service failed to store {len(writes)} writes (status {response.status})')
+    finally:
+        conn.close()
+
+
+def _service_port() -> int:
+    port = settings.getSettingAsInt('webserver_port')
+    if port is None or port == 0:
+        port = globals.WEBSERVER_PORT
+    return port
+
+
 #
 # DB based items
 #
@@ -323,8 +408,10 @@ def qry_get_view_scanned_data(rom_id: str):
 # Source items
 #
 def qry_get_sources():
-    views_repository = ViewRepository(globals.g_PATHS)
-    container = views_repository.find_sources_items()
+    container = _qry_view_from_service('sources')
+    if container is None:
+        views_repository = ViewRepository(globals.g_PATHS)
+        container = views_repository.find_sources_items()
     
     if container is None:
         container = {
@@ -666,6 +753,40 @@ def qry_get_globalreport_items():
             'obj_type': constants.OBJ_NONE
         }
     })
+
+    # --- Command timings ---
+    container['items'].append({
+        'name': kodi.translate(40924),
+        'url': globals.router.url_for_path('execute/command/command_timings_report'),
+        'is_folder': False,
+        'type': 'video',
+        'info': {
+            'title': kodi.translate(40924),
+            'plot': kodi.translate(44034),
+            'overlay': 4
+        },
+        'art': {'icon': listitem_icon, 'fanart': listitem_fanart, 'poster': listitem_poster},
+        'properties': {
+            'obj_type': constants.OBJ_NONE
+        }
+    })
+
+    # --- SQL statements ---
+    container['items'].append({
+        'name': kodi.translate(40925),
+        'url': globals.router.url_for_path('execute/command/sql_trace_report'),
+        'is_folder': False,
+        'type': 'video',
+        'info': {
+            'title': kodi.translate(40925),
+            'plot': kodi.translate(44035),
+            'overlay': 4
+        },
+        'art': {'icon': listitem_icon, 'fanart': listitem_fanart, 'poster': listitem_poster},
+        'properties': {
+            'obj_type': constants.OBJ_NONE
+        }
+    })
     return container
 
 
@@ -738,53 +859,22 @@ def qry_listitem_context_menu_items(list_item_data, container_data) -> typing.Li
     container_type = container_data['obj_type'] if 'obj_type' in container_data else constants.OBJ_NONE
     
     container_is_category: bool = container_type == constants.OBJ_CATEGORY
-    
     is_category: bool = item_type == constants.OBJ_CATEGORY
-    is_source: bool = item_type == constants.OBJ_SOURCE
-    is_launcher: bool = item_type == constants.OBJ_LAUNCHER
-    is_romcollection: bool = item_type == constants.OBJ_ROMCOLLECTION
-    is_virtual_category: bool = item_type == constants.OBJ_CATEGORY_VIRTUAL
-    is_rom: bool = item_type == constants.OBJ_ROM
     
-    commands = []
-    if is_rom:
-        commands.append((kodi.translate(40882), _context_menu_url_for(f'/rom/view/{item_id}')))
-        commands.append((kodi.translate(40883), _context_menu_url_for(f'/rom/edit/{item_id}')))
-        commands.append((kodi.translate(40884), _context_menu_url_for('/execute/command/link_rom', {'rom_id': item_id})))
-        commands.append((kodi.translate(40885), _context_menu_url_for('/execute/command/add_rom_to_favourites', {'rom_id': item_id})))
-        
-    if is_category:
-        commands.append((kodi.translate(40886), _context_menu_url_for(f'/categories/view/{item_id}')))
-        commands.append((kodi.translate(40887), _context_menu_url_for(f'/categories/edit/{item_id}')))
-        commands.append((kodi.translate(40888), _context_menu_url_for(f'/add/{item_id}/in/{container_id}')))
-        
-    if is_romcollection:
-        commands.append((kodi.translate(40891), _context_menu_url_for(f'/romcollection/view/{item_id}')))
-        commands.append((kodi.translate(40892), _context_menu_url_for(f'/romcollection/edit/{item_id}')))
-        commands.append((kodi.translate(40922), _context_menu_url_for('/execute/command/execute_all_rulesets', {
-            'romcollection_id': item_id
-        })))
+    # --- Templates are rendered with the view. Containers without them get them once here ---
+    if 'context_menu' not in container_data:
+        container_data['context_menu'] = view_rendering_commands.render_context_menu_templates(container_id)
+    templates = container_data['context_menu']
     
-    if is_source:
-        if item_id and len(item_id) > 0:
-            commands.append((kodi.translate(40915), _context_menu_url_for(f'/source/edit/{item_id}')))
-        commands.append((kodi.translate(42046), _context_menu_url_for('/execute/command/scan_roms', {
-            'source_id': item_id
-        })))
-        
-    if is_launcher:
-        if item_id and len(item_id) > 0:
-            commands.append((kodi.translate(40918), _context_menu_url_for(f'/launcher/edit/{item_id}')))
-            commands.append((kodi.translate(40919), _context_menu_url_for(f'/launcher/delete/{item_id}')))
-        
+    entries = templates.get(str(item_type), [])
     if not is_category and container_is_category:
-        commands.append((kodi.translate(40888), _context_menu_url_for(f'/add/{container_id}')))
-        
-    if is_virtual_category:
-        commands.append((kodi.translate(40893).format(item_name), _context_menu_url_for('execute/command/render_vcategory_view', {
-            'vcategory_id': item_id})))
-                
-    return commands
+        entries = entries + templates.get(view_rendering_commands.CONTEXT_MENU_IN_CATEGORY, [])
+    
+    return [
+        (label.replace(view_rendering_commands.CONTEXT_MENU_ITEM_NAME, str(item_name)),
+         action.replace(view_rendering_commands.CONTEXT_MENU_ITEM_ID, item_id or ''))
+        for label, action, requires_id in entries if item_id or not requires_id
+    ]
 
 
 def _context_menu_url_for(url: str, params: dict = None) -> str:
@@ -41,10 +41,11 @@ import xbmc
 import xbmcgui
 import xbmcplugin
 
-from akl import constants
+from akl import constants, settings
 from akl.utils import kodi
 
 from resources.lib import viewqueries, globals
+from resources.lib.repositories import UnitOfWork
 from resources.lib.commands.mediator import AppMediator
 from resources.lib.commands import view_rendering_commands
 from resources.lib.globals import router
@@ -65,6 +66,7 @@ def run_plugin(addon_argv):
 
     # --- Bootstrap object instances ---
     globals.g_bootstrap_instances()
+    _apply_database_settings()
 
     argv = None
     if sys.argv[0] == "addon.py":
@@ -82,6 +84,12 @@ def run_plugin(addon_argv):
     logger.debug('Advanced Kodi Launcher run_plugin() exit')
 
 
+def _apply_database_settings():
+    UnitOfWork.BUSY_TIMEOUT = settings.getSettingAsInt('db_busy_timeout') or UnitOfWork.BUSY_TIMEOUT
+    if settings.getSettingAsBool('db_writes_via_service'):
+        UnitOfWork.WRITE_FORWARDER = viewqueries.store_writes_in_service
+
+
 # -------------------------------------------------------------------------------------------------
 # LisItem rendering
 # -------------------------------------------------------------------------------------------------
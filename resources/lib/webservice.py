@@ -21,18 +21,33 @@ import logging
 import json
 import threading
 import socket
+import time
 
-from urllib.parse import parse_qsl
+from urllib.parse import parse_qsl, urlsplit, unquote
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from http.client import HTTPConnection
 
 # AKL modules
 from akl import settings
 from resources.lib import globals, apiqueries
+from resources.lib.repositories import ViewRepository, ViewCache
 from resources.lib.commands import api_commands
+from resources.lib.instrumentation import ServiceMetrics
 
 logger = logging.getLogger(__name__)
 
+# Routes used as labels in the request metrics. Any other path is counted as 'other',
+# so bogus requests can't add labels without bound.
+METRICS_ROUTES = [
+    '/query/metrics', '/query/view',
+    '/query/rom/launcher/settings', '/query/rom',
+    '/query/romcollection/roms', '/query/romcollection',
+    '/query/source/scanner/settings', '/query/source/roms', '/query/source/launchers',
+    '/query/launcher',
+    '/store/launcher', '/store/scanner', '/store/roms/added', '/store/roms/updated', '/store/roms/dead',
+    '/store/rom/updated', '/store/writes'
+]
+
 
 #################################################################################################
 class WebService(threading.Thread):
@@ -138,6 +153,13 @@ class RequestHandler(BaseHTTPRequestHandler):
         except Exception:
             pass
 
+    def send_response(self, code, message=None):
+
+        ''' Keep track of the response status for the metrics.
+        '''
+        self.response_status = code
+        BaseHTTPRequestHandler.send_response(self, code, message)
+
     def do_QUIT(self):
 
         ''' send 200 OK response, and set server.stop to True
@@ -187,6 +209,8 @@ class RequestHandler(BaseHTTPRequestHandler):
 
         '''Send headers and reponse
         '''
+        start = time.perf_counter()
+        self.response_status = 200
         try:
             logger.debug(f'akl.webservice: Processing path "{self.path}"')
             api_path = self.path.lower()
@@ -212,13 +236,28 @@ class RequestHandler(BaseHTTPRequestHandler):
         except Exception as error:
             logger.fatal('akl.webservice exception processing path', exc_info=error)
             self.send_error(500, 'AKL.webservice - Exception occurred: {}'.format(str(error)))
-            
+
+        ServiceMetrics.record_request(self.get_metrics_route(), time.perf_counter() - start, self.response_status)
         logger.debug('akl.webservice/{}/{}'.format(str(id(self)), int(not headers_only)))
         return
 
+    def get_metrics_route(self) -> str:
+        path = urlsplit(self.path).path.lower().rstrip('/')
+        for route in METRICS_ROUTES:
+            if path == route or path.startswith(f'{route}/'):
+                return route
+        return 'other'
+
     def handle_queries(self, api_path):
         response_data = None
         obj = 'Not specified'
+
+        if 'query/metrics' in api_path:
+            self.handle_metrics_query(api_path)
+            return
+        if 'query/view/' in api_path:
+            self.handle_view_query()
+            return
         
         if 'query/rom/' in api_path:
             obj = 'ROM'
@@ -245,6 +284,64 @@ class RequestHandler(BaseHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(response_data.encode(encoding='utf_8'))
 
+    def handle_metrics_query(self, api_path):
+        params = self.get_params()
+        accept_header = self.headers.get('Accept', '') if self.headers else ''
+        as_prometheus = params.get('format') == 'prometheus' or \
+            ('text/plain' in accept_header and 'application/json' not in accept_header)
+
+        if as_prometheus:
+            response_data = ServiceMetrics.get_metrics_as_prometheus()
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        else:
+            response_data = json.dumps(ServiceMetrics.get_metrics())
+            content_type = 'application/json'
+
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        self.end_headers()
+        self.wfile.write(response_data.encode(encoding='utf_8'))
+
+    def handle_view_query(self):
+        
+        ''' Serves the pre-rendered view files from the memory of the service.
+            Path is /query/view/<type>/<id>, or /query/view/root and /query/view/sources.
+            View ids are case sensitive, so the original path is used.
+        '''
+        route = [unquote(part) for part in urlsplit(self.path).path.strip('/').split('/')[2:]]
+        views_repository = ViewRepository(globals.g_PATHS)
+        if route == ['root']:
+            view_file = globals.g_PATHS.ROOT_PATH
+        elif route == ['sources']:
+            view_file = globals.g_PATHS.SOURCES_VIEW_PATH
+        elif len(route) == 2 and route[0].isdigit():
+            view_file = views_repository.get_view_file(route[1], int(route[0]))
+        else:
+            view_file = None
+        
+        cached_view = ViewCache.get(view_file) if view_file is not None else None
+        if cached_view is None:
+            self.send_response(404)
+            self.send_header('Content-type', 'text/html')
+            self.end_headers()
+            self.wfile.write('View not found'.encode(encoding='utf-8'))
+            return
+        
+        etag, view_data = cached_view
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(view_data)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(view_data)
+
     def handle_rom_queries(self, api_path):
         params = self.get_params()
         id = params.get('id')
@@ -306,5 +403,7 @@ class RequestHandler(BaseHTTPRequestHandler):
                 return api_commands.cmd_remove_roms(data)
         if 'store/rom/updated' in api_path:
             return api_commands.cmd_store_scraped_single_rom(data)
+        if 'store/writes' in api_path:
+            return api_commands.cmd_store_writes(data)
         
         return
@@ -0,0 +1,153 @@
+-- --------------------------------------
+-- LAUNCH PLANS: precomputed launchers, launcher settings and DTO per ROM
+-- --------------------------------------
+CREATE TABLE IF NOT EXISTS rom_launch_plans(
+    rom_id TEXT PRIMARY KEY,
+    launch_plan TEXT NOT NULL,
+    FOREIGN KEY (rom_id) REFERENCES roms (id) 
+        ON DELETE CASCADE ON UPDATE NO ACTION
+);
+
+-- --------------------------------------
+-- TRIGGERS: remove launch plans when anything they are based on changes
+-- --------------------------------------
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_rom_launchers_insert AFTER INSERT ON rom_launchers
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id = NEW.rom_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_rom_launchers_update AFTER UPDATE ON rom_launchers
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id = NEW.rom_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_rom_launchers_delete AFTER DELETE ON rom_launchers
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id = OLD.rom_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_source_launchers_insert AFTER INSERT ON source_launchers
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT id FROM roms WHERE scanned_by_id = NEW.source_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_source_launchers_update AFTER UPDATE ON source_launchers
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT id FROM roms WHERE scanned_by_id = NEW.source_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_source_launchers_delete AFTER DELETE ON source_launchers
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT id FROM roms WHERE scanned_by_id = OLD.source_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_romcollection_launchers_insert AFTER INSERT ON romcollection_launchers
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT rom_id FROM roms_in_romcollection WHERE romcollection_id = NEW.romcollection_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_romcollection_launchers_update AFTER UPDATE ON romcollection_launchers
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT rom_id FROM roms_in_romcollection WHERE romcollection_id = NEW.romcollection_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_romcollection_launchers_delete AFTER DELETE ON romcollection_launchers
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT rom_id FROM roms_in_romcollection WHERE romcollection_id = OLD.romcollection_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_roms_in_romcollection_insert AFTER INSERT ON roms_in_romcollection
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id = NEW.rom_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_roms_in_romcollection_delete AFTER DELETE ON roms_in_romcollection
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id = OLD.rom_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_scanned_roms_data_insert AFTER INSERT ON scanned_roms_data
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id = NEW.rom_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_scanned_roms_data_update AFTER UPDATE ON scanned_roms_data
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id = NEW.rom_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_scanned_roms_data_delete AFTER DELETE ON scanned_roms_data
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id = OLD.rom_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_rom_assets_insert AFTER INSERT ON rom_assets
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id = NEW.rom_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_rom_assets_delete AFTER DELETE ON rom_assets
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id = OLD.rom_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_rom_assetpaths_insert AFTER INSERT ON rom_assetpaths
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id = NEW.rom_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_rom_assetpaths_delete AFTER DELETE ON rom_assetpaths
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id = OLD.rom_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_metatags_insert AFTER INSERT ON metatags
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT id FROM roms WHERE metadata_id = NEW.metadata_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_metatags_delete AFTER DELETE ON metatags
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT id FROM roms WHERE metadata_id = OLD.metadata_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_roms_update AFTER UPDATE OF name, num_of_players, num_of_players_online, esrb_rating, pegi_rating, nointro_status, pclone_status, cloneof, platform, box_size, rom_status, metadata_id, scanned_by_id ON roms
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id = NEW.id;
+END;
+
+-- rom_launch_plans.rom_id cascades only when foreign keys are enforced, which they are not
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_roms_delete AFTER DELETE ON roms
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_metadata_update AFTER UPDATE ON metadata
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT id FROM roms WHERE metadata_id = NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_assets_update AFTER UPDATE ON assets
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT rom_id FROM rom_assets WHERE asset_id = NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_assetpaths_update AFTER UPDATE ON assetpaths
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT rom_id FROM rom_assetpaths WHERE assetpaths_id = NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_launchers_update AFTER UPDATE ON launchers
+BEGIN
+    DELETE FROM rom_launch_plans;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_launchers_delete AFTER DELETE ON launchers
+BEGIN
+    DELETE FROM rom_launch_plans;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_akl_addon_update AFTER UPDATE ON akl_addon
+BEGIN
+    DELETE FROM rom_launch_plans;
+END;
@@ -0,0 +1,134 @@
+-- --------------------------------------
+-- LIBRARY STATS: aggregated ROM counts, launch totals and asset coverage
+-- --------------------------------------
+CREATE TABLE IF NOT EXISTS library_stats(
+    dimension TEXT NOT NULL,
+    dimension_key TEXT NOT NULL,
+    num_roms INTEGER DEFAULT 0 NOT NULL,
+    num_launched INTEGER DEFAULT 0 NOT NULL,
+    launch_count INTEGER DEFAULT 0 NOT NULL,
+    num_favourites INTEGER DEFAULT 0 NOT NULL,
+    PRIMARY KEY (dimension, dimension_key)
+);
+
+CREATE TABLE IF NOT EXISTS library_asset_stats(
+    dimension TEXT NOT NULL,
+    dimension_key TEXT NOT NULL,
+    asset_type TEXT NOT NULL,
+    num_roms INTEGER DEFAULT 0 NOT NULL,
+    PRIMARY KEY (dimension, dimension_key, asset_type)
+);
+
+-- Dimensions (or 'assets' for the asset coverage of all dimensions) to aggregate again
+CREATE TABLE IF NOT EXISTS library_stats_dirty(
+    dimension TEXT PRIMARY KEY
+);
+
+INSERT OR IGNORE INTO library_stats_dirty (dimension)
+    VALUES ('library'), ('category'), ('romcollection'), ('source'), ('platform'), ('genre'), ('year');
+
+-- --------------------------------------
+-- TRIGGERS: mark the dimensions of the library stats that changed
+-- --------------------------------------
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_roms_insert AFTER INSERT ON roms
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension)
+        VALUES ('library'), ('category'), ('romcollection'), ('source'), ('platform'), ('genre'), ('year');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_roms_delete AFTER DELETE ON roms
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension)
+        VALUES ('library'), ('category'), ('romcollection'), ('source'), ('platform'), ('genre'), ('year');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_roms_update AFTER UPDATE OF platform, metadata_id, scanned_by_id ON roms
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('source'), ('platform'), ('genre'), ('year');
+END;
+
+-- Launch totals are updated in place, so launching a ROM does not aggregate the stats again
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_roms_launched AFTER UPDATE OF launch_count, is_favourite ON roms
+    WHEN NEW.launch_count <> OLD.launch_count OR NEW.is_favourite <> OLD.is_favourite
+BEGIN
+    UPDATE library_stats SET
+        num_launched = num_launched + (NEW.launch_count > 0) - (OLD.launch_count > 0),
+        launch_count = launch_count + NEW.launch_count - OLD.launch_count,
+        num_favourites = num_favourites + (NEW.is_favourite > 0) - (OLD.is_favourite > 0)
+    WHERE dimension = 'library'
+        OR (dimension = 'category' AND dimension_key IN (
+            SELECT category_id FROM roms_in_category WHERE rom_id = NEW.id
+            UNION
+            SELECT rc.parent_id FROM roms_in_romcollection AS rr
+                INNER JOIN romcollections AS rc ON rc.id = rr.romcollection_id
+            WHERE rr.rom_id = NEW.id))
+        OR (dimension = 'romcollection' AND dimension_key IN (
+            SELECT romcollection_id FROM roms_in_romcollection WHERE rom_id = NEW.id))
+        OR (dimension = 'source' AND dimension_key = NEW.scanned_by_id)
+        OR (dimension = 'platform' AND dimension_key = COALESCE(NULLIF(NEW.platform, ''),
+            (SELECT platform FROM sources WHERE id = NEW.scanned_by_id), ''))
+        OR (dimension = 'genre' AND dimension_key = (SELECT COALESCE(genre, '') FROM metadata WHERE id = NEW.metadata_id))
+        OR (dimension = 'year' AND dimension_key = (SELECT COALESCE(year, '') FROM metadata WHERE id = NEW.metadata_id));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_metadata_update AFTER UPDATE OF genre, year ON metadata
+    WHEN EXISTS (SELECT 1 FROM roms WHERE metadata_id = NEW.id)
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('genre'), ('year');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_roms_in_romcollection_insert AFTER INSERT ON roms_in_romcollection
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('category'), ('romcollection');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_roms_in_romcollection_delete AFTER DELETE ON roms_in_romcollection
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('category'), ('romcollection');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_roms_in_category_insert AFTER INSERT ON roms_in_category
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('category');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_roms_in_category_delete AFTER DELETE ON roms_in_category
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('category');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_romcollections_update AFTER UPDATE OF parent_id ON romcollections
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('category');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_romcollections_delete AFTER DELETE ON romcollections
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('category'), ('romcollection');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_categories_delete AFTER DELETE ON categories
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('category');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_sources_update AFTER UPDATE OF platform ON sources
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('platform');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_rom_assets_insert AFTER INSERT ON rom_assets
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('assets');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_rom_assets_delete AFTER DELETE ON rom_assets
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('assets');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_assets_update AFTER UPDATE OF filepath, asset_type ON assets
+    WHEN EXISTS (SELECT 1 FROM rom_assets WHERE asset_id = NEW.id)
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('assets');
+END;
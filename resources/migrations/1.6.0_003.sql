@@ -0,0 +1,69 @@
+-- --------------------------------------
+-- ROM ASSET PATHS: inherit the asset paths of the source by reference
+-- --------------------------------------
+-- Only per-ROM overrides are kept in rom_assetpaths. Every other asset type
+-- resolves to the asset path of the source that scanned the ROM.
+DROP VIEW IF EXISTS vw_rom_asset_paths;
+CREATE VIEW IF NOT EXISTS vw_rom_asset_paths AS SELECT
+    a.id as id,
+    r.id as rom_id,
+    a.path,
+    a.asset_type,
+    NULL as source_id
+FROM assetpaths AS a
+ INNER JOIN rom_assetpaths AS ra ON a.id = ra.assetpaths_id
+ INNER JOIN roms AS r ON ra.rom_id = r.id
+UNION ALL SELECT
+    a.id as id,
+    r.id as rom_id,
+    a.path,
+    a.asset_type,
+    sa.source_id
+FROM roms AS r
+ INNER JOIN source_assetpaths AS sa ON sa.source_id = r.scanned_by_id
+ INNER JOIN assetpaths AS a ON a.id = sa.assetpaths_id
+WHERE NOT EXISTS (
+    SELECT 1 FROM rom_assetpaths AS ra
+     INNER JOIN assetpaths AS oa ON oa.id = ra.assetpaths_id
+    WHERE ra.rom_id = r.id AND oa.asset_type = a.asset_type);
+
+-- --------------------------------------
+-- DE-DUPLICATE: drop the per-ROM copies of the source asset paths
+-- --------------------------------------
+DELETE FROM rom_launch_plans;
+
+DELETE FROM rom_assetpaths WHERE EXISTS (
+    SELECT 1 FROM roms AS r
+     INNER JOIN source_assetpaths AS sa ON sa.source_id = r.scanned_by_id
+     INNER JOIN assetpaths AS sp ON sp.id = sa.assetpaths_id
+     INNER JOIN assetpaths AS rp ON rp.id = rom_assetpaths.assetpaths_id
+    WHERE r.id = rom_assetpaths.rom_id
+        AND (sp.id = rp.id OR (sp.asset_type = rp.asset_type AND sp.path IS rp.path)));
+
+DELETE FROM assetpaths WHERE
+    id NOT IN (SELECT assetpaths_id FROM rom_assetpaths WHERE assetpaths_id IS NOT NULL)
+    AND id NOT IN (SELECT assetpaths_id FROM source_assetpaths WHERE assetpaths_id IS NOT NULL);
+
+-- --------------------------------------
+-- TRIGGERS: launch plans of ROMs that inherit the asset paths of a source
+-- --------------------------------------
+DROP TRIGGER IF EXISTS trg_launch_plans_assetpaths_update;
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_assetpaths_update AFTER UPDATE ON assetpaths
+    WHEN NEW.path IS NOT OLD.path OR NEW.asset_type IS NOT OLD.asset_type
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT rom_id FROM rom_assetpaths WHERE assetpaths_id = NEW.id);
+    DELETE FROM rom_launch_plans WHERE rom_id IN (
+        SELECT r.id FROM roms AS r
+         INNER JOIN source_assetpaths AS sa ON sa.source_id = r.scanned_by_id
+        WHERE sa.assetpaths_id = NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_source_assetpaths_insert AFTER INSERT ON source_assetpaths
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT id FROM roms WHERE scanned_by_id = NEW.source_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_source_assetpaths_delete AFTER DELETE ON source_assetpaths
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT id FROM roms WHERE scanned_by_id = OLD.source_id);
+END;
@@ -0,0 +1,69 @@
+-- --------------------------------------
+-- SCANNED DATA: one JSON object per ROM instead of a row per key
+-- --------------------------------------
+ALTER TABLE roms ADD COLUMN scanned_data TEXT NULL;
+
+CREATE TEMP TABLE _scanned_roms_data(
+    rom_id TEXT PRIMARY KEY,
+    scanned_data TEXT
+);
+
+INSERT INTO _scanned_roms_data (rom_id, scanned_data)
+    SELECT rom_id, json_group_object(data_key, data_value) FROM scanned_roms_data
+    WHERE rom_id IS NOT NULL
+    GROUP BY rom_id;
+
+UPDATE roms SET scanned_data = (SELECT s.scanned_data FROM _scanned_roms_data AS s WHERE s.rom_id = roms.id);
+
+DROP TABLE temp._scanned_roms_data;
+
+DROP TRIGGER IF EXISTS trg_launch_plans_scanned_roms_data_insert;
+DROP TRIGGER IF EXISTS trg_launch_plans_scanned_roms_data_update;
+DROP TRIGGER IF EXISTS trg_launch_plans_scanned_roms_data_delete;
+DROP TABLE scanned_roms_data;
+
+DROP VIEW IF EXISTS vw_roms;
+CREATE VIEW IF NOT EXISTS vw_roms AS SELECT 
+    r.id AS id, 
+    r.metadata_id,
+    r.name AS m_name,
+    r.num_of_players AS nplayers,
+    r.num_of_players_online AS nplayers_online,
+    r.esrb_rating AS esrb,
+    r.pegi_rating AS pegi,
+    r.nointro_status AS nointro_status,
+    r.pclone_status AS pclone_status,
+    r.cloneof AS cloneof,
+    r.platform AS platform,
+    r.box_size AS box_size,
+    r.scanned_by_id AS scanned_by_id,
+    r.scanned_data,
+    m.year AS m_year, 
+    m.genre AS m_genre,
+    m.developer AS m_developer,
+    m.rating AS m_rating,
+    m.plot AS m_plot,
+    m.extra AS extra,
+    m.finished,
+    r.rom_status,
+    (SELECT COUNT(*) FROM roms_in_romcollection AS rr WHERE rr.rom_id = r.id) AS collections_count,
+    r.is_favourite,
+    r.launch_count,
+    r.last_launch_timestamp,
+    r.created_on,
+    r.updated_on,
+    (
+        SELECT group_concat(t.tag) AS rom_tags
+        FROM tags AS t 
+        INNER JOIN metatags AS mt ON t.id = mt.tag_id
+        WHERE mt.metadata_id = r.metadata_id
+        GROUP BY mt.metadata_id
+    ) AS rom_tags
+FROM roms AS r 
+    INNER JOIN metadata AS m ON r.metadata_id = m.id;
+
+DROP TRIGGER IF EXISTS trg_launch_plans_roms_update;
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_roms_update AFTER UPDATE OF name, num_of_players, num_of_players_online, esrb_rating, pegi_rating, nointro_status, pclone_status, cloneof, platform, box_size, rom_status, metadata_id, scanned_by_id, scanned_data ON roms
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id = NEW.id;
+END;
@@ -0,0 +1,20 @@
+-- --------------------------------------
+-- INDEXES: columns the many-to-many tables are joined on
+-- --------------------------------------
+CREATE INDEX IF NOT EXISTS idx_roms_metadata_id ON roms (metadata_id);
+CREATE INDEX IF NOT EXISTS idx_roms_scanned_by_id ON roms (scanned_by_id);
+CREATE INDEX IF NOT EXISTS idx_metatags_metadata_id ON metatags (metadata_id, tag_id);
+CREATE INDEX IF NOT EXISTS idx_metatags_tag_id ON metatags (tag_id);
+CREATE INDEX IF NOT EXISTS idx_roms_in_romcollection_romcollection_id ON roms_in_romcollection (romcollection_id, rom_id);
+CREATE INDEX IF NOT EXISTS idx_roms_in_romcollection_rom_id ON roms_in_romcollection (rom_id);
+CREATE INDEX IF NOT EXISTS idx_roms_in_category_category_id ON roms_in_category (category_id, rom_id);
+CREATE INDEX IF NOT EXISTS idx_roms_in_category_rom_id ON roms_in_category (rom_id);
+CREATE INDEX IF NOT EXISTS idx_rom_launchers_rom_id ON rom_launchers (rom_id);
+CREATE INDEX IF NOT EXISTS idx_rom_launchers_launcher_id ON rom_launchers (launcher_id);
+CREATE INDEX IF NOT EXISTS idx_metadata_assetmappings_metadata_id ON metadata_assetmappings (metadata_id);
+CREATE INDEX IF NOT EXISTS idx_rom_assets_rom_id ON rom_assets (rom_id, asset_id);
+CREATE INDEX IF NOT EXISTS idx_rom_assets_asset_id ON rom_assets (asset_id);
+CREATE INDEX IF NOT EXISTS idx_rom_assetpaths_rom_id ON rom_assetpaths (rom_id);
+CREATE INDEX IF NOT EXISTS idx_rom_assetpaths_assetpaths_id ON rom_assetpaths (assetpaths_id);
+CREATE INDEX IF NOT EXISTS idx_source_assetpaths_source_id ON source_assetpaths (source_id);
+CREATE INDEX IF NOT EXISTS idx_source_assetpaths_assetpaths_id ON source_assetpaths (assetpaths_id);
@@ -1,3 +1,5 @@
+PRAGMA auto_vacuum = INCREMENTAL;
+
 -------------------------------------------------
 -- MAIN ENTITIES
 -------------------------------------------------
@@ -78,6 +80,7 @@ CREATE TABLE IF NOT EXISTS roms(
     updated_on TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     metadata_id TEXT,
     scanned_by_id TEXT NULL,
+    scanned_data TEXT NULL,
     FOREIGN KEY (metadata_id) REFERENCES metadata (id) 
         ON DELETE CASCADE ON UPDATE NO ACTION,
     FOREIGN KEY (scanned_by_id) REFERENCES sources (id) 
@@ -119,14 +122,36 @@ CREATE TABLE IF NOT EXISTS launchers(
 -------------------------------------------------
 -- SECONDARY ENTITIES
 -------------------------------------------------
-CREATE TABLE IF NOT EXISTS scanned_roms_data(
-    rom_id TEXT,
-    data_key TEXT NOT NULL,
-    data_value TEXT NULL,
+CREATE TABLE IF NOT EXISTS rom_launch_plans(
+    rom_id TEXT PRIMARY KEY,
+    launch_plan TEXT NOT NULL,
     FOREIGN KEY (rom_id) REFERENCES roms (id) 
         ON DELETE CASCADE ON UPDATE NO ACTION
 );
 
+CREATE TABLE IF NOT EXISTS library_stats(
+    dimension TEXT NOT NULL,
+    dimension_key TEXT NOT NULL,
+    num_roms INTEGER DEFAULT 0 NOT NULL,
+    num_launched INTEGER DEFAULT 0 NOT NULL,
+    launch_count INTEGER DEFAULT 0 NOT NULL,
+    num_favourites INTEGER DEFAULT 0 NOT NULL,
+    PRIMARY KEY (dimension, dimension_key)
+);
+
+CREATE TABLE IF NOT EXISTS library_asset_stats(
+    dimension TEXT NOT NULL,
+    dimension_key TEXT NOT NULL,
+    asset_type TEXT NOT NULL,
+    num_roms INTEGER DEFAULT 0 NOT NULL,
+    PRIMARY KEY (dimension, dimension_key, asset_type)
+);
+
+-- Dimensions (or 'assets' for the asset coverage of all dimensions) to aggregate again
+CREATE TABLE IF NOT EXISTS library_stats_dirty(
+    dimension TEXT PRIMARY KEY
+);
+
 CREATE TABLE IF NOT EXISTS collection_source_ruleset(
     ruleset_id TEXT PRIMARY KEY,
     source_id TEXT,
@@ -268,6 +293,28 @@ CREATE TABLE IF NOT EXISTS source_assetpaths(
         ON DELETE CASCADE ON UPDATE NO ACTION
 );
 -------------------------------------------------
+-- INDEXES
+-------------------------------------------------
+-- Entities are keyed by text SIDs, so the columns the many-to-many tables
+-- are joined on are indexed.
+CREATE INDEX IF NOT EXISTS idx_roms_metadata_id ON roms (metadata_id);
+CREATE INDEX IF NOT EXISTS idx_roms_scanned_by_id ON roms (scanned_by_id);
+CREATE INDEX IF NOT EXISTS idx_metatags_metadata_id ON metatags (metadata_id, tag_id);
+CREATE INDEX IF NOT EXISTS idx_metatags_tag_id ON metatags (tag_id);
+CREATE INDEX IF NOT EXISTS idx_roms_in_romcollection_romcollection_id ON roms_in_romcollection (romcollection_id, rom_id);
+CREATE INDEX IF NOT EXISTS idx_roms_in_romcollection_rom_id ON roms_in_romcollection (rom_id);
+CREATE INDEX IF NOT EXISTS idx_roms_in_category_category_id ON roms_in_category (category_id, rom_id);
+CREATE INDEX IF NOT EXISTS idx_roms_in_category_rom_id ON roms_in_category (rom_id);
+CREATE INDEX IF NOT EXISTS idx_rom_launchers_rom_id ON rom_launchers (rom_id);
+CREATE INDEX IF NOT EXISTS idx_rom_launchers_launcher_id ON rom_launchers (launcher_id);
+CREATE INDEX IF NOT EXISTS idx_metadata_assetmappings_metadata_id ON metadata_assetmappings (metadata_id);
+CREATE INDEX IF NOT EXISTS idx_rom_assets_rom_id ON rom_assets (rom_id, asset_id);
+CREATE INDEX IF NOT EXISTS idx_rom_assets_asset_id ON rom_assets (asset_id);
+CREATE INDEX IF NOT EXISTS idx_rom_assetpaths_rom_id ON rom_assetpaths (rom_id);
+CREATE INDEX IF NOT EXISTS idx_rom_assetpaths_assetpaths_id ON rom_assetpaths (assetpaths_id);
+CREATE INDEX IF NOT EXISTS idx_source_assetpaths_source_id ON source_assetpaths (source_id);
+CREATE INDEX IF NOT EXISTS idx_source_assetpaths_assetpaths_id ON source_assetpaths (assetpaths_id);
+-------------------------------------------------
 -- VIEWS
 -------------------------------------------------
 CREATE VIEW IF NOT EXISTS vw_categories AS SELECT 
@@ -341,6 +388,7 @@ CREATE VIEW IF NOT EXISTS vw_roms AS SELECT
     r.platform AS platform,
     r.box_size AS box_size,
     r.scanned_by_id AS scanned_by_id,
+    r.scanned_data,
     m.year AS m_year, 
     m.genre AS m_genre,
     m.developer AS m_developer,
@@ -403,14 +451,29 @@ FROM assetpaths AS a
  INNER JOIN source_assetpaths AS sa ON a.id = sa.assetpaths_id 
  INNER JOIN sources AS s ON sa.source_id = s.id;
 
+-- Per-ROM overrides and the asset paths inherited from the source that scanned the ROM
 CREATE VIEW IF NOT EXISTS vw_rom_asset_paths AS SELECT
     a.id as id,
     r.id as rom_id, 
     a.path,
-    a.asset_type
+    a.asset_type,
+    NULL as source_id
 FROM assetpaths AS a
  INNER JOIN rom_assetpaths AS ra ON a.id = ra.assetpaths_id 
- INNER JOIN roms AS r ON ra.rom_id = r.id;
+ INNER JOIN roms AS r ON ra.rom_id = r.id
+UNION ALL SELECT
+    a.id as id,
+    r.id as rom_id,
+    a.path,
+    a.asset_type,
+    sa.source_id
+FROM roms AS r
+ INNER JOIN source_assetpaths AS sa ON sa.source_id = r.scanned_by_id
+ INNER JOIN assetpaths AS a ON a.id = sa.assetpaths_id
+WHERE NOT EXISTS (
+    SELECT 1 FROM rom_assetpaths AS ra
+     INNER JOIN assetpaths AS oa ON oa.id = ra.assetpaths_id
+    WHERE ra.rom_id = r.id AND oa.asset_type = a.asset_type);
 
 CREATE VIEW IF NOT EXISTS vw_rom_tags AS SELECT
     t.id as id,
@@ -468,6 +531,257 @@ FROM rom_launchers AS rl
     INNER JOIN launchers AS l ON rl.launcher_id = l.id
     INNER JOIN akl_addon AS a ON l.akl_addon_id = a.id;
 
+-------------------------------------------------
+-- TRIGGERS
+-- Launch plans are removed when anything they are based on changes
+-------------------------------------------------
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_rom_launchers_insert AFTER INSERT ON rom_launchers
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id = NEW.rom_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_rom_launchers_update AFTER UPDATE ON rom_launchers
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id = NEW.rom_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_rom_launchers_delete AFTER DELETE ON rom_launchers
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id = OLD.rom_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_source_launchers_insert AFTER INSERT ON source_launchers
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT id FROM roms WHERE scanned_by_id = NEW.source_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_source_launchers_update AFTER UPDATE ON source_launchers
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT id FROM roms WHERE scanned_by_id = NEW.source_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_source_launchers_delete AFTER DELETE ON source_launchers
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT id FROM roms WHERE scanned_by_id = OLD.source_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_romcollection_launchers_insert AFTER INSERT ON romcollection_launchers
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT rom_id FROM roms_in_romcollection WHERE romcollection_id = NEW.romcollection_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_romcollection_launchers_update AFTER UPDATE ON romcollection_launchers
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT rom_id FROM roms_in_romcollection WHERE romcollection_id = NEW.romcollection_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_romcollection_launchers_delete AFTER DELETE ON romcollection_launchers
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT rom_id FROM roms_in_romcollection WHERE romcollection_id = OLD.romcollection_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_roms_in_romcollection_insert AFTER INSERT ON roms_in_romcollection
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id = NEW.rom_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_roms_in_romcollection_delete AFTER DELETE ON roms_in_romcollection
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id = OLD.rom_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_rom_assets_insert AFTER INSERT ON rom_assets
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id = NEW.rom_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_rom_assets_delete AFTER DELETE ON rom_assets
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id = OLD.rom_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_rom_assetpaths_insert AFTER INSERT ON rom_assetpaths
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id = NEW.rom_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_rom_assetpaths_delete AFTER DELETE ON rom_assetpaths
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id = OLD.rom_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_source_assetpaths_insert AFTER INSERT ON source_assetpaths
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT id FROM roms WHERE scanned_by_id = NEW.source_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_source_assetpaths_delete AFTER DELETE ON source_assetpaths
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT id FROM roms WHERE scanned_by_id = OLD.source_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_metatags_insert AFTER INSERT ON metatags
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT id FROM roms WHERE metadata_id = NEW.metadata_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_metatags_delete AFTER DELETE ON metatags
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT id FROM roms WHERE metadata_id = OLD.metadata_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_roms_update AFTER UPDATE OF name, num_of_players, num_of_players_online, esrb_rating, pegi_rating, nointro_status, pclone_status, cloneof, platform, box_size, rom_status, metadata_id, scanned_by_id, scanned_data ON roms
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id = NEW.id;
+END;
+
+-- rom_launch_plans.rom_id cascades only when foreign keys are enforced, which they are not
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_roms_delete AFTER DELETE ON roms
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_metadata_update AFTER UPDATE ON metadata
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT id FROM roms WHERE metadata_id = NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_assets_update AFTER UPDATE ON assets
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT rom_id FROM rom_assets WHERE asset_id = NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_assetpaths_update AFTER UPDATE ON assetpaths
+    WHEN NEW.path IS NOT OLD.path OR NEW.asset_type IS NOT OLD.asset_type
+BEGIN
+    DELETE FROM rom_launch_plans WHERE rom_id IN (SELECT rom_id FROM rom_assetpaths WHERE assetpaths_id = NEW.id);
+    DELETE FROM rom_launch_plans WHERE rom_id IN (
+        SELECT r.id FROM roms AS r
+         INNER JOIN source_assetpaths AS sa ON sa.source_id = r.scanned_by_id
+        WHERE sa.assetpaths_id = NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_launchers_update AFTER UPDATE ON launchers
+BEGIN
+    DELETE FROM rom_launch_plans;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_launchers_delete AFTER DELETE ON launchers
+BEGIN
+    DELETE FROM rom_launch_plans;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_launch_plans_akl_addon_update AFTER UPDATE ON akl_addon
+BEGIN
+    DELETE FROM rom_launch_plans;
+END;
+
+-------------------------------------------------
+-- Library stats are aggregated again for the dimensions that changed
+-------------------------------------------------
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_roms_insert AFTER INSERT ON roms
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension)
+        VALUES ('library'), ('category'), ('romcollection'), ('source'), ('platform'), ('genre'), ('year');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_roms_delete AFTER DELETE ON roms
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension)
+        VALUES ('library'), ('category'), ('romcollection'), ('source'), ('platform'), ('genre'), ('year');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_roms_update AFTER UPDATE OF platform, metadata_id, scanned_by_id ON roms
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('source'), ('platform'), ('genre'), ('year');
+END;
+
+-- Launch totals are updated in place, so launching a ROM does not aggregate the stats again
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_roms_launched AFTER UPDATE OF launch_count, is_favourite ON roms
+    WHEN NEW.launch_count <> OLD.launch_count OR NEW.is_favourite <> OLD.is_favourite
+BEGIN
+    UPDATE library_stats SET
+        num_launched = num_launched + (NEW.launch_count > 0) - (OLD.launch_count > 0),
+        launch_count = launch_count + NEW.launch_count - OLD.launch_count,
+        num_favourites = num_favourites + (NEW.is_favourite > 0) - (OLD.is_favourite > 0)
+    WHERE dimension = 'library'
+        OR (dimension = 'category' AND dimension_key IN (
+            SELECT category_id FROM roms_in_category WHERE rom_id = NEW.id
+            UNION
+            SELECT rc.parent_id FROM roms_in_romcollection AS rr
+                INNER JOIN romcollections AS rc ON rc.id = rr.romcollection_id
+            WHERE rr.rom_id = NEW.id))
+        OR (dimension = 'romcollection' AND dimension_key IN (
+            SELECT romcollection_id FROM roms_in_romcollection WHERE rom_id = NEW.id))
+        OR (dimension = 'source' AND dimension_key = NEW.scanned_by_id)
+        OR (dimension = 'platform' AND dimension_key = COALESCE(NULLIF(NEW.platform, ''),
+            (SELECT platform FROM sources WHERE id = NEW.scanned_by_id), ''))
+        OR (dimension = 'genre' AND dimension_key = (SELECT COALESCE(genre, '') FROM metadata WHERE id = NEW.metadata_id))
+        OR (dimension = 'year' AND dimension_key = (SELECT COALESCE(year, '') FROM metadata WHERE id = NEW.metadata_id));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_metadata_update AFTER UPDATE OF genre, year ON metadata
+    WHEN EXISTS (SELECT 1 FROM roms WHERE metadata_id = NEW.id)
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('genre'), ('year');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_roms_in_romcollection_insert AFTER INSERT ON roms_in_romcollection
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('category'), ('romcollection');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_roms_in_romcollection_delete AFTER DELETE ON roms_in_romcollection
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('category'), ('romcollection');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_roms_in_category_insert AFTER INSERT ON roms_in_category
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('category');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_roms_in_category_delete AFTER DELETE ON roms_in_category
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('category');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_romcollections_update AFTER UPDATE OF parent_id ON romcollections
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('category');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_romcollections_delete AFTER DELETE ON romcollections
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('category'), ('romcollection');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_categories_delete AFTER DELETE ON categories
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('category');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_sources_update AFTER UPDATE OF platform ON sources
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('platform');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_rom_assets_insert AFTER INSERT ON rom_assets
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('assets');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_rom_assets_delete AFTER DELETE ON rom_assets
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('assets');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_library_stats_assets_update AFTER UPDATE OF filepath, asset_type ON assets
+    WHEN EXISTS (SELECT 1 FROM rom_assets WHERE asset_id = NEW.id)
+BEGIN
+    INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('assets');
+END;
+
 CREATE TABLE IF NOT EXISTS akl_version(
     app TEXT, 
     version TEXT
@@ -492,6 +806,9 @@ INSERT INTO tags (id, tag) VALUES
     ('ccd62da94f7a4bf4ba593670329c2690', '720'),
     ('bf62ca2ffb0347559b1a52ec70b0b189', '1080');
 
+INSERT INTO library_stats_dirty (dimension)
+    VALUES ('library'), ('category'), ('romcollection'), ('source'), ('platform'), ('genre'), ('year');
+
 INSERT INTO akl_migrations (migration_file, applied_version, execution_date, applied)
      VALUES
      ('1.2.0.sql','1.4.0',CURRENT_TIMESTAMP,1),
@@ -502,4 +819,9 @@ INSERT INTO akl_migrations (migration_file, applied_version, execution_date, app
      ('1.5.0_002.sql','1.5.0',CURRENT_TIMESTAMP,1),
      ('1.5.0_003.sql','1.5.0',CURRENT_TIMESTAMP,1),
      ('1.5.0_004.sql','1.5.0',CURRENT_TIMESTAMP,1),
-     ('1.5.2.sql','1.5.2',CURRENT_TIMESTAMP,1);
\ No newline at end of file
+     ('1.5.2.sql','1.5.2',CURRENT_TIMESTAMP,1),
+     ('1.6.0_001.sql','1.6.0',CURRENT_TIMESTAMP,1),
+     ('1.6.0_002.sql','1.6.0',CURRENT_TIMESTAMP,1),
+     ('1.6.0_003.sql','1.6.0',CURRENT_TIMESTAMP,1),
+     ('1.6.0_004.sql','1.6.0',CURRENT_TIMESTAMP,1),
+     ('1.6.0_005.sql','1.6.0',CURRENT_TIMESTAMP,1);
\ No newline at end of file
@@ -0,0 +1,136 @@
+import sys
+import unittest
+import os
+import shutil
+import tempfile
+import sqlite3
+
+import logging
+
+from unittest.mock import patch, MagicMock
+
+import tests.fake_routing
+from tests.fakes import FakeFile
+
+module = type(sys)('routing')
+module.Plugin = tests.fake_routing.Plugin
+sys.modules['routing'] = module
+
+from akl.utils import io
+
+from resources.lib import globals
+from resources.lib.repositories import UnitOfWork
+from resources.lib.commands.misc_commands import cmd_database_maintenance
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(format = '%(asctime)s %(module)s %(levelname)s: %(message)s',
+                    datefmt = '%m/%d/%Y %I:%M:%S %p', level = logging.INFO)
+
+class Test_database_maintenance(unittest.TestCase):
+
+    ROOT_DIR = ''
+    TEST_DIR = ''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+        cls.ROOT_DIR = os.path.abspath(os.path.join(cls.TEST_DIR, os.pardir))
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = io.FileName(os.path.join(self.test_dir, 'akl.db'))
+
+        # database created before incremental auto-vacuum was enabled in the schema
+        with open(os.path.join(self.ROOT_DIR, 'resources', 'schema.sql'), 'r') as schema_file:
+            schema = schema_file.read().replace('PRAGMA auto_vacuum = INCREMENTAL;', '')
+        conn = sqlite3.connect(self.db_path.getPathTranslated())
+        conn.executescript(schema)
+        conn.execute("CREATE TABLE scanned_data(id INTEGER PRIMARY KEY, data TEXT)")
+        conn.executemany("INSERT INTO scanned_data (data) VALUES(?)", (('x' * 500,) for _ in range(5000)))
+        conn.commit()
+        conn.execute("DELETE FROM scanned_data WHERE id > 2500")
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    @patch('resources.lib.commands.misc_commands.globals')
+    def test_maintenance_releases_free_pages_and_writes_report(self, globals_mock: MagicMock):
+        # arrange
+        globals_mock.g_PATHS.DATABASE_FILE_PATH = self.db_path
+        globals_mock.g_PATHS.DB_MAINTENANCE_REPORT_FILE_PATH = FakeFile('report_database_maintenance.txt')
+        globals_mock.g_PATHS.MAINTENANCE_INDICATOR_FILE = FakeFile('db_maintenance.txt')
+        uow = UnitOfWork(self.db_path)
+        before = uow.get_storage_statistics()
+
+        # act
+        cmd_database_maintenance(None)
+
+        # assert
+        after = uow.get_storage_statistics()
+        report = globals_mock.g_PATHS.DB_MAINTENANCE_REPORT_FILE_PATH.getFakeContent()
+        logger.info(report)
+
+        self.assertEqual(before['auto_vacuum'], 0)
+        self.assertGreater(before['freelist_count'], 0)
+        self.assertEqual(after['auto_vacuum'], UnitOfWork.AUTO_VACUUM_INCREMENTAL)
+        self.assertEqual(after['freelist_count'], 0)
+        self.assertLess(after['file_size'], before['file_size'])
+        self.assertIn('SELECT_VCOLLECTION_GENRES', report)
+        self.assertIn('last database maintenance', globals_mock.g_PATHS.MAINTENANCE_INDICATOR_FILE.getFakeContent())
+
+    def test_incremental_vacuum_releases_pages_of_deleted_rows(self):
+        # arrange
+        target = UnitOfWork(self.db_path)
+        target.optimize_database()
+
+        conn = sqlite3.connect(self.db_path.getPathTranslated())
+        conn.execute("DELETE FROM scanned_data")
+        conn.commit()
+        conn.close()
+        before = target.get_storage_statistics()
+
+        # act
+        target.optimize_database()
+
+        # assert
+        after = target.get_storage_statistics()
+        self.assertGreater(before['freelist_count'], 0)
+        self.assertEqual(after['freelist_count'], 0)
+        self.assertLess(after['page_count'], before['page_count'])
+
+    def test_freelist_ratio_matches_storage_statistics(self):
+        # arrange
+        conn = sqlite3.connect(self.db_path.getPathTranslated())
+        conn.execute("DELETE FROM scanned_data")
+        conn.commit()
+        conn.close()
+        target = UnitOfWork(self.db_path)
+
+        # act
+        actual = target.get_freelist_ratio()
+
+        # assert
+        self.assertGreater(actual, 0)
+        self.assertEqual(actual, target.get_storage_statistics()['freelist_ratio'])
+
+    def test_new_database_uses_incremental_auto_vacuum(self):
+        # arrange
+        db_path = io.FileName(os.path.join(self.test_dir, 'new.db'))
+        target = UnitOfWork(db_path)
+
+        # act
+        target.create_empty_database(io.FileName(os.path.join(self.ROOT_DIR, 'resources', 'schema.sql')))
+
+        # assert
+        conn = sqlite3.connect(db_path.getPathTranslated())
+        auto_vacuum = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+        journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+        conn.close()
+        self.assertEqual(auto_vacuum, UnitOfWork.AUTO_VACUUM_INCREMENTAL)
+        self.assertEqual(journal_mode, UnitOfWork.JOURNAL_MODE.lower())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from unittest.mock import patch, MagicMock
+
+from akl.utils import io
+
+from resources.lib import globals
+from resources.lib.repositories import UnitOfWork
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+# Benchmarks compare timings, which depend on the machine and its load, on libraries of thousands
+# of ROMs. They are skipped unless enabled with AKL_BENCHMARKS=1.
+benchmark = unittest.skipUnless(os.environ.get('AKL_BENCHMARKS'), 'benchmarks are enabled with AKL_BENCHMARKS=1')
+
+
+def create_database(db_path: io.FileName):
+    UnitOfWork(db_path).create_empty_database(io.FileName(os.path.join(ROOT_DIR, 'resources/schema.sql')))
+
+
+def query_database(db_path: io.FileName, sql: str, *args) -> list:
+    conn = sqlite3.connect(db_path.getPathTranslated())
+    rows = conn.execute(sql, args).fetchall()
+    conn.commit()
+    conn.close()
+    return rows
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """
+    Creates an empty database from the schema in a temporary directory for every test,
+    and patches globals.g_PATHS so the commands and queries under test use it.
+    """
+    ROOT_DIR = ROOT_DIR
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = io.FileName(os.path.join(self.test_dir, 'akl.db'))
+        create_database(self.db_path)
+
+        self.paths = self.create_paths()
+        self.paths.DATABASE_FILE_PATH = self.db_path
+        self.paths_patcher = patch.object(globals, 'g_PATHS', self.paths, create=True)
+        self.paths_patcher.start()
+
+    def tearDown(self):
+        self.paths_patcher.stop()
+        shutil.rmtree(self.test_dir)
+
+    def create_paths(self):
+        return MagicMock()
+
+    def query(self, sql: str, *args) -> list:
+        return query_database(self.db_path, sql, *args)
+
+    def create_source(self, source_id: str = 'src_1', name: str = 'Source'):
+        self.query("INSERT OR IGNORE INTO akl_addon (id, name, addon_id, version, addon_type) "
+                   "VALUES ('addon_1', 'Scanner', 'script.scanner', '1.0', 'SCANNER')")
+        self.query("INSERT INTO sources (id, name, akl_addon_id, settings) VALUES (?, ?, 'addon_1', '{}')", source_id, name)
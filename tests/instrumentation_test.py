@@ -0,0 +1,112 @@
+import sys
+import unittest
+
+import logging
+
+import tests.fake_routing
+
+module = type(sys)('routing')
+module.Plugin = tests.fake_routing.Plugin
+sys.modules['routing'] = module
+
+from unittest.mock import patch, MagicMock
+
+from resources.lib import instrumentation, queries
+from resources.lib.instrumentation import RollingHistogram, CommandMetrics, SqlTracer
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(format = '%(asctime)s %(module)s %(levelname)s: %(message)s',
+                datefmt = '%m/%d/%Y %I:%M:%S %p', level = logging.INFO)
+
+class Test_instrumentation(unittest.TestCase):
+
+    def setUp(self):
+        CommandMetrics.reset()
+        SqlTracer.reset()
+
+    def test_histogram_only_keeps_last_samples(self):
+        # arrange
+        target = RollingHistogram(size=10)
+
+        # act
+        for value in range(100):
+            target.add(value)
+
+        # assert
+        self.assertEqual(target.count(), 100)
+        self.assertEqual(len(target.samples()), 10)
+        self.assertEqual(target.max(), 99)
+        self.assertEqual(target.percentile(0), 90)
+        self.assertEqual(target.percentile(50), 95)
+        self.assertEqual(target.buckets([92, 95]), [3, 3, 4])
+
+    def test_executing_command_records_db_counters(self):
+        # arrange
+        def fake_command(args):
+            instrumentation.count_statement()
+            instrumentation.count_statement()
+            instrumentation.count_rows(25)
+            return args['value']
+
+        # act
+        actual = CommandMetrics.execute('FAKE_COMMAND', fake_command, {'value': 'x'})
+
+        # assert
+        self.assertEqual(actual, 'x')
+        stats = CommandMetrics.get_stats()
+        self.assertEqual(len(stats), 1)
+        self.assertEqual(stats[0].statements.samples(), [2])
+        self.assertEqual(stats[0].rows.samples(), [25])
+        self.assertEqual(stats[0].failures, 0)
+
+    def test_failing_command_is_recorded_and_raised(self):
+        # arrange
+        def fake_command(args):
+            raise ValueError('failure')
+
+        # act
+        with self.assertRaises(ValueError):
+            CommandMetrics.execute('FAKE_COMMAND', fake_command, None)
+
+        # assert
+        stats = CommandMetrics.get_slowest()
+        self.assertEqual(stats[0].failures, 1)
+        self.assertEqual(stats[0].wall_time.count(), 1)
+
+    def test_sql_statements_are_aggregated_by_query_constant(self):
+        # act
+        for _ in range(3):
+            SqlTracer.trace_execute(queries.SELECT_ROM, ['abc'], 0.001)
+            SqlTracer.trace_fetch(0.002, 1)
+        SqlTracer.trace_execute('SELECT   *\n FROM roms', [], 0.001)
+        SqlTracer.trace_fetch(0.001, 10)
+
+        # assert
+        stats = {s.name: s for s in SqlTracer.get_stats()}
+        self.assertEqual(stats['SELECT_ROM'].calls, 3)
+        self.assertEqual(stats['SELECT_ROM'].rows, 3)
+        self.assertAlmostEqual(stats['SELECT_ROM'].total_time(), 0.009)
+        self.assertEqual(stats['SELECT * FROM roms'].rows, 10)
+
+    @patch('resources.lib.instrumentation.globals')
+    def test_slow_statements_are_logged_with_query_plan(self, globals_mock: MagicMock):
+        # arrange
+        explain_mock = MagicMock(return_value=['SCAN roms'])
+        SqlTracer.SLOW_QUERY_THRESHOLD = 0.5
+
+        # act
+        SqlTracer.trace_execute(queries.SELECT_ROM, ['abc'], 0.3, explain_mock)
+        SqlTracer.trace_fetch(0.3, 1)
+        SqlTracer.trace_execute(queries.SELECT_ROM, ['abc'], 0.3, explain_mock)
+        SqlTracer.trace_fetch(0.3, 1)
+
+        # assert
+        explain_mock.assert_called_once_with(queries.SELECT_ROM, ['abc'])
+        log_mock = globals_mock.g_PATHS.SLOW_QUERY_LOG_FILE_PATH.writeAll
+        self.assertEqual(log_mock.call_count, 2)
+        self.assertIn('PLAN: SCAN roms', log_mock.call_args_list[0][0][0])
+        self.assertEqual(SqlTracer.get_stats()[0].slow_calls, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
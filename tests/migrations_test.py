@@ -0,0 +1,164 @@
+import sys
+import unittest
+import os
+import shutil
+import tempfile
+import time
+import sqlite3
+
+import logging
+
+from unittest.mock import patch
+from distutils.version import LooseVersion
+
+import tests.fake_routing
+from tests.fakes import FakeFile
+
+module = type(sys)('routing')
+module.Plugin = tests.fake_routing.Plugin
+sys.modules['routing'] = module
+
+from akl.utils import io
+
+from tests.fixtures import benchmark
+from resources.lib import globals
+from resources.lib.repositories import UnitOfWork
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(format = '%(asctime)s %(module)s %(levelname)s: %(message)s',
+                    datefmt = '%m/%d/%Y %I:%M:%S %p', level = logging.INFO)
+
+MIGRATION_WITH_TRANSACTION = """
+-- --------------------------------------
+-- RENAME THE ROMS TABLE
+-- --------------------------------------
+PRAGMA foreign_keys=off;
+BEGIN TRANSACTION;
+
+ALTER TABLE roms RENAME TO _roms_old;
+CREATE TABLE roms(
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    rating INTEGER NULL
+);
+INSERT INTO roms (id, name) SELECT id, name FROM _roms_old;
+DROP TABLE _roms_old;
+
+CREATE TRIGGER IF NOT EXISTS roms_rating AFTER INSERT ON roms
+BEGIN
+    UPDATE roms SET rating = 0 WHERE id = NEW.id;
+END;
+
+COMMIT;
+PRAGMA foreign_keys=on;
+"""
+
+FAILING_MIGRATION = """
+CREATE INDEX idx_roms_name ON roms(name);
+INSERT INTO unknown_table VALUES (1);
+"""
+
+class Test_migrations(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = io.FileName(os.path.join(self.test_dir, 'akl.db'))
+        UnitOfWork.MIGRATION_BACKUP_PAGES = -1
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def create_database(self, num_of_roms: int):
+        conn = sqlite3.connect(self.db_path.getPathTranslated())
+        conn.executescript("""
+            CREATE TABLE akl_version(app TEXT, version TEXT);
+            CREATE TABLE akl_migrations(migration_file TEXT UNIQUE, applied_version TEXT,
+                                        execution_date TIMESTAMP, applied INTEGER DEFAULT 0);
+            CREATE TABLE roms(id TEXT PRIMARY KEY, name TEXT NOT NULL);
+        """)
+        conn.execute("INSERT INTO akl_version VALUES(?, ?)", [globals.addon_id, '1.4.0'])
+        conn.executemany("INSERT INTO roms VALUES(?, ?)",
+                         ((f'rom_{i}', f'ROM number {i} ' + 'x' * 200) for i in range(num_of_roms)))
+        conn.commit()
+        conn.close()
+
+    def query(self, sql: str) -> list:
+        conn = sqlite3.connect(self.db_path.getPathTranslated())
+        rows = conn.execute(sql).fetchall()
+        conn.close()
+        return rows
+
+    def migration_file(self, name: str, content: str) -> FakeFile:
+        migration_file = FakeFile(os.path.join(self.test_dir, name))
+        migration_file.setFakeContent(content)
+        return migration_file
+
+    @patch('resources.lib.repositories.kodi')
+    def test_in_place_migration_runs_scripts_in_one_transaction(self, kodi_mock):
+        # arrange
+        self.create_database(10)
+        target = UnitOfWork(self.db_path)
+
+        # act
+        actual = target.migrate_database_in_place([
+            self.migration_file('1.5.0_001.sql', MIGRATION_WITH_TRANSACTION)], LooseVersion('1.5.0'))
+
+        # assert
+        self.assertTrue(actual)
+        self.assertEqual(self.query("SELECT version FROM akl_version"), [('1.5.0',)])
+        self.assertEqual(self.query("SELECT COUNT(*) FROM roms WHERE rating IS NULL"), [(10,)])
+        self.assertEqual(self.query("SELECT migration_file, applied FROM akl_migrations"), [('1.5.0_001.sql', 1)])
+        self.assertEqual(self.query("SELECT name FROM sqlite_master WHERE type='trigger'"), [('roms_rating',)])
+        self.assertTrue(self.db_path.changeExtension('.db.bak').exists())
+        kodi_mock.notify_error.assert_not_called()
+
+    @patch('resources.lib.repositories.kodi')
+    def test_failing_in_place_migration_restores_the_database(self, kodi_mock):
+        # arrange
+        self.create_database(10)
+        target = UnitOfWork(self.db_path)
+        UnitOfWork.MIGRATION_BACKUP_PAGES = 1
+
+        # act
+        actual = target.migrate_database_in_place([
+            self.migration_file('1.5.0_001.sql', MIGRATION_WITH_TRANSACTION),
+            self.migration_file('1.5.0_002.sql', FAILING_MIGRATION)], LooseVersion('1.5.0'))
+
+        # assert
+        self.assertFalse(actual)
+        kodi_mock.notify_error.assert_called_once()
+        self.assertEqual(self.query("SELECT version FROM akl_version"), [('1.4.0',)])
+        self.assertEqual(self.query("SELECT sql FROM sqlite_master WHERE name='roms'"),
+                         [('CREATE TABLE roms(id TEXT PRIMARY KEY, name TEXT NOT NULL)',)])
+        self.assertEqual(self.query("SELECT COUNT(*) FROM sqlite_master WHERE type IN ('index', 'trigger') AND sql IS NOT NULL"), [(0,)])
+        self.assertEqual(self.query("SELECT migration_file, applied FROM akl_migrations"), [('1.5.0_002.sql', 0)])
+
+    @benchmark
+    @patch('resources.lib.repositories.kodi')
+    def test_benchmark_upgrade_time_against_database_size(self, kodi_mock):
+        for num_of_roms in [1000, 10000, 50000]:
+            timings = {}
+            for in_place in [False, True]:
+                # arrange
+                self.create_database(num_of_roms)
+                target = UnitOfWork(self.db_path)
+                db_size = os.path.getsize(self.db_path.getPathTranslated())
+
+                # act
+                start = time.perf_counter()
+                target.migrate_database([self.migration_file('1.5.0_001.sql', MIGRATION_WITH_TRANSACTION)],
+                                        LooseVersion('1.5.0'), in_place=in_place)
+                timings[in_place] = time.perf_counter() - start
+
+                # assert
+                self.assertEqual(self.query("SELECT COUNT(*) FROM roms"), [(num_of_roms,)])
+                self.assertEqual(self.query("SELECT version FROM akl_version"), [('1.5.0',)])
+                for file_name in os.listdir(self.test_dir):
+                    os.remove(os.path.join(self.test_dir, file_name))
+
+            logger.info(f'{num_of_roms} roms ({db_size / 1024:.0f} KiB): '
+                        f'copy {timings[False]:.3f}s, in place {timings[True]:.3f}s')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,18 +1,32 @@
 import sys
 import unittest, os
+import typing
 from unittest.mock import patch, MagicMock, Mock
 
 import logging
+import gc
+import time
+import shutil
+import tempfile
+import tracemalloc
+
+from xml.etree import ElementTree as ET
+from xml.dom import minidom
 
 import tests.fake_routing
 import tests.fakes
+from tests.fakes import FakeFile
+
+from akl.utils import io
 
 module = type(sys)('routing')
 module.Plugin = tests.fake_routing.Plugin
 sys.modules['routing'] = module
 
+from tests.fixtures import benchmark
 from resources.lib.commands import misc_commands as target
 from resources.lib import globals
+from resources.lib.repositories import XmlConfigurationRepository, XmlConfigurationWriter
 
 from resources.lib.domain import AklAddon, Category, ROMCollection
 
@@ -82,6 +96,204 @@ class Test_Misc_Commands(unittest.TestCase):
         
         assert actual == expected
 
+
+    @patch('resources.lib.commands.misc_commands.UnitOfWork', autospec=True)
+    @patch('resources.lib.commands.misc_commands.AklAddonRepository', autospec=True)
+    @patch('resources.lib.commands.misc_commands.CategoryRepository', autospec=True)
+    @patch('resources.lib.commands.misc_commands.ROMCollectionRepository', autospec=True)
+    @patch('resources.lib.commands.misc_commands.AppMediator', autospec=True)
+    @patch('resources.lib.commands.misc_commands.kodi')
+    def test_importing_launchers_from_xml_stores_collections_with_their_parent_category(self,
+        kodi_mock: MagicMock,
+        mediator: MagicMock,
+        collections_repo_mock: MagicMock,
+        categories_repo_mock: MagicMock,
+        addons_repo_mock: MagicMock,
+        uow_mock: MagicMock):
+
+        # arrange
+        kodi_mock.browse.return_value = [os.path.join(self.TEST_ASSETS_DIR, 'ms_categories.xml')]
+        categories_repo_mock.return_value.find_all_category_ids.return_value = []
+        collections_repo_mock.return_value.find_all_romcollection_ids.return_value = []
+        addons_repo_mock.return_value.find_all_launcher_addons.return_value = []
+        expected_category_id = 'c20f56e7c2242b03e8133c512303ec63'
+
+        # act
+        target.cmd_execute_import_launchers(None)
+
+        # assert
+        insert_mock = collections_repo_mock.return_value.insert_romcollection
+        self.assertEqual(categories_repo_mock.return_value.insert_category.call_count, 7)
+        self.assertEqual(insert_mock.call_count, 42)
+        actual = [args[0][1] for args in insert_mock.call_args_list if args[0][1] and args[0][1].get_id() == expected_category_id]
+        self.assertEqual(len(actual), 5)
+        categories_repo_mock.return_value.find_category.assert_not_called()
+
+    @patch('resources.lib.commands.misc_commands.UnitOfWork', autospec=True)
+    @patch('resources.lib.commands.misc_commands.AklAddonRepository', autospec=True)
+    @patch('resources.lib.commands.misc_commands.CategoryRepository', autospec=True)
+    @patch('resources.lib.commands.misc_commands.ROMCollectionRepository', autospec=True)
+    @patch('resources.lib.commands.misc_commands.AppMediator', autospec=True)
+    @patch('resources.lib.commands.misc_commands.kodi')
+    def test_importing_launchers_twice_will_not_insert_duplicates(self,
+        kodi_mock: MagicMock,
+        mediator: MagicMock,
+        collections_repo_mock: MagicMock,
+        categories_repo_mock: MagicMock,
+        addons_repo_mock: MagicMock,
+        uow_mock: MagicMock):
+
+        # arrange
+        xml_path = os.path.join(self.TEST_ASSETS_DIR, 'ms_categories.xml')
+        kodi_mock.browse.return_value = [xml_path, xml_path]
+        kodi_mock.dialog_yesno.return_value = False
+        categories_repo_mock.return_value.find_all_category_ids.return_value = ['89aa16032d46cf083e1544d961c58298']
+        collections_repo_mock.return_value.find_all_romcollection_ids.return_value = []
+        addons_repo_mock.return_value.find_all_launcher_addons.return_value = []
+
+        # act
+        target.cmd_execute_import_launchers(None)
+
+        # assert
+        self.assertEqual(categories_repo_mock.return_value.insert_category.call_count, 6)
+        self.assertEqual(collections_repo_mock.return_value.insert_romcollection.call_count, 42)
+        self.assertEqual(kodi_mock.dialog_yesno.call_count, 1 + 7 + 42)
+        categories_repo_mock.return_value.find_category.assert_called_once_with('89aa16032d46cf083e1544d961c58298')
+
+    @patch('resources.lib.commands.misc_commands.UnitOfWork', autospec=True)
+    @patch('resources.lib.commands.misc_commands.AklAddonRepository', autospec=True)
+    @patch('resources.lib.commands.misc_commands.CategoryRepository', autospec=True)
+    @patch('resources.lib.commands.misc_commands.ROMCollectionRepository', autospec=True)
+    @patch('resources.lib.commands.misc_commands.AppMediator', autospec=True)
+    @patch('resources.lib.commands.misc_commands.kodi')
+    def test_importing_collections_before_their_category_stores_them_with_their_parent(self,
+        kodi_mock: MagicMock,
+        mediator: MagicMock,
+        collections_repo_mock: MagicMock,
+        categories_repo_mock: MagicMock,
+        addons_repo_mock: MagicMock,
+        uow_mock: MagicMock):
+
+        # arrange
+        test_dir = tempfile.mkdtemp()
+        launchers_path = os.path.join(test_dir, 'launchers.xml')
+        categories_path = os.path.join(test_dir, 'categories.xml')
+        with open(launchers_path, 'w', encoding='utf-8') as xml_file:
+            xml_file.write('<advanced_emulator_launcher version="1">\n'
+                           '<launcher><id>launcher_1</id><m_name>Launcher 1</m_name><categoryID>category_1</categoryID></launcher>\n'
+                           '<launcher><id>launcher_2</id><m_name>Launcher 2</m_name><categoryID>unknown</categoryID></launcher>\n'
+                           '</advanced_emulator_launcher>\n')
+        with open(categories_path, 'w', encoding='utf-8') as xml_file:
+            xml_file.write('<advanced_emulator_launcher version="1">\n'
+                           '<category><id>category_1</id><m_name>Category 1</m_name></category>\n'
+                           '</advanced_emulator_launcher>\n')
+        kodi_mock.browse.return_value = [launchers_path, categories_path]
+        categories_repo_mock.return_value.find_all_category_ids.return_value = []
+        collections_repo_mock.return_value.find_all_romcollection_ids.return_value = []
+        addons_repo_mock.return_value.find_all_launcher_addons.return_value = []
+
+        # act
+        target.cmd_execute_import_launchers(None)
+        shutil.rmtree(test_dir)
+
+        # assert
+        insert_mock = collections_repo_mock.return_value.insert_romcollection
+        actual = {args[0][0].get_id(): args[0][1].get_id() if args[0][1] else None for args in insert_mock.call_args_list}
+        self.assertEqual(actual, {'launcher_1': 'category_1', 'launcher_2': None})
+        uow_mock.return_value.commit.assert_called_once()
+
+    @patch('resources.lib.commands.misc_commands.UnitOfWork', autospec=True)
+    @patch('resources.lib.commands.misc_commands.AklAddonRepository', autospec=True)
+    @patch('resources.lib.commands.misc_commands.CategoryRepository', autospec=True)
+    @patch('resources.lib.commands.misc_commands.ROMCollectionRepository', autospec=True)
+    @patch('resources.lib.commands.misc_commands.AppMediator', autospec=True)
+    @patch('resources.lib.commands.misc_commands.kodi')
+    def test_importing_invalid_xml_imports_nothing(self,
+        kodi_mock: MagicMock,
+        mediator: MagicMock,
+        collections_repo_mock: MagicMock,
+        categories_repo_mock: MagicMock,
+        addons_repo_mock: MagicMock,
+        uow_mock: MagicMock):
+
+        # arrange
+        test_dir = tempfile.mkdtemp()
+        xml_path = os.path.join(test_dir, 'broken.xml')
+        with open(xml_path, 'w', encoding='utf-8') as xml_file:
+            xml_file.write('<advanced_emulator_launcher version="1">\n'
+                           '<category><id>category_1</id><m_name>Category 1</m_name></category>\n'
+                           '<launcher><id>launcher_1</id><m_name>Launcher \x01</m_name></launcher>\n'
+                           '</advanced_emulator_launcher>\n')
+        kodi_mock.browse.return_value = [xml_path]
+        categories_repo_mock.return_value.find_all_category_ids.return_value = []
+        collections_repo_mock.return_value.find_all_romcollection_ids.return_value = []
+        addons_repo_mock.return_value.find_all_launcher_addons.return_value = []
+
+        # act
+        target.cmd_execute_import_launchers(None)
+        shutil.rmtree(test_dir)
+
+        # assert
+        uow_mock.return_value.rollback.assert_called_once()
+        uow_mock.return_value.commit.assert_not_called()
+        kodi_mock.notify_error.assert_called_once()
+        mediator.async_cmd.assert_not_called()
+
+    def test_reading_xml_from_other_filesystem_uses_local_copy(self):
+        # arrange
+        xml_path = os.path.join(self.TEST_ASSETS_DIR, 'ms_categories.xml')
+        remote_file = MagicMock()
+        remote_file.getPath.return_value = remote_file.getPathTranslated.return_value = 'smb://nas/ms_categories.xml'
+        remote_file.getBase.return_value = 'ms_categories.xml'
+        remote_file.copy.side_effect = lambda to_file: shutil.copy(xml_path, to_file.getPathTranslated())
+        target = XmlConfigurationRepository(remote_file)
+
+        # act
+        actual = [*target.get_items()]
+
+        # assert
+        self.assertEqual(len([item for item in actual if isinstance(item, Category)]), 7)
+        self.assertEqual(len([item for item in actual if isinstance(item, ROMCollection)]), 42)
+        local_copy = remote_file.copy.call_args[0][0].getPathTranslated()
+        self.assertFalse(os.path.exists(local_copy))
+
+    @benchmark
+    @patch('resources.lib.repositories.ROMCollection', new=lambda *args: args)
+    def test_benchmark_streaming_xml_import_memory(self):
+        # arrange
+        amount = 20000
+        test_dir = tempfile.mkdtemp()
+        xml_path = os.path.join(test_dir, 'huge_configuration.xml')
+        with open(xml_path, 'w', encoding='utf-8') as xml_file:
+            xml_file.write('<?xml version="1.0" encoding="utf-8" standalone="yes"?>\n<advanced_emulator_launcher version="1">\n')
+            for i in range(amount):
+                xml_file.write(f'<launcher>\n  <id>launcher_{i}</id>\n  <m_name>Launcher {i}</m_name>\n'
+                               f'  <categoryID>root_category</categoryID>\n  <m_plot>{"Plot " * 50}</m_plot>\n'
+                               f'  <application>/usr/bin/emulator</application>\n  <args>"$rom$"</args>\n</launcher>\n')
+            xml_file.write('</advanced_emulator_launcher>\n')
+        repository = XmlConfigurationRepository(io.FileName(xml_path))
+
+        def _peak_memory(parse_func) -> typing.Tuple[int, float]:
+            gc.collect()
+            tracemalloc.start()
+            start = time.perf_counter()
+            parse_func()
+            duration = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return peak, duration
+
+        # act
+        document_peak, document_duration = _peak_memory(lambda: ET.parse(xml_path))
+        streaming_peak, streaming_duration = _peak_memory(lambda: sum(1 for _ in repository.get_items()))
+        actual = sum(1 for _ in repository.get_items())
+        shutil.rmtree(test_dir)
+
+        # assert
+        logger.info(f'Reading {amount} launchers: whole document {document_peak / 1024:.0f} KiB in {document_duration:.2f}s, '
+                    f'streaming {streaming_peak / 1024:.0f} KiB in {streaming_duration:.2f}s')
+        self.assertEqual(actual, amount)
+        self.assertLess(streaming_peak, document_peak / 10)
         
     # def test_when_finding_categories_it_will_give_the_correct_result(self):
         
@@ -205,3 +417,128 @@ class Test_Misc_Commands(unittest.TestCase):
                 
     #     # assert
     #     print(rom_dir.getFakeContent())
+
+
+class Test_export_to_xml(unittest.TestCase):
+
+    def _export_with_element_tree(self, elements) -> str:
+        # the way the configuration was exported before, building the whole document first
+        root = ET.Element('advanced_emulator_launcher_configuration')
+        for tag, children in elements:
+            element_xml = ET.SubElement(root, tag)
+            for child_tag, child_value in children:
+                ET.SubElement(element_xml, child_tag).text = None if child_value is None else str(child_value)
+        result_xml = ET.tostring(root, 'utf-8')
+        parsed_xml = minidom.parseString(result_xml)
+        return parsed_xml.toprettyxml(indent="  ")
+
+    def _export_with_writer(self, elements) -> str:
+        export_file = FakeFile('AKL_configuration.xml')
+        with XmlConfigurationWriter(export_file) as xml_writer:
+            for tag, children in elements:
+                xml_writer.write_element(tag, children)
+        return export_file.getFakeContent()
+
+    def _create_elements(self, amount: int):
+        for i in range(amount):
+            yield ('launcher', [
+                ('name', f'Nintendo {i} & "Friends" <US>'),
+                ('category', 'Consoles'),
+                ('year', None),
+                ('genre', ''),
+                ('rating', i % 10),
+                ('plot', 'A plot\nover multiple lines with ünicode ✓'),
+                ('ROM_path', f'/roms/nintendo_{i}/'),
+                ('s_icon', f'/assets/nintendo_{i}/icon.png'),
+                ('path_title', f'/assets/nintendo_{i}/titles/')
+            ])
+
+    def test_streaming_export_is_equal_to_element_tree_export(self):
+        # arrange
+        elements = [
+            ('category', [('name', 'Consoles'), ('year', '1990'), ('plot', None)]),
+            *self._create_elements(20),
+            ('launcher', [])
+        ]
+        expected = self._export_with_element_tree(elements)
+
+        # act
+        actual = self._export_with_writer(elements)
+
+        # assert
+        self.assertEqual(actual, expected)
+
+    def test_streaming_export_without_elements_is_equal_to_element_tree_export(self):
+        self.assertEqual(self._export_with_writer([]), self._export_with_element_tree([]))
+
+    @patch('resources.lib.commands.misc_commands.SourcesRepository', autospec=True)
+    @patch('resources.lib.commands.misc_commands.ROMCollectionRepository', autospec=True)
+    @patch('resources.lib.commands.misc_commands.CategoryRepository', autospec=True)
+    @patch('resources.lib.commands.misc_commands.UnitOfWork', autospec=True)
+    @patch('resources.lib.commands.misc_commands.globals')
+    @patch('resources.lib.commands.misc_commands.io.FileName')
+    @patch('resources.lib.commands.misc_commands.kodi')
+    def test_exporting_collections_writes_name_of_parent_category(self, kodi_mock: MagicMock, filename_mock: MagicMock, globals_mock,
+                                                                  uow_mock, categories_repo_mock, collections_repo_mock, sources_repo_mock):
+        # arrange
+        export_file = FakeFile('/export/AKL_configuration.xml')
+        filename_mock.return_value.pjoin.return_value = export_file
+        kodi_mock.dialog_get_directory.return_value = '/export/'
+        kodi_mock.dialog_yesno.return_value = True
+
+        categories_repo_mock.return_value.find_all_categories.return_value = [
+            Category({'id': 'c2', 'm_name': 'Handhelds'}),
+            Category({'id': 'c1', 'm_name': 'Consoles', 'm_rating': '8'})
+        ]
+        collections_repo_mock.return_value.find_all_romcollections.return_value = [
+            ROMCollection({'id': 'r1', 'm_name': 'SNES', 'parent_id': 'c1', 'platform': 'Nintendo SNES'}),
+            ROMCollection({'id': 'r2', 'm_name': 'Game Boy', 'parent_id': 'c2'})
+        ]
+        source = MagicMock()
+        source.get_settings.return_value = {'rompath': '/roms/snes/', 'romext': 'zip|sfc'}
+        sources_repo_mock.return_value.find_all.return_value = [source]
+        sources_repo_mock.return_value.find_romcollection_ids_by_source.return_value = ['r1']
+
+        # act
+        target.cmd_export_to_xml(None)
+
+        # assert
+        actual = minidom.parseString(export_file.getFakeContent())
+        categories = [e.getElementsByTagName('name')[0].firstChild.data for e in actual.getElementsByTagName('category')
+                      if e.parentNode == actual.documentElement]
+        launchers = {e.getElementsByTagName('name')[0].firstChild.data: e.getElementsByTagName('category')[0].firstChild.data
+                     for e in actual.getElementsByTagName('launcher')}
+        self.assertEqual(categories, ['Consoles', 'Handhelds'])
+        self.assertEqual(launchers, {'Game Boy': 'Handhelds', 'SNES': 'Consoles'})
+        self.assertIn('<rating>8</rating>', export_file.getFakeContent())
+        self.assertIn('<ROM_path>/roms/snes/</ROM_path>', export_file.getFakeContent())
+        kodi_mock.notify.assert_called_once()
+
+    @benchmark
+    def test_benchmark_export_memory(self):
+        # arrange
+        elements = [*self._create_elements(5000)]
+        
+        def _export_with_writer_to_nowhere():
+            export_file = FakeFile('AKL_configuration.xml')
+            export_file.write = lambda data: None
+            with XmlConfigurationWriter(export_file) as xml_writer:
+                for tag, children in elements:
+                    xml_writer.write_element(tag, children)
+
+        def _peak_memory(export_func) -> int:
+            gc.collect()
+            tracemalloc.start()
+            export_func()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return peak
+
+        # act
+        element_tree_peak = _peak_memory(lambda: self._export_with_element_tree(elements))
+        writer_peak = _peak_memory(_export_with_writer_to_nowhere)
+
+        # assert
+        logger.info(f'Peak memory exporting {len(elements)} launchers: '
+                    f'element tree {element_tree_peak / 1024:.0f} KiB, streaming {writer_peak / 1024:.0f} KiB')
+        self.assertLess(writer_peak, element_tree_peak / 10)
@@ -0,0 +1,988 @@
+import sys
+import unittest
+import os
+import io as pyio
+import re
+import gc
+import json
+import time
+import datetime
+import shutil
+import sqlite3
+import tempfile
+import threading
+import typing
+import tracemalloc
+
+import logging
+
+from unittest.mock import patch, MagicMock
+
+import tests.fake_routing
+
+module = type(sys)('routing')
+module.Plugin = tests.fake_routing.Plugin
+sys.modules['routing'] = module
+
+from akl import constants
+from akl.utils import io, text
+
+from tests.fakes import FakeFile
+from tests.fixtures import DatabaseTestCase, benchmark, create_database, query_database
+from resources.lib import queries as qry
+from resources.lib.domain import ROM, VirtualCollectionFactory, parse_nfo_str, g_assetFactory
+from resources.lib.repositories import JsonStreamReader, ROMsJsonFileRepository, ROMsNFOFileRepository, ViewRepository, ViewCache
+from resources.lib.repositories import UnitOfWork, ROMsRepository, ROMCollectionRepository, SourcesRepository
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(format = '%(asctime)s %(module)s %(levelname)s: %(message)s',
+                    datefmt = '%m/%d/%Y %I:%M:%S %p', level = logging.INFO)
+
+class Test_ROMsJsonFileRepository(unittest.TestCase):
+
+    ROOT_DIR = ''
+    TEST_DIR = ''
+    TEST_ASSETS_DIR = ''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+        cls.ROOT_DIR = os.path.abspath(os.path.join(cls.TEST_DIR, os.pardir))
+        cls.TEST_ASSETS_DIR = os.path.abspath(os.path.join(cls.TEST_DIR,'assets/'))
+
+    def setUp(self):
+        JsonStreamReader.CHUNK_SIZE = 64 * 1024
+
+    def test_reading_values_across_chunk_boundaries(self):
+        # arrange
+        JsonStreamReader.CHUNK_SIZE = 7
+        expected = [{'a': 'x' * 20, 'b': [1, 2, {'c': None}]}, 12345678, 'text with \\"quotes\\" and ]', True, -1.5e3]
+        target = JsonStreamReader(pyio.StringIO(' [ ' + ' , '.join(json.dumps(v) for v in expected) + ' ] '))
+
+        # act
+        target.enter_container()
+        actual = []
+        while target.next_value():
+            actual.append(target.read_value())
+
+        # assert
+        self.assertEqual(actual, expected)
+
+    def test_reading_invalid_json_raises_value_error(self):
+        # arrange
+        target = JsonStreamReader(pyio.StringIO('{"a": {"b": 1}, "c": '))
+
+        # act
+        target.enter_container()
+        target.next_value()
+        target.read_value()
+
+        # assert
+        with self.assertRaises(ValueError):
+            target.next_value()
+            target.read_value()
+
+    def test_loading_roms_from_dictionary_file(self):
+        # arrange
+        JsonStreamReader.CHUNK_SIZE = 100
+        file_path = io.FileName(os.path.join(self.TEST_ASSETS_DIR, 'roms_Sega_32X_518519.json'))
+        with open(file_path.getPathTranslated(), 'r', encoding='utf-8') as json_file:
+            expected = [*json.load(json_file).keys()]
+        target = ROMsJsonFileRepository(file_path)
+
+        # act
+        actual = [rom.get_id() for rom in target.iterate_ROMs()]
+
+        # assert
+        self.assertEqual(actual, expected)
+
+    def test_loading_roms_from_file_with_control_header(self):
+        # arrange
+        file_path = io.FileName(os.path.join(self.TEST_ASSETS_DIR, 'favourites.json'))
+        target = ROMsJsonFileRepository(file_path)
+
+        # act
+        actual = target.load_ROMs()
+
+        # assert
+        self.assertEqual(len(actual), 6)
+        self.assertEqual(actual[0].get_id(), '5ee79397563425dd3ab23cf81d31ce8e')
+
+    def test_loading_roms_from_other_filesystem_uses_local_copy(self):
+        # arrange
+        json_path = os.path.join(self.TEST_ASSETS_DIR, 'favourites.json')
+        remote_file = MagicMock()
+        remote_file.getPath.return_value = remote_file.getPathTranslated.return_value = 'nfs://nas/favourites.json'
+        remote_file.getBase.return_value = 'favourites.json'
+        remote_file.copy.side_effect = lambda to_file: shutil.copy(json_path, to_file.getPathTranslated())
+        target = ROMsJsonFileRepository(remote_file)
+
+        # act
+        actual = [*target.iterate_ROMs()]
+
+        # assert
+        self.assertEqual(len(actual), 6)
+        self.assertFalse(os.path.exists(remote_file.copy.call_args[0][0].getPathTranslated()))
+
+    def test_loading_roms_from_empty_file_returns_none(self):
+        # arrange
+        test_dir = tempfile.mkdtemp()
+        file_path = io.FileName(os.path.join(test_dir, 'empty.json'))
+        open(file_path.getPathTranslated(), 'w').close()
+        target = ROMsJsonFileRepository(file_path)
+
+        # act
+        actual = target.load_ROMs()
+        shutil.rmtree(test_dir)
+
+        # assert
+        self.assertIsNone(actual)
+
+    @benchmark
+    @patch('resources.lib.repositories.ROM', new=lambda *args, **kwargs: args)
+    def test_benchmark_streaming_roms_memory(self):
+        # arrange
+        amount = 100000
+        test_dir = tempfile.mkdtemp()
+        file_path = io.FileName(os.path.join(test_dir, 'roms_MAME.json'))
+        with open(file_path.getPathTranslated(), 'w', encoding='utf-8') as json_file:
+            json_file.write('[{"control": "Advanced Emulator Launcher ROMs", "version": 1}, {')
+            json_file.write(','.join(json.dumps(f'rom_{i}') + ':' + json.dumps({
+                'id': f'rom_{i}', 'm_name': f'MAME game {i}', 'filename': f'/roms/mame/game_{i}.zip',
+                'm_plot': 'Plot ' * 20, 'nplayers': '2'}) for i in range(amount)))
+            json_file.write('}]')
+        file_size = os.path.getsize(file_path.getPathTranslated())
+        target = ROMsJsonFileRepository(file_path)
+
+        def _peak_memory(load_func):
+            gc.collect()
+            tracemalloc.start()
+            start = time.perf_counter()
+            actual = load_func()
+            duration = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return actual, peak, duration
+
+        # act
+        loaded_amount, document_peak, document_duration = _peak_memory(lambda: len(json.load(open(file_path.getPathTranslated()))[1]))
+        streamed_amount, streaming_peak, streaming_duration = _peak_memory(lambda: sum(1 for _ in target.iterate_ROMs()))
+        shutil.rmtree(test_dir)
+
+        # assert
+        logger.info(f'Reading {amount} roms from {file_size / 1024:.0f} KiB: '
+                    f'json.load {document_peak / 1024:.0f} KiB in {document_duration:.2f}s, '
+                    f'streaming {streaming_peak / 1024:.0f} KiB in {streaming_duration:.2f}s')
+        self.assertEqual(loaded_amount, amount)
+        self.assertEqual(streamed_amount, amount)
+        self.assertLess(streaming_peak, document_peak / 10)
+
+
+class Test_ROMsNFOFileRepository(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def create_roms(self, amount: int) -> list:
+        roms = []
+        for i in range(amount):
+            rom_file = os.path.join(self.test_dir, f'game_{i}.zip')
+            roms.append(ROM(scanned_data={'file': rom_file}))
+        return roms
+
+    def write_nfo(self, rom: ROM, title: str):
+        with open(rom.get_nfo_file().getPathTranslated(), 'w', encoding='utf-8') as nfo_file:
+            nfo_file.write(f'<ROM>\n<title>{title}</title>\n<year>1994</year>\n</ROM>\n')
+
+    def import_nfo_data(self, repository: ROMsNFOFileRepository, roms: list, nfo_data_list: list):
+        for rom, nfo_data in zip(roms, nfo_data_list):
+            if nfo_data is not None:
+                rom.update_with_nfo_data(nfo_data)
+                repository.mark_imported(rom)
+
+    def test_single_pass_parser_matches_findall_per_tag(self):
+        # arrange
+        nfo_str = ('<?xml version="1.0" encoding="utf-8" standalone="yes"?>\r\n<ROM>\r\n'
+                   '<title>Tom &amp; Jerry</title>\n<year>1994</year>\n<genre></genre>\n'
+                   '<developer>Hudson &lt;Soft&gt;</developer>\n<nplayers>2</nplayers>\n'
+                   '<plot>First line\nsecond line</plot>\n<rating>7</rating>\n<title>Duplicate</title>\n'
+                   '<trailer>http://www.youtube.com/watch?v=abc</trailer>\n</ROM>\n')
+        single_line_str = nfo_str.replace('\r', '').replace('\n', '')
+        expected = {}
+        for tag in ['title', 'year', 'genre', 'developer', 'nplayers', 'esrb', 'pegi', 'rating', 'plot', 'trailer']:
+            matches = re.findall(f'<{tag}>(.*?)</{tag}>', single_line_str)
+            if len(matches) > 0:
+                expected[tag] = text.unescape_XML(matches[0])
+
+        # act
+        actual = parse_nfo_str(nfo_str)
+
+        # assert
+        self.assertEqual(actual, expected)
+
+    def test_unchanged_nfo_files_are_skipped(self):
+        # arrange
+        roms = self.create_roms(3)
+        self.write_nfo(roms[0], 'First')
+        self.write_nfo(roms[1], 'Second')
+        cache_file = FakeFile(os.path.join(self.test_dir, 'nfo_cache.json'))
+        first_run = ROMsNFOFileRepository(cache_file)
+        first_actual = [nfo_data for _, nfo_data in first_run.read_nfo_files(roms)]
+        self.import_nfo_data(first_run, roms, first_actual)
+        first_run.save_cache()
+        self.write_nfo(roms[1], 'Second changed')
+
+        # act
+        target = ROMsNFOFileRepository(cache_file)
+        actual = [nfo_data for _, nfo_data in target.read_nfo_files(roms)]
+
+        # assert
+        self.assertEqual([data['title'] if data else None for data in first_actual], ['First', 'Second', None])
+        self.assertEqual(actual, [None, {'title': 'Second changed', 'year': '1994'}, None])
+
+    def test_exporting_and_deleting_nfo_files(self):
+        # arrange
+        roms = self.create_roms(ROMsNFOFileRepository.BATCH_SIZE + 10)
+        for i, rom in enumerate(roms):
+            rom.set_name(f'Game {i}')
+        target = ROMsNFOFileRepository()
+
+        # act
+        num_of_written = target.write_nfo_files(roms)
+        read_back = [nfo_data for _, nfo_data in target.read_nfo_files(roms)]
+        self.import_nfo_data(target, roms, read_back)
+        unchanged = [nfo_data for _, nfo_data in target.read_nfo_files(roms)]
+        num_of_deleted = target.delete_nfo_files(roms)
+
+        # assert
+        self.assertEqual(num_of_written, len(roms))
+        self.assertEqual([data['title'] for data in read_back], [rom.get_name() for rom in roms])
+        self.assertEqual(unchanged, [None] * len(roms))
+        self.assertEqual(num_of_deleted, len(roms))
+        self.assertEqual(target.cache, {})
+        self.assertEqual(os.listdir(self.test_dir), [])
+
+    def test_nfo_files_are_read_again_for_changed_or_rescanned_roms(self):
+        # arrange
+        roms = self.create_roms(3)
+        for rom in roms:
+            self.write_nfo(rom, 'Title')
+        target = ROMsNFOFileRepository()
+        self.import_nfo_data(target, roms, [nfo_data for _, nfo_data in target.read_nfo_files(roms)])
+
+        roms[0].set_name('Edited')
+        rescanned_rom = ROM(scanned_data={'file': os.path.join(self.test_dir, 'game_1.zip')})
+
+        # act
+        actual = [nfo_data for _, nfo_data in target.read_nfo_files([roms[0], rescanned_rom, roms[2]])]
+
+        # assert
+        self.assertEqual([data['title'] if data else None for data in actual], ['Title', 'Title', None])
+
+    def test_imported_nfo_files_are_skipped_for_roms_loaded_from_database(self):
+        # arrange
+        db_path = io.FileName(os.path.join(self.test_dir, 'akl.db'))
+        create_database(db_path)
+        conn = sqlite3.connect(db_path.getPathTranslated())
+        conn.execute("INSERT INTO akl_addon (id, name, addon_id, version, addon_type) VALUES ('addon_1', 'Scanner', 'script.scanner', '1.0', 'SCANNER')")
+        conn.execute("INSERT INTO sources (id, name, akl_addon_id, settings) VALUES ('src_1', 'Source', 'addon_1', '{}')")
+        conn.commit()
+        conn.close()
+        roms = self.create_roms(2)
+        uow = UnitOfWork(db_path)
+        with uow:
+            for rom in roms:
+                rom.scanned_by('src_1')
+                ROMsRepository(uow).insert_rom(rom)
+                self.write_nfo(rom, 'Title')
+            uow.commit()
+        target = ROMsNFOFileRepository()
+
+        # act
+        with uow:
+            repository = ROMsRepository(uow)
+            loaded_roms = [*repository.find_roms_by_source(SourcesRepository(uow).find('src_1'))]
+            self.import_nfo_data(target, loaded_roms, [nfo_data for _, nfo_data in target.read_nfo_files(loaded_roms)])
+            repository.update_roms_nfo_data(loaded_roms)
+            uow.commit()
+        with uow:
+            reloaded_roms = [*ROMsRepository(uow).find_roms_by_source(SourcesRepository(uow).find('src_1'))]
+            actual = [nfo_data for _, nfo_data in target.read_nfo_files(reloaded_roms)]
+
+        # assert
+        self.assertEqual([rom.get_name() for rom in reloaded_roms], ['Title', 'Title'])
+        self.assertEqual(actual, [None, None])
+
+    def test_exported_nfo_files_are_read_on_next_import(self):
+        # arrange
+        roms = self.create_roms(2)
+        for rom in roms:
+            self.write_nfo(rom, 'Title')
+        target = ROMsNFOFileRepository()
+        self.import_nfo_data(target, roms, [nfo_data for _, nfo_data in target.read_nfo_files(roms)])
+
+        # act
+        target.write_nfo_files(roms)
+        actual = [nfo_data for _, nfo_data in target.read_nfo_files(roms)]
+
+        # assert
+        self.assertEqual([data['title'] for data in actual], ['Title', 'Title'])
+
+
+class Test_ViewRepository(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.paths = MagicMock()
+        self.paths.VIEWS_DIR = io.FileName(self.test_dir)
+        self.paths.VIEWS_INDEX_FILE_PATH = io.FileName(os.path.join(self.test_dir, 'views_index.json'))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def create_view(self, amount: int, name: str = 'Game') -> dict:
+        return {'id': 'collection_1', 'items': [{'id': f'rom_{i}', 'name': f'{name} {i}'} for i in range(amount)]}
+
+    def test_items_index_follows_changed_views(self):
+        # arrange
+        target = ViewRepository(self.paths)
+        target.store_view('collection_1', constants.OBJ_ROMCOLLECTION, self.create_view(10))
+        target.store_view('collection_2', constants.OBJ_ROMCOLLECTION,
+                          {'id': 'collection_2', 'items': [{'id': 'rom_3'}, {'id': 'rom_20'}]})
+        target.save_items_index()
+        collection_1 = target.get_view_file('collection_1', constants.OBJ_ROMCOLLECTION).getPath()
+        collection_2 = target.get_view_file('collection_2', constants.OBJ_ROMCOLLECTION).getPath()
+
+        # act
+        target.delete_view_item('collection_1', constants.OBJ_ROMCOLLECTION, 'rom_1')
+        pending = target.find_item_views('rom_3')
+        target.save_items_index()
+        target.store_view('collection_2', constants.OBJ_ROMCOLLECTION, None)
+        target.save_items_index()
+        stored = ViewRepository(self.paths)
+
+        # assert
+        self.assertEqual(pending, {collection_1: 2, collection_2: 0})
+        self.assertEqual(stored.find_item_views('rom_3'), {collection_1: 2})
+        self.assertEqual(stored.find_item_views('rom_1'), {})
+        self.assertEqual(stored.find_item_views('rom_20'), {})
+        self.assertEqual(stored.find_item_views('rom_9'), {collection_1: 8})
+
+    def read_view_version(self, target: ViewRepository, view_id: str) -> dict:
+        view_file = target.get_view_file(view_id, constants.OBJ_ROMCOLLECTION)
+        with open(target.get_view_version_file(view_file).getPathTranslated(), 'r') as version_file:
+            return json.load(version_file)
+
+    def test_unchanged_views_are_not_written_again(self):
+        # arrange
+        target = ViewRepository(self.paths)
+        view_file = target.get_view_file('collection_1', constants.OBJ_ROMCOLLECTION)
+        target.store_view('collection_1', constants.OBJ_ROMCOLLECTION, self.create_view(10))
+        first_version = self.read_view_version(target, 'collection_1')
+        first_mtime = view_file.stat().st_mtime_ns
+
+        # act
+        target.store_view('collection_1', constants.OBJ_ROMCOLLECTION, self.create_view(10))
+        unchanged_version = self.read_view_version(target, 'collection_1')
+        unchanged_mtime = view_file.stat().st_mtime_ns
+        target.store_view('collection_1', constants.OBJ_ROMCOLLECTION, self.create_view(10, 'Changed'))
+        changed_version = self.read_view_version(target, 'collection_1')
+
+        # assert
+        self.assertEqual(first_version['generation'], 1)
+        self.assertEqual(unchanged_version, first_version)
+        self.assertEqual(unchanged_mtime, first_mtime)
+        self.assertEqual(changed_version['generation'], 2)
+        self.assertNotEqual(changed_version['hash'], first_version['hash'])
+        self.assertEqual(target.find_items('collection_1', constants.OBJ_ROMCOLLECTION)['items'][0]['name'], 'Changed 0')
+
+    def test_removing_view_removes_version(self):
+        # arrange
+        target = ViewRepository(self.paths)
+        target.store_view('collection_1', constants.OBJ_ROMCOLLECTION, self.create_view(10))
+
+        # act
+        target.store_view('collection_1', constants.OBJ_ROMCOLLECTION, None)
+
+        # assert
+        self.assertEqual(os.listdir(self.test_dir), [])
+
+    def test_readers_never_see_partially_written_views(self):
+        # arrange
+        views = [self.create_view(5000), self.create_view(20, 'Small')]
+        ViewRepository(self.paths).store_view('collection_1', constants.OBJ_ROMCOLLECTION, views[0])
+        writing_done = threading.Event()
+        failed_reads = []
+        reads = 0
+
+        def write_views():
+            writer = ViewRepository(self.paths)
+            for i in range(50):
+                writer.store_view('collection_1', constants.OBJ_ROMCOLLECTION, views[i % 2])
+            writing_done.set()
+
+        # act
+        writer_thread = threading.Thread(target=write_views)
+        writer_thread.start()
+        reader = ViewRepository(self.paths)
+        with patch.object(reader.logger, 'error'):
+            while not writing_done.is_set():
+                view_data = reader.find_items('collection_1', constants.OBJ_ROMCOLLECTION)
+                reads += 1
+                if view_data is None or len(view_data['items']) not in (5000, 20):
+                    failed_reads.append(view_data)
+        writer_thread.join()
+
+        # assert
+        logger.info(f'Read views {reads} times while writing them 50 times')
+        self.assertEqual(failed_reads, [])
+        self.assertEqual(sorted(os.listdir(self.test_dir)), ['collection_collection_1.json', 'collection_collection_1.version'])
+
+
+    def create_listitems_view(self, amount: int) -> dict:
+        return {'id': 'collection_1', 'items': [{
+            'id': f'rom_{i}',
+            'name': f'Game {i}',
+            'url': f'plugin://plugin.program.akl/execute/rom/rom_{i}',
+            'is_folder': False,
+            'type': 'game',
+            'info': {'title': f'Game {i}', 'year': str(1980 + i % 30), 'genre': f'Genre {i % 12}',
+                     'plot': f'Plot of game {i}. ' * 8, 'overlay': 4},
+            'art': {asset: f'/storage/roms/art/{asset}/game_{i}.png' for asset in ['boxfront', 'fanart', 'icon', 'poster']},
+            'properties': {'platform': 'Nintendo SNES', 'nplayers': '1', 'esrb': 'E', 'obj_type': 5}
+        } for i in range(amount)]}
+
+    def test_compressed_views_are_read_and_served_as_json(self):
+        # arrange
+        target = ViewRepository(self.paths)
+        large_view = self.create_view(500)
+        small_view = {'id': 'collection_2', 'items': [{'id': 'rom_1'}]}
+        ViewCache.clear()
+
+        # act
+        with patch.object(ViewRepository, 'COMPRESSION_THRESHOLD', 1024):
+            target.store_view('collection_1', constants.OBJ_ROMCOLLECTION, large_view)
+            target.store_view('collection_2', constants.OBJ_ROMCOLLECTION, small_view)
+        large_file = target.get_view_file('collection_1', constants.OBJ_ROMCOLLECTION)
+        with open(large_file.getPathTranslated(), 'rb') as file:
+            compressed_header = file.read(2)
+        served_view = ViewCache.get(large_file)
+        target.store_view('collection_1', constants.OBJ_ROMCOLLECTION, large_view)
+        with open(large_file.getPathTranslated(), 'rb') as file:
+            uncompressed_header = file.read(2)
+
+        # assert
+        self.assertEqual(compressed_header, b'\x1f\x8b')
+        self.assertEqual(uncompressed_header, b'{"')
+        self.assertEqual(json.loads(served_view[1]), large_view)
+        self.assertEqual(target.find_items('collection_1', constants.OBJ_ROMCOLLECTION), large_view)
+        self.assertEqual(target.find_items('collection_2', constants.OBJ_ROMCOLLECTION), small_view)
+        self.assertEqual(self.read_view_version(target, 'collection_1')['generation'], 2)
+
+    @benchmark
+    def test_benchmark_reading_compressed_views(self):
+        # arrange
+        target = ViewRepository(self.paths)
+        reads = 5
+        results = []
+
+        for amount in [1000, 10000, 50000]:
+            view_data = self.create_listitems_view(amount)
+            view_file = target.get_view_file('collection_1', constants.OBJ_ROMCOLLECTION)
+            durations = {}
+            sizes = {}
+            for mode, threshold in [('raw', None), ('compressed', 0)]:
+                with patch.object(ViewRepository, 'COMPRESSION_THRESHOLD', threshold):
+                    target.store_view('collection_1', constants.OBJ_ROMCOLLECTION, view_data)
+                sizes[mode] = view_file.stat().st_size
+
+                # act
+                start = time.perf_counter()
+                for _ in range(reads):
+                    read_view = target.find_items('collection_1', constants.OBJ_ROMCOLLECTION)
+                durations[mode] = (time.perf_counter() - start) / reads
+                self.assertEqual(len(read_view['items']), amount)
+            results.append((amount, sizes, durations))
+
+        # assert
+        for amount, sizes, durations in results:
+            logger.info(f'Reading view with {amount} items: '
+                        f'raw {sizes["raw"] / 1024:.0f} KiB in {durations["raw"] * 1000:.1f}ms, '
+                        f'compressed {sizes["compressed"] / 1024:.0f} KiB in {durations["compressed"] * 1000:.1f}ms')
+            self.assertLess(sizes['compressed'], sizes['raw'] / 5)
+
+class Test_ROMsRepository_asset_paths(DatabaseTestCase):
+
+    ASSET_TYPES = [constants.ASSET_BOXFRONT_ID, constants.ASSET_TITLE_ID, constants.ASSET_SNAP_ID,
+                   constants.ASSET_FANART_ID, constants.ASSET_ICON_ID, constants.ASSET_POSTER_ID]
+
+    def setUp(self):
+        super().setUp()
+        self.create_source_with_asset_paths(self.db_path)
+
+    def create_source_with_asset_paths(self, db_path: io.FileName):
+        conn = sqlite3.connect(db_path.getPathTranslated())
+        conn.execute("INSERT INTO akl_addon (id, name, addon_id, version, addon_type) VALUES ('addon_1', 'Scanner', 'script.scanner', '1.0', 'SCANNER')")
+        conn.execute("INSERT INTO sources (id, name, akl_addon_id, settings) VALUES ('src_1', 'Source', 'addon_1', '{}')")
+        for asset_type in self.ASSET_TYPES:
+            conn.execute("INSERT INTO assetpaths (id, path, asset_type) VALUES (?,?,?)",
+                         (f'path_{asset_type}', f'/art/{asset_type}/', asset_type))
+            conn.execute("INSERT INTO source_assetpaths (source_id, assetpaths_id) VALUES ('src_1', ?)", (f'path_{asset_type}',))
+        conn.commit()
+        conn.close()
+
+    def store_scanned_roms(self, db_path: io.FileName, num_of_roms: int, legacy=False):
+        uow = UnitOfWork(db_path)
+        with uow:
+            source = SourcesRepository(uow).find('src_1')
+            repository = ROMsRepository(uow)
+            for i in range(num_of_roms):
+                rom = ROM()
+                rom.set_name(f'Game {i}')
+                rom.scanned_by(source.get_id())
+                rom.apply_source_asset_paths(source)
+                repository.insert_rom(rom)
+                if legacy:
+                    # Scan import as it was before, storing every asset path of the source with each ROM.
+                    for asset_path in source.get_asset_paths():
+                        uow.execute(qry.UPDATE_ASSET_PATH, asset_path.get_path(), asset_path.get_asset_info_id(), asset_path.get_id())
+                        uow.execute(qry.INSERT_ROM_ASSET_PATH, rom.get_id(), asset_path.get_id())
+            uow.commit()
+
+    def find_asset_paths(self, db_path: io.FileName, rom_id: str) -> dict:
+        uow = UnitOfWork(db_path)
+        with uow:
+            rom = ROMsRepository(uow).find_rom(rom_id)
+        return {asset_path.get_asset_info_id(): asset_path.get_path() for asset_path in rom.get_asset_paths()}
+
+    def test_scanned_roms_inherit_asset_paths_of_source(self):
+        # arrange
+        db_path = self.db_path
+        self.store_scanned_roms(db_path, 3)
+        rom_ids = [row[0] for row in self.query("SELECT id FROM roms ORDER BY name")]
+        snap_info = g_assetFactory.get_asset_info(constants.ASSET_SNAP_ID)
+
+        # act
+        uow = UnitOfWork(db_path)
+        with uow:
+            repository = ROMsRepository(uow)
+            rom = repository.find_rom(rom_ids[0])
+            rom.set_asset_path(snap_info, '/custom/snaps/')
+            repository.update_rom(rom)
+            uow.commit()
+        self.query("UPDATE assetpaths SET path = '/new/icons/' WHERE id = ?", f'path_{constants.ASSET_ICON_ID}')
+
+        # assert
+        self.assertEqual(self.query("SELECT COUNT(*) FROM rom_assetpaths"), [(1,)])
+        self.assertEqual(self.query("SELECT COUNT(*) FROM assetpaths"), [(len(self.ASSET_TYPES) + 1,)])
+        overridden = self.find_asset_paths(db_path, rom_ids[0])
+        inherited = self.find_asset_paths(db_path, rom_ids[1])
+        self.assertEqual(overridden[constants.ASSET_SNAP_ID], '/custom/snaps/')
+        self.assertEqual(inherited[constants.ASSET_SNAP_ID], f'/art/{constants.ASSET_SNAP_ID}/')
+        self.assertEqual(overridden[constants.ASSET_ICON_ID], '/new/icons/')
+        self.assertEqual(inherited[constants.ASSET_ICON_ID], '/new/icons/')
+        self.assertEqual(len(inherited), len(self.ASSET_TYPES))
+
+    def test_migration_removes_duplicated_rom_asset_paths(self):
+        # arrange
+        db_path = self.db_path
+        self.store_scanned_roms(db_path, 5, legacy=True)
+        rom_ids = [row[0] for row in self.query("SELECT id FROM roms ORDER BY name")]
+        conn = sqlite3.connect(db_path.getPathTranslated())
+        conn.execute("INSERT INTO assetpaths (id, path, asset_type) VALUES ('copy', ?, ?)",
+                     (f'/art/{constants.ASSET_FANART_ID}/', constants.ASSET_FANART_ID))
+        conn.execute("INSERT INTO assetpaths (id, path, asset_type) VALUES ('override', '/custom/', ?)", (constants.ASSET_FANART_ID,))
+        conn.execute("DELETE FROM rom_assetpaths WHERE rom_id IN (?, ?) AND assetpaths_id = ?",
+                     (rom_ids[0], rom_ids[1], f'path_{constants.ASSET_FANART_ID}'))
+        conn.execute("INSERT INTO rom_assetpaths (rom_id, assetpaths_id) VALUES (?, 'copy'), (?, 'override')", (rom_ids[0], rom_ids[1]))
+        conn.commit()
+        conn.close()
+        expected = set(self.query("SELECT rom_id, path, asset_type FROM vw_rom_asset_paths"))
+        with open(os.path.join(self.ROOT_DIR, 'resources/migrations/1.6.0_003.sql')) as migration_file:
+            migration = migration_file.read()
+
+        # act
+        conn = sqlite3.connect(db_path.getPathTranslated())
+        conn.executescript(migration)
+        conn.close()
+
+        # assert
+        self.assertEqual(set(self.query("SELECT rom_id, path, asset_type FROM vw_rom_asset_paths")), expected)
+        self.assertEqual(len(expected), len(rom_ids) * len(self.ASSET_TYPES))
+        self.assertEqual(self.query("SELECT rom_id, assetpaths_id FROM rom_assetpaths"), [(rom_ids[1], 'override')])
+        self.assertEqual(self.query("SELECT COUNT(*) FROM assetpaths WHERE id = 'copy'"), [(0,)])
+
+    @benchmark
+    def test_benchmark_scan_import_with_inherited_asset_paths(self):
+        # arrange
+        num_of_roms = 2000
+        legacy_db_path = io.FileName(os.path.join(self.test_dir, 'legacy.db'))
+        create_database(legacy_db_path)
+        self.create_source_with_asset_paths(legacy_db_path)
+        results = {}
+
+        # act
+        for legacy in [True, False]:
+            db_path = legacy_db_path if legacy else self.db_path
+            start = time.perf_counter()
+            self.store_scanned_roms(db_path, num_of_roms, legacy=legacy)
+            duration = time.perf_counter() - start
+            rows = query_database(db_path, "SELECT COUNT(*) FROM rom_assetpaths")[0][0]
+            results[legacy] = (duration, rows, os.path.getsize(db_path.getPathTranslated()))
+
+        # assert
+        for legacy, (duration, rows, size) in results.items():
+            logger.info(f'Importing {num_of_roms} scanned ROMs with {len(self.ASSET_TYPES)} source asset paths '
+                        f'{"copied per ROM" if legacy else "by reference"}: {duration:.2f}s, '
+                        f'{rows} rom_assetpaths rows, database {size / 1024:.0f} KiB')
+        self.assertEqual(results[False][1], 0)
+        self.assertLess(results[False][2], results[True][2])
+
+
+class Test_ROMsRepository_scanned_data(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.create_source()
+
+    def store_roms(self, num_of_roms: int, num_of_keys: int) -> typing.List[ROM]:
+        roms = []
+        uow = UnitOfWork(self.db_path)
+        with uow:
+            repository = ROMsRepository(uow)
+            for i in range(num_of_roms):
+                rom = ROM()
+                rom.set_name(f'Game {i}')
+                rom.scanned_by('src_1')
+                rom.set_scanned_data_element('file', f'/roms/game_{i}.zip')
+                for key in range(num_of_keys - 1):
+                    rom.set_scanned_data_element(f'key_{key}', f'value {key} of game {i}')
+                repository.insert_rom(rom)
+                roms.append(rom)
+            uow.commit()
+        return roms
+
+    def test_scanned_data_is_stored_with_the_rom(self):
+        # arrange
+        rom = self.store_roms(3, 3)[1]
+
+        # act
+        uow = UnitOfWork(self.db_path)
+        with uow:
+            repository = ROMsRepository(uow)
+            stored = repository.find_rom(rom.get_id())
+            stored.set_scanned_data_element('crc', 'abcd1234')
+            repository.update_rom(stored)
+            uow.commit()
+        with uow:
+            repository = ROMsRepository(uow)
+            actual = repository.find_rom(rom.get_id())
+            by_source = {r.get_id(): r for r in repository.find_roms_by_source(SourcesRepository(uow).find('src_1'))}
+
+        # assert
+        self.assertEqual(actual.get_scanned_data(), {
+            'file': '/roms/game_1.zip', 'key_0': 'value 0 of game 1', 'key_1': 'value 1 of game 1', 'crc': 'abcd1234'})
+        self.assertNotIn('scanned_data', actual.get_data_dic())
+        self.assertEqual(by_source[rom.get_id()].get_scanned_data(), actual.get_scanned_data())
+
+    def test_migration_moves_scanned_data_from_key_value_rows(self):
+        # arrange
+        conn = sqlite3.connect(self.db_path.getPathTranslated())
+        conn.executescript("""
+            DROP VIEW vw_roms;
+            DROP TRIGGER trg_launch_plans_roms_update;
+            ALTER TABLE roms DROP COLUMN scanned_data;
+            CREATE TABLE scanned_roms_data(rom_id TEXT, data_key TEXT NOT NULL, data_value TEXT NULL);
+            INSERT INTO metadata (id) VALUES ('meta_1'), ('meta_2');
+            INSERT INTO roms (id, name, metadata_id, scanned_by_id) VALUES
+                ('rom_1', 'Game 1', 'meta_1', 'src_1'), ('rom_2', 'Game 2', 'meta_2', 'src_1');
+            INSERT INTO scanned_roms_data (rom_id, data_key, data_value) VALUES
+                ('rom_1', 'file', '/roms/game_1.zip'), ('rom_1', 'identifier', 'game_1'), ('rom_1', 'size', NULL);
+        """)
+        with open(os.path.join(self.ROOT_DIR, 'resources/migrations/1.6.0_004.sql')) as migration_file:
+            migration = migration_file.read()
+
+        # act
+        conn.executescript(migration)
+        conn.close()
+
+        # assert
+        uow = UnitOfWork(self.db_path)
+        with uow:
+            repository = ROMsRepository(uow)
+            rom_1 = repository.find_rom('rom_1')
+            rom_2 = repository.find_rom('rom_2')
+        self.assertEqual(rom_1.get_scanned_data(), {'file': '/roms/game_1.zip', 'identifier': 'game_1', 'size': None})
+        self.assertEqual(rom_2.get_scanned_data(), {})
+        self.assertEqual(self.query("SELECT name FROM sqlite_master WHERE name = 'scanned_roms_data'"), [])
+
+    @benchmark
+    def test_benchmark_scanned_data_with_many_keys(self):
+        # arrange
+        num_of_roms, num_of_keys = 1000, 25
+        roms = self.store_roms(num_of_roms, num_of_keys)
+        conn = sqlite3.connect(self.db_path.getPathTranslated())
+        conn.row_factory = sqlite3.Row
+        conn.execute("CREATE TABLE legacy_scanned_roms_data(rom_id TEXT, data_key TEXT NOT NULL, data_value TEXT NULL)")
+        conn.executemany("INSERT INTO legacy_scanned_roms_data VALUES (?, ?, ?)",
+                         ((rom.get_id(), key, value) for rom in roms for key, value in rom.get_scanned_data().items()))
+        conn.commit()
+        durations = {}
+
+        # act
+        # Scanned data stored as it was before, one row per key which is rewritten on every update
+        # and regrouped per ROM when loading.
+        start = time.perf_counter()
+        result_set = [dict(row) for row in conn.execute(
+            "SELECT s.* FROM legacy_scanned_roms_data AS s INNER JOIN roms AS r ON r.id = s.rom_id AND r.scanned_by_id = ?", ('src_1',))]
+        legacy_loaded = [{entry['data_key']: entry['data_value'] for entry in filter(lambda s: s['rom_id'] == rom.get_id(), result_set)}
+                         for rom in roms]
+        durations['legacy load'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for rom in roms:
+            conn.execute("DELETE FROM legacy_scanned_roms_data WHERE rom_id = ?", (rom.get_id(),))
+            conn.executemany("INSERT INTO legacy_scanned_roms_data VALUES (?, ?, ?)",
+                             ((rom.get_id(), key, value) for key, value in rom.get_scanned_data().items()))
+        conn.commit()
+        durations['legacy update'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        loaded = [json.loads(row['scanned_data']) for row in conn.execute(
+            "SELECT r.scanned_data FROM roms AS r WHERE r.scanned_by_id = ?", ('src_1',))]
+        durations['load'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for rom in roms:
+            conn.execute("UPDATE roms SET scanned_data = ? WHERE id = ?", (json.dumps(rom.get_scanned_data()), rom.get_id()))
+        conn.commit()
+        durations['update'] = time.perf_counter() - start
+        conn.close()
+
+        # assert
+        logger.info(f'Scanned data of {num_of_roms} ROMs with {num_of_keys} keys: ' +
+                    ', '.join(f'{name} {duration * 1000:.1f}ms' for name, duration in durations.items()))
+        self.assertEqual(len(loaded), num_of_roms)
+        self.assertEqual(sorted(json.dumps(d, sort_keys=True) for d in loaded),
+                         sorted(json.dumps(d, sort_keys=True) for d in legacy_loaded))
+        self.assertLess(durations['load'], durations['legacy load'])
+        self.assertLess(durations['update'], durations['legacy update'])
+
+
+class Test_ROMsRepository_indexes(DatabaseTestCase):
+
+    def create_library(self, num_of_roms: int, num_of_collections: int):
+        conn = sqlite3.connect(self.db_path.getPathTranslated())
+        for c in range(num_of_collections):
+            conn.execute("INSERT INTO metadata (id) VALUES (?)", (f'meta_col_{c}',))
+            conn.execute("INSERT INTO romcollections (id, name, metadata_id) VALUES (?,?,?)", (f'col_{c}', f'Collection {c}', f'meta_col_{c}'))
+        for i in range(num_of_roms):
+            rom_id = text.misc_generate_random_SID()
+            conn.execute("INSERT INTO metadata (id, genre) VALUES (?,?)", (f'meta_{i}', f'Genre {i % 20}'))
+            conn.execute("INSERT INTO roms (id, name, metadata_id) VALUES (?,?,?)", (rom_id, f'Game {i}', f'meta_{i}'))
+            conn.execute("INSERT INTO metatags (metadata_id, tag_id) VALUES (?, '2e1f3086c96b44d2a81f5c08876b4ef6')", (f'meta_{i}',))
+            for asset_type in [constants.ASSET_BOXFRONT_ID, constants.ASSET_SNAP_ID, constants.ASSET_FANART_ID]:
+                asset_id = text.misc_generate_random_SID()
+                conn.execute("INSERT INTO assets (id, filepath, asset_type) VALUES (?,?,?)", (asset_id, f'/art/{i}_{asset_type}.png', asset_type))
+                conn.execute("INSERT INTO rom_assets (rom_id, asset_id) VALUES (?,?)", (rom_id, asset_id))
+            conn.executemany("INSERT INTO roms_in_romcollection (rom_id, romcollection_id) VALUES (?,?)",
+                             ((rom_id, f'col_{c}') for c in {i % num_of_collections, (i * 7 + 3) % num_of_collections}))
+        conn.commit()
+        conn.close()
+
+    def load_roms(self) -> typing.Tuple[list, list]:
+        uow = UnitOfWork(self.db_path)
+        with uow:
+            repository = ROMsRepository(uow)
+            romcollection = ROMCollectionRepository(uow).find_romcollection('col_3')
+            roms = [(rom.get_id(), rom.get_custom_attribute('collections_count'), len(rom.get_assets()), rom.get_tags())
+                    for rom in repository.find_roms_by_romcollection(romcollection)]
+            vcollection = VirtualCollectionFactory.create_by_category(constants.VCATEGORY_GENRE_ID, 'Genre 3')
+            vroms = [(rom.get_id(), len(rom.get_assets())) for rom in repository.find_roms_by_romcollection(vcollection)]
+        return sorted(roms), sorted(vroms)
+
+    def drop_indexes(self) -> list:
+        index_names = [row[0] for row in self.query("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'")]
+        for index_name in index_names:
+            self.query(f"DROP INDEX {index_name}")
+        return index_names
+
+    def test_loading_roms_by_romcollection_with_and_without_indexes(self):
+        # arrange
+        self.create_library(num_of_roms=200, num_of_collections=20)
+
+        # act
+        indexed = self.load_roms()
+        self.drop_indexes()
+        unindexed = self.load_roms()
+
+        # assert
+        self.assertEqual(indexed, unindexed)
+        self.assertEqual(len(indexed[0]), 20)
+        self.assertEqual(len(indexed[1]), 10)
+        self.assertEqual(set(rom[1] for rom in indexed[0]), {2})
+
+    @benchmark
+    def test_benchmark_loading_roms_by_romcollection(self):
+        # arrange
+        self.create_library(num_of_roms=10000, num_of_collections=20)
+
+        # act
+        start = time.perf_counter()
+        indexed = self.load_roms()
+        indexed_duration = time.perf_counter() - start
+
+        index_names = self.drop_indexes()
+        start = time.perf_counter()
+        unindexed = self.load_roms()
+        unindexed_duration = time.perf_counter() - start
+
+        # assert
+        logger.info(f'Loading a collection of {len(indexed[0])} ROMs and a virtual collection of {len(indexed[1])} ROMs '
+                    f'out of 10000: without indexes {unindexed_duration * 1000:.0f}ms, '
+                    f'with {len(index_names)} indexes {indexed_duration * 1000:.0f}ms')
+        self.assertEqual(indexed, unindexed)
+        self.assertEqual(len(indexed[0]), 1000)
+        self.assertEqual(set(rom[1] for rom in indexed[0]), {2})
+        self.assertLess(indexed_duration * 5, unindexed_duration)
+
+
+class Test_UnitOfWork_concurrency(DatabaseTestCase):
+
+    NUM_OF_ROMS = 5
+
+    def setUp(self):
+        super().setUp()
+        conn = sqlite3.connect(self.db_path.getPathTranslated())
+        for i in range(self.NUM_OF_ROMS):
+            conn.execute("INSERT INTO metadata (id) VALUES (?)", (f'meta_{i}',))
+            conn.execute("INSERT INTO roms (id, name, metadata_id) VALUES (?,?,?)", (f'rom_{i}', f'Game {i}', f'meta_{i}'))
+        conn.commit()
+        conn.close()
+
+    def run_concurrently(self, num_of_writers: int, num_of_readers: int, sessions: int) -> list:
+        errors = []
+
+        def write(writer: int):
+            try:
+                for session in range(sessions):
+                    uow = UnitOfWork(self.db_path)
+                    with uow:
+                        rom_id = f'rom_{(writer + session) % self.NUM_OF_ROMS}'
+                        uow.execute(qry.UPDATE_ROM_LAUNCH_STATS, datetime.datetime.now(), rom_id)
+                        uow.execute(qry.SELECT_ROM, rom_id)
+                        uow.single_result()
+                        uow.commit()
+            except Exception as ex:
+                errors.append(ex)
+
+        def read():
+            try:
+                for session in range(sessions):
+                    uow = UnitOfWork(self.db_path)
+                    with uow:
+                        # keep the read transaction open while the writers commit
+                        cursor = uow.execute("SELECT * FROM vw_roms")
+                        cursor.fetchone()
+                        time.sleep(0.001)
+                        cursor.fetchall()
+            except Exception as ex:
+                errors.append(ex)
+
+        threads = [threading.Thread(target=write, args=(w,)) for w in range(num_of_writers)]
+        threads.extend(threading.Thread(target=read) for _ in range(num_of_readers))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+    def total_launch_count(self) -> int:
+        conn = sqlite3.connect(self.db_path.getPathTranslated())
+        total = conn.execute("SELECT SUM(launch_count) FROM roms").fetchone()[0]
+        conn.close()
+        return total
+
+    def test_concurrent_readers_and_writers(self):
+        # act
+        start = time.perf_counter()
+        errors = self.run_concurrently(num_of_writers=8, num_of_readers=8, sessions=50)
+        duration = time.perf_counter() - start
+
+        # assert
+        logger.info(f'8 writers and 8 readers with 50 sessions each in {duration * 1000:.0f}ms')
+        self.assertEqual(errors, [])
+        self.assertEqual(self.total_launch_count(), 8 * 50)
+        conn = sqlite3.connect(self.db_path.getPathTranslated())
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+        conn.close()
+
+    @patch.object(UnitOfWork, 'BUSY_TIMEOUT', 0.05)
+    def test_retries_while_database_is_locked(self):
+        # arrange
+        lock_conn = sqlite3.connect(self.db_path.getPathTranslated(), check_same_thread=False)
+        lock_conn.execute("BEGIN EXCLUSIVE")
+        unlock = threading.Timer(0.3, lock_conn.rollback)
+        unlock.start()
+
+        # act
+        uow = UnitOfWork(self.db_path)
+        with uow:
+            uow.execute(qry.UPDATE_ROM_LAUNCH_STATS, datetime.datetime.now(), 'rom_0')
+            uow.commit()
+
+        # assert
+        unlock.join()
+        lock_conn.close()
+        self.assertEqual(self.total_launch_count(), 1)
+
+    @patch.object(UnitOfWork, 'BUSY_TIMEOUT', 0.05)
+    @patch.object(UnitOfWork, 'BUSY_RETRIES', 0)
+    def test_fails_when_database_stays_locked(self):
+        # arrange
+        lock_conn = sqlite3.connect(self.db_path.getPathTranslated())
+        lock_conn.execute("BEGIN EXCLUSIVE")
+
+        # act
+        uow = UnitOfWork(self.db_path)
+        with self.assertRaises(sqlite3.OperationalError):
+            with uow:
+                uow.execute(qry.UPDATE_ROM_LAUNCH_STATS, datetime.datetime.now(), 'rom_0')
+
+        # assert
+        lock_conn.rollback()
+        lock_conn.close()
+        self.assertEqual(self.total_launch_count(), 0)
+
+    def test_writes_are_forwarded_until_they_must_be_read(self):
+        # arrange
+        forwarded = []
+        
+        # act
+        with patch.object(UnitOfWork, 'WRITE_FORWARDER', forwarded.extend):
+            uow = UnitOfWork(self.db_path)
+            with uow:
+                uow.execute(qry.SELECT_ROM, 'rom_0')
+                uow.execute(qry.UPDATE_ROM_LAUNCH_STATS, '2024-01-01 10:00:00', 'rom_0')
+                uow.commit()
+            forwarded_count = self.total_launch_count()
+
+            uow = UnitOfWork(self.db_path)
+            with uow:
+                uow.execute(qry.UPDATE_ROM_LAUNCH_STATS, '2024-01-01 10:00:00', 'rom_1')
+                uow.execute(qry.SELECT_ROM, 'rom_1')
+                launched_rom = uow.single_result()
+                uow.commit()
+
+        # assert
+        self.assertEqual(forwarded, [[qry.UPDATE_ROM_LAUNCH_STATS, ['2024-01-01 10:00:00', 'rom_0']]])
+        self.assertEqual(forwarded_count, 0)
+        self.assertEqual(launched_rom['launch_count'], 1)
+        self.assertEqual(self.total_launch_count(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
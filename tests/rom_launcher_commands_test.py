@@ -0,0 +1,210 @@
+import sys
+import unittest
+import json
+import time
+import sqlite3
+
+import logging
+
+from unittest.mock import patch
+
+import tests.fake_routing
+
+module = type(sys)('routing')
+module.Plugin = tests.fake_routing.Plugin
+sys.modules['routing'] = module
+
+from tests.fixtures import DatabaseTestCase, benchmark
+from resources.lib import apiqueries
+from resources.lib.repositories import UnitOfWork, ROMsRepository, ROMCollectionRepository, SourcesRepository
+from resources.lib.repositories import LaunchersRepository
+from resources.lib.commands import rom_launcher_commands as target
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(format = '%(asctime)s %(module)s %(levelname)s: %(message)s',
+                    datefmt = '%m/%d/%Y %I:%M:%S %p', level = logging.INFO)
+
+
+class Test_rom_launch_plans(DatabaseTestCase):
+
+    def create_library(self, collections_per_rom: int = 3, roms_per_collection: int = 10):
+        conn = sqlite3.connect(self.db_path.getPathTranslated())
+        conn.execute("INSERT INTO akl_addon (id, name, addon_id, version, addon_type) VALUES ('addon_1', 'Launcher', 'script.launcher', '1.0', 'LAUNCHER')")
+        conn.executemany("INSERT INTO launchers (id, name, akl_addon_id, settings) VALUES (?,?,'addon_1',?)",
+                         ((f'launcher_{name}', f'Launcher {name}', json.dumps({'application': f'/bin/{name}'}))
+                          for name in ['rom', 'source', 'collection']))
+        conn.execute("INSERT INTO sources (id, name, akl_addon_id, settings) VALUES ('src_1', 'Source', 'addon_1', '{}')")
+        conn.execute("INSERT INTO source_launchers (source_id, launcher_id, is_default) VALUES ('src_1', 'launcher_source', 1)")
+
+        for c in range(collections_per_rom):
+            conn.execute("INSERT INTO metadata (id) VALUES (?)", (f'meta_col_{c}',))
+            conn.execute("INSERT INTO romcollections (id, name, metadata_id) VALUES (?,?,?)", (f'col_{c}', f'Collection {c}', f'meta_col_{c}'))
+        conn.execute("INSERT INTO romcollection_launchers (romcollection_id, launcher_id, is_default) VALUES ('col_0', 'launcher_collection', 0)")
+
+        for i in range(roms_per_collection):
+            conn.execute("INSERT INTO metadata (id, genre) VALUES (?, 'Platform')", (f'meta_{i}',))
+            conn.execute("INSERT INTO roms (id, name, metadata_id, scanned_by_id, scanned_data) VALUES (?,?,?,'src_1',?)",
+                         (f'rom_{i}', f'Game {i}', f'meta_{i}', json.dumps({'file': f'/roms/game_{i}.zip'})))
+            conn.execute("INSERT INTO assets (id, filepath, asset_type) VALUES (?,?,'ASSET_BOXFRONT_ID')", (f'asset_{i}', f'/art/game_{i}.png'))
+            conn.execute("INSERT INTO rom_assets (rom_id, asset_id) VALUES (?,?)", (f'rom_{i}', f'asset_{i}'))
+            conn.executemany("INSERT INTO roms_in_romcollection (rom_id, romcollection_id) VALUES (?,?)",
+                             ((f'rom_{i}', f'col_{c}') for c in range(collections_per_rom)))
+        conn.execute("INSERT INTO rom_launchers (rom_id, launcher_id, is_default) VALUES ('rom_1', 'launcher_rom', 0)")
+        conn.commit()
+        conn.close()
+
+    def find_launch_plan(self, rom_id: str):
+        uow = UnitOfWork(self.db_path)
+        with uow:
+            return ROMsRepository(uow).find_launch_plan(rom_id)
+
+    def stub_launcher_addon(self, addon_id: str, launch_args: dict):
+        # Mimics a launcher addon, which queries the ROM and its launcher settings from the webservice.
+        rom_id = launch_args['--rom_id']
+        rom_data = json.loads(apiqueries.qry_get_rom(rom_id))
+        launcher_settings = json.loads(apiqueries.qry_get_rom_launcher_settings(rom_id, launch_args['--akl_addon_id']))
+        self.launched.append((rom_data['id'], launcher_settings['application']))
+
+    def launch_with_full_loads(self, rom_id: str):
+        # Launch path as it was before launch plans: full aggregate loads for every launch and query.
+        uow = UnitOfWork(self.db_path)
+        with uow:
+            rom = ROMsRepository(uow).find_rom(rom_id)
+            romcollections = ROMCollectionRepository(uow).find_romcollections_by_rom(rom_id)
+            source = SourcesRepository(uow).find(rom.get_scanned_by())
+            launchers = [*rom.get_launchers(), *source.get_launchers()]
+            for romcollection in romcollections:
+                launchers.extend(romcollection.get_launchers())
+        launcher = next(launcher for launcher in launchers if launcher.is_default())
+        with uow:
+            rom_data = ROMsRepository(uow).find_rom(rom_id).create_dto().get_data_dic()
+        with uow:
+            launcher_settings = LaunchersRepository(uow).find(launcher.get_id()).get_settings()
+        self.launched.append((rom_data['id'], launcher_settings['application']))
+
+    @patch('resources.lib.commands.rom_launcher_commands.AppMediator')
+    @patch('resources.lib.commands.rom_launcher_commands.kodi')
+    @patch('resources.lib.domain.kodi')
+    def test_launching_rom_creates_launch_plan_once(self, domain_kodi_mock, kodi_mock, mediator_mock):
+        # arrange
+        self.create_library()
+        self.launched = []
+        domain_kodi_mock.run_script.side_effect = self.stub_launcher_addon
+        kodi_mock.OrdDictionaryDialog.return_value.select.side_effect = \
+            lambda title, options, preselect=None: preselect
+
+        # act
+        target.cmd_execute_rom_with_launcher({'rom_id': 'rom_1'})
+        target.cmd_execute_rom_with_launcher({'rom_id': 'rom_1'})
+
+        # assert
+        launch_plan = self.find_launch_plan('rom_1')
+        self.assertEqual([launcher.get_id() for launcher in launch_plan.get_launchers()],
+                         ['launcher_rom', 'launcher_source', 'launcher_collection'])
+        self.assertEqual(launch_plan.get_default_launcher_id(), 'launcher_source')
+        self.assertEqual(launch_plan.get_rom().get_scanned_data_element('file'), '/roms/game_1.zip')
+        self.assertEqual(self.launched, [('rom_1', '/bin/source'), ('rom_1', '/bin/source')])
+        self.assertEqual(self.query("SELECT COUNT(*) FROM rom_launch_plans"), [(1,)])
+        mediator_mock.async_cmd.assert_called_with('ROM_WAS_LAUNCHED', {'rom_id': 'rom_1'})
+
+    def test_launch_plans_are_removed_when_launchers_or_collections_change(self):
+        # arrange
+        self.create_library()
+
+        def create_plans():
+            for i in range(3):
+                apiqueries.qry_get_rom(f'rom_{i}')
+
+        # act and assert
+        create_plans()
+        self.query("UPDATE roms SET launch_count = 5, is_favourite = 1 WHERE id = 'rom_0'")
+        self.assertEqual(self.query("SELECT COUNT(*) FROM rom_launch_plans"), [(3,)])
+        self.assertEqual(self.find_launch_plan('rom_0').get_rom_dto_data()['launch_count'], 5)
+
+        self.query("UPDATE launchers SET settings = '{}' WHERE id = 'launcher_collection'")
+        self.assertEqual(self.query("SELECT COUNT(*) FROM rom_launch_plans"), [(0,)])
+
+        create_plans()
+        self.query("DELETE FROM roms_in_romcollection WHERE rom_id = 'rom_2' AND romcollection_id = 'col_0'")
+        self.assertEqual(self.query("SELECT rom_id FROM rom_launch_plans ORDER BY rom_id"), [('rom_0',), ('rom_1',)])
+
+        self.query("INSERT INTO romcollection_launchers (romcollection_id, launcher_id) VALUES ('col_1', 'launcher_rom')")
+        self.assertEqual(self.query("SELECT COUNT(*) FROM rom_launch_plans"), [(0,)])
+
+        create_plans()
+        self.query("UPDATE roms SET name = 'Renamed' WHERE id = 'rom_0'")
+        self.query("UPDATE metadata SET genre = 'Other' WHERE id = 'meta_1'")
+        self.assertEqual(self.query("SELECT rom_id FROM rom_launch_plans"), [('rom_2',)])
+        self.assertEqual(json.loads(apiqueries.qry_get_rom('rom_0'))['m_name'], 'Renamed')
+
+    @patch.object(UnitOfWork, 'BUSY_RETRIES', 0)
+    @patch.object(UnitOfWork, 'BUSY_TIMEOUT', 0.1)
+    def test_launch_plan_is_returned_when_database_is_locked(self):
+        # arrange
+        self.create_library()
+        conn = sqlite3.connect(self.db_path.getPathTranslated())
+        conn.execute("BEGIN IMMEDIATE")
+
+        # act
+        try:
+            rom_data = apiqueries.qry_get_rom('rom_1')
+            launcher_settings = apiqueries.qry_get_rom_launcher_settings('rom_1', 'launcher_source')
+        finally:
+            conn.rollback()
+            conn.close()
+
+        # assert
+        self.assertEqual(json.loads(rom_data)['id'], 'rom_1')
+        self.assertEqual(json.loads(launcher_settings)['application'], '/bin/source')
+        self.assertEqual(self.query("SELECT COUNT(*) FROM rom_launch_plans"), [(0,)])
+
+    def test_launch_plans_are_removed_with_their_rom(self):
+        # arrange
+        self.create_library()
+        apiqueries.qry_get_rom('rom_0')
+        apiqueries.qry_get_rom('rom_1')
+
+        # act
+        self.query("DELETE FROM roms WHERE id = 'rom_0'")
+
+        # assert
+        self.assertEqual(self.query("SELECT rom_id FROM rom_launch_plans"), [('rom_1',)])
+
+    @benchmark
+    @patch('resources.lib.commands.rom_launcher_commands.AppMediator')
+    @patch('resources.lib.commands.rom_launcher_commands.kodi')
+    @patch('resources.lib.domain.kodi')
+    def test_benchmark_time_to_launcher(self, domain_kodi_mock, kodi_mock, mediator_mock):
+        # arrange
+        self.create_library(collections_per_rom=25, roms_per_collection=200)
+        self.launched = []
+        domain_kodi_mock.run_script.side_effect = self.stub_launcher_addon
+        kodi_mock.OrdDictionaryDialog.return_value.select.side_effect = \
+            lambda title, options, preselect=None: preselect
+        launches = 20
+
+        # act
+        start = time.perf_counter()
+        for _ in range(launches):
+            self.launch_with_full_loads('rom_1')
+        full_loads_duration = (time.perf_counter() - start) / launches
+
+        start = time.perf_counter()
+        target.cmd_execute_rom_with_launcher({'rom_id': 'rom_1'})
+        first_launch_duration = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(launches):
+            target.cmd_execute_rom_with_launcher({'rom_id': 'rom_1'})
+        launch_plan_duration = (time.perf_counter() - start) / launches
+
+        # assert
+        logger.info(f'Time to launcher for a ROM in 25 collections: full loads {full_loads_duration * 1000:.1f}ms, '
+                    f'first launch {first_launch_duration * 1000:.1f}ms, '
+                    f'with launch plan {launch_plan_duration * 1000:.1f}ms')
+        self.assertEqual(set(self.launched), {('rom_1', '/bin/source')})
+        self.assertLess(launch_plan_duration, full_loads_duration)
+
+
+if __name__ == '__main__':
+    unittest.main()
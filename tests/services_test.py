@@ -1,6 +1,9 @@
 import sys
 import unittest, os
 import unittest.mock
+import json
+import time
+import threading
 from unittest.mock import MagicMock, patch
 
 import logging
@@ -13,9 +16,11 @@ module = type(sys)('routing')
 module.Plugin = tests.fake_routing.Plugin
 sys.modules['routing'] = module
 
+from tests.fixtures import benchmark
 from resources.lib import globals
 from resources.lib.services import AppService
 from resources.lib.repositories import UnitOfWork
+from resources.lib.commands.mediator import AppMediator
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(format = '%(asctime)s %(module)s %(levelname)s: %(message)s',
@@ -78,3 +83,109 @@ class Test_services(unittest.TestCase):
         self.assertEqual(actual[4].getPath(), '1.3.0_001.sql')
         self.assertEqual(actual[5].getPath(), '1.3.0_002.sql')
         self.assertEqual(actual[6].getPath(), '1.3.0_004.sql')
+
+
+class Test_service_loop(unittest.TestCase):
+
+    CHAIN_LENGTH = 5
+
+    @patch('resources.lib.services.globals.g_bootstrap_instances', autospec=True)
+    def setUp(self, bootstrap_mock):
+        self.service = AppService()
+        self.abort = threading.Event()
+        self.service.monitor.abortRequested = self.abort.is_set
+        self.service.monitor.waitForAbort = lambda timeout=None: self.abort.wait(timeout)
+        self.chain_done = threading.Event()
+        AppMediator.register_command('TEST_CHAIN_STEP', self.chain_step)
+
+        # delivers async commands like the Kodi event bus does, as notification on another thread
+        def deliver_event(command, data):
+            threading.Thread(target=self.service.monitor.onNotification,
+                             args=(self.service.monitor.addon_id, f'Other.{command}', json.dumps(data))).start()
+        self.event_patcher = patch('resources.lib.commands.mediator.kodi.event', side_effect=deliver_event)
+        self.event_mock = self.event_patcher.start()
+
+        self.loop = threading.Thread(target=self.service._process_service_actions)
+        self.loop.start()
+
+    def tearDown(self):
+        self.abort.set()
+        self.loop.join(2)
+        self.event_patcher.stop()
+        AppMediator.set_async_dispatcher(None)
+        AppMediator._commands.pop('TEST_CHAIN_STEP', None)
+
+    def chain_step(self, args):
+        if args['step'] >= args['length']:
+            self.chain_done.set()
+            return
+        AppMediator.async_cmd('TEST_CHAIN_STEP', {'step': args['step'] + 1, 'length': args['length']})
+
+    def run_chain(self, length: int) -> float:
+        self.chain_done.clear()
+        start = time.perf_counter()
+        AppMediator.async_cmd('TEST_CHAIN_STEP', {'step': 1, 'length': length})
+        self.assertTrue(self.chain_done.wait(10))
+        return time.perf_counter() - start
+
+    def test_chain_of_async_commands_runs_without_polling_delays(self):
+        # arrange
+        AppMediator.set_async_dispatcher(None)
+
+        # act
+        duration = self.run_chain(self.CHAIN_LENGTH)
+
+        # assert
+        logger.info(f'Chain of {self.CHAIN_LENGTH} async commands through events finished in {duration * 1000:.1f}ms')
+        self.assertEqual(self.event_mock.call_count, self.CHAIN_LENGTH)
+
+    def test_async_commands_within_service_are_queued_directly(self):
+        # act
+        self.run_chain(self.CHAIN_LENGTH)
+
+        # assert
+        self.assertEqual(self.event_mock.call_count, 0)
+
+    @benchmark
+    def test_benchmark_async_command_latency(self):
+        # act
+        in_process_duration = self.run_chain(self.CHAIN_LENGTH)
+        AppMediator.set_async_dispatcher(None)
+        event_duration = self.run_chain(self.CHAIN_LENGTH)
+
+        start = time.perf_counter()
+        self.abort.set()
+        self.loop.join(2)
+        abort_duration = time.perf_counter() - start
+
+        # assert
+        logger.info(f'Chain of {self.CHAIN_LENGTH} async commands: through events {event_duration * 1000:.1f}ms, '
+                    f'in process {in_process_duration * 1000:.1f}ms. Service loop ended {abort_duration * 1000:.1f}ms after abort')
+        self.assertLess(event_duration, 0.5)
+        self.assertLess(in_process_duration, 0.5)
+        self.assertLess(abort_duration, 0.5)
+
+    @benchmark
+    def test_benchmark_chained_async_command_dispatch(self):
+        # arrange
+        chain_length = 500
+        AppMediator.set_async_dispatcher(None)
+        
+        # act
+        event_duration = self.run_chain(chain_length)
+        AppMediator.set_async_dispatcher(self.service._queue_service_action)
+        in_process_duration = self.run_chain(chain_length)
+
+        # assert
+        logger.info(f'Dispatching {chain_length} chained async commands: through events {event_duration * 1000:.1f}ms '
+                    f'({chain_length / event_duration:.0f}/s), in process {in_process_duration * 1000:.1f}ms '
+                    f'({chain_length / in_process_duration:.0f}/s)')
+        self.assertLess(in_process_duration, event_duration)
+
+    def test_service_loop_ends_right_after_abort(self):
+        # act
+        self.abort.set()
+        self.loop.join(2)
+
+        # assert
+        self.assertFalse(self.loop.is_alive())
@@ -0,0 +1,53 @@
+import sys
+import unittest
+import os
+import json
+
+import logging
+
+from unittest.mock import patch, MagicMock
+
+import tests.fake_routing
+
+module = type(sys)('routing')
+module.Plugin = tests.fake_routing.Plugin
+sys.modules['routing'] = module
+
+from tests.fixtures import DatabaseTestCase
+from resources.lib.domain import ROM
+from resources.lib.commands import source_commands as target
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(format = '%(asctime)s %(module)s %(levelname)s: %(message)s',
+                    datefmt = '%m/%d/%Y %I:%M:%S %p', level = logging.INFO)
+
+class Test_source_commands(DatabaseTestCase):
+
+    @patch('resources.lib.commands.source_commands.IMPORT_BATCH_SIZE', 1)
+    @patch('resources.lib.commands.source_commands.AppMediator')
+    @patch('resources.lib.commands.source_commands.kodi')
+    def test_importing_invalid_roms_json_imports_nothing(self, kodi_mock: MagicMock, mediator_mock: MagicMock):
+        # arrange
+        self.create_source('src_1')
+        roms = []
+        for idx in range(3):
+            rom = ROM()
+            rom.set_name(f'Game {idx}')
+            roms.append(rom.copy_of_data_dic())
+        json_path = os.path.join(self.test_dir, 'roms.json')
+        with open(json_path, 'w', encoding='utf-8') as json_file:
+            # the ROMs before the truncated one are stored in batches already
+            json_file.write('[' + ', '.join(json.dumps(rom) for rom in roms[:3]) + ', {"id": ')
+        kodi_mock.browse.return_value = [json_path]
+
+        # act
+        target.cmd_import_roms_json({'source_id': 'src_1'})
+
+        # assert
+        self.assertEqual(self.query("SELECT COUNT(*) FROM roms")[0][0], 0)
+        kodi_mock.notify_error.assert_called_once()
+        mediator_mock.async_cmd.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
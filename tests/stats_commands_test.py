@@ -0,0 +1,261 @@
+import sys
+import unittest
+import os
+import time
+import sqlite3
+
+import logging
+
+from unittest.mock import patch
+
+import tests.fake_routing
+
+module = type(sys)('routing')
+module.Plugin = tests.fake_routing.Plugin
+sys.modules['routing'] = module
+
+from akl import constants
+from akl.utils import io
+
+from tests.fixtures import DatabaseTestCase, benchmark
+from resources.lib.repositories import UnitOfWork, ViewRepository, StatisticsRepository
+from resources.lib.repositories import CategoryRepository, ROMCollectionRepository
+from resources.lib.commands import stats_commands as target
+from resources.lib.commands import report_commands
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(format = '%(asctime)s %(module)s %(levelname)s: %(message)s',
+                    datefmt = '%m/%d/%Y %I:%M:%S %p', level = logging.INFO)
+
+class Test_stats_commands(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.paths.GENERATED_VIEWS_DIR = io.FileName(self.test_dir)
+        self.paths.VIEWS_INDEX_FILE_PATH = io.FileName(os.path.join(self.test_dir, 'views_index.json'))
+
+        conn = sqlite3.connect(self.db_path.getPathTranslated())
+        conn.executemany("INSERT INTO metadata (id) VALUES (?)", ((f'meta_{i}',) for i in range(5)))
+        conn.executemany("INSERT INTO roms (id, name, metadata_id, launch_count) VALUES (?,?,?,?)",
+                         ((f'rom_{i}', f'Game {i}', f'meta_{i}', i * 2) for i in range(5)))
+        conn.commit()
+        conn.close()
+
+    def store_vcollection_view(self, vcollection_id: str, item_ids: list):
+        ViewRepository(self.paths).store_view(vcollection_id, constants.OBJ_COLLECTION_VIRTUAL, {
+            'id': vcollection_id, 'items': [{'id': item_id} for item_id in item_ids]})
+
+    def vcollection_view_item_ids(self, vcollection_id: str) -> list:
+        view_data = ViewRepository(self.paths).find_items(vcollection_id, constants.OBJ_COLLECTION_VIRTUAL)
+        return [item['id'] for item in view_data['items']]
+
+    @patch('resources.lib.commands.view_rendering_commands.AppMediator')
+    def test_launching_rom_updates_stats_and_patches_played_views(self, mediator_mock):
+        # arrange
+        self.store_vcollection_view(constants.VCOLLECTION_RECENT_ID, ['rom_1', 'rom_4', 'rom_2'])
+        self.store_vcollection_view(constants.VCOLLECTION_MOST_PLAYED_ID, ['rom_4', 'rom_3', 'rom_2', 'rom_1'])
+
+        # act
+        target.cmd_process_launching_of_rom({'rom_id': 'rom_2'})
+        target.cmd_process_launching_of_rom({'rom_id': 'rom_2'})
+        target.cmd_process_launching_of_rom({'rom_id': 'rom_2'})
+
+        # assert
+        self.assertEqual(self.query("SELECT launch_count FROM roms WHERE id = 'rom_2'"), [(7,)])
+        self.assertEqual(self.query("SELECT COUNT(*) FROM roms WHERE last_launch_timestamp IS NOT NULL"), [(1,)])
+        self.assertEqual(self.vcollection_view_item_ids(constants.VCOLLECTION_RECENT_ID), ['rom_2', 'rom_1', 'rom_4'])
+        self.assertEqual(self.vcollection_view_item_ids(constants.VCOLLECTION_MOST_PLAYED_ID), ['rom_4', 'rom_2', 'rom_3', 'rom_1'])
+        mediator_mock.async_cmd.assert_not_called()
+
+    @patch('resources.lib.commands.view_rendering_commands.AppMediator')
+    def test_launching_rom_renders_missing_views_completely(self, mediator_mock):
+        # act
+        target.cmd_process_launching_of_rom({'rom_id': 'rom_0'})
+
+        # assert
+        self.assertEqual(self.query("SELECT launch_count FROM roms WHERE id = 'rom_0'"), [(1,)])
+        mediator_mock.async_cmd.assert_any_call('RENDER_VCOLLECTION_VIEW', {'vcollection_id': constants.VCOLLECTION_RECENT_ID})
+        mediator_mock.async_cmd.assert_any_call('RENDER_VCOLLECTION_VIEW', {'vcollection_id': constants.VCOLLECTION_MOST_PLAYED_ID})
+
+
+class Test_library_stats(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.paths.GENERATED_VIEWS_DIR = io.FileName(self.test_dir)
+        self.paths.VIEWS_INDEX_FILE_PATH = io.FileName(os.path.join(self.test_dir, 'views_index.json'))
+
+    def create_library(self, num_of_roms: int, num_of_collections: int = 6):
+        conn = sqlite3.connect(self.db_path.getPathTranslated())
+        conn.execute("INSERT INTO akl_addon (id, name, addon_id, version, addon_type) VALUES ('addon_1', 'Scanner', 'script.scanner', '1.0', 'SCANNER')")
+        conn.executemany("INSERT INTO sources (id, name, platform, akl_addon_id) VALUES (?,?,?,'addon_1')",
+                         [('src_snes', 'SNES roms', 'Nintendo SNES'), ('src_md', 'Megadrive roms', 'Sega Megadrive')])
+        conn.executemany("INSERT INTO metadata (id) VALUES (?)", ((f'meta_cat_{c}',) for c in range(2)))
+        conn.executemany("INSERT INTO categories (id, name, metadata_id) VALUES (?,?,?)",
+                         ((f'cat_{c}', f'Category {c}', f'meta_cat_{c}') for c in range(2)))
+        conn.executemany("INSERT INTO metadata (id) VALUES (?)", ((f'meta_col_{c}',) for c in range(num_of_collections)))
+        conn.executemany("INSERT INTO romcollections (id, name, parent_id, metadata_id) VALUES (?,?,?,?)",
+                         ((f'col_{c}', f'Collection {c}', f'cat_{c % 3}' if c % 3 < 2 else None, f'meta_col_{c}')
+                          for c in range(num_of_collections)))
+        conn.executemany("INSERT INTO metadata (id, year, genre) VALUES (?,?,?)",
+                         ((f'meta_{i}', str(1990 + i % 5), f'Genre {i % 4}' if i % 7 else None) for i in range(num_of_roms)))
+        conn.executemany("INSERT INTO roms (id, name, metadata_id, scanned_by_id, platform, launch_count, is_favourite) VALUES (?,?,?,?,?,?,?)",
+                         ((f'rom_{i}', f'Game {i}', f'meta_{i}', 'src_snes' if i % 2 else 'src_md',
+                           'Nintendo SNES Hack' if i % 11 == 0 else None, i % 3, int(i % 5 == 0)) for i in range(num_of_roms)))
+        conn.executemany("INSERT INTO roms_in_romcollection (rom_id, romcollection_id) VALUES (?,?)",
+                         ((f'rom_{i}', f'col_{c}') for i in range(num_of_roms) for c in range(num_of_collections) if (i + c) % 3 == 0))
+        conn.executemany("INSERT INTO roms_in_category (rom_id, category_id) VALUES (?,?)",
+                         ((f'rom_{i}', 'cat_1') for i in range(0, num_of_roms, 4)))
+        rom_assets = [(f'rom_{i}', asset_type) for i in range(num_of_roms)
+                      for asset_type in ['ASSET_BOXFRONT_ID', 'ASSET_SNAP_ID'] if i % 2 == 0 or asset_type == 'ASSET_BOXFRONT_ID']
+        conn.executemany("INSERT INTO assets (id, filepath, asset_type) VALUES (?,?,?)",
+                         ((f'{rom_id}_{asset_type}', f'/art/{asset_type}/{rom_id}.png', asset_type) for rom_id, asset_type in rom_assets))
+        conn.executemany("INSERT INTO rom_assets (rom_id, asset_id) VALUES (?,?)",
+                         ((rom_id, f'{rom_id}_{asset_type}') for rom_id, asset_type in rom_assets))
+        conn.commit()
+        conn.close()
+
+    def refresh_stats(self) -> list:
+        uow = UnitOfWork(self.db_path)
+        with uow:
+            refreshed_dimensions = StatisticsRepository(uow).refresh_stats()
+            uow.commit()
+        return refreshed_dimensions
+
+    def stored_stats(self) -> list:
+        return self.query("SELECT * FROM library_stats ORDER BY dimension, dimension_key") + \
+            self.query("SELECT * FROM library_asset_stats ORDER BY dimension, dimension_key, asset_type")
+
+    def aggregated_stats(self) -> list:
+        # the stats as a complete aggregation from scratch
+        self.query("INSERT OR IGNORE INTO library_stats_dirty (dimension) VALUES ('library'), ('category'), "
+                     "('romcollection'), ('source'), ('platform'), ('genre'), ('year')")
+        self.refresh_stats()
+        return self.stored_stats()
+
+    def test_aggregating_stats_by_every_dimension(self):
+        # arrange
+        self.create_library(num_of_roms=60)
+
+        # act
+        refreshed_dimensions = self.refresh_stats()
+        uow = UnitOfWork(self.db_path)
+        with uow:
+            repository = StatisticsRepository(uow)
+            totals = repository.find_totals()
+            sources = {stats['name']: stats['num_roms'] for stats in repository.find_stats('source')}
+            platforms = {stats['name']: stats['num_roms'] for stats in repository.find_stats('platform')}
+            genres = {stats['name']: stats['num_roms'] for stats in repository.find_stats('genre')}
+            categories = {stats['name']: stats['num_roms'] for stats in repository.find_stats('category')}
+            collections = {stats['name']: stats['num_roms'] for stats in repository.find_romcollection_stats()}
+            library_assets = repository.find_asset_stats('library')['']
+
+        # assert
+        self.assertEqual(refreshed_dimensions, StatisticsRepository.DIMENSIONS)
+        self.assertEqual(totals['num_roms'], 60)
+        self.assertEqual(totals['launch_count'], sum(i % 3 for i in range(60)))
+        self.assertEqual(totals['num_launched'], len([i for i in range(60) if i % 3]))
+        self.assertEqual(totals['num_favourites'], 12)
+        self.assertEqual(sources, {'Megadrive roms': 30, 'SNES roms': 30})
+        self.assertEqual(platforms, {'Nintendo SNES': 27, 'Nintendo SNES Hack': 6, 'Sega Megadrive': 27})
+        self.assertEqual(genres[''], len([i for i in range(60) if i % 7 == 0]))
+        self.assertEqual(collections, {f'Collection {c}': 20 for c in range(6)})
+        # ROMs of collections 0 and 3, and the ROMs directly in the category
+        self.assertEqual(categories['Category 1'], len([i for i in range(60) if i % 3 == 2 or i % 4 == 0]))
+        self.assertEqual(library_assets, {'ASSET_BOXFRONT_ID': 60, 'ASSET_SNAP_ID': 30})
+        self.assertEqual(self.refresh_stats(), [])
+
+    @patch('resources.lib.commands.view_rendering_commands.AppMediator')
+    def test_only_changed_dimensions_are_aggregated_again(self, mediator_mock):
+        # arrange
+        self.create_library(num_of_roms=60)
+        self.refresh_stats()
+
+        # act and assert
+        target.cmd_process_launching_of_rom({'rom_id': 'rom_4'})
+        target.cmd_add_rom_to_favourites({'rom_id': 'rom_4'})
+        self.assertEqual(self.refresh_stats(), [])
+
+        self.query("DELETE FROM roms_in_romcollection WHERE rom_id = 'rom_3' AND romcollection_id = 'col_0'")
+        self.assertEqual(self.refresh_stats(), ['category', 'romcollection'])
+
+        self.query("UPDATE metadata SET genre = 'Genre 9' WHERE id = 'meta_5'")
+        self.query("UPDATE metadata SET plot = 'Changed' WHERE id = 'meta_col_1'")
+        self.assertEqual(self.refresh_stats(), ['genre', 'year'])
+
+        self.query("UPDATE sources SET platform = 'Nintendo Super Famicom' WHERE id = 'src_snes'")
+        self.assertEqual(self.refresh_stats(), ['platform'])
+
+        self.query("DELETE FROM rom_assets WHERE rom_id = 'rom_8'")
+        self.assertEqual(self.refresh_stats(), StatisticsRepository.DIMENSIONS)
+
+        self.query("DELETE FROM roms WHERE id = 'rom_10'")
+        self.query("UPDATE roms SET launch_count = launch_count + 3 WHERE id IN ('rom_2', 'rom_3', 'rom_9')")
+        self.refresh_stats()
+
+        incremental_stats = self.stored_stats()
+        self.assertEqual(incremental_stats, self.aggregated_stats())
+        # rom_4 launched and favourite, rom_10 (launched and favourite) deleted, rom_3 and rom_9 launched for the first time
+        self.assertIn(('library', '', 59, 41, sum(i % 3 for i in range(60)) + 1 - 1 + 9, 12), incremental_stats)
+
+    @patch('resources.lib.commands.report_commands.kodi')
+    def test_global_rom_stats_report(self, kodi_mock):
+        # arrange
+        self.create_library(num_of_roms=60)
+
+        # act
+        report_commands.cmd_report_global_rom_stats({})
+
+        # assert
+        report_text = kodi_mock.display_text_window_mono.call_args[0][1]
+        self.assertIn('60 ROMs', report_text)
+        self.assertIn('Collection 5', report_text)
+
+    @benchmark
+    @patch('resources.lib.commands.report_commands.kodi')
+    def test_benchmark_global_rom_stats_report(self, kodi_mock):
+        # arrange
+        self.create_library(num_of_roms=10000, num_of_collections=60)
+        reports = 5
+
+        def report_with_collection_walk():
+            # the report as it was before the stats tables: a walk over all categories and collections
+            uow = UnitOfWork(self.db_path)
+            with uow:
+                categories_repository = CategoryRepository(uow)
+                collections_repository = ROMCollectionRepository(uow)
+                rows = []
+                for category in [*categories_repository.find_all_categories()]:
+                    for collection in collections_repository.find_romcollections_by_parent(category.get_id()):
+                        rows.append([category.get_name(), collection.get_name(), str(collection.num_roms())])
+                for collection in collections_repository.find_root_romcollections():
+                    rows.append(['', collection.get_name(), str(collection.num_roms())])
+            return rows
+
+        # act
+        start = time.perf_counter()
+        for _ in range(reports):
+            report_with_collection_walk()
+        walk_duration = (time.perf_counter() - start) / reports
+
+        start = time.perf_counter()
+        report_commands.cmd_report_global_rom_stats({})
+        first_report_duration = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(reports):
+            report_commands.cmd_report_global_rom_stats({})
+        stats_duration = (time.perf_counter() - start) / reports
+
+        # assert
+        logger.info(f'Global ROM stats of 10000 ROMs in 60 collections: collection walk {walk_duration * 1000:.1f}ms, '
+                    f'first report with aggregation {first_report_duration * 1000:.1f}ms, '
+                    f'report from stats {stats_duration * 1000:.1f}ms')
+        report_text = kodi_mock.display_text_window_mono.call_args[0][1]
+        self.assertIn('10000 ROMs', report_text)
+        self.assertIn('Collection 59', report_text)
+        self.assertLess(stats_duration, walk_duration)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,9 @@
 import sys
 import unittest, os
+import time
+import typing
+import json
+import sqlite3
 from unittest.mock import patch, MagicMock, Mock
 
 import logging
@@ -13,9 +17,11 @@ module = type(sys)('routing')
 module.Plugin = tests.fake_routing.Plugin
 sys.modules['routing'] = module
 
-from resources.lib.repositories import UnitOfWork
+from tests.fixtures import DatabaseTestCase, benchmark
+from resources.lib.repositories import UnitOfWork, ROMsRepository, ROMCollectionRepository, SourcesRepository, ViewRepository
+from resources.lib.repositories import CategoryRepository
 from resources.lib.domain import *
-from resources.lib import globals
+from resources.lib import globals, instrumentation
 
 from resources.lib.commands import view_rendering_commands as target
 
@@ -87,4 +93,381 @@ class Test_View_Rendering_Commands(unittest.TestCase):
         
         # assert
         self.assertIsNotNone(Test_View_Rendering_Commands.CREATED_VIEWS)
-        
\ No newline at end of file
+        
+
+class Test_VCategory_Rendering(DatabaseTestCase):
+
+    VCATEGORY_IDS = [constants.VCATEGORY_TITLE_ID, constants.VCATEGORY_GENRE_ID, constants.VCATEGORY_YEARS_ID,
+                     constants.VCATEGORY_DEVELOPER_ID, constants.VCATEGORY_RATING_ID]
+
+    def create_roms(self, amount: int):
+        conn = sqlite3.connect(self.db_path.getPathTranslated())
+        conn.executemany("INSERT INTO metadata (id, year, genre, developer, rating) VALUES (?,?,?,?,?)",
+                         ((f'meta_{i}', str(1980 + i % 30), f'Genre {i % 12}', f'Developer {i % 40}',
+                           None if i % 7 == 0 else i % 10) for i in range(amount)))
+        conn.executemany("INSERT INTO roms (id, name, metadata_id) VALUES (?,?,?)",
+                         ((f'rom_{i}', f'{chr(65 + i % 26)} game {i}', f'meta_{i}') for i in range(amount)))
+        conn.executemany("INSERT INTO assets (id, filepath, asset_type) VALUES (?,?,?)",
+                         ((f'asset_{i}', f'/art/boxfront/game_{i}.png', constants.ASSET_BOXFRONT_ID) for i in range(amount)))
+        conn.executemany("INSERT INTO rom_assets (rom_id, asset_id) VALUES (?,?)",
+                         ((f'rom_{i}', f'asset_{i}') for i in range(amount)))
+        conn.commit()
+        conn.close()
+
+    def render_per_collection(self, uow: UnitOfWork) -> dict:
+        romcollections_repository = ROMCollectionRepository(uow)
+        roms_repository = ROMsRepository(uow)
+        views = {}
+        for vcategory_id in self.VCATEGORY_IDS:
+            for vcollection in romcollections_repository.find_virtualcollections_by_category(vcategory_id):
+                view_data = target._render_romcollection_view(vcollection, roms_repository)
+                views[(vcategory_id, vcollection.get_custom_attribute('collection_value'))] = view_data
+        return views
+
+    def render_single_pass(self, uow: UnitOfWork) -> dict:
+        views = {}
+        views_repository = MagicMock()
+        views_repository.store_virtual_collection_view.side_effect = \
+            lambda vcategory_id, value, view_data: views.__setitem__((vcategory_id, value), view_data)
+        vcategories = [VirtualCategoryFactory.create(vcategory_id) for vcategory_id in self.VCATEGORY_IDS]
+        target._render_vcategory_views(vcategories, ROMsRepository(uow), views_repository)
+        return views
+
+    def test_single_pass_rendering_matches_rendering_per_collection(self):
+        # arrange
+        self.create_roms(300)
+        uow = UnitOfWork(self.db_path)
+
+        # act
+        with uow:
+            expected = self.render_per_collection(uow)
+            actual = self.render_single_pass(uow)
+
+        # assert
+        self.assertEqual(len(actual[(constants.VCATEGORY_GENRE_ID, 'Genre 3')]['items']), 25)
+        self.assertEqual(len(actual[(constants.VCATEGORY_RATING_ID, 'Undefined')]['items']), 43)
+        for key, expected_view in expected.items():
+            if key[1] == 'Undefined':
+                continue
+            self.assertEqual([item['id'] for item in actual[key]['items']],
+                             [item['id'] for item in expected_view['items']], key)
+            self.assertEqual(actual[key]['id'], expected_view['id'])
+
+    @benchmark
+    def test_benchmark_single_pass_rendering(self):
+        # arrange
+        self.create_roms(3000)
+        uow = UnitOfWork(self.db_path)
+
+        # act
+        with uow:
+            start = time.perf_counter()
+            self.render_per_collection(uow)
+            per_collection_duration = time.perf_counter() - start
+
+            start = time.perf_counter()
+            self.render_single_pass(uow)
+            single_pass_duration = time.perf_counter() - start
+
+        # assert
+        logger.info(f'Rendering virtual categories of 3000 roms: per collection {per_collection_duration:.2f}s, '
+                    f'single pass {single_pass_duration:.2f}s')
+        self.assertLess(single_pass_duration, per_collection_duration)
+
+
+class Test_ROM_Views_Patching(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join(self.test_dir, 'db_views'))
+        os.makedirs(os.path.join(self.test_dir, 'db_generated_views'))
+        self.paths.VIEWS_DIR = io.FileName(os.path.join(self.test_dir, 'db_views'))
+        self.paths.GENERATED_VIEWS_DIR = io.FileName(os.path.join(self.test_dir, 'db_generated_views'))
+        self.paths.VIEWS_INDEX_FILE_PATH = io.FileName(os.path.join(self.test_dir, 'views_index.json'))
+
+    def create_paths(self):
+        return globals.AKL_Paths('plugin.tests')
+
+    def create_roms(self, amount: int):
+        self.create_source()
+        conn = sqlite3.connect(self.db_path.getPathTranslated())
+        conn.executemany("INSERT INTO metadata (id, year, genre, developer, rating) VALUES (?,?,?,?,?)",
+                         ((f'meta_{i}', str(1980 + i % 30), f'Genre {i % 3}', f'Developer {i % 40}', i % 10)
+                          for i in range(amount)))
+        conn.executemany("INSERT INTO roms (id, name, metadata_id, scanned_by_id) VALUES (?,?,?,'src_1')",
+                         ((f'rom_{i}', f'{chr(65 + i % 26)} game {i}', f'meta_{i}') for i in range(amount)))
+        conn.commit()
+        conn.close()
+
+    def render_all_views(self):
+        uow = UnitOfWork(self.db_path)
+        with uow:
+            roms_repository = ROMsRepository(uow)
+            views_repository = ViewRepository(self.paths)
+            source = SourcesRepository(uow).find('src_1')
+            views_repository.store_view(source.get_id(), source.get_type(), target._render_source_view(source, roms_repository))
+            vcategories = [VirtualCategoryFactory.create(vcategory_id) for vcategory_id in constants.VCATEGORIES]
+            target._render_vcategory_views(vcategories, roms_repository, views_repository)
+            views_repository.save_items_index()
+
+    def rendered_views(self) -> dict:
+        views = {}
+        for view_dir in [self.paths.VIEWS_DIR, self.paths.GENERATED_VIEWS_DIR]:
+            for file_name in os.listdir(view_dir.getPath()):
+                if file_name.endswith('.json') and (file_name.startswith('collection_') or file_name.startswith('source_')):
+                    views[file_name] = view_dir.pjoin(file_name).readJson()['items']
+        return views
+
+    def update_rom(self, rom_id: str, name: str, genre: str):
+        conn = sqlite3.connect(self.db_path.getPathTranslated())
+        conn.execute("UPDATE roms SET name = ? WHERE id = ?", (name, rom_id))
+        conn.execute("UPDATE metadata SET genre = ? WHERE id = (SELECT metadata_id FROM roms WHERE id = ?)", (genre, rom_id))
+        conn.commit()
+        conn.close()
+
+    @patch('resources.lib.commands.view_rendering_commands.AppMediator')
+    def test_patching_rom_views_matches_rendering_all_views(self, mediator_mock):
+        # arrange
+        self.create_roms(100)
+        self.render_all_views()
+        source_items_before = self.rendered_views()['source_src_1.json']
+        self.update_rom('rom_1', 'Renamed game', 'Genre 2')
+
+        # act
+        target.cmd_render_rom_views({'rom_id': 'rom_1'})
+
+        # assert
+        actual = self.rendered_views()
+        self.render_all_views()
+        expected = self.rendered_views()
+
+        source_items = actual['source_src_1.json']
+        self.assertEqual([item['id'] for item in source_items], [item['id'] for item in source_items_before])
+        self.assertEqual(source_items[1]['name'], 'Renamed game')
+        self.assertEqual(actual.keys(), expected.keys())
+        for view_name, expected_items in expected.items():
+            self.assertEqual(sorted(item['id'] for item in actual[view_name]),
+                             sorted(item['id'] for item in expected_items), view_name)
+            self.assertEqual(sorted(item['name'] for item in actual[view_name]),
+                             sorted(item['name'] for item in expected_items), view_name)
+        mediator_mock.async_cmd.assert_not_called()
+
+        rom_views = ViewRepository(self.paths).find_item_views('rom_1')
+        self.assertEqual(len(rom_views), 1 + len(constants.VCATEGORIES))
+        for view_path, position in rom_views.items():
+            self.assertEqual(io.FileName(view_path).readJson()['items'][position]['id'], 'rom_1')
+
+    @patch('resources.lib.commands.view_rendering_commands.AppMediator')
+    def test_patching_rom_in_view_not_rendered_yet_renders_view(self, mediator_mock):
+        # arrange
+        self.create_roms(100)
+        self.render_all_views()
+        self.update_rom('rom_1', 'A game', 'New genre')
+
+        # act
+        target.cmd_render_rom_views({'rom_id': 'rom_1'})
+
+        # assert
+        mediator_mock.async_cmd.assert_called_once_with('RENDER_VCATEGORY_VIEW', {'vcategory_id': constants.VCATEGORY_GENRE_ID})
+        genre_views = ViewRepository(self.paths).find_item_views('rom_1')
+        self.assertNotIn(ViewRepository(self.paths).get_virtual_collection_file(constants.VCATEGORY_GENRE_ID, 'Genre 1').getPath(),
+                         genre_views)
+
+    @benchmark
+    @patch('resources.lib.commands.view_rendering_commands.AppMediator')
+    def test_benchmark_patching_rom_views(self, mediator_mock):
+        # arrange
+        self.create_roms(10000)
+        self.render_all_views()
+        self.update_rom('rom_1', 'Renamed game', 'Genre 2')
+
+        # act
+        start = time.perf_counter()
+        target.cmd_render_rom_views({'rom_id': 'rom_1'})
+        patch_duration = time.perf_counter() - start
+
+        start = time.perf_counter()
+        self.render_all_views()
+        render_duration = time.perf_counter() - start
+
+        # assert
+        logger.info(f'Updating views of 1 ROM out of 10000 roms: rendering views {render_duration:.2f}s, '
+                    f'patching views {patch_duration:.2f}s')
+        self.assertLess(patch_duration, render_duration)
+
+
+class Test_Category_Tree_Rendering(DatabaseTestCase):
+
+    def create_category_tree(self, depth: int, branches: int, roms_per_category: int):
+        conn = sqlite3.connect(self.db_path.getPathTranslated())
+        parent_ids = [None]
+        category_ids = []
+        for level in range(depth):
+            level_ids = []
+            for parent_id in parent_ids:
+                for branch in range(branches):
+                    category_id = f'{parent_id or "cat"}_{branch}'
+                    conn.execute("INSERT INTO metadata (id) VALUES (?)", (f'meta_{category_id}',))
+                    conn.execute("INSERT INTO categories (id, name, parent_id, metadata_id) VALUES (?,?,?,?)",
+                                 (category_id, f'Category {category_id}', parent_id, f'meta_{category_id}'))
+                    conn.execute("INSERT INTO metadata (id) VALUES (?)", (f'meta_col_{category_id}',))
+                    conn.execute("INSERT INTO romcollections (id, name, parent_id, metadata_id) VALUES (?,?,?,?)",
+                                 (f'col_{category_id}', f'Collection {category_id}', category_id, f'meta_col_{category_id}'))
+                    level_ids.append(category_id)
+            category_ids.extend(level_ids)
+            parent_ids = level_ids
+
+        for category_id in category_ids:
+            for i in range(roms_per_category):
+                rom_id = f'rom_{category_id}_{i}'
+                conn.execute("INSERT INTO metadata (id) VALUES (?)", (f'meta_{rom_id}',))
+                conn.execute("INSERT INTO roms (id, name, metadata_id) VALUES (?,?,?)", (rom_id, f'Game {rom_id}', f'meta_{rom_id}'))
+                conn.execute("INSERT INTO roms_in_category (rom_id, category_id) VALUES (?,?)", (rom_id, category_id))
+                conn.execute("INSERT INTO roms_in_romcollection (rom_id, romcollection_id) VALUES (?,?)", (rom_id, f'col_{category_id}'))
+                conn.execute("INSERT INTO assets (id, filepath, asset_type) VALUES (?,?,?)",
+                             (f'asset_{rom_id}', f'/art/{rom_id}.png', constants.ASSET_BOXFRONT_ID))
+                conn.execute("INSERT INTO rom_assets (rom_id, asset_id) VALUES (?,?)", (rom_id, f'asset_{rom_id}'))
+        conn.commit()
+        conn.close()
+
+    def render_category(self, category_id: str, from_tree: bool) -> typing.Tuple[dict, int]:
+        views = {}
+        views_repository = MagicMock()
+        views_repository.store_view.side_effect = lambda view_id, obj_type, view_data: views.__setitem__(view_id, view_data)
+        uow = UnitOfWork(self.db_path)
+        with uow:
+            categories_repository = CategoryRepository(uow)
+            roms_repository = ROMsRepository(uow)
+            statements_before, _ = instrumentation.get_db_counters()
+            category_node = target._load_category_tree(category_id, categories_repository, roms_repository) if from_tree else None
+            category = category_node.category if from_tree else categories_repository.find_category(category_id)
+            target._render_category_view(category, categories_repository, ROMCollectionRepository(uow), roms_repository,
+                                         views_repository, render_sub_views=True, force_rendering=True,
+                                         category_node=category_node)
+            statements_after, _ = instrumentation.get_db_counters()
+        return views, statements_after - statements_before
+
+    def test_rendering_from_category_tree_matches_rendering_per_category(self):
+        # arrange
+        self.create_category_tree(depth=3, branches=3, roms_per_category=4)
+
+        # act
+        expected, per_category_statements = self.render_category('cat_0', from_tree=False)
+        actual, tree_statements = self.render_category('cat_0', from_tree=True)
+
+        # assert
+        self.assertEqual(len(actual), 13 * 2)
+        self.assertLess(tree_statements, per_category_statements)
+        self.assertEqual(actual.keys(), expected.keys())
+        for view_id, expected_view in expected.items():
+            self.assertEqual([item['id'] for item in actual[view_id]['items']],
+                             [item['id'] for item in expected_view['items']], view_id)
+            self.assertEqual([item['name'] for item in actual[view_id]['items']],
+                             [item['name'] for item in expected_view['items']], view_id)
+            self.assertEqual([item['art'] for item in actual[view_id]['items']],
+                             [item['art'] for item in expected_view['items']], view_id)
+
+    def test_loading_category_tree_uses_fixed_amount_of_queries(self):
+        # arrange
+        self.create_category_tree(depth=4, branches=4, roms_per_category=2)
+        uow = UnitOfWork(self.db_path)
+
+        # act
+        with uow:
+            statements_before, _ = instrumentation.get_db_counters()
+            category_tree = target._load_category_tree(None, CategoryRepository(uow), ROMsRepository(uow))
+            statements_after, _ = instrumentation.get_db_counters()
+
+        # assert
+        nodes = list(category_tree.walk())
+        self.assertEqual(len(nodes), 1 + 4 + 16 + 64 + 256)
+        self.assertEqual(statements_after - statements_before, 12)
+        self.assertEqual([node.category.get_id() for node in category_tree.sub_categories], ['cat_0', 'cat_1', 'cat_2', 'cat_3'])
+        self.assertEqual(len(nodes[-1].roms), 2)
+        self.assertEqual(len(nodes[-1].romcollections), 1)
+
+    @benchmark
+    def test_benchmark_rendering_from_category_tree(self):
+        # arrange
+        self.create_category_tree(depth=4, branches=4, roms_per_category=5)
+
+        def fastest_render(from_tree: bool) -> typing.Tuple[float, int]:
+            durations = []
+            for _ in range(5):
+                start = time.perf_counter()
+                _, statements = self.render_category('cat_0', from_tree=from_tree)
+                durations.append(time.perf_counter() - start)
+            return min(durations), statements
+
+        # act
+        per_category_duration, per_category_statements = fastest_render(from_tree=False)
+        tree_duration, tree_statements = fastest_render(from_tree=True)
+
+        # assert
+        logger.info(f'Rendering a category tree of 85 categories: per category {per_category_duration:.2f}s '
+                    f'({per_category_statements} queries), from tree {tree_duration:.2f}s ({tree_statements} queries)')
+        self.assertLess(tree_statements, per_category_statements)
+        self.assertLess(tree_duration, per_category_duration)
+
+
+class Test_Context_Menu_Templates(unittest.TestCase):
+
+    def rom_items(self, amount: int) -> list:
+        return [{'id': f'rom_{i}', 'name': f'Game {i}', 'properties': {'obj_type': constants.OBJ_ROM}} for i in range(amount)]
+
+    def test_context_menu_entries_are_filled_in_from_view_templates(self):
+        # arrange
+        from resources.lib import viewqueries
+        category_view = {'id': 'cat_1', 'obj_type': constants.OBJ_CATEGORY,
+                         'context_menu': target.render_context_menu_templates('cat_1')}
+        collection_view = json.loads(json.dumps({'id': 'col_1', 'obj_type': constants.OBJ_ROMCOLLECTION,
+                                                 'context_menu': target.render_context_menu_templates('col_1')}))
+        rom_item = self.rom_items(1)[0]
+        category_item = {'id': 'cat_2', 'name': 'Sub', 'properties': {'obj_type': constants.OBJ_CATEGORY}}
+        source_item = {'name': 'Sources', 'properties': {'obj_type': constants.OBJ_SOURCE}}
+
+        # act
+        rom_in_collection = viewqueries.qry_listitem_context_menu_items(rom_item, collection_view)
+        rom_in_category = viewqueries.qry_listitem_context_menu_items(rom_item, category_view)
+        category_in_category = viewqueries.qry_listitem_context_menu_items(category_item, category_view)
+        source_without_id = viewqueries.qry_listitem_context_menu_items(source_item, {'id': '', 'obj_type': constants.OBJ_CATEGORY})
+
+        # assert
+        self.assertEqual(rom_in_collection, [
+            ('40882', 'RunPlugin(plugin://mock.plugin//rom/view/rom_0)'),
+            ('40883', 'RunPlugin(plugin://mock.plugin//rom/edit/rom_0)'),
+            ('40884', 'RunPlugin(plugin://mock.plugin//execute/command/link_rom?rom_id=rom_0)'),
+            ('40885', 'RunPlugin(plugin://mock.plugin//execute/command/add_rom_to_favourites?rom_id=rom_0)')])
+        self.assertEqual(rom_in_category, rom_in_collection + [('40888', 'RunPlugin(plugin://mock.plugin//add/cat_1)')])
+        self.assertEqual(category_in_category[2], ('40888', 'RunPlugin(plugin://mock.plugin//add/cat_2/in/cat_1)'))
+        self.assertEqual(len(category_in_category), 3)
+        self.assertEqual(source_without_id, [
+            ('42046', 'RunPlugin(plugin://mock.plugin//execute/command/scan_roms?source_id=)'),
+            ('40888', 'RunPlugin(plugin://mock.plugin//add/)')])
+
+    @benchmark
+    @patch('resources.lib.commands.view_rendering_commands.kodi.translate', side_effect=lambda string_id: f'label {string_id}')
+    def test_benchmark_context_menu_entries_per_browse(self, translate_mock):
+        # arrange
+        from resources.lib import viewqueries
+        items = self.rom_items(10000)
+
+        # act
+        start = time.perf_counter()
+        for item in items:
+            viewqueries.qry_listitem_context_menu_items(item, {'id': 'col_1', 'obj_type': constants.OBJ_ROMCOLLECTION})
+        per_item_duration = time.perf_counter() - start
+        per_item_translations = translate_mock.call_count
+
+        translate_mock.reset_mock()
+        view = {'id': 'col_1', 'obj_type': constants.OBJ_ROMCOLLECTION, 'context_menu': target.render_context_menu_templates('col_1')}
+        start = time.perf_counter()
+        for item in items:
+            viewqueries.qry_listitem_context_menu_items(item, view)
+        templated_duration = time.perf_counter() - start
+
+        # assert
+        logger.info(f'Context menus of 10000 items: rendered per item {per_item_duration:.2f}s, '
+                    f'from view templates {templated_duration:.2f}s')
+        self.assertEqual(per_item_translations, 10000 * 16)
+        self.assertLess(templated_duration, per_item_duration)
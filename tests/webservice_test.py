@@ -0,0 +1,335 @@
+import sys
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+import json
+import socket
+import sqlite3
+
+import logging
+
+from http.client import HTTPConnection
+from unittest.mock import patch
+
+import tests.fake_routing
+
+module = type(sys)('routing')
+module.Plugin = tests.fake_routing.Plugin
+sys.modules['routing'] = module
+
+from akl import constants
+from akl.utils import io
+
+from tests.fixtures import DatabaseTestCase
+from resources.lib import globals, viewqueries, queries as qry
+from resources.lib.commands import api_commands
+from resources.lib.webservice import AelHttpServer, RequestHandler
+from resources.lib.repositories import ViewRepository, ViewCache, UnitOfWork
+from resources.lib.instrumentation import ServiceMetrics
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(format = '%(asctime)s %(module)s %(levelname)s: %(message)s',
+                datefmt = '%m/%d/%Y %I:%M:%S %p', level = logging.INFO)
+
+class Test_webservice(unittest.TestCase):
+
+    def setUp(self):
+        ServiceMetrics.reset()
+        ServiceMetrics.queue_depth_provider = lambda: 3
+        self.server = AelHttpServer(('127.0.0.1', 0), RequestHandler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.request('QUIT', '/')
+        self.thread.join(5)
+        self.server.server_close()
+        ServiceMetrics.queue_depth_provider = None
+
+    def request(self, method: str, path: str, headers: dict = {}):
+        status, headers, body = self.request_with_headers(method, path, headers)
+        return status, headers.get('Content-type'), body
+
+    def request_with_headers(self, method: str, path: str, headers: dict = {}):
+        conn = HTTPConnection('127.0.0.1', self.port, timeout=5)
+        conn.request(method, path, headers=headers)
+        response = conn.getresponse()
+        body = response.read().decode('utf-8')
+        response_headers = dict(response.getheaders())
+        conn.close()
+        return response.status, response_headers, body
+
+    def scrape(self) -> dict:
+        # stand-in for a prometheus scraper: parse the text exposition format into samples
+        status, content_type, body = self.request('GET', '/query/metrics', {'Accept': 'text/plain;version=0.0.4'})
+        self.assertEqual(status, 200)
+        self.assertTrue(content_type.startswith('text/plain'))
+        samples = {}
+        for line in body.splitlines():
+            if not line or line.startswith('#'):
+                continue
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+        return samples
+
+    def test_metrics_are_served_as_json(self):
+        # arrange
+        ServiceMetrics.record_render('romcollection', 0.25)
+        ServiceMetrics.record_cache_lookup('views', True)
+        ServiceMetrics.record_cache_lookup('views', False)
+
+        # act
+        status, content_type, body = self.request('GET', '/query/metrics')
+
+        # assert
+        self.assertEqual(status, 200)
+        self.assertEqual(content_type, 'application/json')
+        actual = json.loads(body)
+        self.assertEqual(actual['queue']['depth'], 3)
+        self.assertEqual(actual['renders']['romcollection']['count'], 1)
+        self.assertEqual(actual['caches']['views']['hit_rate'], 0.5)
+
+    def test_metrics_count_requests_per_route(self):
+        # arrange
+        for idx in range(5):
+            self.request('GET', f'/unknown/path/{idx}')
+
+        # act
+        samples = self.scrape()
+
+        # assert
+        self.assertEqual(samples['akl_http_request_duration_seconds_count{route="other"}'], 5)
+        self.assertEqual(samples['akl_http_request_errors_total{route="other"}'], 5)
+        self.assertEqual(samples['akl_command_queue_depth'], 3)
+        self.assertIn('akl_http_request_duration_seconds{route="other",quantile="0.99"}', samples)
+        self.assertFalse(any('/unknown/path' in name for name in samples))
+
+    def test_metrics_route_of_known_paths(self):
+        # arrange
+        self.request('GET', f'/query/view/{constants.OBJ_ROMCOLLECTION}/collection_a')
+        self.request('GET', '/query/metrics/?format=json')
+
+        # act
+        requests = ServiceMetrics.get_metrics()['requests']
+
+        # assert
+        self.assertEqual(requests['/query/view']['count'], 1)
+        self.assertEqual(requests['/query/metrics']['count'], 1)
+        self.assertEqual(set(requests), {'/query/view', '/query/metrics'})
+
+
+
+class Test_webservice_views(Test_webservice):
+
+    def setUp(self):
+        super(Test_webservice_views, self).setUp()
+        ViewCache.clear()
+        self.test_dir = tempfile.mkdtemp()
+        self.paths = globals.AKL_Paths('plugin.tests')
+        self.paths.VIEWS_DIR = io.FileName(self.test_dir)
+        self.paths.VIEWS_INDEX_FILE_PATH = io.FileName(os.path.join(self.test_dir, 'views_index.json'))
+        self.paths.ROOT_PATH = io.FileName(os.path.join(self.test_dir, 'root.json'))
+        self.paths_patcher = patch.object(globals, 'g_PATHS', self.paths, create=True)
+        self.paths_patcher.start()
+
+    def tearDown(self):
+        super(Test_webservice_views, self).tearDown()
+        self.paths_patcher.stop()
+        shutil.rmtree(self.test_dir)
+
+    def store_view(self, view_id: str, items: list):
+        ViewRepository(self.paths).store_view(view_id, constants.OBJ_ROMCOLLECTION, {
+            'id': view_id, 'name': view_id, 'items': items})
+
+    def test_views_are_served_from_memory_with_etag(self):
+        # arrange
+        self.store_view('Collection_A', [{'id': 'rom_1'}])
+        path = f'/query/view/{constants.OBJ_ROMCOLLECTION}/Collection_A'
+
+        # act
+        first_status, first_headers, first_body = self.request_with_headers('GET', path)
+        second_status, second_headers, second_body = self.request_with_headers('GET', path)
+        not_modified_status, _, not_modified_body = self.request_with_headers('GET', path, {'If-None-Match': first_headers['ETag']})
+        missing_status, _, _ = self.request_with_headers('GET', f'/query/view/{constants.OBJ_ROMCOLLECTION}/unknown')
+
+        # assert
+        self.assertEqual(first_status, 200)
+        self.assertEqual(json.loads(first_body)['items'], [{'id': 'rom_1'}])
+        self.assertEqual(second_body, first_body)
+        self.assertEqual(second_headers['ETag'], first_headers['ETag'])
+        self.assertEqual(not_modified_status, 304)
+        self.assertEqual(not_modified_body, '')
+        self.assertEqual(missing_status, 404)
+        self.assertEqual(ServiceMetrics.get_metrics()['caches']['views']['hits'], 2)
+
+    def test_stored_views_are_served_updated(self):
+        # arrange
+        self.store_view('collection_b', [{'id': 'rom_1'}])
+        path = f'/query/view/{constants.OBJ_ROMCOLLECTION}/collection_b'
+        _, headers, _ = self.request_with_headers('GET', path)
+
+        # act
+        ViewRepository(self.paths).upsert_view_item('collection_b', constants.OBJ_ROMCOLLECTION, {'id': 'rom_2'})
+        status, updated_headers, body = self.request_with_headers('GET', path, {'If-None-Match': headers['ETag']})
+
+        # assert
+        self.assertEqual(status, 200)
+        self.assertNotEqual(updated_headers['ETag'], headers['ETag'])
+        self.assertEqual(json.loads(body)['items'], [{'id': 'rom_1'}, {'id': 'rom_2'}])
+
+    def test_plugin_requests_known_views_with_etag(self):
+        # arrange
+        self.store_view('collection_c', [{'id': 'rom_1'}])
+        route = f'{constants.OBJ_ROMCOLLECTION}/collection_c'
+        viewqueries._service_views.clear()
+
+        # act
+        with patch.object(viewqueries, '_service_port', return_value=self.port):
+            first_view = viewqueries.qry_get_view_items('collection_c', constants.OBJ_ROMCOLLECTION)
+            first_known_view = viewqueries._service_views[route]
+            unchanged_view = viewqueries.qry_get_view_items('collection_c', constants.OBJ_ROMCOLLECTION)
+            unchanged_known_view = viewqueries._service_views[route]
+            ViewRepository(self.paths).upsert_view_item('collection_c', constants.OBJ_ROMCOLLECTION, {'id': 'rom_2'})
+            changed_view = viewqueries.qry_get_view_items('collection_c', constants.OBJ_ROMCOLLECTION)
+
+        # assert
+        self.assertEqual(first_view['items'], [{'id': 'rom_1'}])
+        self.assertEqual(unchanged_view, first_view)
+        # a 304 answer keeps the view received before
+        self.assertIs(unchanged_known_view, first_known_view)
+        self.assertEqual(changed_view['items'], [{'id': 'rom_1'}, {'id': 'rom_2'}])
+        self.assertNotEqual(viewqueries._service_views[route][0], first_known_view[0])
+
+    def test_view_cache_is_bounded(self):
+        # arrange
+        for idx in range(ViewCache.MAX_VIEWS + 10):
+            self.store_view(f'collection_{idx}', [])
+
+        # act
+        for idx in range(ViewCache.MAX_VIEWS + 10):
+            ViewCache.get(ViewRepository(self.paths).get_view_file(f'collection_{idx}', constants.OBJ_ROMCOLLECTION))
+        ViewCache.get(ViewRepository(self.paths).get_view_file('collection_0', constants.OBJ_ROMCOLLECTION))
+
+        # assert
+        self.assertEqual(len(ViewCache._views), ViewCache.MAX_VIEWS)
+        self.assertEqual(ServiceMetrics.get_metrics()['caches']['views']['misses'], ViewCache.MAX_VIEWS + 11)
+
+
+class Test_webservice_writes(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.query("INSERT INTO metadata (id) VALUES ('meta_1')")
+        self.query("INSERT INTO roms (id, name, metadata_id) VALUES ('rom_1', 'Game 1', 'meta_1')")
+
+        ServiceMetrics.reset()
+        self.server = AelHttpServer(('127.0.0.1', 0), RequestHandler)
+        self.port_patcher = patch.object(viewqueries, '_service_port', return_value=self.server.server_address[1])
+        self.port_patcher.start()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        conn = HTTPConnection('127.0.0.1', self.server.server_address[1], timeout=5)
+        conn.request('QUIT', '/')
+        conn.getresponse()
+        conn.close()
+        self.thread.join(5)
+        self.server.server_close()
+        self.port_patcher.stop()
+        super().tearDown()
+
+    def launch_count(self) -> int:
+        return self.query("SELECT launch_count FROM roms WHERE id = 'rom_1'")[0][0]
+
+    def test_plugin_writes_are_stored_by_service(self):
+        # arrange
+        errors = []
+
+        def plugin_session():
+            try:
+                for _ in range(20):
+                    uow = UnitOfWork(self.db_path)
+                    with uow:
+                        uow.execute(qry.SELECT_ROM, 'rom_1')
+                        uow.single_result()
+                        uow.execute(qry.UPDATE_ROM_LAUNCH_STATS, '2024-01-01 10:00:00', 'rom_1')
+                        uow.commit()
+            except Exception as ex:
+                errors.append(ex)
+
+        # act
+        with patch.object(UnitOfWork, 'WRITE_FORWARDER', viewqueries.store_writes_in_service):
+            threads = [threading.Thread(target=plugin_session) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            # the service keeps writing itself at the same time
+            for _ in range(20):
+                uow = UnitOfWork(self.db_path, forward_writes=False)
+                with uow:
+                    uow.execute(qry.UPDATE_ROM_LAUNCH_STATS, '2024-01-01 11:00:00', 'rom_1')
+                    uow.commit()
+            for thread in threads:
+                thread.join()
+
+        # assert
+        self.assertEqual(errors, [])
+        self.assertEqual(self.launch_count(), 5 * 20 + 20)
+        self.assertEqual(ServiceMetrics.get_metrics()['requests']['/store/writes']['count'], 5 * 20)
+
+    def test_unknown_statements_are_refused(self):
+        # act
+        with self.assertRaises(ConnectionError):
+            viewqueries.store_writes_in_service([["UPDATE roms SET launch_count = 99", []]])
+
+        # assert
+        self.assertEqual(self.launch_count(), 0)
+
+    def test_writes_are_stored_locally_without_service(self):
+        # arrange
+        self.port_patcher.stop()
+        self.port_patcher = patch.object(viewqueries, '_service_port', return_value=1)
+        self.port_patcher.start()
+
+        # act
+        with patch.object(UnitOfWork, 'WRITE_FORWARDER', viewqueries.store_writes_in_service):
+            uow = UnitOfWork(self.db_path)
+            with uow:
+                uow.execute(qry.UPDATE_ROM_LAUNCH_STATS, '2024-01-01 10:00:00', 'rom_1')
+                uow.commit()
+
+        # assert
+        self.assertEqual(self.launch_count(), 1)
+
+    def test_writes_are_stored_locally_when_service_fails(self):
+        # arrange
+        failing_store = patch.object(api_commands, 'cmd_store_writes', side_effect=sqlite3.OperationalError('disk I/O error'))
+
+        # act
+        with failing_store, patch.object(UnitOfWork, 'WRITE_FORWARDER', viewqueries.store_writes_in_service):
+            uow = UnitOfWork(self.db_path)
+            with uow:
+                uow.execute(qry.UPDATE_ROM_LAUNCH_STATS, '2024-01-01 10:00:00', 'rom_1')
+                uow.commit()
+
+        # assert
+        self.assertEqual(self.launch_count(), 1)
+        self.assertEqual(ServiceMetrics.get_metrics()['requests']['/store/writes']['count'], 1)
+
+    def test_writes_are_not_stored_locally_when_service_times_out(self):
+        # act
+        with patch.object(UnitOfWork, 'WRITE_FORWARDER', side_effect=socket.timeout('timed out')):
+            uow = UnitOfWork(self.db_path)
+            with uow:
+                uow.execute(qry.UPDATE_ROM_LAUNCH_STATS, '2024-01-01 10:00:00', 'rom_1')
+                uow.commit()
+
+        # assert
+        self.assertEqual(self.launch_count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()